@@ -0,0 +1,53 @@
+"""Cost of completion requests while a query is typed.
+
+Completes every prefix of a few queries, with an empty cache (as for a
+parser state stack seen for the first time) and with cached results, and
+while typing with the checkpoints of an incremental parser.
+
+Run with::
+
+    python benchmarks/bench_complete.py
+"""
+
+import time
+
+from cql.incremental import CQLIncrementalParser
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+QUERIES = [
+    'dc.title any/rel.algorithm=cori "fish food" and (b or c) sortby dc.date/sort.descending',
+    "> dc = info:srw/cql-context-set/1/dc-v1.1 dc.creator = sanderson prox/unit=word cat",
+    " or ".join(f'dc.title any "term {i}"' for i in range(20)),
+]
+
+
+def main():
+    parser = CQLParser12()
+    parser.build()
+    prefixes = [query[:pos] for query in QUERIES for pos in range(len(query) + 1)]
+
+    for label in ("uncached", "cached"):
+        start = time.perf_counter()
+        for prefix in prefixes:
+            if label == "uncached":
+                parser._completions.clear()
+            parser.complete(prefix)
+        elapsed = (time.perf_counter() - start) / len(prefixes)
+        print(f"complete() {label:8}: {elapsed * 1e6:7.1f} us/request")
+
+    start = time.perf_counter()
+    inc = CQLIncrementalParser(parser)
+    for query in QUERIES:
+        inc.update("")
+        for char in query:
+            inc.edit(len(inc.text), len(inc.text), char)
+            inc.complete()
+    elapsed = (time.perf_counter() - start) / len(prefixes)
+    print(f"incremental edit + complete(): {elapsed * 1e6:7.1f} us/keystroke")
+
+
+if __name__ == "__main__":
+    main()
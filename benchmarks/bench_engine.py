@@ -0,0 +1,133 @@
+"""Indexing and search times of the in-memory engine on a synthetic
+collection, and the set operations of posting lists compared with a k-way
+heap merge and a galloping intersection in Python.
+
+Run with::
+
+    python benchmarks/bench_engine.py [num_docs]
+"""
+
+import heapq
+import random
+import sys
+import time
+from array import array
+from itertools import accumulate
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.engine.postings import gallop
+from cql.engine.postings import intersect
+from cql.engine.postings import union_all
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+QUERIES = [
+    "dc.title = w7",
+    "dc.title = w7 and dc.title = w3",
+    "dc.title = w1 and dc.title = w2 and dc.title = w3 and dc.title = w4",
+    "dc.title = rare17 and dc.type = book",
+    "dc.type = book or dc.type = article",
+    'dc.title any "w5 w6 w8" not dc.type == map',
+    "fish and dc.date == 2001",
+    "cql.allRecords = 1 not dc.type = map",
+]
+
+
+def make_documents(num: int):
+    rnd = random.Random(42)
+    # a few frequent words and a long tail
+    words = [f"w{i}" for i in range(10)] + [f"rare{i}" for i in range(num // 10)]
+    cum_weights = list(accumulate([200] * 10 + [1] * (num // 10)))
+    for _ in range(num):
+        yield {
+            "dc.title": " ".join(rnd.choices(words, cum_weights=cum_weights, k=6)),
+            "dc.type": rnd.choice(["book", "article", "map"]),
+            "dc.date": str(rnd.randint(1950, 2024)),
+            "dc.subject": "fish" if rnd.random() < 0.01 else "other",
+        }
+
+
+def heap_union(lists):
+    result = array("I")
+    last = -1
+    for doc_id in heapq.merge(*lists):
+        if doc_id != last:
+            result.append(doc_id)
+            last = doc_id
+    return result
+
+
+def galloping_intersect(a, b):
+    result = array("I")
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            result.append(a[i])
+            i += 1
+            j += 1
+        elif a[i] < b[j]:
+            i = gallop(a, b[j], i + 1)
+        else:
+            j = gallop(b, a[i], j + 1)
+    return result
+
+
+def bench_postings(num: int):
+    rnd = random.Random(7)
+
+    def make(size: int):
+        return array("I", sorted(rnd.sample(range(num), size)))
+
+    print("posting lists (set operations / heap merge or galloping)")
+    for k, size in [(2, num // 10), (10, num // 50), (50, num // 200)]:
+        lists = [make(size) for _ in range(k)]
+        ours = best_time(lambda: union_all(lists))
+        other = best_time(lambda: heap_union(lists))
+        label = f"union of {k} x {size}"
+        print(f"{label:50} {ours * 1e3:8.2f} / {other * 1e3:8.2f} ms")
+    for small, large in [(num // 10, num // 10), (num // 100, num // 10)]:
+        a, b = make(small), make(large)
+        ours = best_time(lambda: intersect(a, b))
+        other = best_time(lambda: galloping_intersect(a, b))
+        label = f"intersection of {small} and {large}"
+        print(f"{label:50} {ours * 1e3:8.2f} / {other * 1e3:8.2f} ms")
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    index = CQLInvertedIndex()
+    start = time.perf_counter()
+    index.add_all(make_documents(num))
+    print(f"indexed {index} in {time.perf_counter() - start:.1f} s")
+
+    parser = CQLParser12()
+    parser.build()
+    for bitmaps in (False, True):
+        print(f"bitmaps={bitmaps} (search / count)")
+        engine = CQLSearchEngine(index, server_choice=["dc.subject"], bitmaps=bitmaps)
+        for text in QUERIES:
+            query = parser.parse(text)
+            hits = len(engine.search(query))
+            search = best_time(lambda: engine.search(query))
+            count = best_time(lambda: engine.count(query))
+            print(
+                f"{text[:50]:50} {hits:8} hits in {search * 1e3:8.2f} /"
+                f" {count * 1e3:8.2f} ms"
+            )
+    bench_postings(num)
+
+
+def best_time(func) -> float:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    main()
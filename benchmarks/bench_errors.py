@@ -0,0 +1,77 @@
+"""Throughput of rejecting invalid queries (as sent by scanners and bots).
+
+Compares the default (no logging) with ``log_errors=True``, which logs the
+parser stack and possible reductions for each error.
+
+Run with::
+
+    python benchmarks/bench_errors.py [--number N]
+"""
+
+import argparse
+import logging
+import time
+
+from cql.lexer import CQLLexer
+from cql.lexer import CQLLexerError
+from cql.parser import CQLParser12
+from cql.parser import CQLParserError
+
+# ---------------------------------------------------------------------------
+
+
+INVALID_QUERIES = [
+    "dc.title any fish fish",
+    "apple OR",
+    "( apple OR banana",
+    "apple ) OR banana",
+    "a = = b",
+    "dc.title any fish sortby",
+    "a sortby b ) c",
+    "' OR 1=1 --",
+    "<script>alert(1)</script>",
+    "../../../../etc/passwd",
+    "a and (b or (c not d)",
+    "=",
+    "",
+    'a = "unterminated',
+    "dc.title any fish /",
+    "title=foo and author=(bar or baz)",
+]
+
+
+def run(parser: CQLParser12, queries, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        for query in queries:
+            try:
+                parser.parse(query)
+            except (CQLParserError, CQLLexerError):
+                pass
+    return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    argparser.add_argument("--number", type=int, default=2000)
+    args = argparser.parse_args()
+
+    # as in a service that writes its logs somewhere
+    logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+
+    for log_errors in (False, True):
+        lexer = CQLLexer()
+        lexer.build(log_errors=log_errors)
+        parser = CQLParser12()
+        parser.build(lexer, log_errors=log_errors)
+
+        elapsed = run(parser, INVALID_QUERIES, args.number)
+        count = args.number * len(INVALID_QUERIES)
+        print(
+            f"log_errors={log_errors!s:5}: {count / elapsed:10,.0f} invalid queries/s"
+            f" ({elapsed / count * 1e6:.1f} us/query)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Cost per keystroke of incremental validation vs. validating the whole query.
+
+Types a clause into the middle of queries of different lengths, one
+character at a time.
+
+Run with::
+
+    python benchmarks/bench_incremental.py
+"""
+
+import time
+
+from cql.incremental import CQLIncrementalParser
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+TYPED = " and dc.creator any/relevant sanderson"
+
+
+def make_query(num_clauses: int) -> str:
+    return " or ".join(f'dc.title any "term {i}"' for i in range(num_clauses))
+
+
+def main():
+    parser = CQLParser12()
+    parser.build()
+
+    for num_clauses in (10, 100, 1000, 10000):
+        query = make_query(num_clauses)
+        middle = query.index(" or ", len(query) // 2)
+
+        inc = CQLIncrementalParser(parser, query)
+        start = time.perf_counter()
+        for pos, char in enumerate(TYPED, start=middle):
+            inc.edit(pos, pos, char)
+        incremental = (time.perf_counter() - start) / len(TYPED)
+
+        start = time.perf_counter()
+        for pos in range(middle, middle + len(TYPED)):
+            parser.validate(query[:middle] + TYPED[: pos - middle + 1] + query[middle:])
+        full = (time.perf_counter() - start) / len(TYPED)
+
+        print(
+            f"{len(query):8} chars: incremental {incremental * 1e6:8.1f} us/keystroke,"
+            f" validate {full * 1e6:9.1f} us/keystroke"
+        )
+
+
+if __name__ == "__main__":
+    main()
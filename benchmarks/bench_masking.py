@@ -0,0 +1,97 @@
+"""Masked terms (``comput*``, ``c?t``, ``f*ing``) of the in-memory engine
+by its sorted term dictionaries (a prefix is a binary search, other masks
+match the words with the same prefix), compared with matching the masked
+word against the whole vocabulary.
+
+Run with::
+
+    python benchmarks/bench_masking.py [num_docs]
+"""
+
+import random
+import string
+import sys
+import time
+from typing import List
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.masking import compile_pattern
+from cql.masking import parse_mask
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+QUERIES = [
+    "title = qu*",
+    "title = quan*",
+    "title = q?a*",
+    "title = qua*ng",
+    "title = *ing",
+    'title = "qu* ba*"',
+]
+
+
+def make_documents(num: int):
+    rnd = random.Random(42)
+    vocabulary = [
+        "".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(3, 9)))
+        for _ in range(50_000)
+    ]
+    for _ in range(num):
+        yield {"title": " ".join(rnd.choices(vocabulary, k=8))}
+
+
+def best_time(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def scan_vocabulary(terms: List[str], word: str) -> int:
+    # every word of the vocabulary matched against the masked word
+    fullmatch = compile_pattern(parse_mask(word).pattern).fullmatch
+    return sum(1 for term in terms if fullmatch(term))
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    index = CQLInvertedIndex(positions=True)
+    index.add_all(make_documents(num))
+
+    parser = CQLParser12()
+    parser.build()
+    engine = CQLSearchEngine(index)
+    start = time.perf_counter()
+    dictionary = index.term_dictionary("title")
+    print(f"{dictionary} of {index} made in {time.perf_counter() - start:.2f} s")
+
+    print(
+        f"{'query':24} {'words':>7} {'hits':>8} {'lookup (ms)':>12}"
+        f" {'scan (ms)':>10} {'search (ms)':>12}"
+    )
+    for text in QUERIES:
+        words = text.split("=", 1)[1].strip().strip('"').split()
+        matched = sum(len(dictionary.matching(parse_mask(word))) for word in words)
+        assert matched == sum(scan_vocabulary(dictionary.terms, word) for word in words)
+        looked_up = best_time(
+            lambda: [dictionary.matching(parse_mask(word)) for word in words]
+        )
+        scanned = best_time(
+            lambda: [scan_vocabulary(dictionary.terms, word) for word in words],
+            repeat=1,
+        )
+        hits = engine.search(parser.parse(text))
+        searched = best_time(lambda: engine.search(parser.parse(text)))
+        print(
+            f"{text[:24]:24} {matched:7} {len(hits):8} {looked_up * 1e3:12.2f}"
+            f" {scanned * 1e3:10.1f} {searched * 1e3:12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
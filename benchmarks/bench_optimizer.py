@@ -0,0 +1,46 @@
+"""Size reduction and cost of the boolean optimizer on facet style queries.
+
+Run with::
+
+    python benchmarks/bench_optimizer.py
+"""
+
+import time
+
+from cql.optimizer import CQLOptimizer
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+def make_query(num_facets: int) -> str:
+    # what a facet UI generates: repeated selections, redundant refinements
+    clauses = []
+    for i in range(num_facets):
+        facet = f"(format = book and subject = s{i % 20})"
+        clauses.append(facet)
+        clauses.append(f"(format = book and subject = s{i % 20} and year > 2000)")
+        clauses.append(f"(subject = s{i % 20} and format = book)")
+    return "dc.title any fish and (" + " or ".join(clauses) + ")"
+
+
+def main():
+    parser = CQLParser12()
+    parser.build()
+    optimizer = CQLOptimizer()
+
+    for num_facets in (10, 100, 1000, 10000):
+        query = parser.parse(make_query(num_facets))
+        start = time.perf_counter()
+        optimizer.optimize(query)
+        elapsed = time.perf_counter() - start
+        report = optimizer.report
+        print(
+            f"{report.nodes_before:7} nodes -> {report.nodes_after:4}"
+            f" ({report.duplicates} duplicates, {report.absorbed} absorbed)"
+            f" in {elapsed * 1e3:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
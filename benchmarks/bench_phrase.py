@@ -0,0 +1,89 @@
+"""Phrase search times of the in-memory engine with positional postings,
+compared with intersecting the documents of the words (``all``) and checking
+the candidates with a compiled predicate, for long phrases and phrases of
+high-frequency words.
+
+Run with::
+
+    python benchmarks/bench_phrase.py [num_docs]
+"""
+
+import random
+import sys
+import time
+from itertools import accumulate
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+#: frequent words (about 1 in 10 words each) and a long tail
+FREQUENT = ["the", "of", "and", "in", "history", "science"]
+
+PHRASES = [
+    "history of science",
+    "the history of the science of history",
+    "of the",
+    "the of and in the of",
+    "history of rare17",
+    "rare1 rare2 rare3 rare4 rare5 rare6 rare7 rare8",
+]
+
+
+def make_documents(num: int):
+    rnd = random.Random(42)
+    words = FREQUENT + [f"rare{i}" for i in range(num // 10)]
+    cum_weights = list(accumulate([100] * len(FREQUENT) + [1] * (num // 10)))
+    for _ in range(num):
+        length = rnd.randint(10, 500)
+        yield {"title": " ".join(rnd.choices(words, cum_weights=cum_weights, k=length))}
+
+
+def best_time(func) -> float:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    documents = list(make_documents(num))
+    index = CQLInvertedIndex(positions=True)
+    start = time.perf_counter()
+    index.add_all(documents)
+    print(f"indexed {index} in {time.perf_counter() - start:.1f} s")
+
+    parser = CQLParser12()
+    parser.build()
+    engine = CQLSearchEngine(index)
+    print(f"{'phrase':45} {'hits':>6} {'positions (ms)':>15} {'all + check (ms)':>17}")
+    for text in PHRASES:
+        query = parser.parse(f'title adj "{text}"')
+        candidates = parser.parse(f'title all "{text}"')
+        predicate = query.compile()
+
+        def check():
+            return [
+                doc_id
+                for doc_id in engine.search(candidates)
+                if predicate(documents[doc_id])
+            ]
+
+        hits = engine.search(query)
+        assert hits.tolist() == check()
+        positions = best_time(lambda: engine.search(query))
+        checked = best_time(check)
+        print(
+            f"{text[:45]:45} {len(hits):6} {positions * 1e3:15.1f}"
+            f" {checked * 1e3:17.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Search times of queries as typed and as planned by selectivity, with the
+in-memory engine and with compiled predicates (the document frequencies of
+the engine's index are the statistics of both).
+
+Run with::
+
+    python benchmarks/bench_planner.py [num_docs]
+"""
+
+import random
+import sys
+import time
+from itertools import accumulate
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+QUERIES = [
+    "dc.title any w1 and dc.type = book and dc.title = rare17",
+    "(dc.type = book or dc.type = article) and dc.title = unknown",
+    "dc.title = w1 and (dc.title = w2 or dc.title = w3) and dc.date == 2001",
+    "(dc.title = w1 not dc.type = map) and (dc.title = w2 and dc.title = rare5)",
+]
+
+
+def make_documents(num: int):
+    rnd = random.Random(42)
+    words = [f"w{i}" for i in range(10)] + [f"rare{i}" for i in range(num // 10)]
+    cum_weights = list(accumulate([200] * 10 + [1] * (num // 10)))
+    for _ in range(num):
+        yield {
+            "dc.title": " ".join(rnd.choices(words, cum_weights=cum_weights, k=6)),
+            "dc.type": rnd.choice(["book", "article", "map"]),
+            "dc.date": str(rnd.randint(1950, 2024)),
+        }
+
+
+def best_time(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    documents = list(make_documents(num))
+    index = CQLInvertedIndex()
+    index.add_all(documents)
+    fields = {name: name for name in ("dc.title", "dc.type", "dc.date")}
+
+    parser = CQLParser12()
+    parser.build()
+    planned = CQLSearchEngine(index)
+    unplanned = CQLSearchEngine(index, planner=False)
+    print(f"{'query':60} {'engine (ms)':>20} {'predicate (ms)':>20}")
+    for text in QUERIES:
+        query = parser.parse(text)
+        plan = planned.plan(query)
+        assert planned.search(query) == unplanned.search(query)
+        engine = [best_time(lambda: e.search(query)) for e in (unplanned, planned)]
+
+        predicates = [q.compile(fields=fields) for q in (query, plan.query)]
+        predicate = [
+            best_time(lambda: sum(map(p, documents)), repeat=1) for p in predicates
+        ]
+        print(
+            f"{text[:60]:60} {engine[0] * 1e3:9.2f} {engine[1] * 1e3:9.2f}"
+            f" {predicate[0] * 1e3:9.1f} {predicate[1] * 1e3:9.1f}"
+        )
+        print(f"  planned: {plan.query.toCQL()[:70]} (~{plan.estimate})")
+
+
+if __name__ == "__main__":
+    main()
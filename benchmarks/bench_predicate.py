@@ -0,0 +1,93 @@
+"""Throughput of compiled query predicates over in-memory records, compared
+with walking the query tree for each record.
+
+Run with::
+
+    python benchmarks/bench_predicate.py [num_records]
+"""
+
+import random
+import re
+import sys
+import time
+
+from cql.parser import CQLParser12
+from cql.parser import CQLSearchClause
+
+# ---------------------------------------------------------------------------
+
+
+QUERIES = [
+    "title = fish",
+    'title any "fish chips" and year > 2000',
+    "(format = book or format = article) and year >= 1990 not lang = de",
+    " or ".join(f"subject = s{i}" for i in range(20)),
+]
+
+
+def make_records(num: int):
+    rnd = random.Random(42)
+    words = ["fish", "chips", "history", "science", "of", "the", "cat", "dog"]
+    return [
+        {
+            "title": " ".join(rnd.choices(words, k=4)),
+            "year": rnd.randint(1900, 2024),
+            "format": rnd.choice(["book", "article", "map"]),
+            "lang": rnd.choice(["en", "de", "fr"]),
+            "subject": f"s{rnd.randint(0, 99)}",
+        }
+        for _ in range(num)
+    ]
+
+
+def walk(node, record) -> bool:
+    # what the predicates replace, tree walk and relation dispatch per record
+    if isinstance(node, CQLSearchClause):
+        value = record.get(node.index.name.lower())
+        relation = node.relation.comparitor.name.lower()
+        if relation in ("=", "any"):
+            words = set(re.findall(r"\w+", str(value).lower()))
+            return any(word in words for word in node.term.lower().split())
+        if relation == ">":
+            return value > float(node.term)
+        if relation == ">=":
+            return value >= float(node.term)
+        raise ValueError(relation)
+    op = node.operator.value.lower()
+    if op == "and":
+        return walk(node.left, record) and walk(node.right, record)
+    if op == "or":
+        return walk(node.left, record) or walk(node.right, record)
+    return walk(node.left, record) and not walk(node.right, record)
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    records = make_records(num)
+    parser = CQLParser12()
+    parser.build()
+
+    for text in QUERIES:
+        query = parser.parse(text)
+        start = time.perf_counter()
+        predicate = query.compile()
+        compiled = time.perf_counter() - start
+
+        start = time.perf_counter()
+        hits = sum(1 for record in records if predicate(record))
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = sum(1 for record in records if walk(query.root, record))
+        walked = time.perf_counter() - start
+        assert hits == expected, (hits, expected)
+
+        print(
+            f"{text[:50]:50} {hits:7} hits, compile {compiled * 1e3:6.2f} ms,"
+            f" {num / elapsed / 1e6:5.2f} M records/s"
+            f" (tree walk {num / walked / 1e6:5.2f} M records/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
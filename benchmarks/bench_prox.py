@@ -0,0 +1,96 @@
+"""Indexing with word positions and ``prox`` search times of the in-memory
+engine, compared with checking all pairs of positions (texts of 10 to 2000
+words).
+
+Run with::
+
+    python benchmarks/bench_prox.py [num_docs]
+"""
+
+import random
+import sys
+import time
+from itertools import accumulate
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.engine import positions
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+QUERIES = [
+    "dc.title = w1 prox dc.title = w2",
+    "dc.title = w1 prox/distance<=3/ordered dc.title = w2",
+    "dc.title = w1 prox/distance>20 dc.title = w2",
+    "dc.title = w1 prox/distance=2 dc.title = rare17",
+    'dc.title any "w1 w2 w3" prox/distance<2 dc.title = w4',
+]
+
+
+def make_documents(num: int):
+    rnd = random.Random(42)
+    words = [f"w{i}" for i in range(10)] + [f"rare{i}" for i in range(num // 10)]
+    cum_weights = list(accumulate([200] * 10 + [1] * (num // 10)))
+    for _ in range(num):
+        length = rnd.randint(10, 2000)
+        yield {
+            "dc.title": " ".join(rnd.choices(words, cum_weights=cum_weights, k=length))
+        }
+
+
+def all_pairs(left, right, comparator: str, distance: int, ordered: bool) -> bool:
+    # what the sliding windows replace
+    compare = positions.DISTANCE_COMPARATORS[comparator]
+    for pos in left:
+        for other in right:
+            gap = other - pos if ordered else abs(other - pos)
+            if (gap > 0 or not ordered) and compare(gap, distance):
+                return True
+    return False
+
+
+def best_time(func) -> float:
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    documents = list(make_documents(num))
+    for with_positions in (False, True):
+        index = CQLInvertedIndex(positions=with_positions)
+        start = time.perf_counter()
+        index.add_all(documents)
+        print(
+            f"indexed {index} (positions={with_positions})"
+            f" in {time.perf_counter() - start:.1f} s"
+        )
+
+    parser = CQLParser12()
+    parser.build()
+    engine = CQLSearchEngine(index)
+    print(f"{'query':60} {'hits':>8} {'windows (ms)':>14} {'all pairs (ms)':>15}")
+    for text in QUERIES:
+        query = parser.parse(text)
+        hits = engine.count(query)
+        windows = best_time(lambda: engine.search(query))
+
+        positions.near = all_pairs
+        try:
+            assert engine.count(query) == hits
+            pairs = best_time(lambda: engine.search(query))
+        finally:
+            positions.near = near
+        print(f"{text[:60]:60} {hits:8} {windows * 1e3:14.1f} {pairs * 1e3:15.1f}")
+
+
+near = positions.near
+
+if __name__ == "__main__":
+    main()
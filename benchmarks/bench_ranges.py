@@ -0,0 +1,80 @@
+"""Range searches (``<``, ``>``, ``within``, ``/isoDate``) of the in-memory
+engine by binary search in its range indexes, compared with a compiled
+predicate checking every document.
+
+Run with::
+
+    python benchmarks/bench_ranges.py [num_docs]
+"""
+
+import random
+import sys
+import time
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+QUERIES = [
+    "year > 2020",
+    'year within/number "1990 1999"',
+    "year >=/number 1950",
+    "date >=/isoDate 2024-06",
+    'date within/isoDate "2001-01-01 2001-01-31"',
+    "year >/number 2020 and date </isoDate 2000",
+]
+
+
+def make_documents(num: int):
+    rnd = random.Random(42)
+    for _ in range(num):
+        year = rnd.randint(1900, 2024)
+        yield {
+            "year": str(year),
+            "date": f"{year}-{rnd.randint(1, 12):02}-{rnd.randint(1, 28):02}",
+        }
+
+
+def best_time(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    documents = list(make_documents(num))
+    index = CQLInvertedIndex()
+    index.add_all(documents)
+
+    parser = CQLParser12()
+    parser.build()
+    engine = CQLSearchEngine(index)
+    start = time.perf_counter()
+    for text in QUERIES:
+        engine.search(parser.parse(text))
+    print(f"range indexes of {index} made in {time.perf_counter() - start:.2f} s")
+
+    print(f"{'query':50} {'hits':>8} {'engine (ms)':>12} {'scan (ms)':>10}")
+    for text in QUERIES:
+        query = parser.parse(text.replace(" > 2020", " >/number 2020"))
+        predicate = query.compile()
+        hits = engine.search(parser.parse(text))
+        scan = [i for i, document in enumerate(documents) if predicate(document)]
+        assert hits.tolist() == scan
+        searched = best_time(lambda: engine.search(parser.parse(text)))
+        scanned = best_time(lambda: sum(map(predicate, documents)), repeat=1)
+        print(
+            f"{text[:50]:50} {len(hits):8} {searched * 1e3:12.2f}"
+            f" {scanned * 1e3:10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""BM25 ranking (``/relevant``) of the in-memory engine: the best 10
+documents by MaxScore pruning, compared with scoring every document with
+any of the words and sorting them.
+
+Run with::
+
+    python benchmarks/bench_ranking.py [num_docs]
+"""
+
+import random
+import sys
+import time
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+QUERIES = [
+    'text any/relevant "w0 w1 w2"',
+    'text any/relevant "w0 w1 w500"',
+    'text any/relevant "w2 w50 w900 w4000"',
+    'text any/relevant "w0 w1 w2 w3 w4 w5 w6 w7"',
+    'text any/relevant "w0 w3000" and tag = a',
+]
+K = 10
+
+
+def make_documents(num: int):
+    rnd = random.Random(42)
+    # Zipf-like word frequencies
+    words = [f"w{rank}" for rank in range(5000)]
+    weights = [1.0 / (rank + 1) for rank in range(5000)]
+    for _ in range(num):
+        yield {
+            "text": " ".join(rnd.choices(words, weights, k=rnd.randint(5, 60))),
+            "tag": rnd.choice("abc"),
+        }
+
+
+def best_time(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def exhaustive(engine: CQLSearchEngine, query):
+    # score every matching document, sort all of them
+    matches = set(engine.search(query).tolist())
+    scores = engine.scorer.scores(engine.relevant_terms(query), matches.__contains__)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:K]
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    index = CQLInvertedIndex()
+    index.add_all(make_documents(num))
+    engine = CQLSearchEngine(index)
+
+    parser = CQLParser12()
+    parser.build()
+    print(f"{'query':46} {'matches':>8} {'top (ms)':>9} {'all (ms)':>9}")
+    for text in QUERIES:
+        query = parser.parse(text)
+        ranked = engine.rank(query, K)
+        assert [doc for doc, _ in ranked] == [
+            doc for doc, _ in exhaustive(engine, query)
+        ]
+        top = best_time(lambda: engine.rank(query, K))
+        scored = best_time(lambda: exhaustive(engine, query))
+        print(
+            f"{text[:46]:46} {engine.count(query):8} {top * 1e3:9.1f}"
+            f" {scored * 1e3:9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""``sortBy`` of records: the first page by heap selection, compared with
+sorting all records, and the first page of several shards by merging their
+first pages.
+
+Run with::
+
+    python benchmarks/bench_sorting.py [num_records]
+"""
+
+import random
+import string
+import sys
+import time
+from itertools import islice
+
+from cql.parser import CQLParser12
+from cql.sorting import sorter
+
+# ---------------------------------------------------------------------------
+
+
+QUERIES = [
+    "x sortBy year",
+    "x sortBy title/ignoreCase",
+    "x sortBy year/descending title/ignoreCase/missingLow",
+]
+PAGE = 20
+SHARDS = 8
+
+
+def make_records(num: int):
+    rnd = random.Random(42)
+    for _ in range(num):
+        yield {
+            "title": "".join(rnd.choices(string.ascii_letters, k=8)),
+            "year": rnd.randint(1900, 2024) if rnd.random() < 0.9 else None,
+        }
+
+
+def best_time(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    records = list(make_records(num))
+    # contiguous shards, so equal keys are in the same order as in records
+    size = (num + SHARDS - 1) // SHARDS
+    shards = [
+        list(islice(records, start, start + size)) for start in range(0, num, size)
+    ]
+
+    parser = CQLParser12()
+    parser.build()
+    print(f"{'query':52} {'top (ms)':>9} {'sort (ms)':>10}" f" {'shards (ms)':>12}")
+    for text in QUERIES:
+        sort = sorter(parser.parse(text))
+        expected = sort.sort(records)[:PAGE]
+        assert sort.top(records, PAGE) == expected
+        pages = [sort.top(shard, PAGE) for shard in shards]
+        assert list(sort.merge(*pages, limit=PAGE)) == expected
+
+        top = best_time(lambda: sort.top(records, PAGE))
+        full = best_time(lambda: sort.sort(records)[:PAGE])
+        # shards are independent, the slowest one and the merge count
+        slowest = max(best_time(lambda: sort.top(shard, PAGE)) for shard in shards)
+        merged = best_time(lambda: list(sort.merge(*pages, limit=PAGE)))
+        print(
+            f"{text[:52]:52} {top * 1e3:9.1f} {full * 1e3:10.1f}"
+            f" {(slowest + merged) * 1e3:12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compiling queries into SQL with the statement cache (queries of a few
+shapes with other terms only bind other values) and without it (a new
+compiler for each query), and running the statements on an in-memory
+SQLite table: ``LIKE`` with the default separators, without separators and
+``REGEXP`` (a Python call for each row).
+
+Run with::
+
+    python benchmarks/bench_sql.py [num_queries]
+"""
+
+import random
+import sqlite3
+import sys
+import time
+
+from cql.parser import CQLParser12
+from cql.sql import CQLSQLCompiler
+from cql.sql import register_functions
+
+# ---------------------------------------------------------------------------
+
+
+WORDS = ["fish", "chips", "cat", "coat", "history", "science", "map", "book"]
+SHAPES = [
+    "title any {} and year > {}",
+    '(title = {} or subject == {}) and year within "{} 2010"',
+    "title all {} not subject = {} sortBy year/descending title",
+]
+COLUMNS = {"title": "title", "subject": "subject", "year": "year"}
+NUM_ROWS = 5_000
+
+
+def make_queries(num: int):
+    rnd = random.Random(42)
+    for _ in range(num):
+        shape = rnd.choice(SHAPES)
+        args = [
+            str(rnd.randint(1990, 2010)) if "year" in part else rnd.choice(WORDS)
+            for part in shape.split("{}")[:-1]
+        ]
+        yield shape.format(*args)
+
+
+def best_time(func, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    num = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    parser = CQLParser12()
+    parser.build()
+    queries = [parser.parse(text) for text in make_queries(num)]
+
+    cached = CQLSQLCompiler(COLUMNS)
+    t_cached = best_time(lambda: [cached.compile(query) for query in queries])
+    t_uncached = best_time(
+        lambda: [CQLSQLCompiler(COLUMNS).compile(query) for query in queries]
+    )
+    print(f"{num} queries of {len(SHAPES)} shapes")
+    print(f"  compile, cached shapes:  {t_cached * 1000:9.1f} ms")
+    print(f"  compile, no cache:       {t_uncached * 1000:9.1f} ms")
+
+    rnd = random.Random(7)
+    connection = sqlite3.connect(":memory:")
+    register_functions(connection)
+    connection.execute("CREATE TABLE records (title TEXT, subject TEXT, year INTEGER)")
+    connection.executemany(
+        "INSERT INTO records VALUES (?, ?, ?)",
+        (
+            (
+                " ".join(rnd.choices(WORDS, k=4)),
+                rnd.choice(WORDS),
+                rnd.randint(1990, 2010),
+            )
+            for _ in range(NUM_ROWS)
+        ),
+    )
+    statements = [cached.compile(query).select("records", "rowid") for query in queries]
+    print(f"  distinct SQL texts:      {len({sql for sql, _ in statements}):9d}")
+    print(f"run 100 on {NUM_ROWS} rows")
+    for name, compiler in [
+        ("LIKE, separators", cached),
+        ("LIKE, spaces only", CQLSQLCompiler(COLUMNS, separators="")),
+        ("REGEXP", CQLSQLCompiler(COLUMNS, regexp=True)),
+    ]:
+        some = [compiler.compile(query).select("records", "rowid") for query in queries]
+        t_run = best_time(
+            lambda: [
+                connection.execute(sql, params).fetchall() for sql, params in some[:100]
+            ],
+            repeat=1,
+        )
+        print(f"  {name + ':':23} {t_run * 1000:9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
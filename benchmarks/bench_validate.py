@@ -0,0 +1,96 @@
+"""Throughput of checking queries with ``validate()`` vs. a full ``parse()``.
+
+``validate_all()`` additionally recovers from errors to report all of them.
+
+Uses the queries of the regression corpus (``tests/regression``), both valid
+and invalid ones.
+
+Run with::
+
+    python benchmarks/bench_validate.py [--number N]
+"""
+
+import argparse
+import glob
+import os.path
+import time
+
+from cql.lexer import CQLLexer
+from cql.lexer import CQLLexerError
+from cql.parser import CQLParser12
+from cql.parser import CQLParserError
+
+# ---------------------------------------------------------------------------
+
+
+REGRESSION_QUERIES = sorted(
+    glob.glob(
+        os.path.join(
+            os.path.dirname(__file__), "..", "tests", "regression", "*", "*.cql"
+        )
+    )
+)
+
+
+def load_queries():
+    queries = list()
+    for fname in REGRESSION_QUERIES:
+        with open(fname, "r") as fp:
+            queries.append(fp.read())
+    return queries
+
+
+def run_parse(parser: CQLParser12, queries, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        for query in queries:
+            try:
+                parser.parse(query)
+            except (CQLParserError, CQLLexerError):
+                pass
+    return time.perf_counter() - start
+
+
+def run_validate(parser: CQLParser12, queries, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        for query in queries:
+            parser.validate(query)
+    return time.perf_counter() - start
+
+
+def run_validate_all(parser: CQLParser12, queries, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        for query in queries:
+            parser.validate_all(query)
+    return time.perf_counter() - start
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    argparser.add_argument("--number", type=int, default=200)
+    args = argparser.parse_args()
+
+    queries = load_queries()
+    lexer = CQLLexer()
+    lexer.build()
+    parser = CQLParser12()
+    parser.build(lexer)
+
+    count = args.number * len(queries)
+    print(f"{len(queries)} queries, {args.number} rounds")
+    for name, run in (
+        ("parse", run_parse),
+        ("validate", run_validate),
+        ("validate_all", run_validate_all),
+    ):
+        elapsed = run(parser, queries, args.number)
+        print(
+            f"{name:12}: {count / elapsed:10,.0f} queries/s"
+            f" ({elapsed / count * 1e6:.1f} us/query)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
 import logging
+from typing import List
 from typing import Optional
+from typing import Union
 
 from cql.lexer import CQLLexer
 from cql.lexer import CQLLexerError  # noqa: F401
+from cql.lexer import CQLTokenStream
+from cql.parser import CQLCompletion
 from cql.parser import CQLParser  # noqa: F401
 from cql.parser import CQLParser11  # noqa: F401
 from cql.parser import CQLParser12
 from cql.parser import CQLParserError  # noqa: F401
+from cql.parser import CQLParserLimitError  # noqa: F401
+from cql.parser import CQLParserLimits
 from cql.parser import CQLQuery
 
 
@@ -15,6 +21,7 @@ def parse(
     debug_show_lexerinfo: bool = False,
     debug_show_parserinfo: bool = False,
     debug_parsing: bool = False,
+    limits: Optional[CQLParserLimits] = None,
 ) -> Optional[CQLQuery]:
     kwargs_lexer = dict()
     kwargs_parser = dict()
@@ -36,6 +43,44 @@ def parse(
     cqllexer.build(**kwargs_lexer)
 
     cqlparser = CQLParser12()
-    cqlparser.build(cqllexer, **kwargs_parser)
+    cqlparser.build(cqllexer, limits=limits, **kwargs_parser)
 
     return cqlparser.parse(query, **kwargs_parser_run)
+
+
+def tokenize(query: str) -> CQLTokenStream:
+    return CQLLexer().tokenize(query)
+
+
+def validate(
+    query: str, limits: Optional[CQLParserLimits] = None
+) -> Optional[Union[CQLParserError, CQLLexerError]]:
+    cqllexer = CQLLexer()
+    cqllexer.build()
+
+    cqlparser = CQLParser12()
+    cqlparser.build(cqllexer, limits=limits)
+
+    return cqlparser.validate(query)
+
+
+def validate_all(
+    query: str, limits: Optional[CQLParserLimits] = None
+) -> List[Union[CQLParserError, CQLLexerError]]:
+    cqllexer = CQLLexer()
+    cqllexer.build()
+
+    cqlparser = CQLParser12()
+    cqlparser.build(cqllexer, limits=limits)
+
+    return cqlparser.validate_all(query)
+
+
+def complete(prefix_text: str) -> CQLCompletion:
+    cqllexer = CQLLexer()
+    cqllexer.build()
+
+    cqlparser = CQLParser12()
+    cqlparser.build(cqllexer)
+
+    return cqlparser.complete(prefix_text)
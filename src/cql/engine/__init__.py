@@ -0,0 +1,4 @@
+"""In-memory search engine executing CQL queries on an inverted index."""
+
+from cql.engine.index import CQLInvertedIndex  # noqa: F401
+from cql.engine.search import CQLSearchEngine  # noqa: F401
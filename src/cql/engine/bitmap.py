@@ -0,0 +1,300 @@
+"""Compressed bitmaps of document ids (Roaring-style).
+
+Ids are split into chunks of 65536 by their upper 16 bits. Each chunk is a
+container of the lower 16 bits: a sorted ``array('H')`` if it has up to
+:data:`MAX_ARRAY` ids, otherwise a bitmap (a Python ``int`` of 65536 bits,
+so ``&``, ``|`` and and-not are single big integer operations). Containers
+change their type after each operation by their cardinality.
+"""
+
+from array import array
+from bisect import bisect_left
+from itertools import compress
+from itertools import filterfalse
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Union
+
+from cql.engine.postings import TYPECODE
+from cql.engine.postings import postings
+
+# ---------------------------------------------------------------------------
+
+
+#: bits of the lower part of an id (within a chunk)
+CHUNK_BITS = 16
+#: ids per chunk
+CHUNK_SIZE = 1 << CHUNK_BITS
+#: max. ids of an array container, bitmaps above (same size in bytes)
+MAX_ARRAY = 4096
+
+#: array container (sorted lower 16 bits) or bitmap container
+Container = Union[array, int]
+
+#: binary digits to 0 / 1 bytes
+_FLAGS = bytes.maketrans(b"01", b"\x00\x01")
+
+if hasattr(int, "bit_count"):  # Python 3.10+
+
+    def _popcount(bits: int) -> int:
+        return bits.bit_count()
+
+else:  # pragma: no cover
+
+    def _popcount(bits: int) -> int:
+        return bin(bits).count("1")
+
+
+def _to_bits(values: array) -> int:
+    data = bytearray(CHUNK_SIZE // 8)
+    for value in values:
+        data[value >> 3] |= 1 << (value & 7)
+    return int.from_bytes(data, "little")
+
+
+def _positions(bits: int, base: int = 0) -> Iterator[int]:
+    # set bits (plus base) in order: one flag byte per bit, selected in C
+    flags = format(bits, "0%db" % CHUNK_SIZE)[::-1].encode("ascii")
+    return compress(range(base, base + CHUNK_SIZE), flags.translate(_FLAGS))
+
+
+def _to_array(bits: int) -> array:
+    return array("H", _positions(bits))
+
+
+def _shrink(bits: int) -> Optional[Container]:
+    # container type by cardinality, None if empty
+    return _bits_container(bits) if bits else None
+
+
+def _from_values(values: array) -> Optional[Container]:
+    return _values_container(values) if values else None
+
+
+def _bits_container(bits: int) -> Container:
+    # container type of (non empty) bits by cardinality
+    return _to_array(bits) if _popcount(bits) <= MAX_ARRAY else bits
+
+
+def _values_container(values: array) -> Container:
+    # container type of (non empty) values by cardinality
+    return values if len(values) <= MAX_ARRAY else _to_bits(values)
+
+
+def _len(container: Container) -> int:
+    return _popcount(container) if isinstance(container, int) else len(container)
+
+
+def _and(a: Container, b: Container) -> Optional[Container]:
+    if isinstance(a, int) and isinstance(b, int):
+        return _shrink(a & b)
+    if isinstance(a, int):
+        a, b = b, a
+    if isinstance(b, int):
+        data = b.to_bytes(CHUNK_SIZE // 8, "little")
+        return _from_values(array("H", [x for x in a if data[x >> 3] >> (x & 7) & 1]))
+    if len(a) > len(b):
+        a, b = b, a
+    return _from_values(array("H", filter(set(a).__contains__, b)))
+
+
+def _or(a: Container, b: Container) -> Container:
+    if isinstance(a, int) or isinstance(b, int):
+        return (a if isinstance(a, int) else _to_bits(a)) | (
+            b if isinstance(b, int) else _to_bits(b)
+        )
+    return _values_container(array("H", sorted(set(a).union(b))))
+
+
+def _and_not(a: Container, b: Container) -> Optional[Container]:
+    if isinstance(a, int):
+        return _shrink(a & ~(b if isinstance(b, int) else _to_bits(b)))
+    if isinstance(b, int):
+        data = b.to_bytes(CHUNK_SIZE // 8, "little")
+        return _from_values(
+            array("H", [x for x in a if not data[x >> 3] >> (x & 7) & 1])
+        )
+    return _from_values(array("H", filterfalse(set(b).__contains__, a)))
+
+
+def _member_test(container: Container):
+    # whether an id (its lower 16 bits) is in a container
+    mask = CHUNK_SIZE - 1
+    if isinstance(container, int):
+        data = container.to_bytes(CHUNK_SIZE // 8, "little")
+
+        def in_bits(value: int) -> bool:
+            value &= mask
+            return bool(data[value >> 3] >> (value & 7) & 1)
+
+        return in_bits
+
+    members = set(container)
+
+    def in_array(value: int) -> bool:
+        return (value & mask) in members
+
+    return in_array
+
+
+# ---------------------------------------------------------------------------
+
+
+class CQLBitmap:
+    """Set of document ids as a compressed bitmap, see :mod:`cql.engine.bitmap`.
+
+    Supports ``&``, ``|``, ``-`` (and-not), ``len()``, ``in`` and iteration
+    in order. Cheaper than posting lists for large sets, e.g. an ``or`` of
+    frequent words, with :meth:`filter` for intersections with short
+    posting lists.
+    """
+
+    __slots__ = ("_containers",)
+
+    def __init__(self, containers: Optional[Dict[int, Container]] = None):
+        # containers by chunk, in order of the chunks
+        self._containers: Dict[int, Container] = containers or dict()
+
+    @classmethod
+    def from_postings(cls, values: Iterable[int]) -> "CQLBitmap":
+        """Bitmap of a posting list (sorted ids)."""
+        if not isinstance(values, array):
+            values = postings(values)
+        containers: Dict[int, Container] = dict()
+        pos, end = 0, len(values)
+        while pos < end:
+            chunk = values[pos] >> CHUNK_BITS
+            stop = bisect_left(values, (chunk + 1) << CHUNK_BITS, pos, end)
+            base = chunk << CHUNK_BITS
+            low = array("H", [value - base for value in values[pos:stop]])
+            containers[chunk] = _values_container(low)
+            pos = stop
+        return cls(containers)
+
+    @classmethod
+    def range(cls, stop: int) -> "CQLBitmap":
+        """Bitmap of the ids ``0 .. stop - 1`` (e.g. all documents)."""
+        containers: Dict[int, Container] = dict()
+        for chunk in range((stop + CHUNK_SIZE - 1) >> CHUNK_BITS):
+            size = min(CHUNK_SIZE, stop - (chunk << CHUNK_BITS))
+            containers[chunk] = _bits_container((1 << size) - 1)
+        return cls(containers)
+
+    @classmethod
+    def union_all(cls, bitmaps: List["CQLBitmap"]) -> "CQLBitmap":
+        """Ids in any of the bitmaps."""
+        containers: Dict[int, Container] = dict()
+        for bitmap in bitmaps:
+            for chunk, container in bitmap._containers.items():
+                other = containers.get(chunk)
+                containers[chunk] = (
+                    container if other is None else _or(other, container)
+                )
+        return cls(dict(sorted(containers.items())))
+
+    def to_postings(self) -> array:
+        """Posting list (sorted ids)."""
+        values = array(TYPECODE)
+        for chunk, container in self._containers.items():
+            base = chunk << CHUNK_BITS
+            if isinstance(container, int):
+                values.extend(_positions(container, base))
+            else:
+                values.extend(map(base.__add__, container))
+        return values
+
+    def filter(self, values: array) -> array:
+        """Ids of a posting list that are in the bitmap (cost linear in the
+        posting list)."""
+        return self._select(values, True)
+
+    def exclude(self, values: array) -> array:
+        """Ids of a posting list that are not in the bitmap."""
+        return self._select(values, False)
+
+    def _select(self, values: array, keep: bool) -> array:
+        result = array(TYPECODE)
+        pos, end = 0, len(values)
+        while pos < end:
+            chunk = values[pos] >> CHUNK_BITS
+            stop = bisect_left(values, (chunk + 1) << CHUNK_BITS, pos, end)
+            part = values[pos:stop]
+            pos = stop
+
+            container = self._containers.get(chunk)
+            if container is None:
+                if not keep:
+                    result.extend(part)
+                continue
+            test = _member_test(container)
+            result.extend(filter(test, part) if keep else filterfalse(test, part))
+        return result
+
+    def complement(self, stop: int) -> "CQLBitmap":
+        """Ids ``0 .. stop - 1`` not in the bitmap (and-not from the
+        universe)."""
+        return CQLBitmap.range(stop) - self
+
+    # ---------------------------------------------------
+
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> CHUNK_BITS)
+        if container is None:
+            return False
+        low = value & (CHUNK_SIZE - 1)
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        pos = bisect_left(container, low)
+        return pos < len(container) and container[pos] == low
+
+    def __len__(self) -> int:
+        return sum(_len(container) for container in self._containers.values())
+
+    def __bool__(self) -> bool:
+        return bool(self._containers)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.to_postings())
+
+    def __and__(self, other: "CQLBitmap") -> "CQLBitmap":
+        containers: Dict[int, Container] = dict()
+        for chunk, container in self._containers.items():
+            other_container = other._containers.get(chunk)
+            if other_container is None:
+                continue
+            result = _and(container, other_container)
+            if result is not None:
+                containers[chunk] = result
+        return CQLBitmap(containers)
+
+    def __or__(self, other: "CQLBitmap") -> "CQLBitmap":
+        return CQLBitmap.union_all([self, other])
+
+    def __sub__(self, other: "CQLBitmap") -> "CQLBitmap":
+        containers: Dict[int, Container] = dict()
+        for chunk, container in self._containers.items():
+            other_container = other._containers.get(chunk)
+            if other_container is None:
+                containers[chunk] = container
+                continue
+            result = _and_not(container, other_container)
+            if result is not None:
+                containers[chunk] = result
+        return CQLBitmap(containers)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CQLBitmap):
+            return NotImplemented
+        return self.to_postings() == other.to_postings()
+
+    def __repr__(self) -> str:
+        num_bitmaps = sum(
+            isinstance(container, int) for container in self._containers.values()
+        )
+        return (
+            f"CQLBitmap[{len(self)} ids, {len(self._containers)} containers,"
+            f" {num_bitmaps} bitmaps]"
+        )
@@ -0,0 +1,232 @@
+import re
+from array import array
+from collections import Counter
+from collections import defaultdict
+from functools import partial
+from itertools import repeat
+from typing import Any
+from typing import DefaultDict
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Mapping
+from typing import Tuple
+
+from cql.engine.positions import Positions
+from cql.engine.positions import value_positions
+from cql.engine.postings import TYPECODE
+from cql.engine.postings import postings
+from cql.engine.ranges import RangeIndex
+from cql.masking import CQLTermDictionary
+from cql.predicate import MULTI_VALUED
+from cql.predicate import WORD_RE
+
+# ---------------------------------------------------------------------------
+
+
+def tokenize(value: Any) -> List[str]:
+    """Lower case words of a value."""
+    return WORD_RE.findall(str(value).lower())
+
+
+class CQLInvertedIndex:
+    """In-memory inverted index: for each index name and word (lower case)
+    the sorted ids of the documents containing it, as ``array('I')``.
+
+    Documents are mappings of index names to values (or lists of values),
+    their ids are given in order of :meth:`add`, so posting lists are built
+    by appending. Whole values are indexed as well (for ``==``).
+
+    Args:
+        positions: whether to keep the word positions in each document as
+            well (see :mod:`cql.engine.positions`, needed for ``prox``)
+    """
+
+    def __init__(self, positions: bool = False):
+        #: number of documents
+        self.num_docs = 0
+        #: whether word positions are kept
+        self.has_positions = positions
+        self._indexes: Dict[str, _Index] = dict()
+        # range indexes and term dictionaries by index name and type, for
+        # the number of documents they were made for
+        self._ranges: Dict[Tuple[str, str], RangeIndex] = dict()
+        self._terms: Dict[Tuple[str, str], CQLTermDictionary] = dict()
+        self._derived_docs = 0
+
+    def add(self, document: Mapping[str, Any]) -> int:
+        """Adds a document, returns its id.
+
+        Raises:
+            ValueError: for too many values or words for positions (see
+                :func:`cql.engine.positions.value_positions`), nothing is
+                added then
+        """
+        # values by index (and their words with positions), all checked
+        # before anything is added
+        fields: List[Tuple[str, List[str], List[List[str]]]] = list()
+        for name, value in document.items():
+            if value is None:
+                continue
+            if isinstance(value, MULTI_VALUED):
+                values = [str(item) for item in value if item is not None]
+                if not values:
+                    continue
+            else:
+                values = [str(value)]
+            words_of_values: List[List[str]] = list()
+            if self.has_positions:
+                words_of_values = [tokenize(value) for value in values]
+                value_positions(len(values) - 1, max(map(len, words_of_values)))
+            fields.append((name.lower(), values, words_of_values))
+
+        doc_id = self.num_docs
+        self.num_docs += 1
+        for name, values, words_of_values in fields:
+            index = self._indexes.get(name)
+            if index is None:
+                index = self._indexes[name] = _Index()
+            index.docs.append(doc_id)
+            for value in set(values):
+                index.values[value].append(doc_id)
+            if not self.has_positions:
+                counts = Counter(WORD_RE.findall(" ".join(values).lower()))
+                for word, num in counts.items():
+                    index.words[word].append(doc_id)
+                    index.freqs[word].append(num)
+                index.set_length(doc_id, sum(counts.values()))
+                continue
+            # positions by word, with the ordinal of the value of a list
+            by_word: Dict[str, List[int]] = dict()
+            for ordinal, words in enumerate(words_of_values):
+                for pos, word in zip(value_positions(ordinal, len(words)), words):
+                    by_word.setdefault(word, []).append(pos)
+            for word, word_positions in by_word.items():
+                entry = index.positions.get(word)
+                if entry is None:
+                    # shares the posting list of the word
+                    entry = index.positions[word] = Positions(index.words[word])
+                entry.add(doc_id, word_positions)
+                index.freqs[word].append(len(word_positions))
+            index.set_length(doc_id, sum(map(len, by_word.values())))
+        return doc_id
+
+    def add_all(self, documents: Iterable[Mapping[str, Any]]) -> None:
+        """Adds documents."""
+        for document in documents:
+            self.add(document)
+
+    # ---------------------------------------------------
+
+    @property
+    def index_names(self) -> List[str]:
+        """(Lower case) names of the indexes with documents."""
+        return list(self._indexes)
+
+    def postings(self, index: str, word: str) -> array:
+        """Documents with a word (lower case) in an index (do not modify)."""
+        found = self._indexes.get(index)
+        return found.words.get(word, _EMPTY) if found is not None else _EMPTY
+
+    def positions(self, index: str, word: str) -> Positions:
+        """Documents with a word (lower case) in an index and its positions
+        (do not modify).
+
+        Raises:
+            ValueError: if positions are not kept
+        """
+        if not self.has_positions:
+            raise ValueError("Positions are not kept, see CQLInvertedIndex(positions=)")
+        found = self._indexes.get(index)
+        entry = found.positions.get(word) if found is not None else None
+        return entry if entry is not None else Positions()
+
+    def frequencies(self, index: str, word: str) -> array:
+        """Number of times a word (lower case) is in each document of its
+        posting list (in the same order, do not modify)."""
+        found = self._indexes.get(index)
+        return found.freqs.get(word, _EMPTY) if found is not None else _EMPTY
+
+    def lengths(self, index: str) -> array:
+        """Number of words of each document in an index, by id (``0``
+        without a value there, ids after the last document with a value are
+        left out; do not modify)."""
+        found = self._indexes.get(index)
+        return found.lengths if found is not None else _EMPTY
+
+    def value_postings(self, index: str, value: str) -> array:
+        """Documents with exactly this value in an index (do not modify)."""
+        found = self._indexes.get(index)
+        return found.values.get(value, _EMPTY) if found is not None else _EMPTY
+
+    def range_index(self, index: str, kind: str) -> RangeIndex:
+        """Values of an index as sorted keys of a type (``number``,
+        ``isodate`` or ``text``), made once and again after documents were
+        added (do not modify)."""
+        self._check_derived()
+        found = self._ranges.get((index, kind))
+        if found is None:
+            values = self._indexes.get(index)
+            found = self._ranges[(index, kind)] = RangeIndex(
+                values.values if values is not None else {}, kind
+            )
+        return found
+
+    def term_dictionary(self, index: str, kind: str = "words") -> CQLTermDictionary:
+        """Sorted words (or with ``kind="values"`` whole values) of an index
+        for masked terms (see :mod:`cql.masking`), made once and again after
+        documents were added (do not modify)."""
+        if kind not in ("words", "values"):
+            raise ValueError(f"Unknown kind of terms {kind!r}")
+        self._check_derived()
+        found = self._terms.get((index, kind))
+        if found is None:
+            terms = self._indexes.get(index)
+            found = self._terms[(index, kind)] = CQLTermDictionary(
+                getattr(terms, kind) if terms is not None else (),
+                re.DOTALL if kind == "values" else 0,
+            )
+        return found
+
+    def _check_derived(self) -> None:
+        # range indexes and term dictionaries are made again after adding
+        if self._derived_docs != self.num_docs:
+            self._ranges.clear()
+            self._terms.clear()
+            self._derived_docs = self.num_docs
+
+    def index_postings(self, index: str) -> array:
+        """Documents with any value in an index (do not modify)."""
+        found = self._indexes.get(index)
+        return found.docs if found is not None else _EMPTY
+
+    def __repr__(self) -> str:
+        num_words = sum(len(index.words) for index in self._indexes.values())
+        return (
+            f"CQLInvertedIndex[{self.num_docs} documents, {len(self._indexes)} indexes,"
+            f" {num_words} words]"
+        )
+
+
+class _Index:
+    # posting lists of one index: by word (with positions if kept and the
+    # frequencies of the word), by whole value and of all documents with a
+    # value; the number of words of each document
+    __slots__ = ("words", "positions", "freqs", "values", "docs", "lengths")
+
+    def __init__(self):
+        self.words: DefaultDict[str, array] = defaultdict(postings)
+        self.positions: Dict[str, Positions] = dict()
+        self.freqs: DefaultDict[str, array] = defaultdict(partial(array, TYPECODE))
+        self.values: DefaultDict[str, array] = defaultdict(postings)
+        self.docs = postings()
+        self.lengths = array(TYPECODE)
+
+    def set_length(self, doc_id: int, length: int) -> None:
+        # ids without a value in between are 0
+        if len(self.lengths) < doc_id:
+            self.lengths.extend(repeat(0, doc_id - len(self.lengths)))
+        self.lengths.append(length)
+
+
+_EMPTY = postings()
@@ -0,0 +1,375 @@
+"""Positional postings and proximity (``prox``) matching.
+
+A :class:`Positions` list has the documents of a word (a posting list) and
+for each of them the sorted word positions in the value of an index. Two
+lists are matched with merge-style passes: documents are intersected by
+galloping, positions by sliding windows over both position lists, so the
+cost is linear in the positions scanned (no pairs of positions). Phrases
+intersect the positions of their words shifted by their offset in the
+phrase.
+
+The position of a word in a value of a list is the ordinal of the value
+above its :data:`VALUE_BITS` lower bits (the word in the value), so
+``prox`` only compares the positions of the same value, and a phrase
+never spans values.
+"""
+
+import operator
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from itertools import chain
+from itertools import count
+from itertools import repeat
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from cql.engine.postings import GALLOP_RATIO
+from cql.engine.postings import TYPECODE
+from cql.engine.postings import gallop
+from cql.engine.postings import intersect_all
+from cql.engine.postings import postings
+from cql.parser import CQLBoolean
+from cql.predicate import CQLCompileError
+
+# ---------------------------------------------------------------------------
+
+
+#: comparisons of the ``distance`` modifier of ``prox``
+DISTANCE_COMPARATORS: Dict[str, Callable[[int, int], bool]] = {
+    "=": operator.eq,
+    "<>": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+#: default of ``prox`` (CQL 1.1: ``prox/<=/1/word/unordered``)
+DEFAULT_DISTANCE = ("<=", 1)
+#: supported ``unit`` of ``prox``, words of a value
+PROX_UNITS = ("word",)
+
+#: bits of the position of a word in a value, the ordinal of the value (of
+#: a list) above them
+VALUE_BITS = 20
+#: max. number of values of a list with positions
+MAX_VALUES = 1 << (32 - VALUE_BITS)
+#: max. number of words of a value with positions (half of the positions
+#: of a value, so phrases shorter than that do not span values)
+MAX_VALUE_WORDS = 1 << (VALUE_BITS - 1)
+
+
+class Positions:
+    """Documents with their word positions: the posting list ``docs`` and
+    for the document ``docs[i]`` the positions
+    ``data[offsets[i]:offsets[i + 1]]`` (or up to the end for the last one).
+    """
+
+    __slots__ = ("docs", "offsets", "data")
+
+    def __init__(
+        self,
+        docs: Optional[array] = None,
+        offsets: Optional[array] = None,
+        data: Optional[array] = None,
+    ):
+        self.docs = docs if docs is not None else postings()
+        self.offsets = offsets if offsets is not None else array(TYPECODE)
+        self.data = data if data is not None else array(TYPECODE)
+
+    def add(self, doc_id: int, positions: Sequence[int]) -> None:
+        """Appends a document (with a larger id than the last one)."""
+        self.docs.append(doc_id)
+        self.offsets.append(len(self.data))
+        self.data.extend(positions)
+
+    def get(self, pos: int) -> array:
+        """Positions of the document ``docs[pos]``."""
+        start = self.offsets[pos]
+        end = self.offsets[pos + 1] if pos + 1 < len(self.offsets) else len(self.data)
+        return self.data[start:end]
+
+    @classmethod
+    def union(cls, lists: List["Positions"]) -> "Positions":
+        """Documents in any list, with the positions of all lists (e.g. of
+        several words)."""
+        lists = [positions for positions in lists if positions.docs]
+        if len(lists) == 1:
+            return lists[0]
+        result = cls()
+        # documents in order by a k-way merge, then their positions merged
+        by_doc: List[Tuple[int, List[array]]] = list()
+        for doc_id, idx, pos in merge(
+            *[
+                zip(positions.docs, repeat(idx), count())
+                for idx, positions in enumerate(lists)
+            ]
+        ):
+            if not by_doc or by_doc[-1][0] != doc_id:
+                by_doc.append((doc_id, list()))
+            by_doc[-1][1].append(lists[idx].get(pos))
+        for doc_id, parts in by_doc:
+            result.add(doc_id, parts[0] if len(parts) == 1 else sorted(chain(*parts)))
+        return result
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def __repr__(self) -> str:
+        return f"Positions[{len(self.docs)} documents, {len(self.data)} positions]"
+
+
+# ---------------------------------------------------------------------------
+
+
+def prox_modifiers(boolean: CQLBoolean) -> Tuple[str, int, bool]:
+    """Distance comparator, distance and whether ordered of a ``prox``
+    boolean (defaults: ``<= 1``, unordered).
+
+    Raises:
+        CQLCompileError: for unsupported units or modifiers
+    """
+    comparator, distance = DEFAULT_DISTANCE
+    ordered = False
+    for modifier in boolean.modifiers or ():
+        name = modifier.name.name.lower()
+        if name.startswith("cql."):
+            name = name[4:]
+        if name == "distance":
+            if modifier.comparitor not in DISTANCE_COMPARATORS:
+                raise CQLCompileError(f"Invalid prox distance {modifier.toCQL()!r}")
+            comparator = modifier.comparitor
+            try:
+                distance = int(modifier.value)
+            except (TypeError, ValueError):
+                raise CQLCompileError(f"Invalid prox distance {modifier.toCQL()!r}")
+        elif name == "unit":
+            if (modifier.value or "").lower() not in PROX_UNITS:
+                raise CQLCompileError(f"Unsupported prox unit {modifier.toCQL()!r}")
+        elif name in ("ordered", "unordered"):
+            ordered = name == "ordered"
+        else:
+            raise CQLCompileError(f"Unsupported prox modifier {modifier.toCQL()!r}")
+    return comparator, distance, ordered
+
+
+def min_distance(
+    left: Sequence[int], right: Sequence[int], ordered: bool, stop: int = -1
+) -> int:
+    """Smallest distance of a left and a right position (right after left
+    if ordered), ``-1`` if there is none. Both lists must be sorted. Stops
+    at the first distance of at most ``stop``."""
+    best, i, end = -1, 0, len(left)
+    if ordered:
+        # last left position before each right one
+        for pos in right:
+            while i < end and left[i] < pos:
+                i += 1
+            if i and (best < 0 or pos - left[i - 1] < best):
+                best = pos - left[i - 1]
+                if best <= stop:
+                    break
+        return best
+    # neighbours in the merged order, the last position of each side
+    last_left = last_right = None
+    j, end_right = 0, len(right)
+    while i < end or j < end_right:
+        if j == end_right or (i < end and left[i] <= right[j]):
+            last_left = left[i]
+            i += 1
+            if last_right is None:
+                continue
+            gap = last_left - last_right
+        else:
+            last_right = right[j]
+            j += 1
+            if last_left is None:
+                continue
+            gap = last_right - last_left
+        if best < 0 or gap < best:
+            best = gap
+            if best <= stop:
+                break
+    return best
+
+
+def has_distance(
+    left: Sequence[int], right: Sequence[int], distance: int, ordered: bool
+) -> bool:
+    """Whether a right position is exactly ``distance`` after (or, if not
+    ordered, before) a left one."""
+    if ordered and distance <= 0:
+        return False
+    # targets ascend with the right positions, so each pointer only moves on
+    before = after = 0
+    end = len(left)
+    for pos in right:
+        target = pos - distance
+        while before < end and left[before] < target:
+            before += 1
+        if before < end and left[before] == target:
+            return True
+        if not ordered:
+            target = pos + distance
+            while after < end and left[after] < target:
+                after += 1
+            if after < end and left[after] == target:
+                return True
+    return False
+
+
+def max_distance(left: Sequence[int], right: Sequence[int], ordered: bool) -> int:
+    """Largest distance of a left and a right position (right after left if
+    ordered), ``-1`` if there is none."""
+    if not left or not right:
+        return -1
+    best = right[-1] - left[0]
+    if ordered:
+        return best if best > 0 else -1
+    return max(best, left[-1] - right[0])
+
+
+def near(
+    left: Sequence[int],
+    right: Sequence[int],
+    comparator: str,
+    distance: int,
+    ordered: bool,
+) -> bool:
+    """Whether a left and a right position have a distance that compares
+    to ``distance`` (right after left if ordered)."""
+    if comparator in ("<", "<="):
+        stop = distance - 1 if comparator == "<" else distance
+        best = min_distance(left, right, ordered, stop)
+        return best >= 0 and DISTANCE_COMPARATORS[comparator](best, distance)
+    if comparator in (">", ">="):
+        best = max_distance(left, right, ordered)
+        return best >= 0 and DISTANCE_COMPARATORS[comparator](best, distance)
+    if comparator == "=":
+        return has_distance(left, right, distance, ordered)
+    # "<>": all distances are in between the smallest and the largest one
+    best = min_distance(left, right, ordered)
+    return best >= 0 and (
+        best != distance or max_distance(left, right, ordered) != distance
+    )
+
+
+def prox(
+    left: Positions,
+    right: Positions,
+    comparator: str = "<=",
+    distance: int = 1,
+    ordered: bool = False,
+) -> array:
+    """Documents with positions of both lists within a distance."""
+    result = postings()
+    if len(left.docs) > len(right.docs):
+        # the shorter list drives the intersection, the sides stay the same
+        outer, inner, swapped = right, left, True
+    else:
+        outer, inner, swapped = left, right, False
+    pos, end = 0, len(inner.docs)
+    for idx, doc_id in enumerate(outer.docs):
+        pos = gallop(inner.docs, doc_id, pos)
+        if pos == end:
+            break
+        if inner.docs[pos] != doc_id:
+            continue
+        a, b = outer.get(idx), inner.get(pos)
+        if swapped:
+            a, b = b, a
+        if _near_values(a, b, comparator, distance, ordered):
+            result.append(doc_id)
+    return result
+
+
+def value_positions(ordinal: int, num: int) -> range:
+    """Positions of the words of a value (its ordinal in a list).
+
+    Raises:
+        ValueError: for more than :data:`MAX_VALUES` values or
+            :data:`MAX_VALUE_WORDS` words
+    """
+    if ordinal >= MAX_VALUES or num > MAX_VALUE_WORDS:
+        raise ValueError(
+            f"Too many values ({ordinal + 1}, max. {MAX_VALUES}) or words"
+            f" ({num}, max. {MAX_VALUE_WORDS}) for positions"
+        )
+    start = ordinal << VALUE_BITS
+    return range(start, start + num)
+
+
+def _near_values(
+    left: Sequence[int],
+    right: Sequence[int],
+    comparator: str,
+    distance: int,
+    ordered: bool,
+) -> bool:
+    # near() for the positions of the same value of a list
+    if not (left[-1] | right[-1]) >> VALUE_BITS:
+        return near(left, right, comparator, distance, ordered)
+    i, j, end_left, end_right = 0, 0, len(left), len(right)
+    while i < end_left and j < end_right:
+        value, other = left[i] >> VALUE_BITS, right[j] >> VALUE_BITS
+        if value < other:
+            i = bisect_left(left, other << VALUE_BITS, i)
+        elif other < value:
+            j = bisect_left(right, value << VALUE_BITS, j)
+        else:
+            stop = (value + 1) << VALUE_BITS
+            next_i = bisect_left(left, stop, i)
+            next_j = bisect_left(right, stop, j)
+            if near(left[i:next_i], right[j:next_j], comparator, distance, ordered):
+                return True
+            i, j = next_i, next_j
+    return False
+
+
+def phrase(lists: List[Positions]) -> array:
+    """Documents with the words of a phrase at consecutive positions, the
+    positions of the words in order (a word may be repeated)."""
+    if not lists or not all(lists):
+        return postings()
+    if len(lists) == 1:
+        return lists[0].docs
+    # documents with all words first, then for each of them the positions
+    # of the rarest word are the candidate starts the others narrow down
+    candidates = intersect_all([positions.docs for positions in lists])
+    order = sorted(range(len(lists)), key=lambda offset: len(lists[offset]))
+    found = [0] * len(lists)
+    result = postings()
+    for doc_id in candidates:
+        starts: Optional[List[int]] = None
+        for offset in order:
+            docs = lists[offset].docs
+            found[offset] = pos = gallop(docs, doc_id, found[offset])
+            positions = lists[offset].get(pos)
+            if starts is None:
+                starts = [value - offset for value in positions]
+            else:
+                starts = _aligned(starts, positions, offset)
+            if not starts:
+                break
+        else:
+            result.append(doc_id)
+    return result
+
+
+def _aligned(starts: List[int], positions: array, offset: int) -> List[int]:
+    # starts with a position at the offset
+    if len(positions) > GALLOP_RATIO * len(starts):
+        kept, pos, end = list(), 0, len(positions)
+        for start in starts:
+            pos = gallop(positions, start + offset, pos)
+            if pos == end:
+                break
+            if positions[pos] == start + offset:
+                kept.append(start)
+        return kept
+    members = set(positions)
+    return [start for start in starts if start + offset in members]
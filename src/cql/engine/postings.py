@@ -0,0 +1,104 @@
+"""Operations on posting lists, sorted arrays of unique document ids
+(``array('I')``).
+
+Unions (and intersections of lists of similar length) go through sets,
+hash lookups and a sort in C, instead of a k-way heap merge (or galloping
+both ways) in Python: in CPython they are up to several times faster,
+though ``O(n log n)`` (see ``benchmarks/bench_engine.py``). Galloping is
+only used for lists of very different lengths, where it skips most of the
+longer list.
+"""
+
+from array import array
+from bisect import bisect_left
+from itertools import filterfalse
+from typing import List
+from typing import Sequence
+
+# ---------------------------------------------------------------------------
+
+
+#: typecode of posting arrays (unsigned int, at least 32 bit)
+TYPECODE = "I"
+
+#: galloping (exponential search) instead of a linear pass if the longer
+#: list is this many times longer than the shorter one
+GALLOP_RATIO = 32
+
+
+def postings(doc_ids: Sequence[int] = ()) -> array:
+    """New posting list (the ids must be sorted and unique)."""
+    return array(TYPECODE, doc_ids)
+
+
+def gallop(values: Sequence[int], target: int, lo: int = 0) -> int:
+    """Index of the first value ``>= target`` at or after ``lo``, found by
+    doubling steps and a binary search in the last step (cost logarithmic
+    in the distance, not the length)."""
+    step, hi = 1, lo
+    end = len(values)
+    while hi < end and values[hi] < target:
+        lo = hi + 1
+        hi += step
+        step *= 2
+    return bisect_left(values, target, lo, min(hi, end))
+
+
+def intersect(a: array, b: array) -> array:
+    """Documents in both lists."""
+    if len(a) > len(b):
+        a, b = b, a
+    if not a:
+        return postings()
+    if len(b) > GALLOP_RATIO * len(a):
+        # each id of the short list is searched for from the last position
+        result = postings()
+        pos, end = 0, len(b)
+        for doc_id in a:
+            pos = gallop(b, doc_id, pos)
+            if pos == end:
+                break
+            if b[pos] == doc_id:
+                result.append(doc_id)
+        return result
+    # a pass over the longer list, in order, with hash lookups
+    return array(TYPECODE, filter(set(a).__contains__, b))
+
+
+def intersect_all(lists: List[array]) -> array:
+    """Documents in all lists, the shortest lists first (stops once the
+    result is empty)."""
+    if not lists:
+        return postings()
+    lists = sorted(lists, key=len)
+    result = lists[0]
+    for other in lists[1:]:
+        if not result:
+            break
+        result = intersect(result, other)
+    return result
+
+
+def union_all(lists: List[array]) -> array:
+    """Documents in any list (a set union, sorted)."""
+    lists = [values for values in lists if values]
+    if not lists:
+        return postings()
+    if len(lists) == 1:
+        return lists[0]
+    return array(TYPECODE, sorted(set().union(*lists)))
+
+
+def difference(a: array, b: array) -> array:
+    """Documents of ``a`` not in ``b``."""
+    if not a or not b:
+        return a
+    if len(b) > GALLOP_RATIO * len(a):
+        result = postings()
+        pos, end = 0, len(b)
+        for doc_id in a:
+            pos = gallop(b, doc_id, pos)
+            if pos == end or b[pos] != doc_id:
+                result.append(doc_id)
+        return result
+    return array(TYPECODE, filterfalse(set(b).__contains__, a))
@@ -0,0 +1,124 @@
+"""Range index for ``<``, ``>``, ``<=``, ``>=`` and ``within``: the values
+of an index parsed as numbers, dates or text once, sorted with their
+documents, so a range is found by binary search (``O(log n + k)`` for
+``k`` matching values, plus sorting the documents)."""
+
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
+from typing import Any
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+from cql.engine.postings import TYPECODE
+from cql.engine.postings import postings
+from cql.predicate import CQLCompileError
+from cql.predicate import parse_number
+from cql.predicate import typed_value
+
+# ---------------------------------------------------------------------------
+
+
+#: relations with a lower / upper bound (and whether it is inclusive)
+LOWER_BOUNDS = {">": False, ">=": True}
+UPPER_BOUNDS = {"<": False, "<=": True}
+#: types of keys of a range index
+RANGE_KINDS = ("number", "isodate", "text")
+
+#: a bound of a range, ``None`` if open, and whether it is inclusive
+Bound = Tuple[Optional[Any], bool]
+
+
+def range_key(value: str, kind: str) -> Any:
+    """Key of a value (or term) in a range index of a type, ``None`` if it
+    does not parse."""
+    return value if kind == "text" else typed_value(value, kind)
+
+
+def range_kind(term: str, modifiers: Mapping[str, Optional[str]]) -> str:
+    """Type of keys of a range search: by ``/number`` or ``/isoDate``,
+    else numbers if the term (each word for ``within``) is a number, text
+    otherwise."""
+    for kind in RANGE_KINDS[:2]:
+        if kind in modifiers:
+            return kind
+    if all(parse_number(value) is not None for value in term.split() or [term]):
+        return "number"
+    return "text"
+
+
+def range_bounds(relation: str, term: str, kind: str) -> Tuple[Bound, Bound]:
+    """Lower and upper bound of a range relation (``within``: the two words
+    of the term, inclusive), the term parsed as the type of keys.
+
+    Raises:
+        CQLCompileError: if the term is not of the type
+    """
+    if relation == "within":
+        terms = term.split()
+        if len(terms) != 2:
+            raise CQLCompileError(f"Relation 'within' needs two values, not {term!r}")
+    else:
+        terms = [term]
+    keys = [range_key(value, kind) for value in terms]
+    if any(key is None for key in keys):
+        raise CQLCompileError(f"Not a valid {kind}: {term!r}")
+
+    if relation == "within":
+        return (keys[0], True), (keys[1], True)
+    if relation in LOWER_BOUNDS:
+        return (keys[0], LOWER_BOUNDS[relation]), (None, False)
+    if relation in UPPER_BOUNDS:
+        return (None, False), (keys[0], UPPER_BOUNDS[relation])
+    if relation in ("==", "exact"):
+        return (keys[0], True), (keys[0], True)
+    raise CQLCompileError(f"Unsupported range relation {relation!r}")
+
+
+class RangeIndex:
+    """The values of an index as sorted keys of a type, each with its
+    documents (a document with several values is there for each of them).
+
+    Args:
+        values: posting lists by value of an index
+        kind: type of keys, see :data:`RANGE_KINDS` (values that do not
+            parse are left out)
+    """
+
+    __slots__ = ("kind", "keys", "docs")
+
+    def __init__(self, values: Mapping[str, array], kind: str):
+        self.kind = kind
+        pairs: List[Tuple[Any, array]] = list()
+        for value, docs in values.items():
+            key = range_key(value, kind)
+            if key is not None:
+                pairs.append((key, docs))
+        pairs.sort(key=lambda pair: pair[0])
+        #: sorted keys, one per document of a value
+        self.keys: List[Any] = list()
+        #: documents of the keys
+        self.docs = array(TYPECODE)
+        for key, docs in pairs:
+            self.keys.extend([key] * len(docs))
+            self.docs.extend(docs)
+
+    def search(self, low: Bound, high: Bound) -> array:
+        """Documents with a key in a range (a posting list)."""
+        (low_key, low_inclusive), (high_key, high_inclusive) = low, high
+        start, end = 0, len(self.keys)
+        if low_key is not None:
+            start = (bisect_left if low_inclusive else bisect_right)(self.keys, low_key)
+        if high_key is not None:
+            end = (bisect_right if high_inclusive else bisect_left)(self.keys, high_key)
+        if start >= end:
+            return postings()
+        return postings(sorted(set(self.docs[start:end])))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __repr__(self) -> str:
+        return f"RangeIndex[{self.kind}, {len(self.keys)} keys]"
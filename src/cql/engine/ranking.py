@@ -0,0 +1,245 @@
+"""Relevance ranking (BM25) for the ``/relevant`` relation modifier.
+
+Scores are computed from the term frequencies stored with the posting
+lists and the number of words of each document (both kept by
+:class:`~cql.engine.index.CQLInvertedIndex`). The length norm of each
+document and the IDF and an upper bound of the score of each term are
+computed once (and again after documents were added).
+
+The best ``k`` documents are found document at a time with MaxScore
+pruning: terms are ordered by their upper bound, once ``k`` documents are
+found, terms whose bounds add up to no more than the ``k``-th best score
+cannot bring a new document into the top ``k`` on their own, so their
+posting lists are only looked into (by galloping) for documents of the
+other terms, and not at all once a document cannot reach the top ``k``.
+"""
+
+import heapq
+import math
+from array import array
+from operator import add
+from operator import truediv
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from cql.engine.index import CQLInvertedIndex
+from cql.engine.postings import gallop
+
+# ---------------------------------------------------------------------------
+
+
+#: BM25 term frequency saturation
+K1 = 1.2
+#: BM25 document length normalization
+B = 0.75
+#: upper bounds are raised by this fraction, so rounding of (partial) sums
+#: of scores never prunes a document that would be in the top k
+BOUND_SLACK = 1e-9
+
+#: a document id and its score
+Scored = Tuple[int, float]
+
+
+def bm25_idf(doc_freq: int, num_docs: int) -> float:
+    """IDF of a term in ``doc_freq`` of ``num_docs`` documents (BM25, never
+    negative)."""
+    return math.log(1.0 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+class BM25Term:
+    """A term (word of an index) for scoring: its documents, frequencies,
+    IDF and the upper bound of its score in any document."""
+
+    __slots__ = ("index", "word", "docs", "freqs", "norms", "weight", "upper")
+
+    def __init__(
+        self,
+        index: str,
+        word: str,
+        docs: array,
+        freqs: array,
+        norms: array,
+        idf: float,
+        k1: float,
+    ):
+        self.index = index
+        self.word = word
+        self.docs = docs
+        self.freqs = freqs
+        # length norms of the documents of the index, by id
+        self.norms = norms
+        self.weight = idf * (k1 + 1.0)
+        # the best score of the term in any of its documents
+        best = max(
+            map(truediv, freqs, map(add, freqs, map(norms.__getitem__, docs))),
+            default=0.0,
+        )
+        self.upper = self.weight * best * (1.0 + BOUND_SLACK)
+
+    def score(self, pos: int) -> float:
+        """Score in the document ``docs[pos]``."""
+        freq = self.freqs[pos]
+        return self.weight * freq / (freq + self.norms[self.docs[pos]])
+
+    def __repr__(self) -> str:
+        return f"BM25Term[{self.index}={self.word!r}, {len(self.docs)} documents]"
+
+
+class BM25Scorer:
+    """BM25 scores of documents of an index for words of its indexes, the
+    score of a document is the sum over the terms (an index and a word).
+
+    Args:
+        index: the inverted index
+        k1: term frequency saturation
+        b: document length normalization (``0``: none, ``1``: full)
+    """
+
+    def __init__(self, index: CQLInvertedIndex, k1: float = K1, b: float = B):
+        self.index = index
+        self.k1 = k1
+        self.b = b
+        # norms by index, terms by index and word, for the number of
+        # documents they were made for
+        self._norms: Dict[str, array] = dict()
+        self._terms: Dict[Tuple[str, str], BM25Term] = dict()
+        self._num_docs = index.num_docs
+
+    def term(self, index: str, word: str) -> BM25Term:
+        """Scoring data of a word (lower case) in an index (cached)."""
+        if self._num_docs != self.index.num_docs:
+            self._norms.clear()
+            self._terms.clear()
+            self._num_docs = self.index.num_docs
+        term = self._terms.get((index, word))
+        if term is None:
+            norms = self._index_norms(index)
+            docs = self.index.postings(index, word)
+            term = self._terms[(index, word)] = BM25Term(
+                index,
+                word,
+                docs,
+                self.index.frequencies(index, word),
+                norms,
+                bm25_idf(len(docs), self.index.num_docs),
+                self.k1,
+            )
+        return term
+
+    def scores(
+        self, terms: Sequence[BM25Term], accept: Optional[Callable[[int], bool]] = None
+    ) -> Dict[int, float]:
+        """Scores of all documents with any of the terms (and accepted)."""
+        parts: Dict[int, List[float]] = dict()
+        for term in terms:
+            for pos, doc_id in enumerate(term.docs):
+                if accept is None or accept(doc_id):
+                    parts.setdefault(doc_id, []).append(term.score(pos))
+        return {doc_id: _sum(scores) for doc_id, scores in parts.items()}
+
+    def top(
+        self,
+        terms: Sequence[BM25Term],
+        k: int,
+        accept: Optional[Callable[[int], bool]] = None,
+    ) -> List[Scored]:
+        """The ``k`` best documents with any of the terms (and accepted), by
+        score, then id; the same as sorting all :meth:`scores`, without
+        scoring all documents."""
+        terms = sorted((term for term in terms if term.docs), key=lambda t: t.upper)
+        if k <= 0 or not terms:
+            return []
+        num = len(terms)
+        # bounds[i]: sum of the upper bounds of terms[0] to terms[i]
+        bounds: List[float] = list()
+        for term in terms:
+            bounds.append(term.upper + (bounds[-1] if bounds else 0.0))
+        pointers = [0] * num
+        ends = [len(term.docs) for term in terms]
+        # min-heap of the best documents, the worst (lowest score, then
+        # highest id) on top
+        heap: List[Tuple[float, int]] = list()
+        threshold = -1.0
+        # terms[:first] do not bring new documents (non-essential)
+        first = 0
+
+        while True:
+            # next document of the essential terms
+            doc_id = -1
+            for i in range(first, num):
+                if pointers[i] < ends[i]:
+                    candidate = terms[i].docs[pointers[i]]
+                    if doc_id < 0 or candidate < doc_id:
+                        doc_id = candidate
+            if doc_id < 0:
+                break
+
+            accepted = accept is None or accept(doc_id)
+            parts: List[float] = list()
+            for i in range(first, num):
+                pos = pointers[i]
+                if pos < ends[i] and terms[i].docs[pos] == doc_id:
+                    if accepted:
+                        parts.append(terms[i].score(pos))
+                    pointers[i] = pos + 1
+            if not accepted:
+                continue
+            score = sum(parts)
+
+            # non-essential terms, the largest bound first, while the
+            # document may still get into the top k (documents come in
+            # order of their ids, so a tie does not)
+            for i in range(first - 1, -1, -1):
+                if score + bounds[i] <= threshold:
+                    break
+                pos = pointers[i] = gallop(terms[i].docs, doc_id, pointers[i])
+                if pos < ends[i] and terms[i].docs[pos] == doc_id:
+                    parts.append(terms[i].score(pos))
+                    score += parts[-1]
+            else:
+                score = _sum(parts)
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, -doc_id))
+                elif score > threshold:
+                    heapq.heapreplace(heap, (score, -doc_id))
+                else:
+                    continue
+                if len(heap) == k:
+                    threshold = heap[0][0]
+                    while first < num and bounds[first] <= threshold:
+                        first += 1
+
+        return sorted(
+            ((-neg_id, score) for score, neg_id in heap),
+            key=lambda item: (-item[1], item[0]),
+        )
+
+    def _index_norms(self, index: str) -> array:
+        # k1 * (1 - b + b * length / average length) of each document
+        norms = self._norms.get(index)
+        if norms is None:
+            lengths = self.index.lengths(index)
+            num_docs = len(self.index.index_postings(index))
+            average = (sum(lengths) / num_docs) if num_docs else 0.0
+            k1, b = self.k1, self.b
+            norms = self._norms[index] = array(
+                "d",
+                (
+                    [k1 * (1.0 - b + b * length / average) for length in lengths]
+                    if average
+                    else [k1] * len(lengths)
+                ),
+            )
+        return norms
+
+    def __repr__(self) -> str:
+        return f"BM25Scorer[k1={self.k1}, b={self.b}, {self.index}]"
+
+
+def _sum(scores: List[float]) -> float:
+    # exact (does not depend on the order of the terms)
+    return scores[0] if len(scores) == 1 else math.fsum(scores)
@@ -0,0 +1,600 @@
+from array import array
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from cql.engine.bitmap import MAX_ARRAY
+from cql.engine.bitmap import CQLBitmap
+from cql.engine.index import CQLInvertedIndex
+from cql.engine.index import tokenize
+from cql.engine.positions import Positions
+from cql.engine.positions import phrase
+from cql.engine.positions import prox
+from cql.engine.positions import prox_modifiers
+from cql.engine.postings import difference
+from cql.engine.postings import intersect
+from cql.engine.postings import postings
+from cql.engine.postings import union_all
+from cql.engine.ranges import range_bounds
+from cql.engine.ranges import range_kind
+from cql.engine.ranking import BM25Scorer
+from cql.engine.ranking import BM25Term
+from cql.engine.ranking import Scored
+from cql.masking import REGEXP
+from cql.masking import UNMASKED
+from cql.masking import CQLMask
+from cql.masking import masked_words
+from cql.masking import parse_mask
+from cql.parser import CQL_DEFAULT_INDEX
+from cql.parser import CQLQuery
+from cql.parser import CQLSearchClause
+from cql.parser import CQLTriple
+from cql.planner import CQLPlan
+from cql.planner import CQLQueryPlanner
+from cql.planner import CQLStatistics
+from cql.predicate import CQL_ALL_RECORDS
+from cql.predicate import CQLCompileError
+from cql.predicate import compile_regexp
+from cql.predicate import flatten_run
+from cql.predicate import index_name
+from cql.predicate import relation_modifiers
+from cql.predicate import relation_name
+from cql.predicate import value_type
+
+# ---------------------------------------------------------------------------
+
+
+Node = Union[CQLTriple, CQLSearchClause]
+
+#: documents of a (sub) query, a posting list or a bitmap
+Result = Union[array, CQLBitmap]
+
+#: relations searched in the range indexes
+RANGE_RELATIONS = ("<", ">", "<=", ">=", "within")
+
+#: results with at least 1 / BITMAP_DENSITY of all documents are bitmaps
+BITMAP_DENSITY = 16
+
+
+class _Frame:
+    # a run of and / or (or a not) while searching, the results of its
+    # operands done so far
+    __slots__ = ("op", "operands", "results")
+
+    def __init__(self, node: CQLTriple):
+        self.op = node.operator.value.lower()
+        if self.op == "not":
+            self.operands: List[Node] = [node.left, node.right]
+        elif self.op in ("and", "or"):
+            self.operands = flatten_run(node, self.op)
+        else:
+            raise CQLCompileError(f"Unsupported boolean {self.op!r}")
+        self.results: List[Result] = list()
+
+    @property
+    def done(self) -> bool:
+        if len(self.results) == len(self.operands):
+            return True
+        # an empty operand of "and" (or the left one of "not") is the result
+        return bool(self.results) and not self.results[-1] and self.op != "or"
+
+
+def _word_mask(word: str) -> CQLMask:
+    # a (lower case, masked) word of a term, anchors are not indexed
+    mask = parse_mask(word)
+    if mask.start or mask.end:
+        raise CQLCompileError(f"Anchored words (^) are not supported: {word!r}")
+    return mask
+
+
+def _is_prox(node: Node) -> bool:
+    return isinstance(node, CQLTriple) and node.operator.value.lower() == "prox"
+
+
+class _EngineStatistics(CQLStatistics):
+    # exact document frequencies of the index, server choice as one index
+    # (so the counts of several indexes are upper bounds)
+
+    def __init__(self, engine: "CQLSearchEngine"):
+        self.engine = engine
+
+    @property
+    def num_records(self) -> int:  # type: ignore[override]
+        return self.engine.index.num_docs
+
+    def word_count(self, index: str, word: str) -> int:
+        postings = self.engine.index.postings
+        return sum(len(postings(name, word)) for name in self.engine.names(index))
+
+    def value_count(self, index: str, value: str) -> int:
+        postings = self.engine.index.value_postings
+        return sum(len(postings(name, value)) for name in self.engine.names(index))
+
+    def index_count(self, index: str) -> int:
+        postings = self.engine.index.index_postings
+        return sum(len(postings(name)) for name in self.engine.names(index))
+
+
+class CQLSearchEngine:
+    """Executes queries on a :class:`CQLInvertedIndex`, e.g. as a local
+    stand-in for a search backend.
+
+    Booleans are set operations on posting lists (see
+    :mod:`cql.engine.postings`): runs of ``and`` intersect the shortest
+    lists first and stop at an empty result, runs of ``or`` are merged at
+    once, ``not`` removes the documents of the right operand.
+
+    Large results (at least 1 / :data:`BITMAP_DENSITY` of all documents)
+    are :class:`~cql.engine.bitmap.CQLBitmap` instead, e.g. for an ``or``
+    of frequent words; large posting lists of the index are converted once
+    and cached. ``cql.allRecords`` is a bitmap of all documents, so
+    ``cql.allRecords = 1 not ...`` is an and-not from the universe.
+
+    ``prox`` needs an index with positions (``CQLInvertedIndex(positions=
+    True)``), its operands must be word searches (``=``, ``any``) in the
+    same index, see :mod:`cql.engine.positions` for the modifiers.
+
+    Queries are planned first (see :mod:`cql.planner`, with the document
+    frequencies of the index), so operands of ``and`` are searched in
+    ascending order of their number of documents.
+
+    Relations (words are compared in lower case):
+
+    * ``=`` (``scr``), ``adj``: a single word, or the words of the term as
+      a phrase (with positions only)
+    * ``any`` / ``all``: any / all words of the term
+    * ``==`` (``exact``): the whole value
+    * ``<>``: documents with a value in the index, but not this one
+    * ``<``, ``>``, ``<=``, ``>=``, ``within``: values in a range, as
+      numbers if the term is a number (values that are none are left out),
+      else as text; with ``/number`` or ``/isoDate`` as numbers or dates
+      (also ``==`` and ``<>``). Each index is sorted once (again after
+      documents were added), see :mod:`cql.engine.ranges`
+
+    :meth:`rank` orders the matching documents by relevance (BM25) for the
+    words of the search clauses with the ``/relevant`` relation modifier,
+    see :mod:`cql.engine.ranking`.
+
+    Args:
+        index: the inverted index
+        server_choice: indexes searched for ``cql.serverChoice``, as if they
+            were one index (default: all indexes)
+        bitmaps: whether to use bitmaps for large results
+        planner: whether to reorder operands by their number of documents
+    """
+
+    def __init__(
+        self,
+        index: CQLInvertedIndex,
+        server_choice: Optional[Sequence[str]] = None,
+        bitmaps: bool = True,
+        planner: bool = True,
+    ):
+        self.index = index
+        self.server_choice = (
+            [name.lower() for name in server_choice]
+            if server_choice is not None
+            else None
+        )
+        self.bitmaps = bitmaps
+        # bitmaps of posting lists of the index (by id, with the list), for
+        # the number of documents they were made for
+        self._bitmaps: Dict[int, Tuple[array, CQLBitmap]] = dict()
+        self._bitmaps_docs = 0
+        self._universe: Optional[CQLBitmap] = None
+        self.planner = CQLQueryPlanner(_EngineStatistics(self)) if planner else None
+        #: relevance scores for :meth:`rank`
+        self.scorer = BM25Scorer(index)
+
+    def search(self, query: CQLQuery) -> array:
+        """Sorted ids of the matching documents.
+
+        Raises:
+            CQLCompileError: for unsupported relations or ``prox`` searches
+        """
+        result = self.evaluate(query)
+        if isinstance(result, CQLBitmap):
+            return result.to_postings()
+        # a copy, results may be posting lists of the index
+        return postings(result)
+
+    def count(self, query: CQLQuery) -> int:
+        """Number of matching documents (bitmaps are not turned into lists)."""
+        return len(self.evaluate(query))
+
+    def evaluate(self, query: CQLQuery) -> Result:
+        """Matching documents as a posting list or bitmap (do not modify)."""
+        if self.planner is not None:
+            query = self.planner.plan(query).query
+        version = query.version
+        if isinstance(query.root, CQLSearchClause):
+            return self.clause_result(query.root, version)
+        if _is_prox(query.root):
+            return self.prox_result(query.root, version)
+
+        # explicit stack (no recursion), operands one after the other so an
+        # and can stop at the first empty operand
+        stack = [_Frame(query.root)]
+        while True:
+            frame = stack[-1]
+            if frame.done:
+                stack.pop()
+                if frame.op == "or":
+                    result = self.union(frame.results)
+                elif frame.op == "and":
+                    result = self.intersect(frame.results)
+                else:
+                    result = self.difference(*frame.results)
+                if not stack:
+                    return result
+                stack[-1].results.append(result)
+                continue
+
+            operand = frame.operands[len(frame.results)]
+            if isinstance(operand, CQLSearchClause):
+                frame.results.append(self.clause_result(operand, version))
+            elif _is_prox(operand):
+                frame.results.append(self.prox_result(operand, version))
+            else:
+                stack.append(_Frame(operand))
+
+    def rank(self, query: CQLQuery, k: int = 10) -> List[Scored]:
+        """The ``k`` best matching documents with their scores, by relevance
+        for the words of the ``/relevant`` search clauses (not those of the
+        right operand of a ``not``), then by id; documents without these
+        words have the score 0.
+
+        Raises:
+            CQLCompileError: for unsupported relations or ``prox`` searches
+        """
+        result = self.evaluate(query)
+        if k <= 0 or not result:
+            return []
+        # a set, for testing each scored document
+        matches = set(result)
+        ranked = self.scorer.top(self.relevant_terms(query), k, matches.__contains__)
+        if len(ranked) < k:
+            # the other matches (in order of their ids)
+            scored = {doc_id for doc_id, _ in ranked}
+            for doc_id in result:
+                if doc_id not in scored:
+                    ranked.append((doc_id, 0.0))
+                    if len(ranked) == k:
+                        break
+        return ranked
+
+    def relevant_terms(self, query: CQLQuery) -> List[BM25Term]:
+        """Terms (words of indexes) of the ``/relevant`` search clauses of a
+        query, masked words are the matching words of the index.
+
+        Raises:
+            CQLCompileError: for ``/relevant`` on other than word relations
+        """
+        version = query.version
+        terms: Dict[Tuple[str, str], BM25Term] = dict()
+        todo: List[Node] = [query.root]
+        while todo:
+            node = todo.pop()
+            if isinstance(node, CQLTriple):
+                # not the words of excluded documents
+                if node.operator.value.lower() != "not":
+                    todo.append(node.right)
+                todo.append(node.left)
+                continue
+            modifiers = relation_modifiers(node.relation)
+            if "relevant" not in modifiers:
+                continue
+            relation = relation_name(node, version)
+            if relation not in ("=", "scr", "adj", "any", "all"):
+                raise CQLCompileError(
+                    f"Relation {relation!r} does not support /relevant"
+                )
+            words = [_word_mask(word) for word in self._words(node.term, modifiers)]
+            for name in self.index_names(node):
+                dictionary = self.index.term_dictionary(name)
+                for mask in words:
+                    matching = (
+                        [mask.literal]
+                        if mask.literal is not None
+                        else dictionary.matching(mask)
+                    )
+                    for word in matching:
+                        if (name, word) not in terms:
+                            terms[(name, word)] = self.scorer.term(name, word)
+        return list(terms.values())
+
+    def plan(self, query: CQLQuery) -> CQLPlan:
+        """Plan of a query with the document frequencies of the index."""
+        planner = self.planner or CQLQueryPlanner(_EngineStatistics(self))
+        return planner.plan(query)
+
+    # ---------------------------------------------------
+
+    def index_names(self, clause: CQLSearchClause) -> List[str]:
+        """Indexes searched by a clause."""
+        return self.names(index_name(clause))
+
+    def names(self, name: str) -> List[str]:
+        """Indexes searched for a (lower case) index name."""
+        if name != CQL_DEFAULT_INDEX.lower():
+            return [name]
+        if self.server_choice is not None:
+            return self.server_choice
+        return self.index.index_names
+
+    def clause_result(self, clause: CQLSearchClause, version: str = "1.2") -> Result:
+        """Documents matching a search clause (do not modify)."""
+        if index_name(clause) == CQL_ALL_RECORDS:
+            return self.universe
+
+        relation = relation_name(clause, version)
+        modifiers = relation_modifiers(clause.relation)
+        term = clause.term
+        # several indexes (server choice) are searched as one
+        names = self.index_names(clause)
+
+        if REGEXP in modifiers:
+            return self.regexp_result(relation, term, modifiers, names)
+        if relation in ("=", "scr", "adj", "any", "all"):
+            if "respectcase" in modifiers:
+                raise CQLCompileError("Words are indexed in lower case only")
+            words = self._words(term, modifiers)
+            if len(words) > 1 and relation not in ("any", "all"):
+                return self.phrase_result(words, names)
+            words = list(dict.fromkeys(words))
+            word_results = [
+                self.union([self.word_result(name, word) for name in names])
+                for word in words
+            ]
+            if relation == "all":
+                return self.intersect(word_results)
+            return self.union(word_results)
+
+        if relation in ("==", "exact", "<>"):
+            if value_type(modifiers) is not None:
+                equal = self.range_result("==", term, modifiers, names)
+            else:
+                mask = parse_mask(term, UNMASKED not in modifiers, whole=True)
+                equal = self.union(
+                    [self._masked_result(name, mask, "values") for name in names]
+                )
+            if relation != "<>":
+                return equal
+            return self.difference(
+                self.union(
+                    [self._leaf(self.index.index_postings(name)) for name in names]
+                ),
+                equal,
+            )
+        if relation in RANGE_RELATIONS:
+            return self.range_result(relation, term, modifiers, names)
+        raise CQLCompileError(f"Unsupported relation {relation!r}")
+
+    def range_result(
+        self,
+        relation: str,
+        term: str,
+        modifiers: Mapping[str, Optional[str]],
+        names: List[str],
+    ) -> Result:
+        """Documents with a value in the range of a relation (by binary
+        search in the range indexes, see :mod:`cql.engine.ranges`)."""
+        if "ignorecase" in modifiers:
+            raise CQLCompileError("Ranges of values are case sensitive only")
+        kind = range_kind(term, modifiers)
+        low, high = range_bounds(relation, term, kind)
+        return self.union(
+            [self.index.range_index(name, kind).search(low, high) for name in names]
+        )
+
+    def word_result(self, name: str, word: str) -> Result:
+        """Documents with a word (lower case, may be masked) in an index,
+        masked words by the term dictionary of the index."""
+        return self._masked_result(name, _word_mask(word), "words")
+
+    def regexp_result(
+        self,
+        relation: str,
+        term: str,
+        modifiers: Mapping[str, Optional[str]],
+        names: List[str],
+    ) -> Result:
+        """Documents with a value matching a ``/regexp`` term (word
+        relations: containing a match, ``==``: as a whole), each distinct
+        value of the indexes is matched."""
+        if relation in ("=", "scr", "adj", "any", "all"):
+            search = compile_regexp(term, "respectcase" not in modifiers).search
+        elif relation in ("==", "exact", "<>"):
+            search = compile_regexp(term, "ignorecase" in modifiers).fullmatch
+        else:
+            raise CQLCompileError(f"Relation {relation!r} does not support /regexp")
+        results: List[Result] = list()
+        for name in names:
+            for value in self.index.term_dictionary(name, "values").terms:
+                if search(value) is not None:
+                    results.append(self._leaf(self.index.value_postings(name, value)))
+        result = self.union(results)
+        if relation != "<>":
+            return result
+        return self.difference(
+            self.union([self._leaf(self.index.index_postings(name)) for name in names]),
+            result,
+        )
+
+    def phrase_result(self, words: List[str], names: List[str]) -> Result:
+        """Documents with the words (lower case, may be masked) as a phrase
+        in any of the indexes."""
+        if not self.index.has_positions:
+            raise CQLCompileError(
+                f"Index without positions, phrases are not supported: {words!r}"
+            )
+        masks = [_word_mask(word) for word in words]
+        return self.union(
+            [
+                phrase([self._masked_positions(name, mask) for mask in masks])
+                for name in names
+            ]
+        )
+
+    def prox_result(self, node: CQLTriple, version: str = "1.2") -> Result:
+        """Documents matching a ``prox`` of two search clauses, in any of
+        their indexes (positions of different indexes are not compared)."""
+        if not self.index.has_positions:
+            raise CQLCompileError("Index without positions, prox is not supported")
+        comparator, distance, ordered = prox_modifiers(node.operator)
+        left, right = node.left, node.right
+        if not isinstance(left, CQLSearchClause) or not isinstance(
+            right, CQLSearchClause
+        ):
+            raise CQLCompileError("Operands of prox must be search clauses")
+        left_words = self._prox_words(left, version)
+        right_words = self._prox_words(right, version)
+
+        right_names = self.index_names(right)
+        results: List[Result] = list()
+        for name in self.index_names(left):
+            if name not in right_names:
+                continue
+            results.append(
+                prox(
+                    Positions.union(
+                        [self._masked_positions(name, mask) for mask in left_words]
+                    ),
+                    Positions.union(
+                        [self._masked_positions(name, mask) for mask in right_words]
+                    ),
+                    comparator,
+                    distance,
+                    ordered,
+                )
+            )
+        return self.union(results)
+
+    def _prox_words(self, clause: CQLSearchClause, version: str) -> List[CQLMask]:
+        # words of a prox operand, any of them
+        relation = relation_name(clause, version)
+        if relation not in ("=", "scr", "adj", "any"):
+            raise CQLCompileError(f"Unsupported relation {relation!r} for prox")
+        modifiers = relation_modifiers(clause.relation)
+        if "respectcase" in modifiers or REGEXP in modifiers:
+            raise CQLCompileError(
+                f"Unsupported relation modifiers for prox: {clause.toCQL()!r}"
+            )
+        words = list(dict.fromkeys(self._words(clause.term, modifiers)))
+        if len(words) > 1 and relation != "any":
+            raise CQLCompileError(f"Phrase searches are not supported: {clause.term!r}")
+        return [_word_mask(word) for word in words]
+
+    def _words(self, term: str, modifiers: Mapping[str, Optional[str]]) -> List[str]:
+        # lower case words of a term, with masking characters unless unmasked
+        if UNMASKED in modifiers:
+            return tokenize(term)
+        return masked_words(term.lower())
+
+    def _masked_result(self, name: str, mask: CQLMask, kind: str) -> Result:
+        # documents with a word / value of an index matching a mask
+        get = self.index.postings if kind == "words" else self.index.value_postings
+        if mask.literal is not None:
+            return self._leaf(get(name, mask.literal))
+        terms = self.index.term_dictionary(name, kind).matching(mask)
+        return self.union([self._leaf(get(name, term)) for term in terms])
+
+    def _masked_positions(self, name: str, mask: CQLMask) -> Positions:
+        # positions of the words of an index matching a mask
+        if mask.literal is not None:
+            return self.index.positions(name, mask.literal)
+        terms = self.index.term_dictionary(name, "words").matching(mask)
+        return Positions.union([self.index.positions(name, term) for term in terms])
+
+    # ---------------------------------------------------
+
+    @property
+    def universe(self) -> CQLBitmap:
+        """Bitmap of all documents."""
+        self._check_bitmaps()
+        if self._universe is None:
+            self._universe = CQLBitmap.range(self.index.num_docs)
+        return self._universe
+
+    def union(self, results: List[Result]) -> Result:
+        """Documents in any of the results."""
+        results = [result for result in results if result]
+        if not results:
+            return postings()
+        if len(results) == 1:
+            return results[0]
+        if self.bitmaps and (
+            any(isinstance(result, CQLBitmap) for result in results)
+            or sum(len(result) for result in results) >= self._min_bitmap
+        ):
+            return CQLBitmap.union_all(
+                [
+                    (
+                        result
+                        if isinstance(result, CQLBitmap)
+                        else CQLBitmap.from_postings(result)
+                    )
+                    for result in results
+                ]
+            )
+        return union_all(results)
+
+    def intersect(self, results: List[Result]) -> Result:
+        """Documents in all results, the smallest ones first."""
+        if not results:
+            return postings()
+        results = sorted(results, key=len)
+        result = results[0]
+        for other in results[1:]:
+            if not result:
+                break
+            if isinstance(result, array):
+                if isinstance(other, array):
+                    result = intersect(result, other)
+                else:
+                    result = other.filter(result)
+            elif isinstance(other, array):
+                result = result.filter(other)
+            else:
+                result = result & other
+        return result
+
+    def difference(self, result: Result, other: Optional[Result] = None) -> Result:
+        """Documents of a result not in the other one."""
+        if not result or not other:
+            return result
+        if isinstance(result, array):
+            if isinstance(other, array):
+                return difference(result, other)
+            return other.exclude(result)
+        if isinstance(other, array):
+            other = CQLBitmap.from_postings(other)
+        return result - other
+
+    @property
+    def _min_bitmap(self) -> int:
+        return max(MAX_ARRAY, self.index.num_docs // BITMAP_DENSITY)
+
+    def _check_bitmaps(self) -> None:
+        # cached bitmaps are outdated once documents were added
+        if self._bitmaps_docs != self.index.num_docs:
+            self._bitmaps.clear()
+            self._universe = None
+            self._bitmaps_docs = self.index.num_docs
+
+    def _leaf(self, values: array) -> Result:
+        # a large posting list of the index as (cached) bitmap
+        if not self.bitmaps or len(values) < self._min_bitmap:
+            return values
+        self._check_bitmaps()
+        cached = self._bitmaps.get(id(values))
+        if cached is None:
+            cached = self._bitmaps[id(values)] = (
+                values,
+                CQLBitmap.from_postings(values),
+            )
+        return cached[1]
@@ -0,0 +1,284 @@
+"""Translates queries into SQLite FTS5 full-text queries (the right side of
+``MATCH``), so the full-text index of an FTS5 table finds the rows instead
+of matching each row.
+
+Each search clause becomes FTS5 phrases (quoted strings) with a column
+filter for its index (``title : ...``, ``{title subject} : ...``), ``and``
+/ ``or`` / ``not`` become ``AND`` / ``OR`` / ``NOT`` and ``prox`` becomes
+``NEAR(...)``. The whole expression is a single bind value::
+
+    match = fts5_match(cql.parse('title = "fish and chips" and subject any food'))
+    rows = connection.execute("SELECT * FROM books WHERE books MATCH ?", [match])
+"""
+
+import re
+from itertools import product
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from cql.engine.positions import prox_modifiers
+from cql.masking import REGEXP
+from cql.masking import UNMASKED
+from cql.masking import masked_words
+from cql.masking import parse_mask
+from cql.parser import CQL_DEFAULT_INDEX
+from cql.parser import CQLQuery
+from cql.parser import CQLSearchClause
+from cql.parser import CQLTriple
+from cql.predicate import CQL_ALL_RECORDS
+from cql.predicate import WORD_RE
+from cql.predicate import CQLCompileError
+from cql.predicate import Node
+from cql.predicate import flatten_run
+from cql.predicate import index_name
+from cql.predicate import relation_modifiers
+from cql.predicate import relation_name
+
+# ---------------------------------------------------------------------------
+
+
+#: FTS5 column name or several names (any of them may match)
+Column = Union[str, Sequence[str]]
+
+#: relations of phrases (the words of the term in this order)
+PHRASE_RELATIONS = ("=", "scr", "adj")
+
+#: FTS5 column names that need no quotes
+COLUMN_RE = re.compile(r"\w+")
+
+
+class CQLFTS5Translator:
+    """Translates queries into FTS5 ``MATCH`` expressions, see
+    :mod:`cql.fts5`.
+
+    * ``=`` (``scr``), ``adj``: a phrase of the words of the term
+    * ``any`` / ``all``: the words of the term with ``OR`` / ``AND``
+    * a trailing ``*`` of a word is a prefix query (``"comput" *``), a
+      ``^`` before the first word of a phrase is the start of the column
+      (``^ "fish"``); other masks are not supported, ``/unmasked`` terms
+      are text
+    * ``a prox/distance<=n b`` (search clauses of the same columns,
+      unordered, unit ``word``) is ``NEAR(a b, n - 1)``, the number of
+      words in between; ``any`` words of its clauses become an ``OR`` of
+      ``NEAR`` groups
+
+    Case and word boundaries are those of the tokenizer of the table
+    (``unicode61`` by default ignores case). Relations that compare whole
+    values (``==``, ``<``, ...), ``/regexp``, ``/respectCase`` and
+    ``cql.allRecords`` cannot be full-text queries (see :mod:`cql.sql`),
+    ``sortBy`` is ignored.
+
+    Args:
+        columns: FTS5 column (or several columns) by index name, by
+            default the lower case index name is the column and
+            ``cql.serverChoice`` looks at all columns
+        version: CQL version for the default relation (default: the
+            version of the query)
+    """
+
+    def __init__(
+        self,
+        columns: Optional[Mapping[str, Column]] = None,
+        version: Optional[str] = None,
+    ):
+        self.columns = {
+            name.lower(): column for name, column in (columns or {}).items()
+        }
+        self.version = version
+
+    def translate(self, query: CQLQuery) -> str:
+        """FTS5 query of a query.
+
+        Raises:
+            CQLCompileError: for unsupported relations, modifiers, masks or
+                ``prox`` searches
+        """
+        version = self.version or query.version
+        expressions: Dict[int, str] = dict()
+        operands: Dict[int, List[Node]] = dict()
+
+        # post order without recursion, runs of and / or are flattened
+        todo: List[Tuple[Node, bool]] = [(query.root, False)]
+        while todo:
+            node, ready = todo.pop()
+            if isinstance(node, CQLSearchClause):
+                expressions[id(node)] = self.translate_clause(node, version)
+                continue
+
+            op = node.operator.value.lower()
+            if op == "prox":
+                expressions[id(node)] = self.translate_prox(node, version)
+                continue
+            if not ready:
+                if op not in ("and", "or", "not"):
+                    raise CQLCompileError(f"Unsupported boolean {op!r}")
+                children = (
+                    flatten_run(node, op) if op != "not" else [node.left, node.right]
+                )
+                operands[id(node)] = children
+                todo.append((node, True))
+                todo.extend((child, False) for child in children)
+                continue
+
+            parts = [expressions.pop(id(child)) for child in operands.pop(id(node))]
+            expressions[id(node)] = "(" + f" {op.upper()} ".join(parts) + ")"
+
+        expression = expressions[id(query.root)]
+        if isinstance(query.root, CQLTriple) and expression.startswith("("):
+            expression = expression[1:-1]
+        return expression
+
+    def translate_clause(self, clause: CQLSearchClause, version: str = "1.2") -> str:
+        """FTS5 query of a search clause (in parentheses if needed)."""
+        relation = relation_name(clause, version)
+        phrases = self._phrases(clause, relation)
+        if relation == "all":
+            expression = _join(phrases, " AND ")
+        else:
+            expression = _join(phrases, " OR ")
+        return _filtered(self.column_names(index_name(clause)), expression)
+
+    def translate_prox(self, node: CQLTriple, version: str = "1.2") -> str:
+        """FTS5 ``NEAR`` query of a ``prox`` of two search clauses."""
+        comparator, distance, ordered = prox_modifiers(node.operator)
+        if ordered or comparator not in ("<", "<="):
+            raise CQLCompileError(
+                "FTS5 NEAR is unordered and needs a distance of at most n"
+            )
+        # NEAR counts the words in between
+        between = distance - (2 if comparator == "<" else 1)
+        if between < 0:
+            raise CQLCompileError(f"Invalid prox distance {comparator}{distance}")
+        left, right = node.left, node.right
+        if not isinstance(left, CQLSearchClause) or not isinstance(
+            right, CQLSearchClause
+        ):
+            raise CQLCompileError("Operands of prox must be search clauses")
+
+        alternatives: List[List[str]] = list()
+        for clause in (left, right):
+            relation = relation_name(clause, version)
+            if relation not in PHRASE_RELATIONS and relation != "any":
+                raise CQLCompileError(f"Unsupported relation {relation!r} for prox")
+            phrases = self._phrases(clause, relation)
+            if any(phrase.startswith("^") for phrase in phrases):
+                raise CQLCompileError(f"Unsupported ^ in prox: {clause.term!r}")
+            alternatives.append(phrases)
+
+        columns = self.column_names(index_name(left))
+        right_columns = self.column_names(index_name(right))
+        if columns is None:
+            columns = right_columns
+        elif right_columns is not None:
+            columns = [column for column in columns if column in right_columns]
+            if not columns:
+                raise CQLCompileError("Operands of prox have different columns")
+
+        groups = [
+            f"NEAR({phrase} {other}, {between})"
+            for phrase, other in product(*alternatives)
+        ]
+        return _filtered(columns, _join(groups, " OR "))
+
+    def column_names(self, index: str) -> Optional[List[str]]:
+        """FTS5 columns of an (lower case) index, ``None`` for all columns.
+
+        Raises:
+            CQLCompileError: for ``cql.allRecords`` or a name that is not an
+                FTS5 column name (letters, digits and ``_``)
+        """
+        if index == CQL_ALL_RECORDS:
+            raise CQLCompileError("FTS5 cannot match all rows (cql.allRecords)")
+        column = self.columns.get(index)
+        if column is None and index == CQL_DEFAULT_INDEX.lower():
+            return None
+        if column is None:
+            column = index
+        names = [column] if isinstance(column, str) else list(column)
+        for name in names:
+            if COLUMN_RE.fullmatch(name) is None:
+                raise CQLCompileError(f"No FTS5 column for index {index!r}: {name!r}")
+        return names
+
+    def _phrases(self, clause: CQLSearchClause, relation: str) -> List[str]:
+        # FTS5 phrases of a clause: one for a phrase, one for each word of
+        # any / all
+        modifiers = relation_modifiers(clause.relation)
+        if relation not in PHRASE_RELATIONS and relation not in ("any", "all"):
+            raise CQLCompileError(f"Unsupported relation {relation!r} for FTS5")
+        if REGEXP in modifiers or "respectcase" in modifiers:
+            raise CQLCompileError(
+                f"Unsupported relation modifiers for FTS5: {clause.toCQL()!r}"
+            )
+        masked = UNMASKED not in modifiers
+        words = masked_words(clause.term) if masked else WORD_RE.findall(clause.term)
+        if not words:
+            raise CQLCompileError(f"No words to search for: {clause.term!r}")
+        if relation in PHRASE_RELATIONS:
+            return [fts5_phrase(words, masked)]
+        return [fts5_phrase([word], masked) for word in words]
+
+
+# ---------------------------------------------------------------------------
+
+
+def fts5_string(text: str) -> str:
+    """FTS5 string (in double quotes) of a text."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def fts5_phrase(words: List[str], masked: bool = True) -> str:
+    """FTS5 phrase of (masked) words, e.g. ``^ "fish" + "chi" *``.
+
+    Raises:
+        CQLCompileError: for masks other than a trailing ``*`` or a ``^``
+            before the first word
+    """
+    strings: List[str] = list()
+    current: List[str] = list()
+    start = False
+    for pos, word in enumerate(words):
+        mask = parse_mask(word, masked)
+        if mask.end or (mask.start and pos > 0):
+            raise CQLCompileError(f"FTS5 anchors only the first word: {word!r}")
+        start = start or mask.start
+        if mask.literal is not None:
+            current.append(mask.literal)
+            continue
+        if not mask.is_prefix or not mask.prefix:
+            raise CQLCompileError(f"FTS5 supports a trailing * only: {word!r}")
+        current.append(mask.prefix)
+        strings.append(fts5_string(" ".join(current)) + " *")
+        current = list()
+    if current:
+        strings.append(fts5_string(" ".join(current)))
+    phrase = " + ".join(strings)
+    return "^ " + phrase if start else phrase
+
+
+def _filtered(columns: Optional[List[str]], expression: str) -> str:
+    # an expression with a column filter
+    if columns is None:
+        return expression
+    if len(columns) == 1:
+        return f"{columns[0]} : {expression}"
+    return f"{{{' '.join(columns)}}} : {expression}"
+
+
+def _join(expressions: List[str], op: str) -> str:
+    if len(expressions) == 1:
+        return expressions[0]
+    return "(" + op.join(expressions) + ")"
+
+
+# ---------------------------------------------------------------------------
+
+
+def fts5_match(query: CQLQuery, columns: Optional[Mapping[str, Column]] = None) -> str:
+    """FTS5 query (for ``MATCH``) of a query, see :class:`CQLFTS5Translator`."""
+    return CQLFTS5Translator(columns).translate(query)
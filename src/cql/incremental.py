@@ -0,0 +1,419 @@
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from cql._vendor.ply.lex import LexToken
+from cql.lexer import CODE_CHAR_STRING2
+from cql.lexer import CQLLexer
+from cql.lexer import CQLLexerError
+from cql.parser import COMPLETION_WORDS
+from cql.parser import CQLCompletion
+from cql.parser import CQLParser
+from cql.parser import CQLParser12
+from cql.parser import CQLParserError
+
+# ---------------------------------------------------------------------------
+
+
+#: parser state stack as linked ``(state, rest)`` tuples, so that checkpoints
+#: share their common bottom part
+Stack = Optional[Tuple[int, "Stack"]]
+
+#: state stack at the start of the input
+BOTTOM: Stack = (0, None)
+
+
+def states_of(stack: Stack) -> List[int]:
+    states = list()
+    while stack is not None:
+        states.append(stack[0])
+        stack = stack[1]
+    states.reverse()
+    return states
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    # binary search, comparing slices is done in C
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def common_suffix_length(a: str, b: str) -> int:
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid : len(a) - lo] == b[len(b) - mid : len(b) - lo]:  # noqa: E203
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+# ---------------------------------------------------------------------------
+
+
+class CQLIncrementalParser:
+    """Validates a query that is edited piece by piece, e.g. in a search box.
+
+    Tokens and the parser state stack before each token (checkpoints) of
+    the current text are kept. After an edit, lexing restarts at the first
+    token touched by the edit and stops once it is back at an old token
+    boundary. Parsing restarts at the checkpoint of that first token and
+    stops once its state stack is the same as the old checkpoint of an
+    unchanged token. So the work per edit depends on the size of the edit,
+    not on the length of the query.
+
+    Like :meth:`CQLParser.validate`, only the syntax is checked and no
+    query objects are built. Parser limits are not checked.
+
+    Args:
+        parser: built parser, a :class:`CQLParser12` by default
+        text: initial query text
+    """
+
+    def __init__(self, parser: Optional[CQLParser] = None, text: str = ""):
+        if parser is None:
+            parser = CQLParser12()
+            parser.build()
+        self.parser = parser
+        self.lexer: CQLLexer = parser.lexer
+
+        self.text = ""
+        # token type codes and offsets; offsets of tokens from index _pivot on
+        # are stored relative to _delta (so edits do not shift all of them)
+        self._types: List[int] = list()
+        self._starts: List[int] = list()
+        self._ends: List[int] = list()
+        self._pivot = 0
+        self._delta = 0
+        #: offset of an unterminated quoted string (after the last token)
+        self._lexer_error: Optional[int] = None
+
+        # checkpoints, parser state stack before reading token i
+        self._stacks: List[Stack] = list()
+        # index of the token (len(tokens) for the end) at which parsing
+        # failed, and the state stack at that point
+        self._error_index: Optional[int] = None
+        self._error_stack: Stack = None
+        self._error: Optional[Union[CQLParserError, CQLLexerError]] = None
+
+        #: number of tokens lexed / read by the parser in the last edit
+        self.relexed = 0
+        self.reparsed = 0
+
+        self.edit(0, 0, text)
+
+    # ---------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def _start(self, idx: int) -> int:
+        return self._starts[idx] + (self._delta if idx >= self._pivot else 0)
+
+    def _end(self, idx: int) -> int:
+        return self._ends[idx] + (self._delta if idx >= self._pivot else 0)
+
+    def tokens(self) -> Iterator[Tuple[str, int, int]]:
+        """Yields type, start and end offset of each token, e.g. for
+        highlighting."""
+        names = CQLLexer.tokens
+        for idx, code in enumerate(self._types):
+            yield names[code], self._start(idx), self._end(idx)
+
+    def _move_pivot(self, pivot: int) -> None:
+        # make offsets before pivot absolute and from pivot on relative,
+        # costs the distance to the last edit
+        starts, ends, delta = self._starts, self._ends, self._delta
+        if pivot > self._pivot:
+            for idx in range(self._pivot, pivot):
+                starts[idx] += delta
+                ends[idx] += delta
+        else:
+            for idx in range(pivot, self._pivot):
+                starts[idx] -= delta
+                ends[idx] -= delta
+        self._pivot = pivot
+
+    # ---------------------------------------------------
+
+    @property
+    def error(self) -> Optional[Union[CQLParserError, CQLLexerError]]:
+        """``None`` if the current text is a valid query, otherwise the error
+        that :meth:`CQLParser.validate` would return."""
+        if self._error is None and self._error_index is not None:
+            self._error = self._make_error()
+        return self._error
+
+    def _make_error(self) -> Union[CQLParserError, CQLLexerError]:
+        text, idx = self.text, self._error_index
+        if idx == len(self._types) and self._lexer_error is not None:
+            try:
+                self.lexer.scan(text, self._lexer_error)
+            except CQLLexerError as ex:
+                return ex
+
+        states = states_of(self._error_stack)
+        symbols = [self.parser._symbols[state] for state in states]
+
+        if idx == len(self._types):
+            return self.parser.syntax_error(
+                symbols, states[-1], None, len(text), len(text) + 1
+            )
+
+        code, start, end = self._types[idx], self._start(idx), self._end(idx)
+        p = LexToken()
+        p.type = CQLLexer.tokens[code]
+        if code == CODE_CHAR_STRING2:
+            p.value = text[start + 1 : end - 1].replace('\\"', '"')  # noqa: E203
+        else:
+            p.value = text[start:end]
+        p.lineno = 1
+        p.lexpos = start
+        return self.parser.syntax_error(symbols, states[-1], p, start, end)
+
+    def complete(self) -> CQLCompletion:
+        """Same as :meth:`CQLParser.complete` for the current text, but the
+        state stack comes from a checkpoint instead of parsing the text."""
+        text, num = self.text, len(self._types)
+        position = len(text)
+        if self._lexer_error is not None:
+            position = self._lexer_error
+        elif (
+            num
+            and self._end(num - 1) == position
+            and self._types[num - 1] in COMPLETION_WORDS
+        ):
+            num -= 1
+            position = self._start(num)
+
+        if self._error_index is not None and self._error_index < num:
+            return CQLCompletion(position, text[position:], dict(), self.error)
+
+        expected = self.parser.expected_after(states_of(self._stacks[num]))
+        return CQLCompletion(position, text[position:], dict(expected))
+
+    # ---------------------------------------------------
+
+    def update(self, text: str) -> Optional[Union[CQLParserError, CQLLexerError]]:
+        """Replaces the text, only the changed part is processed again.
+
+        Returns:
+            Optional[Union[CQLParserError, CQLLexerError]]: see :attr:`error`
+        """
+        old = self.text
+        start = common_prefix_length(old, text)
+        suffix = common_suffix_length(old[start:], text[start:])
+        stop = len(text) - suffix
+        return self.edit(start, len(old) - suffix, text[start:stop])
+
+    def edit(
+        self, start: int, end: int, replacement: str
+    ) -> Optional[Union[CQLParserError, CQLLexerError]]:
+        """Replaces ``text[start:end]`` with ``replacement``.
+
+        Returns:
+            Optional[Union[CQLParserError, CQLLexerError]]: see :attr:`error`
+        """
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError(f"Invalid range {start}:{end} for length {len(self.text)}")
+
+        shift, first, unchanged = self._relex(start, end, replacement)
+        self._error = None
+
+        # parsing stopped before the edit, still the same error
+        error_index = self._error_index
+        if error_index is not None and error_index < first:
+            # of the checkpoints after the error (see _reparse) only the ones
+            # after the edit are still usable
+            after = error_index + 1
+            if unchanged > len(self._types):
+                del self._stacks[after:]
+            elif len(self._stacks) > after:
+                self._stacks[after : unchanged - shift] = [None] * (  # noqa: E203
+                    unchanged - after
+                )
+            self.reparsed = 0
+            return self.error
+
+        self._reparse(first, shift, unchanged)
+        return self.error
+
+    def _relex(self, start: int, end: int, replacement: str) -> Tuple[int, int, int]:
+        # returns shift in token indices, index of the first changed token
+        # and of the first token of the unchanged rest (if any)
+        text = self.text[:start] + replacement + self.text[end:]
+        diff = len(replacement) - (end - start)
+        edit_end = start + len(replacement)
+        num = len(self._types)
+
+        # first token touched by the edit (ending at or after its start)
+        lo, hi = 0, num
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._end(mid) < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        first = lo
+        self._move_pivot(first)
+
+        starts, delta = self._starts, self._delta
+        pos = self._ends[first - 1] if first else 0
+        types: List[int] = list()
+        new_starts: List[int] = list()
+        new_ends: List[int] = list()
+        lexer_error: Optional[int] = None
+        old = first  # next old token that may still be the same
+        synced = False
+        while True:
+            try:
+                tok = self.lexer.scan(text, pos)
+            except CQLLexerError as ex:
+                # always the last thing, same as before if at the old position
+                lexer_error, old = ex.position, num
+                break
+            if tok is None:
+                old = num
+                break
+
+            code, tok_start, pos = tok
+            if tok_start >= edit_end:
+                # back at an old token boundary? then the rest is unchanged
+                while old < num and starts[old] + delta + diff < tok_start:
+                    old += 1
+                if old < num and starts[old] + delta + diff == tok_start:
+                    if self._lexer_error is not None:
+                        lexer_error = self._lexer_error + diff
+                    synced = True
+                    break
+
+            types.append(code)
+            new_starts.append(tok_start)
+            new_ends.append(pos)
+
+        self._types[first:old] = types
+        self._starts[first:old] = new_starts
+        self._ends[first:old] = new_ends
+        self._pivot = first + len(types)
+        self._delta += diff
+        self._lexer_error = lexer_error
+        self.text = text
+        self.relexed = len(types)
+
+        unchanged = first + len(types) if synced else len(self._types) + 1
+        return len(types) - (old - first), first, unchanged
+
+    def _reparse(self, first: int, shift: int, unchanged: int) -> None:
+        # runs the automaton from the checkpoint before token first, until
+        # the state stack is the same as before at a token from unchanged on
+        #
+        # checkpoints of an earlier run after the current error are kept
+        # (they help after the error is fixed), if the state stack matches
+        # one of them, parsing continues from the last of them
+        parser = self.parser
+        actions, defaulted, productions = (
+            parser._actions,
+            parser._defaulted,
+            parser._productions,
+        )
+        goto = parser.parser.goto
+        end = len(actions[0]) - 1
+
+        types, num, lexer_error = self._types, len(self._types), self._lexer_error
+        old_stacks = self._stacks
+        if self._error_index is not None:
+            old_live = self._error_index + 1
+        else:
+            old_live = num - shift + 1
+        stacks: List[Stack] = list()
+        reparsed = 0
+
+        stack = old_stacks[first] if first < len(old_stacks) else BOTTOM
+        code: Optional[int] = None  # lookahead
+        idx = first  # next token
+        jumped = False
+        while True:
+            state = stack[0]
+            t = defaulted[state]
+            if t is None:
+                if code is None:
+                    old = idx - shift
+                    if idx >= unchanged and not jumped and old < len(old_stacks):
+                        if stack == old_stacks[old]:
+                            if old < old_live:
+                                # same state before the same tokens as before
+                                self._stacks[first:old] = stacks
+                                if self._error_index is not None:
+                                    self._error_index += shift
+                                self.reparsed = reparsed
+                                return
+                            # continue after the kept checkpoints
+                            last = len(old_stacks) - 1
+                            stacks.extend(old_stacks[old:last])
+                            idx = last + shift
+                            stack = old_stacks[last]
+                            state = stack[0]
+                            jumped = True
+
+                    stacks.append(stack)
+                    reparsed += 1
+                    if idx < num:
+                        code = types[idx]
+                    elif lexer_error is not None:
+                        break
+                    else:
+                        code = end
+                    idx += 1
+                t = actions[state][code]
+                if t is None:
+                    idx -= 1
+                    break
+
+            if t > 0:
+                stack = (t, stack)
+                code = None
+                continue
+
+            if t < 0:
+                plen, pname, _ = productions[-t]
+                for _ in range(plen):
+                    stack = stack[1]
+                stack = (goto[stack[0]][pname], stack)
+                continue
+
+            idx = None  # accept
+            break
+
+        keep = stop = 0
+        if idx is not None and not jumped and unchanged <= num:
+            # keep checkpoints for unchanged tokens after the error, either
+            # the ones kept from an earlier run or else of the previous run
+            keep = max(unchanged - shift, idx - shift + 1)
+            if len(old_stacks) > old_live:
+                keep, stop = max(keep, old_live), len(old_stacks)
+            else:
+                stop = old_live
+        if keep < stop:
+            del old_stacks[stop:]
+            stacks.extend([None] * (keep + shift - idx - 1))
+            old_stacks[first:keep] = stacks
+        else:
+            old_stacks[first:] = stacks
+        self._error_index = idx
+        self._error_stack = stack if idx is not None else None
+        self.reparsed = reparsed
+
+    def __repr__(self) -> str:
+        return f"CQLIncrementalParser[{len(self)} tokens, valid={self.error is None}]"
+
+
+# ---------------------------------------------------------------------------
@@ -1,5 +1,13 @@
 import logging
 import re
+from array import array
+from collections import Counter
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
 
 import cql._vendor.ply.lex as lex
 from cql._vendor.ply.lex import Lexer
@@ -11,8 +19,139 @@ LOGGER = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 
 
+#: character class for unquoted strings (``CHAR_STRING1``)
+CHAR_STRING1_CHARS = r"""[^\s()=<>"/]"""
+#: unquoted strings / identifiers
+CHAR_STRING1_PATTERN = CHAR_STRING1_CHARS + "+"
+#: quoted strings, only the opening quote, the rest is scanned with :func:`find_quoted_end`
+CHAR_STRING2_PATTERN = r'"'
+
+
+def find_quoted_end(data: str, start: int) -> int:
+    """Returns the end offset (exclusive) of the quoted string that starts at
+    ``start`` or ``-1`` if it is not terminated.
+
+    The closing quote is the first ``"`` not escaped by an odd number of
+    backslashes. Scanning is done with ``str.find`` and every backslash is
+    looked at most once, so this is linear in the input size (unlike a
+    backtracking regular expression on unterminated input).
+    """
+    pos = start + 1
+    while True:
+        pos = data.find('"', pos)
+        if pos == -1:
+            return -1
+        # count backslashes in front of the quote (bounded by opening quote)
+        bs = pos - 1
+        while data[bs] == "\\":
+            bs -= 1
+        if (pos - 1 - bs) % 2 == 0:
+            return pos + 1
+        pos += 1
+
+
+# ---------------------------------------------------------------------------
+
+
 class CQLLexerError(Exception):
-    pass
+    def __init__(self, message: str, token: Optional[LexToken] = None):
+        super().__init__(message, token)
+        #: input offset of the illegal character
+        self.position: Optional[int] = token.lexpos if token is not None else None
+
+
+# ---------------------------------------------------------------------------
+
+
+class CQLTokenStream:
+    """Compact token stream as parallel arrays of type codes and offsets.
+
+    Token values are not stored but sliced from the input on access, so
+    scanning a query does not create any per-token objects. Type codes are
+    indices into :attr:`CQLLexer.tokens`.
+    """
+
+    __slots__ = ("data", "types", "starts", "ends")
+
+    def __init__(self, data: str, types: array, starts: array, ends: array):
+        self.data = data
+        self.types = types  # array("B") of type codes
+        self.starts = starts  # array("I") of start offsets
+        self.ends = ends  # array("I") of end offsets (exclusive)
+
+    def type(self, idx: int) -> str:
+        return CQLLexer.tokens[self.types[idx]]
+
+    def text(self, idx: int) -> str:
+        """Raw token text as in the input (with quotes)."""
+        start, end = self.starts[idx], self.ends[idx]
+        return self.data[start:end]
+
+    def value(self, idx: int) -> str:
+        """Token value as the parser sees it (unquoted / unescaped)."""
+        start, end = self.starts[idx], self.ends[idx]
+        if self.types[idx] == CODE_CHAR_STRING2:
+            return self.data[start + 1 : end - 1].replace('\\"', '"')  # noqa: E203
+        return self.data[start:end]
+
+    def type_counts(self) -> Dict[str, int]:
+        return {CQLLexer.tokens[code]: cnt for code, cnt in Counter(self.types).items()}
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def __repr__(self) -> str:
+        return f"CQLTokenStream[{len(self)} tokens]"
+
+
+class CQLTokenStreamLexer:
+    """PLY compatible lexer (``input()`` / ``token()``) on top of
+    :meth:`CQLLexer.tokenize`. Tokens are only materialized into
+    :class:`LexToken` objects when the parser asks for them."""
+
+    def __init__(self, cqllexer: "CQLLexer"):
+        self.cqllexer = cqllexer
+        self.stream: Optional[CQLTokenStream] = None
+        self.lexdata: Optional[str] = None
+        self.lexpos = 0
+        self.lineno = 1
+        self._tokens: Optional[Iterator[LexToken]] = None
+
+    def input(self, content: str) -> None:
+        self.stream = self.cqllexer.tokenize(content)
+        self.lexdata = content
+        self.lexpos = 0
+        self._tokens = self._materialize(self.stream)
+
+    def _materialize(self, stream: CQLTokenStream) -> Iterator[LexToken]:
+        data, names, lineno = stream.data, CQLLexer.tokens, self.lineno
+        for code, start, end in zip(stream.types, stream.starts, stream.ends):
+            tok = LexToken()
+            tok.type = names[code]
+            if code == CODE_CHAR_STRING2:
+                tok.value = data[start + 1 : end - 1].replace('\\"', '"')  # noqa
+            else:
+                tok.value = data[start:end]
+            tok.lineno = lineno
+            tok.lexpos = start
+            self.lexpos = end
+            yield tok
+        # same as PLY, position after end of input
+        self.lexpos = len(data) + 1
+
+    def token(self) -> Optional[LexToken]:
+        if self._tokens is None:
+            raise RuntimeError("No input string given with input()")
+        return next(self._tokens, None)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> LexToken:
+        tok = self.token()
+        if tok is None:
+            raise StopIteration
+        return tok
 
 
 # ---------------------------------------------------------------------------
@@ -43,6 +182,9 @@ class CQLLexer:
     ] + list(reserved.values())
     # fmt: on
 
+    #: token type codes (index into :attr:`tokens`) as used by :class:`CQLTokenStream`
+    codes = dict(zip(tokens, range(len(tokens))))
+
     # ---------------------------------------------------
 
     t_LPAREN = r"\("
@@ -60,15 +202,24 @@ class CQLLexer:
 
     # ---------------------------------------------------
 
+    @lex.TOKEN(CHAR_STRING1_PATTERN)
     def t_CHAR_STRING1(self, tok: LexToken) -> LexToken:
-        r"""[^\s()=<>"/]+"""
         # check for keywords (as in §4.3 / https://stackoverflow.com/a/39628385/9360161)
-        tok.type = self.reserved.get(tok.value.lower(), tok.type)
+        # (no need to lower() long identifiers)
+        if len(tok.value) <= RESERVED_MAXLEN:
+            tok.type = self.reserved.get(tok.value.lower(), tok.type)
         return tok
 
+    @lex.TOKEN(CHAR_STRING2_PATTERN)
     def t_CHAR_STRING2(self, tok: LexToken) -> LexToken:
-        r'''"(?:\\"|[^"])*"'''
-        tok.value = tok.value[1:-1].replace('\\"', '"')
+        lexdata = tok.lexer.lexdata
+        end = find_quoted_end(lexdata, tok.lexpos)
+        if end == -1:
+            # unterminated, report opening quote
+            tok.value = lexdata[tok.lexpos :]  # noqa: E203
+            self.t_error(tok)
+        tok.lexer.lexpos = end
+        tok.value = lexdata[tok.lexpos + 1 : end - 1].replace('\\"', '"')  # noqa: E203
         return tok
 
     # ---------------------------------------------------
@@ -76,11 +227,18 @@ class CQLLexer:
     #: A string containing ignored characters (spaces, tabs, and newlines)
     t_ignore = " \t\r\n\f\v"
 
+    #: whether to log lexer errors
+    log_errors = False
+
     #: Error handling rule
     def t_error(self, tok: LexToken) -> None:
-        LOGGER.error("Illegal character '%s' at %s", tok.value[0], tok.lexpos)
+        if self.log_errors:
+            LOGGER.error("Illegal character '%s' at %s", tok.value[0], tok.lexpos)
         raise CQLLexerError(f"Illegal character {tok.value[0]!r} at {tok.lexpos}", tok)
 
+    #: regular expression flags for the token rules
+    reflags = re.UNICODE | re.VERBOSE | re.IGNORECASE
+
     # ---------------------------------------------------
 
     def find_column(self, token: LexToken) -> int:
@@ -88,10 +246,115 @@ class CQLLexer:
         line_start = input.rfind("\n", 0, token.lexpos) + 1
         return (token.lexpos - line_start) + 1
 
-    def build(self, **kwargs) -> None:
-        self.lexer: Lexer = lex.lex(
-            module=self, reflags=re.UNICODE | re.VERBOSE | re.IGNORECASE, **kwargs
-        )
+    def build(self, compact: bool = False, log_errors: bool = False, **kwargs) -> None:
+        self.log_errors = log_errors
+        if compact:
+            # single master pattern scan, see tokenize()
+            self.lexer: Union[Lexer, CQLTokenStreamLexer] = CQLTokenStreamLexer(self)
+            return
+
+        self.lexer = lex.lex(module=self, reflags=self.reflags, **kwargs)
+
+    # ---------------------------------------------------
+
+    @classmethod
+    def _compact_pattern(cls):
+        # build (once) a single master pattern from the token rules, in the
+        # same order as PLY would try them but with the reserved keywords
+        # matched directly (instead of lower() + dict lookup for each word)
+        if "_compact_re" in cls.__dict__:
+            return cls._compact_re, cls._compact_codes
+
+        names: List[str] = list()
+        patterns: List[str] = list()
+        for keyword, name in cls.reserved.items():
+            names.append(name)
+            patterns.append(re.escape(keyword) + f"(?!{CHAR_STRING1_CHARS})")
+
+        rules = [(name, getattr(cls, f"t_{name}", None)) for name in cls.tokens]
+        funcs = [(name, rule) for name, rule in rules if callable(rule)]
+        funcs.sort(key=lambda x: x[1].__code__.co_firstlineno)
+        strs = [(name, rule) for name, rule in rules if isinstance(rule, str)]
+        strs.sort(key=lambda x: len(x[1]), reverse=True)
+        for name, rule in funcs:
+            names.append(name)
+            patterns.append(lex._get_regex(rule))
+        for name, rule in strs:
+            names.append(name)
+            patterns.append(rule)
+
+        skip = "[" + re.escape(cls.t_ignore) + "]*"
+        alts = "|".join(f"({pattern})" for pattern in patterns)
+        cls._compact_re = re.compile(f"{skip}(?:{alts}|\\Z)", cls.reflags)
+        # group index to type code
+        cls._compact_codes = [0] + [cls.codes[name] for name in names]
+        return cls._compact_re, cls._compact_codes
+
+    def tokenize(self, content: str) -> CQLTokenStream:
+        """Scans the whole input at once into a :class:`CQLTokenStream`
+        without creating token objects."""
+        master, group_codes = self._compact_pattern()
+        match = master.match
+
+        types = array("B")
+        starts = array("I")
+        ends = array("I")
+        add_type, add_start, add_end = types.append, starts.append, ends.append
+
+        pos = 0
+        while True:
+            m = match(content, pos)
+            if m is None:
+                pos += len(content[pos:]) - len(content[pos:].lstrip(self.t_ignore))
+                self._tokenize_error(content, pos)
+            idx = m.lastindex
+            if idx is None:
+                break
+            code, (start, pos) = group_codes[idx], m.span(idx)
+            if code == CODE_CHAR_STRING2:
+                pos = find_quoted_end(content, start)
+                if pos == -1:
+                    # unterminated, report opening quote
+                    self._tokenize_error(content, start)
+            add_type(code)
+            add_start(start)
+            add_end(pos)
+
+        return CQLTokenStream(content, types, starts, ends)
+
+    def scan(self, content: str, pos: int) -> Optional[Tuple[int, int, int]]:
+        """Scans the single next token at or after ``pos`` (same as
+        :meth:`tokenize`, e.g. to re-scan only part of an edited input).
+
+        Returns:
+            Optional[Tuple[int, int, int]]: type code, start and end offset
+            of the token, ``None`` at the end of input
+
+        Raises:
+            CQLLexerError: for an illegal character or unterminated string
+        """
+        master, group_codes = self._compact_pattern()
+        m = master.match(content, pos)
+        if m is None:
+            pos += len(content[pos:]) - len(content[pos:].lstrip(self.t_ignore))
+            self._tokenize_error(content, pos)
+        idx = m.lastindex
+        if idx is None:
+            return None
+        code, (start, end) = group_codes[idx], m.span(idx)
+        if code == CODE_CHAR_STRING2:
+            end = find_quoted_end(content, start)
+            if end == -1:
+                self._tokenize_error(content, start)
+        return code, start, end
+
+    def _tokenize_error(self, content: str, pos: int) -> None:
+        tok = LexToken()
+        tok.type = "error"
+        tok.value = content[pos:]
+        tok.lineno = 1
+        tok.lexpos = pos
+        self.t_error(tok)
 
     def run(self, content: str, skip: int = 0, limit: int = 30):
         self.lexer.input(content)
@@ -109,3 +372,10 @@ class CQLLexer:
                 break
 
             yield tok
+
+
+# ---------------------------------------------------------------------------
+
+
+CODE_CHAR_STRING2 = CQLLexer.codes["CHAR_STRING2"]
+RESERVED_MAXLEN = max(len(keyword) for keyword in CQLLexer.reserved)
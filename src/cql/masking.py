@@ -0,0 +1,203 @@
+"""Masked terms (CQL 1.2): ``*`` for any characters, ``?`` for a single
+character and ``^`` at the start or end of a word for the start or end of
+the value, ``\\`` escapes the next character.
+
+Masked words are compiled once into regular expressions (cached), a word
+with a trailing ``*`` only is a prefix, found as a range of a sorted
+:class:`CQLTermDictionary` instead of matching each of its terms. The
+relation modifiers ``/unmasked`` (masking characters are text) and
+``/regexp`` (the term is a regular expression) are supported by the
+evaluators.
+"""
+
+import re
+import sys
+from bisect import bisect_left
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Pattern
+from typing import Tuple
+
+# ---------------------------------------------------------------------------
+
+
+#: relation modifier, masking characters are text
+UNMASKED = "unmasked"
+#: relation modifier, the term is a regular expression
+REGEXP = "regexp"
+#: max. number of cached compiled patterns (the cache is cleared once full)
+MAX_PATTERNS = 256
+
+#: words of a masked term, with escapes and masking characters
+MASKED_WORD_RE = re.compile(r"\^?(?:\\.|[\w*?])+\^?", re.DOTALL)
+
+_patterns: Dict[Tuple[str, int], Pattern] = dict()
+
+
+class CQLMask:
+    """A word (or whole term) compiled for matching, see :func:`parse_mask`."""
+
+    __slots__ = ("text", "pattern", "literal", "prefix", "is_prefix", "start", "end")
+
+    def __init__(
+        self,
+        text: str,
+        pattern: str,
+        literal: Optional[str],
+        prefix: str,
+        is_prefix: bool,
+        start: bool = False,
+        end: bool = False,
+    ):
+        #: the word as in the term
+        self.text = text
+        #: regular expression of the word (without anchors)
+        self.pattern = pattern
+        #: the unescaped word if nothing is masked
+        self.literal = literal
+        #: unescaped text before the first masking character
+        self.prefix = prefix
+        #: whether only a trailing ``*`` is masked
+        self.is_prefix = is_prefix
+        #: whether anchored at the start / end of the value (``^``)
+        self.start = start
+        self.end = end
+
+    def __repr__(self) -> str:
+        return f"CQLMask[{self.text!r}: {self.pattern!r}]"
+
+
+def unescape(term: str) -> str:
+    """A term without its escaping backslashes."""
+    return re.sub(r"\\(.)", r"\1", term, flags=re.DOTALL) if "\\" in term else term
+
+
+def masked_words(term: str) -> List[str]:
+    """Words of a masked term, with their masking characters and escapes."""
+    return MASKED_WORD_RE.findall(term)
+
+
+def parse_mask(word: str, masked: bool = True, whole: bool = False) -> CQLMask:
+    """Compiles a word (or with ``whole`` a whole value, ``*`` and ``?``
+    also match non word characters then) of a term."""
+    text = word
+    start = end = False
+    if masked:
+        # ^ anchors a word (a whole value is anchored anyway)
+        if word.startswith("^"):
+            start, word = True, word[1:]
+        if word.endswith("^") and not word.endswith("\\^"):
+            end, word = True, word[:-1]
+
+    any_chars, one_char = (".*", ".") if whole else (r"\w*", r"\w")
+    parts: List[str] = list()
+    literal: List[str] = list()
+    prefix: Optional[str] = None
+    is_prefix = False
+    pos = 0
+    while pos < len(word):
+        char = word[pos]
+        pos += 1
+        if char == "\\" and pos < len(word):
+            char = word[pos]
+            pos += 1
+        elif masked and char in "*?":
+            if prefix is None:
+                prefix = "".join(literal)
+            is_prefix = char == "*" and pos == len(word) and len(parts) == len(literal)
+            parts.append(any_chars if char == "*" else one_char)
+            continue
+        literal.append(char)
+        parts.append(re.escape(char))
+
+    if prefix is None:
+        text_ = "".join(literal)
+        return CQLMask(text, re.escape(text_), text_, text_, False, start, end)
+    pattern = "".join(parts)
+    if not literal and not whole and "?" not in word:
+        # only *, any word (not an empty one)
+        pattern = r"\w+"
+    return CQLMask(text, pattern, None, prefix, is_prefix, start, end)
+
+
+def words_pattern(masks: List[CQLMask]) -> str:
+    """Regular expression of a phrase of masked words, separated by
+    anything but words."""
+    pattern = r"(?<!\w)%s(?!\w)" % r"\W+".join(mask.pattern for mask in masks)
+    if masks and masks[0].start:
+        pattern = r"\A\W*" + pattern
+    if masks and masks[-1].end:
+        pattern += r"\W*\Z"
+    return pattern
+
+
+def compile_pattern(pattern: str, flags: int = 0) -> Pattern:
+    """Compiled regular expression (cached).
+
+    Raises:
+        re.error: if it is invalid (e.g. a ``/regexp`` term)
+    """
+    key = (pattern, flags)
+    compiled = _patterns.get(key)
+    if compiled is None:
+        compiled = re.compile(pattern, flags)
+        if len(_patterns) >= MAX_PATTERNS:
+            _patterns.clear()
+        _patterns[key] = compiled
+    return compiled
+
+
+# ---------------------------------------------------------------------------
+
+
+class CQLTermDictionary:
+    """Sorted terms (e.g. the words of an index) for masked lookups: a
+    literal or a prefix is found by binary search, other masks are matched
+    against the terms with the same prefix only.
+
+    Args:
+        terms: the (unique) terms
+        flags: regular expression flags for masks
+    """
+
+    __slots__ = ("terms", "flags")
+
+    def __init__(self, terms: Iterable[str], flags: int = 0):
+        self.terms = sorted(terms)
+        self.flags = flags
+
+    def prefixed(self, prefix: str) -> List[str]:
+        """Terms starting with a prefix."""
+        if not prefix:
+            return self.terms
+        start = bisect_left(self.terms, prefix)
+        # the range ends at the first term not starting with the prefix,
+        # i.e. before the prefix with its last character incremented (the
+        # last one below sys.maxunicode, else at the end of the terms)
+        base = prefix.rstrip(chr(sys.maxunicode))
+        if not base:
+            return self.terms[start:]
+        stop = base[:-1] + chr(ord(base[-1]) + 1)
+        end = bisect_left(self.terms, stop, start)
+        return self.terms[start:end]
+
+    def matching(self, mask: CQLMask) -> List[str]:
+        """Terms matching a mask (as a whole)."""
+        if mask.literal is not None:
+            pos = bisect_left(self.terms, mask.literal)
+            if pos < len(self.terms) and self.terms[pos] == mask.literal:
+                return [mask.literal]
+            return []
+        candidates = self.prefixed(mask.prefix)
+        if mask.is_prefix:
+            return candidates
+        fullmatch = compile_pattern(mask.pattern, self.flags).fullmatch
+        return [term for term in candidates if fullmatch(term)]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __repr__(self) -> str:
+        return f"CQLTermDictionary[{len(self.terms)} terms]"
@@ -0,0 +1,301 @@
+import copy
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import Tuple
+from typing import Union
+
+from cql.optimizer import SIMPLIFIED_BOOLEANS
+from cql.parser import CQLPrefix
+from cql.parser import CQLPrefixable
+from cql.parser import CQLQuery
+from cql.parser import CQLSearchClause
+from cql.parser import CQLSortSpec
+from cql.parser import CQLTriple
+
+# ---------------------------------------------------------------------------
+
+
+Node = Union[CQLTriple, CQLSearchClause]
+
+#: literals (atom index * 2 + negated) of a conjunction (DNF) or disjunction (CNF)
+Term = FrozenSet[int]
+
+
+class CQLNormalFormError(Exception):
+    """Query cannot be converted within the size budget or the normal form
+    cannot be written as CQL."""
+
+
+# ---------------------------------------------------------------------------
+
+
+class CQLLiteral:
+    """A search clause (or a subtree that is kept as a whole, e.g. a ``prox``
+    triple), possibly negated."""
+
+    def __init__(self, node: Node, negated: bool = False):
+        self.node = node
+        self.negated = negated
+
+    def toCQL(self) -> str:
+        cql = self.node.toCQL()
+        if isinstance(self.node, CQLTriple) and self.node.prefixes:
+            # (only search clauses write their prefixes)
+            cql = f"{CQLPrefixable.toCQL(self.node)} {cql}"
+        if isinstance(self.node, CQLTriple) or self.node.prefixes:
+            cql = f"({cql})"
+        return cql
+
+    def __str__(self) -> str:
+        return f"not {self.toCQL()}" if self.negated else self.toCQL()
+
+    def __repr__(self) -> str:
+        return f"CQLLiteral[{self}]"
+
+
+class CQLNormalForm:
+    """Query as a list of clauses: disjunction of conjunctions (``"dnf"``)
+    or conjunction of disjunctions (``"cnf"``) of literals.
+
+    Args:
+        form: ``"dnf"`` or ``"cnf"``
+        clauses: lists of literals
+        prefixes: prefix assignments of the query
+        sortSpecs: sort keys of the query
+    """
+
+    def __init__(
+        self,
+        form: str,
+        clauses: List[List[CQLLiteral]],
+        prefixes: List[CQLPrefix],
+        sortSpecs: List[CQLSortSpec],
+    ):
+        self.form = form
+        self.clauses = clauses
+        self.prefixes = prefixes
+        self.sortSpecs = sortSpecs
+
+    @property
+    def size(self) -> int:
+        """Number of literals."""
+        return sum(len(clause) for clause in self.clauses)
+
+    def toCQL(self) -> str:
+        """Writes the normal form as CQL (``not`` is binary in CQL, so negated
+        literals can only follow a positive part).
+
+        Raises:
+            CQLNormalFormError: if it cannot be written as CQL
+        """
+        if not self.clauses:
+            raise CQLNormalFormError("Query matches nothing")
+
+        if self.form == "dnf":
+            parts = list()
+            for clause in self.clauses:
+                part = self._conjunction(
+                    [[lit] for lit in clause if not lit.negated],
+                    [lit for lit in clause if lit.negated],
+                )
+                parts.append(
+                    f"({part})" if len(clause) > 1 and len(self.clauses) > 1 else part
+                )
+            cql = " or ".join(parts)
+        else:
+            positive = [
+                clause
+                for clause in self.clauses
+                if not any(lit.negated for lit in clause)
+            ]
+            negated = [
+                clause[0]
+                for clause in self.clauses
+                if len(clause) == 1 and clause[0].negated
+            ]
+            if len(positive) + len(negated) < len(self.clauses):
+                raise CQLNormalFormError(
+                    "Disjunction with a negated literal cannot be written as CQL"
+                )
+            cql = self._conjunction(positive, negated)
+
+        prefixes = " ".join(prefix.toCQL() for prefix in self.prefixes)
+        if prefixes:
+            cql = f"{prefixes} {cql}"
+        if self.sortSpecs:
+            cql += " " + " ".join(spec.toCQL() for spec in self.sortSpecs)
+        return cql
+
+    @staticmethod
+    def _conjunction(
+        disjunctions: List[List[CQLLiteral]], negated: List[CQLLiteral]
+    ) -> str:
+        if not disjunctions:
+            raise CQLNormalFormError("Only negated literals cannot be written as CQL")
+        parts = list()
+        for disjunction in disjunctions:
+            part = " or ".join(lit.toCQL() for lit in disjunction)
+            parts.append(
+                f"({part})" if len(disjunction) > 1 and len(disjunctions) > 1 else part
+            )
+        return " ".join(
+            [" and ".join(parts)] + [f"not {lit.toCQL()}" for lit in negated]
+        )
+
+    def __repr__(self) -> str:
+        return f"CQLNormalForm[{self.form}, {len(self.clauses)} clauses, {self.size} literals]"
+
+
+# ---------------------------------------------------------------------------
+
+
+def to_dnf(query: CQLQuery, max_size: int = 1000) -> CQLNormalForm:
+    """Converts a query into disjunctive normal form (or of ands).
+
+    ``a not b`` is ``a and (not b)``, negations are pushed down to the
+    search clauses. ``prox`` triples, booleans with modifiers and subtrees
+    with prefix assignments are kept as a whole (literals). Contradictory,
+    duplicate and absorbed conjunctions are dropped while converting.
+
+    Args:
+        query: the query
+        max_size: max. number of literals, also of intermediate results
+
+    Raises:
+        CQLNormalFormError: if the size budget is exceeded (this is checked
+            before an expensive step, so it fails early)
+    """
+    return _convert(query, "dnf", max_size)
+
+
+def to_cnf(query: CQLQuery, max_size: int = 1000) -> CQLNormalForm:
+    """Converts a query into conjunctive normal form (and of ors), see
+    :func:`to_dnf`."""
+    return _convert(query, "cnf", max_size)
+
+
+def _convert(query: CQLQuery, form: str, max_size: int) -> CQLNormalForm:
+    # clauses are combined with "and" in DNF (distributing over "or") and
+    # with "or" in CNF
+    distributed = "and" if form == "dnf" else "or"
+    version = query.version
+
+    root = copy.copy(query.root)
+    root.prefixes, root.sortSpecs = list(), list()
+
+    atoms: List[Node] = list()
+    atom_keys: Dict[str, int] = dict()
+
+    # negation normal form with runs of the same boolean flattened, as
+    # nested lists [op, operand, ...], literals as [None, term]
+    top: list = [None]
+    todo: List[Tuple[Node, bool, list]] = [(root, False, top)]
+    while todo:
+        node, negated, parent = todo.pop()
+        op = node.operator.canonical() if isinstance(node, CQLTriple) else None
+        if (
+            op not in SIMPLIFIED_BOOLEANS
+            and op != "not"
+            or (node.prefixes and node is not root)
+        ):
+            key = node.canonical(version)
+            idx = atom_keys.get(key)
+            if idx is None:
+                idx = atom_keys[key] = len(atoms)
+                atoms.append(node)
+            parent.append([None, frozenset((idx * 2 + negated,))])
+            continue
+
+        # a not b == a and (not b); not (a not b) == (not a) or b
+        if op == "not":
+            op = "and"
+        if negated:
+            op = SIMPLIFIED_BOOLEANS[op]
+        if parent[0] != op:
+            run = [op]
+            parent.append(run)
+            parent = run
+        # (the left operand first)
+        todo.append(
+            (node.right, negated != (node.operator.canonical() == "not"), parent)
+        )
+        todo.append((node.left, negated, parent))
+
+    # clauses of each run, in post order without recursion
+    results: Dict[int, List[Term]] = dict()
+    stack = [(top[1], False)]
+    while stack:
+        run, ready = stack.pop()
+        if run[0] is None:
+            results[id(run)] = [run[1]]
+            continue
+        if not ready:
+            stack.append((run, True))
+            stack.extend((operand, False) for operand in run[1:])
+            continue
+
+        operands = [results.pop(id(operand)) for operand in run[1:]]
+        if run[0] == distributed:
+            results[id(run)] = _product(operands, max_size)
+        else:
+            results[id(run)] = _union(operands, max_size)
+
+    terms = results[id(top[1])]
+    clauses = [
+        [CQLLiteral(atoms[lit // 2], bool(lit % 2)) for lit in sorted(term)]
+        for term in terms
+    ]
+    return CQLNormalForm(
+        form, clauses, list(query.root.prefixes), list(query.root.sortSpecs)
+    )
+
+
+def _size(terms: List[Term]) -> int:
+    return sum(len(term) for term in terms)
+
+
+def _union(operands: List[List[Term]], max_size: int) -> List[Term]:
+    terms = [term for operand in operands for term in operand]
+    if _size(terms) > max_size:
+        raise CQLNormalFormError(f"Normal form exceeds max_size={max_size}")
+    return _simplify(terms)
+
+
+def _product(operands: List[List[Term]], max_size: int) -> List[Term]:
+    # operands with a single clause are combined at once
+    single = frozenset().union(
+        *(operand[0] for operand in operands if len(operand) == 1)
+    )
+    result = [single]
+    for operand in operands:
+        if len(operand) == 1:
+            continue
+        # size of all combinations, before computing them
+        if len(operand) * _size(result) + len(result) * _size(operand) > max_size:
+            raise CQLNormalFormError(f"Normal form exceeds max_size={max_size}")
+        result = _simplify([x | y for x in result for y in operand])
+    if len(result) == 1:
+        if len(result[0]) > max_size:
+            raise CQLNormalFormError(f"Normal form exceeds max_size={max_size}")
+        return _simplify(result)
+    return result
+
+
+def _simplify(terms: List[Term]) -> List[Term]:
+    # drops contradictions (x and not x in DNF, x or not x in CNF), duplicates
+    # and terms that contain another term (absorption); a contained term is
+    # found by its smallest literal
+    unique: Dict[Term, None] = dict()
+    for term in terms:
+        if not any(lit ^ 1 in term for lit in term if lit % 2):
+            unique.setdefault(term)
+
+    kept = set()
+    by_min: Dict[int, List[Term]] = dict()
+    for term in sorted(unique, key=len):
+        if any(other <= term for lit in term for other in by_min.get(lit, ())):
+            continue
+        kept.add(term)
+        by_min.setdefault(min(term), list()).append(term)
+    return [term for term in unique if term in kept]
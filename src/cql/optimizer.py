@@ -0,0 +1,262 @@
+import copy
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Union
+
+from cql.parser import CQLBoolean
+from cql.parser import CQLQuery
+from cql.parser import CQLSearchClause
+from cql.parser import CQLTriple
+
+# ---------------------------------------------------------------------------
+
+
+Node = Union[CQLTriple, CQLSearchClause]
+
+#: booleans that are associative, commutative and idempotent (without
+#: modifiers), the other one is the dual for absorption
+SIMPLIFIED_BOOLEANS = {"and": "or", "or": "and"}
+#: max. operands of a run that is checked for absorption by a smaller run
+MAX_SUBSET_RUN = 8
+
+
+def count_nodes(node: Node) -> int:
+    """Number of search clauses and triples in a query tree."""
+    num, todo = 0, [node]
+    while todo:
+        node = todo.pop()
+        num += 1
+        if isinstance(node, CQLTriple):
+            todo.append(node.left)
+            todo.append(node.right)
+    return num
+
+
+# ---------------------------------------------------------------------------
+
+
+class CQLOptimizationReport:
+    """What :meth:`CQLOptimizer.optimize` did to a query."""
+
+    def __init__(self):
+        self.nodes_before = 0  # search clauses + triples before
+        self.nodes_after = 0  # search clauses + triples after
+        self.duplicates = 0  # operands removed as duplicates (idempotence)
+        self.absorbed = 0  # operands removed by absorption
+
+    @property
+    def removed(self) -> int:
+        return self.nodes_before - self.nodes_after
+
+    def __repr__(self) -> str:
+        return (
+            f"CQLOptimizationReport[nodes={self.nodes_before}->{self.nodes_after},"
+            f" duplicates={self.duplicates}, absorbed={self.absorbed}]"
+        )
+
+
+class _Expr:
+    # subtree while optimizing, either a finished node (op is None) or a
+    # flattened run of one boolean (op "and" / "or") over its operands
+    __slots__ = ("op", "operator", "operands", "node", "key", "final")
+
+    def __init__(
+        self,
+        op: Optional[str] = None,
+        operator: Optional[CQLBoolean] = None,
+        operands: Optional[List["_Expr"]] = None,
+        node: Optional[Node] = None,
+        key: Optional[int] = None,
+    ):
+        self.op = op
+        self.operator = operator
+        self.operands = operands
+        self.node = node
+        #: same key for semantically identical subtrees (within one run)
+        self.key = key
+        self.final = op is None
+
+
+class CQLOptimizer:
+    """Simplifies the boolean structure of queries, e.g. from query builders.
+
+    Only rewrites that do not change the result set are done:
+
+    * flattening of ``and`` / ``or`` runs (``a and (b and c)``)
+    * idempotence, removes duplicate operands of such a run, also if they
+      are in a different order (``a and b and a``, ``(a or b) and (b or a)``)
+    * absorption (``a or (a and b)`` is ``a``, ``a and (a or b)`` is ``a``),
+      also by a run with one operand less (``(a and b) or (a and b and c)``)
+
+    Booleans with modifiers, ``not`` and ``prox`` are left as they are (but
+    their operands are simplified), as are subtrees with prefix assignments.
+    Search clauses are the same if their :meth:`CQLSearchClause.canonical`
+    form is. Each node is visited once and each run is simplified once, so
+    this is linear in the size of the query.
+    """
+
+    def __init__(self):
+        #: report of the last :meth:`optimize` call
+        self.report = CQLOptimizationReport()
+        self._keys: Dict[Hashable, int] = dict()
+
+    def optimize(self, query: CQLQuery) -> CQLQuery:
+        """Returns the simplified query (the given one is not modified)."""
+        self.report = report = CQLOptimizationReport()
+        self._keys = dict()
+        version = query.version
+
+        # prefixes and sort keys of the query are added to the new root
+        root = copy.copy(query.root)
+        root.prefixes, root.sortSpecs = list(), list()
+
+        # post order without recursion (runs of booleans are deep trees)
+        order: List[Node] = list()
+        todo: List[Node] = [root]
+        while todo:
+            node = todo.pop()
+            order.append(node)
+            if isinstance(node, CQLTriple):
+                todo.append(node.left)
+                todo.append(node.right)
+        report.nodes_before = len(order)
+
+        exprs: Dict[int, _Expr] = dict()  # by id of the node
+        for node in reversed(order):
+            if isinstance(node, CQLSearchClause):
+                key = self._key(("clause", node.canonical(version)))
+                exprs[id(node)] = _Expr(node=node, key=key)
+                continue
+
+            left, right = exprs.pop(id(node.left)), exprs.pop(id(node.right))
+            op = node.operator.canonical()
+            if op in SIMPLIFIED_BOOLEANS:
+                # the left operand of a run is still open, continue it
+                if left.op == op and not left.final:
+                    expr = left
+                else:
+                    left = self._finish(left)
+                    if left.op == op:
+                        expr = _Expr(op, node.operator, list(left.operands))
+                    else:
+                        expr = _Expr(op, node.operator, [left])
+                right = self._finish(right)
+                if right.op == op:
+                    expr.operands.extend(right.operands)
+                else:
+                    expr.operands.append(right)
+            else:
+                left, right = self._finish(left), self._finish(right)
+                expr = _Expr(
+                    node=CQLTriple(
+                        self._build(left), node.operator, self._build(right)
+                    ),
+                    key=self._key(("triple", op, left.key, right.key)),
+                )
+
+            if node.prefixes:
+                # the prefixes are in scope for this subtree only
+                expr = self._finish(expr)
+                prefixed = copy.copy(self._build(expr))
+                prefixed.prefixes = node.prefixes + prefixed.prefixes
+                expr = _Expr(
+                    node=prefixed,
+                    key=self._key(
+                        (
+                            "prefixed",
+                            tuple(p.canonical() for p in node.prefixes),
+                            expr.key,
+                        )
+                    ),
+                )
+            exprs[id(node)] = expr
+
+        new_root = copy.copy(self._build(self._finish(exprs[id(root)])))
+        new_root.prefixes = query.root.prefixes + new_root.prefixes
+        new_root.sortSpecs = list(query.root.sortSpecs)
+        report.nodes_after = count_nodes(new_root)
+        self._keys = dict()
+        return CQLQuery(new_root, version=version)
+
+    # ---------------------------------------------------
+
+    def _key(self, value: Hashable) -> int:
+        return self._keys.setdefault(value, len(self._keys))
+
+    def _finish(self, expr: _Expr) -> _Expr:
+        # simplifies a run once all its operands are known
+        if expr.final:
+            return expr
+        expr.final = True
+
+        operands: List[_Expr] = list()
+        keys = set()
+        for operand in expr.operands:
+            if operand.key in keys:
+                self.report.duplicates += 1
+            else:
+                keys.add(operand.key)
+                operands.append(operand)
+
+        dual = SIMPLIFIED_BOOLEANS[expr.op]
+        kept = [
+            operand
+            for operand in operands
+            if operand.op != dual
+            or not any(sub.key in keys for sub in operand.operands)
+        ]
+        kept = self._absorb_subsets(kept)
+        self.report.absorbed += len(operands) - len(kept)
+
+        if len(kept) == 1:
+            return kept[0]
+        expr.operands = kept
+        expr.key = self._key((expr.op, frozenset(operand.key for operand in kept)))
+        return expr
+
+    def _absorb_subsets(self, operands: List[_Expr]) -> List[_Expr]:
+        # absorption by a run of the dual boolean with one operand less, e.g.
+        # (a and b) or (a and b and c), looked up by hash for runs of up to
+        # MAX_SUBSET_RUN operands (so this stays linear)
+        groups = {
+            frozenset(sub.key for sub in operand.operands): operand
+            for operand in operands
+            if operand.op is not None
+        }
+        if len(groups) < 2:
+            return operands
+
+        absorbed = set()
+        for keys, group in groups.items():
+            if 2 < len(keys) <= MAX_SUBSET_RUN and any(
+                keys - {key} in groups for key in keys
+            ):
+                absorbed.add(id(group))
+        if not absorbed:
+            return operands
+        return [operand for operand in operands if id(operand) not in absorbed]
+
+    def _build(self, expr: _Expr) -> Node:
+        # query tree of a finished expression, runs as left deep trees
+        todo = [(expr, False)]
+        while todo:
+            current, ready = todo.pop()
+            if current.node is not None:
+                continue
+            if not ready:
+                todo.append((current, True))
+                todo.extend((operand, False) for operand in current.operands)
+                continue
+            node = current.operands[0].node
+            for operand in current.operands[1:]:
+                operator = CQLBoolean(current.operator.value)
+                node = CQLTriple(node, operator, operand.node)
+            current.node = node
+        return expr.node
+
+
+def optimize(query: CQLQuery) -> CQLQuery:
+    """Simplifies a query, see :class:`CQLOptimizer`."""
+    return CQLOptimizer().optimize(query)
@@ -1,9 +1,17 @@
+import hashlib
 import logging
+import re
 import sys
 import xml.etree.ElementTree as ET
 from itertools import groupby
+from typing import Any
+from typing import Callable
+from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Sequence
+from typing import Set
+from typing import Tuple
 from typing import Union
 
 import cql._vendor.ply.yacc as yacc
@@ -11,8 +19,9 @@ from cql._vendor.ply.lex import Lexer
 from cql._vendor.ply.lex import LexToken
 from cql._vendor.ply.yacc import LRParser
 from cql._vendor.ply.yacc import YaccProduction
-from cql._vendor.ply.yacc import YaccSymbol
 from cql.lexer import CQLLexer
+from cql.lexer import CQLLexerError
+from cql.lexer import CQLTokenStream
 
 LOGGER = logging.getLogger(__name__)
 
@@ -27,6 +36,12 @@ CQL12_DEFAULT_RELATION = "="
 CQL11_DEFAULT_RELATION = "scr"
 CQL_DEFAULT_INDEX = "cql.serverChoice"
 
+#: relation symbols (``comparitorSymbol``), other relations are names
+RELATION_SYMBOLS = ("=", "==", "<", ">", "<=", ">=", "<>")
+
+#: unescaped masking characters (CQL 1.2: ``*``, ``?``, ``^``) in a term
+MASKING_RE = re.compile(r"(?:^|[^\\])(?:\\\\)*[*?^]")
+
 
 # ---------------------------------------------------------------------------
 
@@ -41,11 +56,161 @@ def escape(val: Union["CQLPrefixedName", str]) -> str:
     return val
 
 
+def escape_name(val: Union["CQLPrefixedName", str]) -> str:
+    # names (index, relation, modifier, prefix) are case insensitive
+    if isinstance(val, CQLPrefixedName):
+        val = val.name
+    return escape(val.lower())
+
+
 # ---------------------------------------------------------------------------
 
 
 class CQLParserError(Exception):
-    pass
+    """Error while parsing a query.
+
+    Args:
+        message: error message
+        position: input offset of the offending token (or input length if
+            the query ended unexpectedly)
+        token: type of the offending token, ``None`` for end of input
+        value: value of the offending token
+        expected: token types that would have been valid instead
+    """
+
+    def __init__(
+        self,
+        message: str,
+        position: Optional[int] = None,
+        token: Optional[str] = None,
+        value: Optional[str] = None,
+        expected: Tuple[str, ...] = (),
+    ):
+        super().__init__(message)
+        self.position = position
+        self.token = token
+        self.value = value
+        self.expected = expected
+
+
+class CQLParserLimitError(CQLParserError):
+    """Query rejected because it exceeds one of the :class:`CQLParserLimits`."""
+
+    def __init__(
+        self, message: str, limit: str, maximum: int, position: Optional[int] = None
+    ):
+        super().__init__(message, position=position)
+        self.limit = limit  # name of the limit, e.g. "max_depth"
+        self.maximum = maximum
+
+
+# ---------------------------------------------------------------------------
+
+
+class CQLParserLimits:
+    """Limits for parsing (untrusted) queries. ``None`` means unlimited.
+
+    Limits are checked while lexing/parsing so that a query is rejected as
+    soon as it exceeds one of them.
+
+    Args:
+        max_bytes: size of the query in bytes (UTF-8)
+        max_tokens: number of tokens
+        max_depth: nesting depth of parentheses
+        max_clauses: number of search clauses (boolean operators + 1)
+        max_modifiers: number of modifiers per relation, boolean or sort key
+        max_sort_keys: number of sort keys
+    """
+
+    def __init__(
+        self,
+        max_bytes: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        max_depth: Optional[int] = None,
+        max_clauses: Optional[int] = None,
+        max_modifiers: Optional[int] = None,
+        max_sort_keys: Optional[int] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens
+        self.max_depth = max_depth
+        self.max_clauses = max_clauses
+        self.max_modifiers = max_modifiers
+        self.max_sort_keys = max_sort_keys
+
+    def check_size(self, content: str) -> None:
+        if self.max_bytes is None:
+            return
+        # at most 4 bytes per character, so only encode if it might be too long
+        if len(content) > self.max_bytes or (
+            len(content) * 4 > self.max_bytes
+            and len(content.encode("utf-8", "surrogatepass")) > self.max_bytes
+        ):
+            raise CQLParserLimitError(
+                f"Query too long (max_bytes={self.max_bytes})",
+                "max_bytes",
+                self.max_bytes,
+            )
+
+    def __repr__(self) -> str:
+        limits = ", ".join(f"{k}={v}" for k, v in vars(self).items() if v is not None)
+        return f"CQLParserLimits[{limits}]"
+
+
+class CQLLimitingLexer:
+    """Wraps the lexer to check token count and parenthesis depth limits for
+    each token that is handed to the parser."""
+
+    def __init__(self, lexer: Lexer, limits: CQLParserLimits):
+        self.lexer = lexer
+        self.max_tokens = limits.max_tokens
+        self.max_depth = limits.max_depth
+        self.num_tokens = 0
+        self.depth = 0
+
+    @property
+    def lineno(self) -> int:
+        return self.lexer.lineno
+
+    @property
+    def lexpos(self) -> int:
+        return self.lexer.lexpos
+
+    def input(self, content: str) -> None:
+        self.lexer.input(content)
+        self.num_tokens = 0
+        self.depth = 0
+
+    def token(self) -> Optional[LexToken]:
+        tok = self.lexer.token()
+        if tok is None:
+            return tok
+        self.check(tok.type, tok.lexpos)
+        return tok
+
+    def check(self, type: str, lexpos: int) -> None:
+        """Counts the next token (of type ``type`` at ``lexpos``) and raises
+        if a limit is exceeded."""
+        self.num_tokens += 1
+        if self.max_tokens is not None and self.num_tokens > self.max_tokens:
+            raise CQLParserLimitError(
+                f"Too many tokens at position {lexpos} (max_tokens={self.max_tokens})",
+                "max_tokens",
+                self.max_tokens,
+                position=lexpos,
+            )
+
+        if type == "LPAREN":
+            self.depth += 1
+            if self.max_depth is not None and self.depth > self.max_depth:
+                raise CQLParserLimitError(
+                    f"Query nested too deep at position {lexpos} (max_depth={self.max_depth})",
+                    "max_depth",
+                    self.max_depth,
+                    position=lexpos,
+                )
+        elif type == "RPAREN":
+            self.depth -= 1
 
 
 # ---------------------------------------------------------------------------
@@ -100,6 +265,11 @@ class CQLModifier:  # XCQL: modifier
             return f"/{escape(self.name)}"
         return f"/{escape(self.name)}{self.comparitor}{escape(self.value)}"
 
+    def canonical(self) -> str:
+        if self.comparitor is None or self.value is None:
+            return f"/{escape_name(self.name)}"
+        return f"/{escape_name(self.name)}{self.comparitor}{escape(self.value)}"
+
     def toXCQL(self) -> ET.Element:
         ele = ET.Element("modifier")
         ET.SubElement(ele, "type").text = str(self.name)
@@ -124,6 +294,12 @@ class CQLModifierable:  # XCQL: modifiers
             return ""
         return "".join(m.toCQL() for m in self.modifiers)
 
+    def canonical(self) -> str:
+        # modifiers in (name) order
+        if not self.modifiers:
+            return ""
+        return "".join(sorted(m.canonical() for m in self.modifiers))
+
     def toXCQL(self) -> Optional[ET.Element]:
         if not self.modifiers:
             return None
@@ -150,6 +326,11 @@ class CQLPrefix:  # XCQL: prefix
             return f"> {escape(self.uri)}"
         return f"> {self.prefix} = {escape(self.uri)}"
 
+    def canonical(self) -> str:
+        if self.prefix is None:
+            return f"> {escape(self.uri)}"
+        return f"> {escape_name(self.prefix)} = {escape(self.uri)}"
+
     def toXCQL(self) -> ET.Element:
         ele = ET.Element("prefix")
         if self.prefix is not None:
@@ -175,6 +356,10 @@ class CQLPrefixable:  # XCQL: prefixes
     def toCQL(self) -> str:
         return " ".join(p.toCQL() for p in self.prefixes)
 
+    def canonical(self) -> str:
+        # (in order, a later assignment of the same prefix wins)
+        return " ".join(p.canonical() for p in self.prefixes)
+
     def toXCQL(self) -> Optional[ET.Element]:
         if not self.prefixes:
             return None
@@ -202,6 +387,9 @@ class CQLSortSpec(CQLModifierable):  # XCQL: key
     def toCQL(self):
         return f"sortBy {escape(self.index)}{CQLModifierable.toCQL(self)}"
 
+    def canonical(self) -> str:
+        return f"{escape_name(self.index)}{CQLModifierable.canonical(self)}"
+
     def toXCQL(self) -> ET.Element:
         ele = ET.Element("key")
         ET.SubElement(ele, "index").text = str(self.index)
@@ -234,6 +422,13 @@ class CQLSortable:  # XCQL: sortKeys
             ]
         )
 
+    def canonical(self) -> str:
+        if not self.sortSpecs:
+            return ""
+        return " ".join(
+            ["sortby"] + [sortSpec.canonical() for sortSpec in self.sortSpecs]
+        )
+
     def toXCQL(self) -> Optional[ET.Element]:
         if not self.sortSpecs:
             return None
@@ -265,6 +460,12 @@ class CQLRelation(CQLModifierable):  # XCQL: relation
     def toCQL(self) -> str:
         return f"{self.comparitor}{CQLModifierable.toCQL(self)}"
 
+    def canonical(self) -> str:
+        comparitor = self.comparitor.name
+        if comparitor not in RELATION_SYMBOLS:
+            comparitor = escape_name(comparitor)
+        return f"{comparitor}{CQLModifierable.canonical(self)}"
+
     def toXCQL(self) -> ET.Element:
         ele = ET.Element("relation")
         ET.SubElement(ele, "value").text = str(self.comparitor)
@@ -289,6 +490,9 @@ class CQLBoolean(CQLModifierable):  # XCQL: boolean
     def toCQL(self) -> str:
         return f"{self.value}{CQLModifierable.toCQL(self)}"
 
+    def canonical(self) -> str:
+        return f"{self.value.lower()}{CQLModifierable.canonical(self)}"
+
     def toXCQL(self) -> ET.Element:
         ele = ET.Element("boolean")
         ET.SubElement(ele, "value").text = self.value
@@ -337,6 +541,26 @@ class CQLSearchClause(CQLPrefixable, CQLSortable):  # XCQL: searchClause
 
         return sc
 
+    def canonical(self, version: str = "1.2") -> str:
+        """Normalized CQL, see :meth:`CQLQuery.canonical`."""
+        if self.relation is None or self.index is None:
+            index = escape_name(CQL_DEFAULT_INDEX)
+            relation = (
+                CQL11_DEFAULT_RELATION if version == "1.1" else CQL12_DEFAULT_RELATION
+            )
+        else:
+            index, relation = escape_name(self.index), self.relation.canonical()
+        sc = f"{index} {relation} {escape(self.term)}"
+        return " ".join(
+            part
+            for part in (
+                CQLPrefixable.canonical(self),
+                sc,
+                CQLSortable.canonical(self),
+            )
+            if part
+        )
+
     def toXCQL(self) -> ET.Element:
         ele = ET.Element("searchClause")
 
@@ -384,6 +608,43 @@ class CQLTriple(CQLPrefixable, CQLSortable):  # XCQL: triple
             right = f"({right})"
         return f"{left} {self.operator.toCQL()} {right}"
 
+    def canonical(self, version: str = "1.2") -> str:
+        """Normalized CQL, see :meth:`CQLQuery.canonical`."""
+        operator = self.operator.canonical()
+        # runs of the same associative boolean are flattened (keeping the
+        # order of the operands), as booleans are left associative only
+        # operands on the right are put in parentheses
+        operands: List[Union[CQLTriple, CQLSearchClause]] = list()
+        todo: List[Union[CQLTriple, CQLSearchClause]] = [self.right, self.left]
+        while todo:
+            node = todo.pop()
+            if (
+                operator in ("and", "or")
+                and isinstance(node, CQLTriple)
+                and not node.prefixes
+                and node.operator.canonical() == operator
+            ):
+                todo.append(node.right)
+                todo.append(node.left)
+            else:
+                operands.append(node)
+
+        parts: List[str] = list()
+        for idx, node in enumerate(operands):
+            sub = node.canonical(version)
+            if node.prefixes or (idx and isinstance(node, CQLTriple)):
+                sub = f"({sub})"
+            parts.append(sub)
+        return " ".join(
+            part
+            for part in (
+                CQLPrefixable.canonical(self),
+                f" {operator} ".join(parts),
+                CQLSortable.canonical(self),
+            )
+            if part
+        )
+
     def toXCQL(self) -> ET.Element:
         ele = ET.Element("triple")
 
@@ -408,10 +669,67 @@ class CQLTriple(CQLPrefixable, CQLSortable):  # XCQL: triple
         return f"CQLTriple[{self.toCQL()}]"
 
 
+class CQLQueryCost:
+    """Complexity summary of a query, collected by the parser while parsing
+    (no extra walk over the query tree)."""
+
+    #: weights for :attr:`score`
+    weights = {
+        "clauses": 1,
+        "max_depth": 1,
+        "not_booleans": 2,
+        "prox_booleans": 5,
+        "masked_terms": 3,
+        "num_indexes": 1,
+        "sort_keys": 2,
+    }
+
+    def __init__(self):
+        self.clauses = 0  # number of search clauses
+        self.max_depth = 0  # max nesting depth of parentheses
+        self.not_booleans = 0  # number of NOT booleans
+        self.prox_booleans = 0  # number of PROX booleans
+        self.masked_terms = 0  # number of terms with masking/wildcards
+        # distinct indexes (lower case, default index if missing)
+        self.indexes: Set[str] = set()
+        self.sort_keys = 0  # number of sort keys
+
+    @property
+    def num_indexes(self) -> int:
+        return len(self.indexes)
+
+    @property
+    def score(self) -> int:
+        return sum(
+            weight * getattr(self, name) for name, weight in self.weights.items()
+        )
+
+    def add_clause(self, term: str, index: Optional[CQLPrefixedName] = None) -> None:
+        self.clauses += 1
+        self.indexes.add(
+            index.name.lower() if index is not None else "cql.serverchoice"
+        )
+        if MASKING_RE.search(term):
+            self.masked_terms += 1
+
+    def add_boolean(self, value: str) -> None:
+        value = value.lower()
+        if value == "not":
+            self.not_booleans += 1
+        elif value == "prox":
+            self.prox_booleans += 1
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)}" for name in self.weights)
+        return f"CQLQueryCost[score={self.score}, {values}]"
+
+
 class CQLQuery:  # XCQL: triple | searchClause
     def __init__(self, root: Union[CQLTriple, CQLSearchClause], version="1.2"):
         self.root = root  # XCQL: triple | searchClause
         self.version = version
+        #: complexity summary, set by the parser
+        self.cost: Optional[CQLQueryCost] = None
 
     def setServerDefaults(
         self, addCQLPrefixes: bool = False, serverPrefix: Optional[str] = None
@@ -455,6 +773,35 @@ class CQLQuery:  # XCQL: triple | searchClause
     def toCQL(self) -> str:
         return self.root.toCQL()
 
+    def canonical(self) -> str:
+        """Normalized CQL, the same for semantically identical spellings of
+        a query: lower case keywords and names (index, relation, modifier,
+        context set prefix), explicit default index and relation (of the
+        query's CQL version), modifiers in order, quoting only where needed
+        and parentheses only where needed (runs of ``and`` / ``or`` are
+        flattened, the order of operands is kept). Terms, modifier values
+        and URIs are kept as they are.
+        """
+        return self.root.canonical(self.version)
+
+    def fingerprint(self) -> str:
+        """Short stable hash (16 hex digits) of :meth:`canonical`, e.g. as a
+        cache key."""
+        return hashlib.blake2b(
+            self.canonical().encode("utf-8"), digest_size=8
+        ).hexdigest()
+
+    def compile(self, fields=None) -> Callable[[Any], bool]:
+        """Compiles the query into a predicate over records (e.g. dicts), see
+        :class:`cql.predicate.CQLPredicateCompiler`.
+
+        Args:
+            fields: record key (or keys, or a value getter) by index name
+        """
+        from cql.predicate import compile_query
+
+        return compile_query(self, fields)
+
     def toXCQL(self) -> ET.Element:
         ele: ET.Element = self.root.toXCQL()
         ele.attrib["xmlns"] = XCQL_NAMESPACE
@@ -477,17 +824,128 @@ class CQLQuery:  # XCQL: triple | searchClause
 # ---------------------------------------------------------------------------
 
 
+#: completion class of a token by the nonterminal it would start (in order of
+#: precedence, e.g. an ``EQ`` after an index starts a relation, not a
+#: modifier relation), see :meth:`CQLParser.complete`
+COMPLETION_NONTERMINALS = (
+    ("prefixAssignment", "prefix"),
+    ("boolean", "boolean"),
+    ("comparitor", "relation"),
+    ("modifier", "modifier"),
+    ("modifierName", "modifierName"),
+    ("comparitorSymbol", "modifierRelation"),
+    ("modifierValue", "modifierValue"),
+    ("singleSpec", "sortKey"),
+    ("prefix", "prefix"),
+    ("uri", "prefix"),
+    ("term", "term"),
+)
+#: completion class of tokens that do not start a nonterminal
+COMPLETION_TOKENS = {
+    "LPAREN": "openParen",
+    "RPAREN": "closeParen",
+    "SORTBY": "sortBy",
+    "EQ": "prefix",
+    "$end": "end",
+}
+#: tokens that may be a partially typed word
+COMPLETION_WORDS = {
+    CQLLexer.codes[name] for name in ["CHAR_STRING1"] + list(CQLLexer.reserved.values())
+}
+
+
+class CQLCompletion:
+    """What may follow a partial query, see :meth:`CQLParser.complete`."""
+
+    #: spelling of tokens with a fixed text
+    literals = {
+        "LPAREN": "(",
+        "RPAREN": ")",
+        "MODSTART": "/",
+        "LE": "<=",
+        "GE": ">=",
+        "LT": "<",
+        "GT": ">",
+        "NE": "<>",
+        "EQUALS": "==",
+        "EQ": "=",
+        "AND": "and",
+        "OR": "or",
+        "NOT": "not",
+        "PROX": "prox",
+        "SORTBY": "sortBy",
+    }
+    #: named relations of the CQL context set
+    relation_names = ("adj", "all", "any", "encloses", "within")
+
+    def __init__(
+        self,
+        position: int,
+        partial: str,
+        expected: Dict[str, Tuple[str, ...]],
+        error: Optional[Union[CQLParserError, CQLLexerError]] = None,
+    ):
+        #: offset of the partially typed word (length of the text if none)
+        self.position = position
+        #: the partially typed word or quoted string a completion replaces
+        self.partial = partial
+        #: token types that may follow, by class: ``"boolean"``,
+        #: ``"relation"``, ``"modifier"``, ``"sortBy"``, ``"closeParen"``,
+        #: ``"end"`` etc.
+        self.expected = expected
+        #: syntax error before the partial word (nothing is expected then)
+        self.error = error
+
+    def suggestions(self) -> List[str]:
+        """Keywords, named relations and symbols that may follow and start
+        with the partially typed word (ignoring case)."""
+        partial = self.partial.lower()
+        suggestions: List[str] = list()
+        for cls, types in self.expected.items():
+            for name in types:
+                if name == "CHAR_STRING1" and cls == "relation":
+                    words: Sequence[str] = self.relation_names
+                elif name in self.literals and (
+                    # keywords only as such, not as (index) terms or names
+                    name not in CQLLexer.reserved.values()
+                    or cls in ("boolean", "sortBy")
+                ):
+                    words = (self.literals[name],)
+                else:
+                    continue
+                for word in words:
+                    if word.lower().startswith(partial) and word not in suggestions:
+                        suggestions.append(word)
+        return suggestions
+
+    def __repr__(self) -> str:
+        return f"CQLCompletion[position={self.position}, partial={self.partial!r}, expected={self.expected!r}]"
+
+
+# ---------------------------------------------------------------------------
+
+
 class CQLParser:
     tokens = CQLLexer.tokens
 
     # ---------------------------------------------------
 
-    def build(self, lexer: Optional[Lexer] = None, **kwargs) -> None:
+    def build(
+        self,
+        lexer: Optional[Lexer] = None,
+        limits: Optional[CQLParserLimits] = None,
+        log_errors: bool = False,
+        **kwargs,
+    ) -> None:
         if lexer is None:
             lexer = CQLLexer()
             lexer.build()
         self.lexer: Lexer = lexer
 
+        #: limits for queries, default unlimited
+        self.limits = limits if limits is not None else CQLParserLimits()
+        self.cost = CQLQueryCost()
+
         # based on https://github.com/dabeaz/ply/blob/af80858e888c5f36979da88fcb1080de7b848967/src/ply/yacc.py#L2279
         # and https://github.com/dabeaz/ply/blob/af80858e888c5f36979da88fcb1080de7b848967/src/ply/yacc.py#L2075
         class HidePErrorRedefinedLogger(yacc.PlyLogger):
@@ -505,14 +963,517 @@ class CQLParser:
 
         self.parser: LRParser = yacc.yacc(module=self, **kwargs)
 
+        #: expected token types per parser state (for error messages)
+        self.expected: Dict[int, Tuple[str, ...]] = {
+            state: tuple(actions) for state, actions in self.parser.action.items()
+        }
+        #: whether to log syntax errors (with parser stack details)
+        self.log_errors = log_errors
+        self._build_recognizer()
+
     def parse(self, content: str, **kwargs) -> CQLQuery:
         LOGGER.debug("Input: %s", content)
-        result = self.parser.parse(content, lexer=self.lexer.lexer, **kwargs)
+
+        limits = self.limits
+        limits.check_size(content)
+        lexer = self.lexer.lexer
+        if limits.max_tokens is not None or limits.max_depth is not None:
+            lexer = CQLLimitingLexer(lexer, limits)
+        self.cost = CQLQueryCost()
+
+        result = self.parser.parse(content, lexer=lexer, **kwargs)
+        if result is not None:
+            result.cost = self.cost
         return result
 
     # ---------------------------------------------------
 
-    def p_error(self, p: YaccProduction):
+    def _build_recognizer(self) -> None:
+        # LR tables for validate(), indexed by state and token type code
+        codes = CQLLexer.codes
+        end = len(codes)  # code for "$end"
+        action, goto = self.parser.action, self.parser.goto
+        num_states = max(action) + 1
+
+        actions: List[List[Optional[int]]] = [
+            [None] * (end + 1) for _ in range(num_states)
+        ]
+        for state, acts in action.items():
+            for name, t in acts.items():
+                actions[state][codes.get(name, end)] = t
+
+        # accessing symbol of each state (for the parser stack in errors)
+        symbols = ["$end"] * num_states
+        for state, acts in action.items():
+            for name, t in acts.items():
+                if t > 0:
+                    symbols[t] = name
+        for state, gotos in goto.items():
+            for name, t in gotos.items():
+                symbols[t] = name
+
+        defaulted = [None] * num_states
+        for state, t in self.parser.defaulted_states.items():
+            defaulted[state] = t
+
+        self._actions = actions
+        self._defaulted: List[Optional[int]] = defaulted
+        self._symbols = symbols
+        self._productions = [(p.len, p.name, p.prod) for p in self.parser.productions]
+
+        # tokens each nonterminal may start with (the grammar has no empty
+        # productions) and completions by state stack, for complete()
+        first: Dict[str, Set[str]] = {name: set() for _, name, _ in self._productions}
+        changed = True
+        while changed:
+            changed = False
+            for _, name, prod in self._productions:
+                tokens = first.get(prod[0], {prod[0]})
+                if not tokens <= first[name]:
+                    first[name] |= tokens
+                    changed = True
+        self._first = first
+        self._completions: Dict[Tuple[int, ...], Dict[str, Tuple[str, ...]]] = dict()
+
+    def validate(self, content: str) -> Optional[Union[CQLParserError, CQLLexerError]]:
+        """Checks whether ``content`` is a valid query without building it.
+
+        Runs the same LR automaton as :meth:`parse` but on the compact token
+        stream (see :meth:`CQLLexer.tokenize`) and without the ``p_*``
+        actions, so no query objects are created. Parser limits are checked.
+
+        Args:
+            content: the query
+
+        Returns:
+            Optional[Union[CQLParserError, CQLLexerError]]: ``None`` if the
+            query is valid, otherwise the error :meth:`parse` would raise
+        """
+        errors = self._recognize(content, recover=False)
+        return errors[0] if errors else None
+
+    def validate_all(self, content: str) -> List[Union[CQLParserError, CQLLexerError]]:
+        """Like :meth:`validate` but reports all syntax errors in one pass.
+
+        After an error the parser resynchronizes (panic mode): it pretends
+        that a search clause was found at the innermost place where one
+        could start and skips tokens up to the next one that may follow it,
+        i.e. a boolean operator, closing parenthesis, ``sortBy`` or the end.
+        Follow-up errors at the same token are not reported. Limit errors
+        stop the validation.
+
+        Args:
+            content: the query
+
+        Returns:
+            List[Union[CQLParserError, CQLLexerError]]: errors in order of
+            their position, empty if the query is valid
+        """
+        return self._recognize(content, recover=True)
+
+    def complete(self, prefix_text: str) -> CQLCompletion:
+        """Lists the token classes that may follow a partial query, e.g.
+        booleans, relations, modifiers, ``sortBy`` or a closing parenthesis.
+
+        A word (or quoted string) at the very end of the text is taken as
+        being typed, completions are for its position then. The result for
+        a parser state stack is cached, so only the partial query has to be
+        run through the automaton.
+
+        Args:
+            prefix_text: the partial query
+
+        Returns:
+            CQLCompletion: expected token types by class, or the error that
+            :meth:`validate` returns for the text before the partial word
+        """
+        position = len(prefix_text)
+        try:
+            stream = self.lexer.tokenize(prefix_text)
+        except CQLLexerError as ex:
+            # an unterminated quoted string is the only lexer error
+            position = ex.position
+            stream = self.lexer.tokenize(prefix_text[:position])
+            types, num = stream.types, len(stream)
+        else:
+            types, num = stream.types, len(stream)
+            if (
+                num
+                and stream.ends[num - 1] == position
+                and types[num - 1] in COMPLETION_WORDS
+            ):
+                num -= 1
+                position = stream.starts[num]
+
+        statestack = [0]
+        for i in range(num):
+            if not self._shift(statestack, types[i]):
+                error = self.validate(prefix_text[:position])
+                return CQLCompletion(position, prefix_text[position:], dict(), error)
+        return CQLCompletion(
+            position, prefix_text[position:], dict(self.expected_after(statestack))
+        )
+
+    def expected_after(self, statestack: Sequence[int]) -> Dict[str, Tuple[str, ...]]:
+        """Token types by completion class that may follow with the given
+        parser state stack (cached, do not modify the result)."""
+        key = tuple(statestack)
+        expected = self._completions.get(key)
+        if expected is not None:
+            return expected
+
+        actions, productions, goto = self._actions, self._productions, self.parser.goto
+        names = CQLLexer.tokens + ["$end"]
+        classes: Dict[str, List[str]] = dict()
+        for code, name in enumerate(names):
+            # run the reductions up to the state that would shift the token
+            stack = list(key)
+            while True:
+                t = actions[stack[-1]][code]
+                if t is None or t >= 0:
+                    break
+                plen, pname, _ = productions[-t]
+                del stack[len(stack) - plen :]  # noqa: E203
+                stack.append(goto[stack[-1]][pname])
+            if t is None:
+                continue
+
+            gotos = goto.get(stack[-1], {})
+            for nonterminal, cls in COMPLETION_NONTERMINALS:
+                if nonterminal in gotos and name in self._first[nonterminal]:
+                    break
+            else:
+                cls = COMPLETION_TOKENS.get(name, name)
+            classes.setdefault(cls, list()).append(name)
+
+        if len(self._completions) >= 10000:
+            self._completions.clear()
+        expected = {cls: tuple(types) for cls, types in classes.items()}
+        self._completions[key] = expected
+        return expected
+
+    def _shift(self, statestack: List[int], code: int) -> bool:
+        # runs the reductions for the lookahead code and shifts it, returns
+        # False (with a modified state stack) on a syntax error
+        actions, productions, goto = self._actions, self._productions, self.parser.goto
+        while True:
+            t = actions[statestack[-1]][code]
+            if t is None:
+                return False
+            if t >= 0:
+                statestack.append(t)
+                return True
+            plen, pname, _ = productions[-t]
+            del statestack[len(statestack) - plen :]  # noqa: E203
+            statestack.append(goto[statestack[-1]][pname])
+
+    def _recognize(
+        self, content: str, recover: bool
+    ) -> List[Union[CQLParserError, CQLLexerError]]:
+        errors: List[Union[CQLParserError, CQLLexerError]] = list()
+
+        limits = self.limits
+        try:
+            limits.check_size(content)
+        except CQLParserLimitError as ex:
+            errors.append(ex)
+            return errors
+
+        # like the (lazy) PLY lexer, lexer and token limit errors are only
+        # reported once the parser reads the offending token
+        pending: Optional[Union[CQLParserError, CQLLexerError]] = None
+        lexer_error: Optional[CQLLexerError] = None
+        try:
+            stream = self.lexer.tokenize(content)
+        except CQLLexerError as ex:
+            pending = ex
+            stream = self.lexer.tokenize(content[: ex.position])
+        types = stream.types
+        num = len(types)
+
+        if limits.max_tokens is not None or limits.max_depth is not None:
+            limiting = CQLLimitingLexer(None, limits)
+            names, starts = CQLLexer.tokens, stream.starts
+            for i, code in enumerate(types):
+                try:
+                    limiting.check(names[code], starts[i])
+                except CQLParserLimitError as ex:
+                    num, pending = i, ex
+                    break
+
+        if recover and isinstance(pending, CQLLexerError):
+            # the rest of the input is an unterminated string, continue as
+            # if the input ended there and report the lexer error last
+            lexer_error, pending = pending, None
+
+        # limits that are checked on reductions, by production name
+        checked = {
+            name
+            for name, limit in (
+                ("searchClause", limits.max_clauses),
+                ("modifierList", limits.max_modifiers),
+                ("sortSpec", limits.max_sort_keys),
+            )
+            if limit is not None
+        }
+        clauses = 0
+        counts: Dict[int, int] = dict()  # list lengths by stack height
+
+        actions, defaulted, productions = (
+            self._actions,
+            self._defaulted,
+            self._productions,
+        )
+        goto = self.parser.goto
+        end = len(actions[0]) - 1
+
+        statestack = [0]
+        state = 0
+        code: Optional[int] = None  # lookahead
+        i = 0  # tokens read
+        last_error = -1  # index of the last syntax error
+        while True:
+            t = defaulted[state]
+            if t is None:
+                if code is None:
+                    if i < num:
+                        code = types[i]
+                    elif pending is not None:
+                        errors.append(pending)
+                        return errors
+                    else:
+                        code = end
+                    i += 1
+                t = actions[state][code]
+                if t is None:
+                    # (the end of input after a lexer error is no new error)
+                    if i != last_error and (code != end or lexer_error is None):
+                        errors.append(
+                            self._validate_error(content, stream, statestack, i)
+                        )
+                    if not recover:
+                        return errors
+                    last_error = i
+                    i, code = self._recover(statestack, types, num, i, code, end)
+                    if code is None:
+                        break
+                    state = statestack[-1]
+                    continue
+
+            if t > 0:
+                statestack.append(t)
+                state = t
+                code = None
+                continue
+
+            if t < 0:
+                plen, pname, rhs = productions[-t]
+                if plen:
+                    del statestack[-plen:]
+                state = goto[statestack[-1]][pname]
+                statestack.append(state)
+
+                if pname in checked:
+                    if pname == "searchClause":
+                        if rhs[0] == "LPAREN":
+                            continue
+                        clauses += 1
+                        count, limit = clauses, "max_clauses"
+                    else:
+                        height = len(statestack)
+                        count = counts[height] = counts[height] + 1 if plen == 2 else 1
+                        limit = (
+                            "max_modifiers"
+                            if pname == "modifierList"
+                            else "max_sort_keys"
+                        )
+                    if count > getattr(limits, limit):
+                        errors.append(
+                            self.limit_error(
+                                limit, self._validate_lexpos(content, stream, i)
+                            )
+                        )
+                        return errors
+                continue
+
+            break  # accept
+
+        if lexer_error is not None:
+            errors.append(lexer_error)
+        elif pending is not None:
+            # limit exceeded by skipped tokens
+            errors.append(pending)
+        return errors
+
+    def _recover(
+        self,
+        statestack: List[int],
+        types: Sequence[int],
+        num: int,
+        i: int,
+        code: int,
+        end: int,
+    ) -> Tuple[int, Optional[int]]:
+        # panic mode recovery after a syntax error at token i - 1 (lookahead
+        # code): modifies the state stack and returns the new token index
+        # and lookahead (None if the parser cannot continue)
+        goto = self.parser.goto
+        while statestack:
+            # innermost state where a search clause could start, assume one
+            while statestack and "searchClause" not in goto[statestack[-1]]:
+                statestack.pop()
+            if not statestack:
+                break
+            statestack.append(goto[statestack[-1]]["searchClause"])
+
+            # skip to the next token that may follow it
+            while code != end and not self._accepts(statestack, code):
+                code = types[i] if i < num else end
+                i += 1
+            if self._accepts(statestack, code):
+                return i, code
+
+            # nothing fits at the end, try further out
+            del statestack[-2:]
+        return i, None
+
+    def _accepts(self, statestack: List[int], code: int) -> bool:
+        # whether the lookahead code would be shifted (or accepted) after
+        # the reductions it triggers, without changing the state stack
+        actions, productions, goto = self._actions, self._productions, self.parser.goto
+        top = len(statestack)  # statestack[:top] still in use
+        pushed: List[int] = list()  # states pushed by the reductions
+        while True:
+            t = actions[pushed[-1] if pushed else statestack[top - 1]][code]
+            if t is None:
+                return False
+            if t >= 0:
+                return True
+            plen, pname, _ = productions[-t]
+            popped = min(plen, len(pushed))
+            del pushed[len(pushed) - popped :]  # noqa: E203
+            top -= plen - popped
+            pushed.append(goto[pushed[-1] if pushed else statestack[top - 1]][pname])
+
+    def _validate_lexpos(self, content: str, stream: CQLTokenStream, i: int) -> int:
+        # lexer position (like PLY) after reading i tokens
+        if i > len(stream):
+            return len(content) + 1
+        return stream.ends[i - 1] if i else 0
+
+    def _validate_error(
+        self,
+        content: str,
+        stream: CQLTokenStream,
+        statestack: List[int],
+        i: int,
+    ) -> CQLParserError:
+        symbols = [self._symbols[state] for state in statestack]
+        lexpos = self._validate_lexpos(content, stream, i)
+        if i > len(stream):
+            return self.syntax_error(
+                symbols, statestack[-1], None, len(content), lexpos
+            )
+
+        p = LexToken()
+        p.type = stream.type(i - 1)
+        p.value = stream.value(i - 1)
+        p.lineno = 1
+        p.lexpos = stream.starts[i - 1]
+        return self.syntax_error(symbols, statestack[-1], p, p.lexpos, lexpos)
+
+    # ---------------------------------------------------
+
+    def add_clause(self, term: str, index: Optional[CQLPrefixedName] = None) -> None:
+        # called for each search clause
+        self.cost.add_clause(term, index)
+        max_clauses = self.limits.max_clauses
+        if max_clauses is not None and self.cost.clauses > max_clauses:
+            raise self.limit_error("max_clauses", self.lexer.lexer.lexpos)
+
+    def check_modifiers(self, modifiers: List["CQLModifier"]) -> None:
+        max_modifiers = self.limits.max_modifiers
+        if max_modifiers is not None and len(modifiers) > max_modifiers:
+            raise self.limit_error("max_modifiers", self.lexer.lexer.lexpos)
+
+    def check_sort_keys(self, sortSpecs: List["CQLSortSpec"]) -> None:
+        max_sort_keys = self.limits.max_sort_keys
+        if max_sort_keys is not None and len(sortSpecs) > max_sort_keys:
+            raise self.limit_error("max_sort_keys", self.lexer.lexer.lexpos)
+
+    def limit_error(self, limit: str, lexpos: int) -> CQLParserLimitError:
+        what = {
+            "max_clauses": "search clauses",
+            "max_modifiers": "modifiers",
+            "max_sort_keys": "sort keys",
+        }[limit]
+        maximum = getattr(self.limits, limit)
+        return CQLParserLimitError(
+            f"Too many {what} at position {lexpos} ({limit}={maximum})",
+            limit,
+            maximum,
+            position=lexpos,
+        )
+
+    # ---------------------------------------------------
+
+    def p_error(self, p: Optional[LexToken]):
+        if self.log_errors:
+            self.log_syntax_error(p)
+
+        lexer = self.lexer.lexer
+        raise self.syntax_error(
+            [sym.type for sym in self.parser.symstack],
+            self.parser.state,
+            p,
+            p.lexpos if p is not None else len(lexer.lexdata),
+            lexer.lexpos,
+        )
+
+    def syntax_error(
+        self,
+        symbols: Sequence[str],
+        state: int,
+        p: Optional[LexToken],
+        position: int,
+        lexpos: int,
+    ) -> CQLParserError:
+        """Creates the error for a syntax error.
+
+        Args:
+            symbols: types of the symbols on the parser stack (``"$end"`` first)
+            state: current parser state
+            p: offending token, ``None`` for end of input
+            position: input offset of the offending token (or input length)
+            lexpos: lexer position (after the offending token)
+
+        Returns:
+            CQLParserError: the error to raise
+        """
+        if p is None:
+            return self.make_error(
+                "Syntex error: EOF / no symbols left!", state, p, position
+            )
+
+        return self.make_error(
+            f"Found symbol {p.type!r}. Expected any of: {', '.join(self.expected[state])}",
+            state,
+            p,
+            position,
+        )
+
+    def make_error(
+        self, message: str, state: int, p: Optional[LexToken], position: int
+    ) -> CQLParserError:
+        return CQLParserError(
+            message,
+            position=position,
+            token=p.type if p is not None else None,
+            value=p.value if p is not None else None,
+            expected=self.expected[state],
+        )
+
+    def log_syntax_error(self, p: Optional[LexToken]) -> None:
         LOGGER.error("Parser stack: %s. Token: %s", self.parser.symstack[1:], p)
 
         if p is None:
@@ -521,8 +1482,7 @@ class CQLParser:
                 "Syntex error: EOF / no symbols left. Parser stack: %s",
                 self.parser.symstack,
             )
-
-            raise CQLParserError("Syntex error: EOF / no symbols left!")
+            return
 
         LOGGER.error(
             "Syntex error: [lno:%d,col:%d]: %s",
@@ -533,9 +1493,12 @@ class CQLParser:
         LOGGER.error(
             "Found symbol: %s. Expected any of: %s",
             p.type,
-            ", ".join(self.parser.action[self.parser.state].keys()),
+            ", ".join(self.expected[self.parser.state]),
         )
 
+        if not LOGGER.isEnabledFor(logging.DEBUG):
+            return
+
         # only if last symbol/token has no options -> check from previous
         # listing rules/productions that the currently wrong token could have taken if it were correct
         if not self.parser.goto[self.parser.statestack[-1]]:
@@ -560,10 +1523,6 @@ class CQLParser:
                         ", ".join(symbols),
                     )
 
-        raise CQLParserError(
-            f"Found symbol {p.type!r}. Expected any of: {', '.join(self.parser.action[self.parser.state].keys())}"
-        )
-
 
 # ---------------------------------------------------------------------------
 
@@ -586,6 +1545,7 @@ class CQLParser11(CQLParser):
             p[0] = p[2]
         else:
             p[0] = p[1]
+        p.slice[0].depth = getattr(p.slice[-1], "depth", 0)
         LOGGER.debug("stack@p_cqlQuery: %s", p.stack)
         if len(p.stack) == 1 and p.stack[0].type == "$end":
             p[0] = CQLQuery(p[0], version="1.1")
@@ -625,8 +1585,13 @@ class CQLParser11(CQLParser):
         LOGGER.debug("p_scopedClause: %s -> %s", p.slice[1:], p[1:])
         if len(p) == 4:
             p[0] = CQLTriple(left=p[1], operator=p[2], right=p[3])
+            # nesting depth of parentheses (for query cost)
+            p.slice[0].depth = max(
+                getattr(p.slice[1], "depth", 0), getattr(p.slice[3], "depth", 0)
+            )
         else:
             p[0] = p[1]
+            p.slice[0].depth = getattr(p.slice[1], "depth", 0)
 
     def p_booleanGroup(self, p: YaccProduction):
         # fmt: off
@@ -634,6 +1599,7 @@ class CQLParser11(CQLParser):
                         | boolean"""
         # fmt: on
         LOGGER.debug("p_booleanGroup: %s -> %r", p.slice[1:], p[1])
+        self.cost.add_boolean(p[1])
         if len(p) == 3:
             p[0] = CQLBoolean(p[1], modifiers=p[2])
         else:
@@ -659,9 +1625,14 @@ class CQLParser11(CQLParser):
         if len(p) == 4:
             if p.slice[1].type == "LPAREN" and p.slice[3].type == "RPAREN":
                 p[0] = p[2]
+                depth = p.slice[0].depth = getattr(p.slice[2], "depth", 0) + 1
+                if depth > self.cost.max_depth:
+                    self.cost.max_depth = depth
             else:
+                self.add_clause(p[3], p[1])
                 p[0] = CQLSearchClause(term=p[3], relation=p[2], index=p[1])
         else:
+            self.add_clause(p[1])
             p[0] = CQLSearchClause(term=p[1])
 
     def p_relation(self, p: YaccProduction):
@@ -715,6 +1686,7 @@ class CQLParser11(CQLParser):
                 p[0] = list()
             p[0].extend(p[1])
             p[0].append(p[2])
+        self.check_modifiers(p[0])
 
     def p_modifier(self, p: YaccProduction):
         # fmt: off
@@ -777,44 +1749,55 @@ class CQLParser11(CQLParser):
         LOGGER.debug("p_identifier: %s", p.slice[1])
         p[0] = p[1]
 
-    def p_error(self, p: YaccProduction):
-        if len(self.parser.symstack) >= 3:
+    def syntax_error(
+        self,
+        symbols: Sequence[str],
+        state: int,
+        p: Optional[LexToken],
+        position: int,
+        lexpos: int,
+    ) -> CQLParserError:
+        if len(symbols) >= 3:
             # missing right side
-            if (
-                isinstance(self.parser.symstack[-2], YaccSymbol)
-                and self.parser.symstack[-2].type in ("scopedClause",)
-                and isinstance(self.parser.symstack[-1], LexToken)
-                and self.parser.symstack[-1].type in ("AND", "OR", "NOT", "PROX")
+            if symbols[-2] == "scopedClause" and symbols[-1] in (
+                "AND",
+                "OR",
+                "NOT",
+                "PROX",
             ):
-                raise CQLParserError(
-                    f"Missing right side for scopedClause at position {self.lexer.lexer.lexpos}."
+                return self.make_error(
+                    f"Missing right side for scopedClause at position {lexpos}.",
+                    state,
+                    p,
+                    position,
                 )
 
             # missing closing parenthesis
             # TODO: general check whether LPAREN on stack or found remaining RPAREN?
-            if (
-                isinstance(self.parser.symstack[-2], LexToken)
-                and self.parser.symstack[-2].type == "LPAREN"
-                and isinstance(self.parser.symstack[-1], YaccSymbol)
-                and self.parser.symstack[-1].type
-                in ("scopedClause", "cqlQuery", "term")
+            if symbols[-2] == "LPAREN" and symbols[-1] in (
+                "scopedClause",
+                "cqlQuery",
+                "term",
             ):
-                raise CQLParserError(
-                    f"Missing closing parenthesis at position {self.lexer.lexer.lexpos}."
+                return self.make_error(
+                    f"Missing closing parenthesis at position {lexpos}.",
+                    state,
+                    p,
+                    position,
                 )
 
         if p is not None:
             # missing opening parenthesis (any other cases possible here?)
             # check for end symbol ($end) which should mean, query could have been completed
-            if (
-                p.type == "RPAREN"
-                and "$end" in self.parser.action[self.parser.state].keys()
-            ):
-                raise CQLParserError(
-                    f"Missing opening parenthesis / superfluous closing parenthesis at {self.lexer.lexer.lexpos}."
+            if p.type == "RPAREN" and "$end" in self.expected[state]:
+                return self.make_error(
+                    f"Missing opening parenthesis / superfluous closing parenthesis at {lexpos}.",
+                    state,
+                    p,
+                    position,
                 )
 
-        super().p_error(p)
+        return super().syntax_error(symbols, state, p, position, lexpos)
 
 
 # ---------------------------------------------------------------------------
@@ -860,6 +1843,8 @@ class CQLParser12(CQLParser11):
                 p[0] = list()
             p[0].extend(p[1])
             p[0].append(p[2])
+        self.cost.sort_keys = len(p[0])
+        self.check_sort_keys(p[0])
 
     def p_singleSpec(self, p: YaccProduction):
         # fmt: off
@@ -872,25 +1857,26 @@ class CQLParser12(CQLParser11):
         else:
             p[0] = CQLSortSpec(p[1])
 
-    def p_error(self, p: YaccProduction):
-        if len(self.parser.symstack) >= 3:
+    def syntax_error(
+        self,
+        symbols: Sequence[str],
+        state: int,
+        p: Optional[LexToken],
+        position: int,
+        lexpos: int,
+    ) -> CQLParserError:
+        if len(symbols) >= 3:
             # missing sort key
-            if (
-                isinstance(self.parser.symstack[-2], YaccSymbol)
-                and self.parser.symstack[-2].type == "scopedClause"
-                and isinstance(self.parser.symstack[-1], LexToken)
-                and self.parser.symstack[-1].type == "SORTBY"
-            ):
+            if symbols[-2] == "scopedClause" and symbols[-1] == "SORTBY":
                 if p is None:
-                    raise CQLParserError(
-                        f"No sort key supplied at position {self.lexer.lexer.lexpos}. Unexpected end of input."
-                    )
+                    message = f"No sort key supplied at position {lexpos}. Unexpected end of input."
                 else:
-                    raise CQLParserError(
-                        f"No sort key supplied at position {self.lexer.lexer.lexpos}. Found {p} symbol."
+                    message = (
+                        f"No sort key supplied at position {lexpos}. Found {p} symbol."
                     )
+                return self.make_error(message, state, p, position)
 
-        super().p_error(p)
+        return super().syntax_error(symbols, state, p, position, lexpos)
 
 
 # ---------------------------------------------------------------------------
@@ -0,0 +1,282 @@
+"""Selectivity-based query planning: operands of ``and`` / ``or`` runs are
+reordered by their estimated number of matching records, from cardinality
+statistics of a collection."""
+
+import copy
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from cql.parser import MASKING_RE
+from cql.parser import CQLBoolean
+from cql.parser import CQLQuery
+from cql.parser import CQLSearchClause
+from cql.parser import CQLTriple
+from cql.predicate import CQL_ALL_RECORDS
+from cql.predicate import WORD_RE
+from cql.predicate import WORD_RELATIONS
+from cql.predicate import index_name
+from cql.predicate import relation_modifiers
+from cql.predicate import relation_name
+
+# ---------------------------------------------------------------------------
+
+
+Node = Union[CQLTriple, CQLSearchClause]
+
+#: booleans whose runs are reordered (without modifiers, ``not`` and
+#: ``prox`` are not commutative)
+REORDERED_BOOLEANS = ("and", "or")
+#: relation modifiers that do not change which records contain a word
+CASE_MODIFIERS = frozenset(["respectcase", "ignorecase"])
+#: max. number of cached plan shapes (the cache is cleared once full)
+MAX_PLANS = 256
+
+
+class CQLStatistics:
+    """Cardinality statistics of a collection for :class:`CQLQueryPlanner`.
+
+    Counts are numbers of records, they may be upper bounds but must be
+    ``0`` only if there are no such records; ``None`` if unknown. Index
+    names are lower case, ``cql.serverchoice`` for the default index. This
+    base class knows the number of records only, override the methods for
+    a backend (e.g. with the document frequencies of its search index).
+    """
+
+    def __init__(self, num_records: int = 0):
+        #: number of records in the collection
+        self.num_records = num_records
+
+    def word_count(self, index: str, word: str) -> Optional[int]:
+        """Records with a (lower case) word in an index."""
+        return None
+
+    def value_count(self, index: str, value: str) -> Optional[int]:
+        """Records with exactly this value in an index."""
+        return None
+
+    def index_count(self, index: str) -> Optional[int]:
+        """Records with any value in an index."""
+        return None
+
+
+class CQLPlan:
+    """Result of :meth:`CQLQueryPlanner.plan`."""
+
+    def __init__(
+        self, query: CQLQuery, estimate: int, estimates: Dict[int, int]
+    ) -> None:
+        #: the query with reordered operands (same results)
+        self.query = query
+        #: upper bound of the number of matching records
+        self.estimate = estimate
+        # estimates by id of the search clauses and runs of the query
+        self._estimates = estimates
+
+    @property
+    def empty(self) -> bool:
+        """Whether the query is known to match nothing, e.g. an ``and``
+        with a word that is in no record."""
+        return self.estimate == 0
+
+    def explain(self) -> str:
+        """Operands in evaluation order with their estimates, one per line."""
+        lines: List[str] = list()
+        todo: List[Tuple[Node, int]] = [(self.query.root, 0)]
+        while todo:
+            node, depth = todo.pop()
+            estimate = self._estimates.get(id(node))
+            suffix = f" ~{estimate}" if estimate is not None else ""
+            if isinstance(node, CQLSearchClause):
+                lines.append(f"{'  ' * depth}{node.toCQL()}{suffix}")
+                continue
+            lines.append(f"{'  ' * depth}{node.operator.toCQL()}{suffix}")
+            todo.extend((operand, depth + 1) for operand in reversed(_operands(node)))
+        return "\n".join(lines)
+
+    def __repr__(self) -> str:
+        return f"CQLPlan[~{self.estimate}: {self.query.toCQL()}]"
+
+
+# ---------------------------------------------------------------------------
+
+
+def _operands(node: CQLTriple) -> List[Node]:
+    # operands of a run of a reordered boolean (subtrees with prefixes or
+    # modifiers are not part of it), else left and right
+    op = node.operator.canonical()
+    if op not in REORDERED_BOOLEANS:
+        return [node.left, node.right]
+    operands: List[Node] = list()
+    todo: List[Node] = [node.right, node.left]
+    while todo:
+        current = todo.pop()
+        if (
+            isinstance(current, CQLTriple)
+            and not current.prefixes
+            and current.operator.canonical() == op
+        ):
+            todo.append(current.right)
+            todo.append(current.left)
+        else:
+            operands.append(current)
+    return operands
+
+
+class CQLQueryPlanner:
+    """Reorders the operands of ``and`` / ``or`` runs by selectivity.
+
+    Each search clause is estimated from the statistics (an upper bound of
+    its matches: word relations by the document frequency of their words,
+    ``==`` by the value, other relations by the records with a value in the
+    index), runs of ``and`` by their smallest operand, of ``or`` by the sum,
+    ``not`` by its left operand and ``prox`` by the smaller one.
+
+    Operands of ``and`` are put in ascending order, so evaluators intersect
+    the smallest results first and stop at an empty one; of ``or`` in
+    descending order (the most likely match first for evaluators that stop
+    at the first match). ``not``, ``prox`` and booleans with modifiers keep
+    their order, subtrees with prefix assignments are moved as a whole. No
+    operand is removed, so the planned query has the same results and raises
+    the same errors.
+
+    The estimates of the search clauses of a plan are cached by
+    :meth:`CQLQuery.canonical` until the number of records changes (or
+    :meth:`clear`); equivalent queries get a plan of their own nodes with
+    the cached estimates.
+
+    Args:
+        statistics: cardinality statistics of the collection
+    """
+
+    def __init__(self, statistics: CQLStatistics):
+        self.statistics = statistics
+        # estimates of the search clauses (in plan order) by canonical query
+        self._plans: Dict[str, List[int]] = dict()
+        self._num_records = statistics.num_records
+
+    def plan(self, query: CQLQuery) -> CQLPlan:
+        """Plan of a query (the query is not modified)."""
+        if self._num_records != self.statistics.num_records:
+            self.clear()
+        key = query.canonical()
+        cached = self._plans.get(key)
+        plan, estimates = self._plan(query, cached)
+        if cached is None:
+            if len(self._plans) >= MAX_PLANS:
+                self._plans.clear()
+            self._plans[key] = estimates
+        return plan
+
+    def clear(self) -> None:
+        """Drops cached plans, e.g. after the statistics changed."""
+        self._plans.clear()
+        self._num_records = self.statistics.num_records
+
+    def estimate(self, clause: CQLSearchClause, version: str = "1.2") -> int:
+        """Upper bound of the records matching a search clause."""
+        num_records = self.statistics.num_records
+        index = index_name(clause)
+        if index == CQL_ALL_RECORDS:
+            return num_records
+
+        relation = relation_name(clause, version)
+        modifiers = relation_modifiers(clause.relation)
+        term = clause.term
+        count: Optional[int] = None
+        if relation in WORD_RELATIONS:
+            # masked terms match other words, escapes are not words
+            words = list(dict.fromkeys(WORD_RE.findall(term.lower())))
+            if (
+                words
+                and "\\" not in term
+                and not MASKING_RE.search(term)
+                and CASE_MODIFIERS.issuperset(modifiers)
+            ):
+                counts = [self.statistics.word_count(index, word) for word in words]
+                if None not in counts:
+                    # "any" one of the words, else all of them
+                    count = sum(counts) if relation == "any" else min(counts)
+        elif (
+            relation in ("==", "exact")
+            and not modifiers
+            and "\\" not in term
+            and not MASKING_RE.search(term)
+        ):
+            count = self.statistics.value_count(index, term)
+        if count is None:
+            # any relation matches records with a value in the index only
+            count = self.statistics.index_count(index)
+        return num_records if count is None else min(count, num_records)
+
+    # ---------------------------------------------------
+
+    def _plan(
+        self, query: CQLQuery, cached: Optional[List[int]] = None
+    ) -> Tuple[CQLPlan, List[int]]:
+        # the plan and the estimates of its search clauses (the cached ones
+        # of an equivalent query if given, the same clauses in the same
+        # order)
+        version = query.version
+        num_records = self.statistics.num_records
+
+        # post order without recursion, runs of and / or as one node
+        order: List[Node] = list()
+        todo: List[Node] = [query.root]
+        while todo:
+            node = todo.pop()
+            order.append(node)
+            if isinstance(node, CQLTriple):
+                todo.extend(_operands(node))
+
+        estimates: Dict[int, int] = dict()
+        clause_estimates: List[int] = list()
+        planned: Dict[int, Tuple[Node, int]] = dict()  # by id of the node
+        for node in reversed(order):
+            if isinstance(node, CQLSearchClause):
+                if cached is None:
+                    estimate = self.estimate(node, version)
+                else:
+                    estimate = cached[len(clause_estimates)]
+                clause_estimates.append(estimate)
+                estimates[id(node)] = estimate
+                planned[id(node)] = (node, estimate)
+                continue
+
+            operands = [planned.pop(id(operand)) for operand in _operands(node)]
+            op = node.operator.canonical()
+            if op in REORDERED_BOOLEANS:
+                # stable, the given order is kept for equal estimates
+                operands.sort(key=lambda item: item[1], reverse=op == "or")
+                new_node = operands[0][0]
+                for operand, _ in operands[1:]:
+                    new_node = CQLTriple(
+                        new_node, CQLBoolean(node.operator.value), operand
+                    )
+                new_node.prefixes = list(node.prefixes)
+                new_node.sortSpecs = list(node.sortSpecs)
+            else:
+                new_node = copy.copy(node)
+                new_node.left, new_node.right = operands[0][0], operands[1][0]
+
+            counts = [count for _, count in operands]
+            if op == "or" or op.startswith("or/"):
+                estimate = min(sum(counts), num_records)
+            elif op == "not" or op.startswith("not/"):
+                estimate = counts[0]
+            else:
+                estimate = min(counts)
+            estimates[id(new_node)] = estimate
+            planned[id(node)] = (new_node, estimate)
+
+        root, estimate = planned[id(query.root)]
+        planned_query = CQLQuery(root, version=query.version)
+        planned_query.cost = query.cost
+        return CQLPlan(planned_query, estimate, estimates), clause_estimates
+
+
+def plan(query: CQLQuery, statistics: CQLStatistics) -> CQLPlan:
+    """Plans a query, see :class:`CQLQueryPlanner`."""
+    return CQLQueryPlanner(statistics).plan(query)
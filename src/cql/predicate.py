@@ -0,0 +1,599 @@
+import operator
+import re
+from datetime import date
+from datetime import datetime
+from datetime import time
+from datetime import timezone
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Pattern
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from cql.masking import REGEXP
+from cql.masking import UNMASKED
+from cql.masking import compile_pattern
+from cql.masking import masked_words
+from cql.masking import parse_mask
+from cql.masking import words_pattern
+from cql.parser import CQL11_DEFAULT_RELATION
+from cql.parser import CQL12_DEFAULT_RELATION
+from cql.parser import CQL_DEFAULT_INDEX
+from cql.parser import CQLQuery
+from cql.parser import CQLRelation
+from cql.parser import CQLSearchClause
+from cql.parser import CQLTriple
+
+# ---------------------------------------------------------------------------
+
+
+Node = Union[CQLTriple, CQLSearchClause]
+
+#: predicate over a record (e.g. a dict)
+Predicate = Callable[[Any], bool]
+
+#: record key, several keys (any of them may match) or a value getter
+Field = Union[str, Sequence[str], Callable[[Any], Any]]
+
+#: relations comparing words of the term with words of the value (case
+#: insensitive by default), ``scr`` (server choice) is ``=``
+WORD_RELATIONS = ("=", "scr", "any", "all", "adj")
+#: relations comparing the whole value (case sensitive by default)
+VALUE_RELATIONS = {
+    "==": operator.eq,
+    "exact": operator.eq,
+    "<>": operator.ne,
+    "<": operator.lt,
+    ">": operator.gt,
+    "<=": operator.le,
+    ">=": operator.ge,
+}
+
+#: index of all records (``cql.allRecords = 1``, e.g. for a query with
+#: only a negation)
+CQL_ALL_RECORDS = "cql.allrecords"
+
+#: value types with several values, a clause matches if one of them does
+MULTI_VALUED = (list, tuple, set, frozenset)
+#: relation modifiers to compare values (and the term) as numbers / dates
+TYPE_MODIFIERS = ("number", "isodate")
+#: a year or year and month (ISO 8601), the start of the period
+PARTIAL_DATE_RE = re.compile(r"^(\d{4})(?:-(\d{2}))?$")
+
+WORD_RE = re.compile(r"\w+")
+#: whole words (not part of a longer word)
+WORD_PATTERN = r"(?<!\w)(?:%s)(?!\w)"
+
+
+class CQLCompileError(Exception):
+    """Query uses something that cannot be evaluated (e.g. ``prox``)."""
+
+
+# ---------------------------------------------------------------------------
+
+
+def relation_name(clause: CQLSearchClause, version: str = "1.2") -> str:
+    """Lower case comparitor of a search clause, the default relation of the
+    CQL version if there is none."""
+    if clause.relation is None or clause.index is None:
+        return CQL11_DEFAULT_RELATION if version == "1.1" else CQL12_DEFAULT_RELATION
+    return clause.relation.comparitor.name.lower()
+
+
+def relation_modifiers(relation: Optional[CQLRelation]) -> Dict[str, Optional[str]]:
+    """Lower case names of the modifiers of a relation with their values."""
+    if relation is None or not relation.modifiers:
+        return dict()
+    return {
+        modifier.name.name.lower(): modifier.value for modifier in relation.modifiers
+    }
+
+
+def index_name(clause: CQLSearchClause) -> str:
+    """Lower case index of a search clause (``cql.serverchoice`` if there is
+    none)."""
+    if clause.relation is None or clause.index is None:
+        return CQL_DEFAULT_INDEX.lower()
+    return clause.index.name.lower()
+
+
+def parse_number(term: str) -> Optional[Union[int, float]]:
+    """Term as a number, ``None`` if it is none."""
+    try:
+        return int(term)
+    except ValueError:
+        pass
+    try:
+        return float(term)
+    except ValueError:
+        return None
+
+
+def parse_date(term: str) -> Optional[datetime]:
+    """ISO 8601 date (or date and time, a year, a year and month) as a naive
+    UTC datetime, the start of the period; ``None`` if it is none."""
+    text = term.strip()
+    if text.endswith(("Z", "z")):
+        text = text[:-1] + "+00:00"
+    try:
+        match = PARTIAL_DATE_RE.match(text)
+        if match is not None:
+            return datetime(int(match.group(1)), int(match.group(2) or 1), 1)
+        value = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def value_type(modifiers: Mapping[str, Optional[str]]) -> Optional[str]:
+    """Type the values of a clause are compared as by its relation modifiers
+    (``number`` or ``isodate``), ``None`` for their own type."""
+    for kind in TYPE_MODIFIERS:
+        if kind in modifiers:
+            return kind
+    return None
+
+
+def typed_value(value: Any, kind: str) -> Any:
+    """A value (or term) as a number or date, ``None`` if it is none."""
+    if kind == "number":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        return parse_number(value if isinstance(value, str) else str(value))
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, date):
+        return datetime.combine(value, time())
+    return parse_date(value if isinstance(value, str) else str(value))
+
+
+# ---------------------------------------------------------------------------
+
+
+class CQLPredicateCompiler:
+    """Compiles queries into predicates over records, e.g. dicts.
+
+    The query tree is turned into nested closures once, indexes are resolved
+    to value getters and relations to compiled regular expressions or
+    comparison functions, so evaluating a predicate does not look at the
+    query anymore. Runs of ``and`` / ``or`` become a single loop over their
+    operands (and short-circuit), so long runs do not recurse.
+
+    Relations:
+
+    * ``=`` (``scr``), ``adj``: the words of the term, in this order (a
+      single word for a single word term)
+    * ``any`` / ``all``: any / all words of the term
+    * ``==`` (``exact``), ``<>``: the whole value (not) equal to the term
+    * ``<``, ``>``, ``<=``, ``>=``: compare values with the term, as numbers
+      if both are numbers
+    * ``within``: between the two words of the term (inclusive)
+
+    With a ``/number`` or ``/isoDate`` modifier, value relations compare as
+    numbers or dates (ISO 8601, a year or month is its start), values of
+    other types (or text that does not parse) match nothing.
+
+    Terms are masked (CQL 1.2, see :mod:`cql.masking`): ``*`` and ``?`` in
+    a word match any / a single word character (in a whole value for
+    ``==`` any character), ``^`` anchors a word at the start or end of the
+    value, ``\\`` escapes. With ``/unmasked`` the term is text, with
+    ``/regexp`` a regular expression (searched for in the value by word
+    relations, matching the whole value for ``==`` / ``<>``).
+
+    Word relations ignore case, others do not; the ``/respectCase`` and
+    ``/ignoreCase`` relation modifiers change this, other modifiers are
+    ignored. A missing (``None``) value matches nothing, list values match
+    if any of their items does (``all``: each word is in one of the items,
+    ``<>``: none of them is equal). ``cql.allRecords`` matches all records,
+    ``sortBy`` is ignored (see :mod:`cql.sorting`).
+
+    Args:
+        fields: record key (or several keys, or a function returning the
+            value) by index name, by default the lower case index name is
+            the key and ``cql.serverChoice`` looks at all values
+        version: CQL version for the default relation (default: the
+            version of the query)
+    """
+
+    def __init__(
+        self,
+        fields: Optional[Mapping[str, Field]] = None,
+        version: Optional[str] = None,
+    ):
+        self.fields = {name.lower(): field for name, field in (fields or {}).items()}
+        self.version = version
+
+    def compile(self, query: CQLQuery) -> Predicate:
+        """Compiles a query into a predicate.
+
+        Raises:
+            CQLCompileError: for unsupported booleans (``prox``) or relations
+        """
+        version = self.version or query.version
+        predicates: Dict[int, Predicate] = dict()
+        operands: Dict[int, List[Node]] = dict()
+        merged: Dict[int, List[Predicate]] = dict()
+
+        # post order without recursion, runs of and / or are flattened
+        todo: List[Tuple[Node, bool]] = [(query.root, False)]
+        while todo:
+            node, ready = todo.pop()
+            if isinstance(node, CQLSearchClause):
+                predicates[id(node)] = self.compile_clause(node, version)
+                continue
+
+            op = node.operator.value.lower()
+            if not ready:
+                if op not in ("and", "or", "not"):
+                    raise CQLCompileError(f"Unsupported boolean {op!r}")
+                children = (
+                    flatten_run(node, op) if op != "not" else [node.left, node.right]
+                )
+                if op == "or":
+                    children, merged[id(node)] = self._merge_words(children, version)
+                operands[id(node)] = children
+                todo.append((node, True))
+                todo.extend((child, False) for child in children)
+                continue
+
+            children = operands.pop(id(node))
+            preds = merged.pop(id(node), [])
+            preds.extend(predicates.pop(id(child)) for child in children)
+            if op == "not":
+                predicates[id(node)] = _and_not(*preds)
+            elif op == "and":
+                predicates[id(node)] = _all(preds)
+            else:
+                predicates[id(node)] = _any(preds)
+
+        return predicates[id(query.root)]
+
+    def compile_clause(
+        self, clause: CQLSearchClause, version: str = "1.2"
+    ) -> Predicate:
+        """Compiles a single search clause into a predicate."""
+        if index_name(clause) == CQL_ALL_RECORDS:
+            return _any_record
+
+        get = self.getter(index_name(clause))
+        relation = relation_name(clause, version)
+        modifiers = relation_modifiers(clause.relation)
+
+        # relations over all values of a list, not each one
+        masked = UNMASKED not in modifiers
+        words = _term_words(clause.term, masked)
+        if relation == "all" and len(words) > 1 and REGEXP not in modifiers:
+            # each word in one of the values
+            ignore_case = "respectcase" not in modifiers
+            return _all(
+                [
+                    _clause_predicate(
+                        get, _words_matcher("any", word, ignore_case, masked)
+                    )
+                    for word in words
+                ]
+            )
+        if relation == "<>":
+            # a value, but none equal to the term
+            equal = _clause_predicate(get, _equal_matcher(clause.term, modifiers))
+            return _and_not(_clause_predicate(get, _has_value), equal)
+
+        return _clause_predicate(get, self.matcher(clause, version))
+
+    def _merge_words(
+        self, children: List[Node], version: str
+    ) -> Tuple[List[Node], List[Predicate]]:
+        # word clauses of an or run on the same index (e.g. facet values)
+        # are searched for with a single regular expression
+        groups: Dict[Tuple[str, bool], List[Tuple[Node, List[str]]]] = dict()
+        rest: List[Node] = list()
+        for child in children:
+            words: List[str] = list()
+            if (
+                isinstance(child, CQLSearchClause)
+                and index_name(child) != CQL_ALL_RECORDS
+            ):
+                relation = relation_name(child, version)
+                modifiers = relation_modifiers(child.relation)
+                if relation in ("=", "scr", "any") and not (
+                    REGEXP in modifiers or UNMASKED in modifiers
+                ):
+                    words = masked_words(child.term)
+                    if relation != "any" and len(words) != 1:
+                        words = list()
+            if not words:
+                rest.append(child)
+                continue
+            ignore_case = "respectcase" not in modifiers
+            key = (index_name(child), ignore_case)
+            groups.setdefault(key, list()).append((child, words))
+
+        merged: List[Predicate] = list()
+        for (index, ignore_case), clauses in groups.items():
+            if len(clauses) == 1:
+                rest.append(clauses[0][0])
+                continue
+            words = list(dict.fromkeys(word for _, words in clauses for word in words))
+            match = _words_matcher("any", " ".join(words), ignore_case)
+            merged.append(_clause_predicate(self.getter(index), match))
+        return rest, merged
+
+    def getter(self, index: str) -> Callable[[Any], Any]:
+        """Value getter of an (lower case) index."""
+        field = self.fields.get(index)
+        if field is None and index == CQL_DEFAULT_INDEX.lower():
+            return _all_values
+        if field is None:
+            field = index
+        if callable(field):
+            return field
+        if isinstance(field, str):
+            key = field
+            return lambda record: record.get(key)
+
+        keys = tuple(field)
+        return lambda record: [record.get(key) for key in keys]
+
+    def matcher(self, clause: CQLSearchClause, version: str = "1.2") -> Predicate:
+        """Match function for a single (not ``None``) value of a search
+        clause."""
+        relation = relation_name(clause, version)
+        modifiers = relation_modifiers(clause.relation)
+        term = clause.term
+
+        if relation in WORD_RELATIONS:
+            ignore_case = "respectcase" not in modifiers
+            if REGEXP in modifiers:
+                search = compile_regexp(term, ignore_case).search
+                return lambda value: search(_text(value)) is not None
+            return _words_matcher(
+                relation, term, ignore_case, UNMASKED not in modifiers
+            )
+        if relation in ("==", "exact"):
+            return _equal_matcher(term, modifiers)
+        if relation == "<>" and value_type(modifiers) is None:
+            equal = _equal_matcher(term, modifiers)
+            return lambda value: not equal(value)
+        if REGEXP in modifiers:
+            raise CQLCompileError(f"Relation {relation!r} does not support /regexp")
+
+        ignore_case = "ignorecase" in modifiers
+        kind = value_type(modifiers)
+        if relation in VALUE_RELATIONS:
+            return _bound_matcher(VALUE_RELATIONS[relation], term, ignore_case, kind)
+        if relation == "within":
+            bounds = term.split()
+            if len(bounds) != 2:
+                raise CQLCompileError(
+                    f"Relation 'within' needs two values, not {term!r}"
+                )
+            low = _bound_matcher(operator.ge, bounds[0], ignore_case, kind)
+            high = _bound_matcher(operator.le, bounds[1], ignore_case, kind)
+            return lambda value: low(value) and high(value)
+        raise CQLCompileError(f"Unsupported relation {relation!r}")
+
+
+# ---------------------------------------------------------------------------
+
+
+def flatten_run(node: CQLTriple, op: str) -> List[Node]:
+    """Operands of a run of the same (lower case) boolean, in order."""
+    operands: List[Node] = list()
+    todo: List[Node] = [node.right, node.left]
+    while todo:
+        current = todo.pop()
+        if isinstance(current, CQLTriple) and current.operator.value.lower() == op:
+            todo.append(current.right)
+            todo.append(current.left)
+        else:
+            operands.append(current)
+    return operands
+
+
+def _all(preds: List[Predicate]) -> Predicate:
+    if len(preds) == 1:
+        return preds[0]
+    if len(preds) == 2:
+        first, second = preds
+        return lambda record: first(record) and second(record)
+    operands = tuple(preds)
+
+    def predicate(record: Any) -> bool:
+        for pred in operands:
+            if not pred(record):
+                return False
+        return True
+
+    return predicate
+
+
+def _any(preds: List[Predicate]) -> Predicate:
+    if len(preds) == 1:
+        return preds[0]
+    if len(preds) == 2:
+        first, second = preds
+        return lambda record: first(record) or second(record)
+    operands = tuple(preds)
+
+    def predicate(record: Any) -> bool:
+        for pred in operands:
+            if pred(record):
+                return True
+        return False
+
+    return predicate
+
+
+def _and_not(left: Predicate, right: Predicate) -> Predicate:
+    return lambda record: left(record) and not right(record)
+
+
+def _clause_predicate(get: Callable[[Any], Any], match: Predicate) -> Predicate:
+    def predicate(record: Any) -> bool:
+        value = get(record)
+        if value is None:
+            return False
+        if isinstance(value, MULTI_VALUED):
+            for item in value:
+                if item is not None and match(item):
+                    return True
+            return False
+        return match(value)
+
+    return predicate
+
+
+def _has_value(value: Any) -> bool:
+    return True
+
+
+def _any_record(record: Any) -> bool:
+    return True
+
+
+def _all_values(record: Any) -> List[Any]:
+    values: List[Any] = list()
+    for value in record.values():
+        if isinstance(value, MULTI_VALUED):
+            values.extend(value)
+        else:
+            values.append(value)
+    return values
+
+
+def compile_regexp(term: str, ignore_case: bool = False) -> Pattern:
+    """Compiled (cached) regular expression of a ``/regexp`` term.
+
+    Raises:
+        CQLCompileError: if it is invalid
+    """
+    try:
+        return compile_pattern(term, re.IGNORECASE if ignore_case else 0)
+    except re.error as ex:
+        raise CQLCompileError(f"Invalid regular expression {term!r}: {ex}")
+
+
+def _text(value: Any) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+def _term_words(term: str, masked: bool) -> List[str]:
+    return masked_words(term) if masked else WORD_RE.findall(term)
+
+
+def _words_matcher(
+    relation: str, term: str, ignore_case: bool, masked: bool = True
+) -> Predicate:
+    flags = re.IGNORECASE if ignore_case else 0
+    masks = [parse_mask(word, masked) for word in _term_words(term, masked)]
+    if not masks:
+        # no words (e.g. an empty term), the whole value
+        return _value_matcher(operator.eq, term, ignore_case)
+
+    if relation == "any":
+        pattern = "|".join(f"(?:{words_pattern([mask])})" for mask in masks)
+    elif relation == "all" and len(masks) > 1:
+        searches = [
+            compile_pattern(words_pattern([mask]), flags).search for mask in masks
+        ]
+
+        def match(value: Any) -> bool:
+            value = _text(value)
+            for search in searches:
+                if search(value) is None:
+                    return False
+            return True
+
+        return match
+    else:
+        # a phrase, words separated by anything but words
+        pattern = words_pattern(masks)
+
+    search = compile_pattern(pattern, flags).search
+    return lambda value: search(_text(value)) is not None
+
+
+def _equal_matcher(term: str, modifiers: Mapping[str, Optional[str]]) -> Predicate:
+    # the whole value equal to the term, a masked term or a regular expression
+    ignore_case = "ignorecase" in modifiers
+    kind = value_type(modifiers)
+    if REGEXP in modifiers:
+        fullmatch = compile_regexp(term, ignore_case).fullmatch
+        return lambda value: fullmatch(_text(value)) is not None
+    if kind is None and UNMASKED not in modifiers:
+        mask = parse_mask(term, whole=True)
+        if mask.literal is None:
+            flags = re.DOTALL | (re.IGNORECASE if ignore_case else 0)
+            fullmatch = compile_pattern(mask.pattern, flags).fullmatch
+            return lambda value: fullmatch(_text(value)) is not None
+        term = mask.literal
+    return _bound_matcher(operator.eq, term, ignore_case, kind)
+
+
+def _bound_matcher(
+    compare: Callable[[Any, Any], bool],
+    term: str,
+    ignore_case: bool,
+    kind: Optional[str],
+) -> Predicate:
+    if kind is None:
+        return _value_matcher(compare, term, ignore_case)
+    # the term parsed once, each value when matched
+    bound = typed_value(term, kind)
+    if bound is None:
+        raise CQLCompileError(f"Not a valid {kind} for /{kind}: {term!r}")
+
+    def match(value: Any) -> bool:
+        value = typed_value(value, kind)
+        return value is not None and compare(value, bound)
+
+    return match
+
+
+def _value_matcher(
+    compare: Callable[[Any, Any], bool], term: str, ignore_case: bool
+) -> Predicate:
+    number = parse_number(term)
+    text = term.casefold() if ignore_case else term
+
+    def match(value: Any) -> bool:
+        if (
+            number is not None
+            and isinstance(value, (int, float))
+            and not isinstance(value, bool)
+        ):
+            return compare(value, number)
+        return compare(value if isinstance(value, str) else str(value), text)
+
+    def match_folded(value: Any) -> bool:
+        if (
+            number is not None
+            and isinstance(value, (int, float))
+            and not isinstance(value, bool)
+        ):
+            return compare(value, number)
+        return compare(
+            (value if isinstance(value, str) else str(value)).casefold(), text
+        )
+
+    return match_folded if ignore_case else match
+
+
+# ---------------------------------------------------------------------------
+
+
+def compile_query(
+    query: CQLQuery, fields: Optional[Mapping[str, Field]] = None
+) -> Predicate:
+    """Compiles a query into a predicate over records, see
+    :class:`CQLPredicateCompiler`."""
+    return CQLPredicateCompiler(fields).compile(query)
@@ -0,0 +1,254 @@
+"""Sorting records by the sort keys of a query (``sortBy``).
+
+The sort specs are compiled once into a single key function: for each
+record a tuple of collation keys (folded case and accents, numbers before
+text, missing values ranked), so records are compared as tuples and the
+key of each record is computed only once. The first page of a sorted result
+is a heap selection (``O(n log k)`` for ``k`` records), results of several
+shards (each sorted) are merged lazily.
+"""
+
+import heapq
+import unicodedata
+from itertools import count
+from itertools import islice
+from typing import Any
+from typing import Callable
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from cql.parser import CQLQuery
+from cql.parser import CQLSortSpec
+from cql.predicate import MULTI_VALUED
+from cql.predicate import CQLCompileError
+from cql.predicate import CQLPredicateCompiler
+from cql.predicate import Field
+from cql.predicate import parse_number
+
+# ---------------------------------------------------------------------------
+
+
+#: handling of missing values (``/missingLow``, ... or ``/missingValue=x``),
+#: by default they are sorted last (in either direction)
+MISSING_MODIFIERS = ("missingomit", "missingfail", "missinglow", "missinghigh")
+#: sort modifiers without effect here (the values are compared as they are)
+IGNORED_MODIFIERS = ("respectcase", "respectaccents")
+
+#: key of a record, ``None`` if it is left out (``/missingOmit``)
+SortKey = Optional[Tuple[Any, ...]]
+
+
+class CQLSortError(ValueError):
+    """A record has no value for a sort key with ``/missingFail``."""
+
+
+class _Descending:
+    # a collation key in reverse order
+    __slots__ = ("key",)
+
+    def __init__(self, key: Any):
+        self.key = key
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.key < self.key
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and other.key == self.key
+
+
+def strip_accents(text: str) -> str:
+    """Text without combining characters (``é`` is ``e``)."""
+    return "".join(
+        char
+        for char in unicodedata.normalize("NFKD", text)
+        if not unicodedata.combining(char)
+    )
+
+
+class CQLSorter:
+    """Sorts records (e.g. dicts) by sort specs, see :func:`sorter`.
+
+    Sort modifiers (with or without the ``sort.`` context set prefix):
+
+    * ``/ascending`` (default), ``/descending``
+    * ``/ignoreCase``, ``/ignoreAccents`` (values are compared as they are
+      by default)
+    * ``/missingOmit`` (records without a value are left out),
+      ``/missingFail`` (raise :class:`CQLSortError`), ``/missingLow`` /
+      ``/missingHigh`` (before / after all values), ``/missingValue=x`` (a
+      number if it is one); by default missing values are last
+
+    Numbers are compared as numbers and sorted before text, other values
+    as text; list values by their first value in sort order. Records with
+    equal keys keep their order.
+
+    Args:
+        sortSpecs: the sort keys, the first one first
+        fields: record key (or several keys, or a value getter) by index
+            name, as for :class:`cql.predicate.CQLPredicateCompiler`
+
+    Raises:
+        CQLCompileError: for unsupported modifiers
+    """
+
+    def __init__(
+        self,
+        sortSpecs: Sequence[CQLSortSpec],
+        fields: Optional[Mapping[str, Field]] = None,
+    ):
+        self.sortSpecs = list(sortSpecs)
+        compiler = CQLPredicateCompiler(fields)
+        self._keys = [
+            _compile_spec(spec, compiler.getter(spec.index.name.lower()))
+            for spec in self.sortSpecs
+        ]
+
+    def key(self, record: Any) -> SortKey:
+        """Collation keys of a record, ``None`` if it is left out.
+
+        Raises:
+            CQLSortError: for a missing value with ``/missingFail``
+        """
+        keys: List[Any] = list()
+        for spec_key in self._keys:
+            key = spec_key(record)
+            if key is None:
+                return None
+            keys.append(key)
+        return tuple(keys)
+
+    def sort(self, records: Iterable[Any]) -> List[Any]:
+        """Records in sort order."""
+        return [item[-1] for item in sorted(self._decorated(records))]
+
+    def top(self, records: Iterable[Any], k: int) -> List[Any]:
+        """The first ``k`` records in sort order, by a heap of ``k`` records
+        (the rest is not sorted)."""
+        if k <= 0:
+            return []
+        return [item[-1] for item in heapq.nsmallest(k, self._decorated(records))]
+
+    def page(
+        self, records: Iterable[Any], start: int = 1, maximum: int = 10
+    ) -> List[Any]:
+        """Records ``start`` (from 1, as SRU ``startRecord``) to ``start +
+        maximum - 1`` in sort order."""
+        if start < 1:
+            raise ValueError(f"Records start at 1, not {start}")
+        skipped = start - 1
+        return self.top(records, skipped + maximum)[skipped:]
+
+    def merge(
+        self, *shards: Iterable[Any], limit: Optional[int] = None
+    ) -> Iterator[Any]:
+        """Records of several shards in sort order (each shard in sort order
+        itself, e.g. by :meth:`top`), lazily by a k-way merge; with equal
+        keys the records of earlier shards first."""
+        merged = heapq.merge(
+            *[self._decorated(records, shard) for shard, records in enumerate(shards)]
+        )
+        records_ = (item[-1] for item in merged)
+        return islice(records_, limit) if limit is not None else records_
+
+    def _decorated(
+        self, records: Iterable[Any], shard: int = 0
+    ) -> Iterator[Tuple[Tuple[Any, ...], int, int, Any]]:
+        # (key, shard, position, record), so records are never compared
+        key = self.key
+        for seq, record in zip(count(), records):
+            record_key = key(record)
+            if record_key is not None:
+                yield record_key, shard, seq, record
+
+    def __repr__(self) -> str:
+        return f"CQLSorter[{' '.join(spec.canonical() for spec in self.sortSpecs)}]"
+
+
+# ---------------------------------------------------------------------------
+
+
+def _compile_spec(spec: CQLSortSpec, get: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    # key function of a sort spec, None for a record that is left out
+    descending = fold_case = fold_accents = False
+    missing = "missinglast"
+    missing_value: Optional[str] = None
+    for modifier in spec.modifiers or ():
+        name = modifier.name.basename.lower()
+        if name in ("ascending", "descending"):
+            descending = name == "descending"
+        elif name == "ignorecase":
+            fold_case = True
+        elif name == "ignoreaccents":
+            fold_accents = True
+        elif name in MISSING_MODIFIERS:
+            missing = name
+        elif name == "missingvalue" and modifier.value is not None:
+            missing, missing_value = "missingvalue", modifier.value
+        elif name not in IGNORED_MODIFIERS:
+            raise CQLCompileError(f"Unsupported sort modifier {modifier.toCQL()!r}")
+
+    def collate(value: Any) -> Tuple[int, Any]:
+        if isinstance(value, (int, float)):
+            return (0, value)
+        text = value if isinstance(value, str) else str(value)
+        if fold_accents:
+            text = strip_accents(text)
+        return (1, text.casefold() if fold_case else text)
+
+    # rank of missing values before (-1) or after (1) all values, in
+    # ascending order (the whole key is reversed for descending)
+    if missing == "missinglow" or (missing == "missinglast" and descending):
+        missing_key: Any = (-1, 0, 0)
+    else:
+        missing_key = (1, 0, 0)
+    if missing_value is not None:
+        number = parse_number(missing_value)
+        missing_key = (0,) + collate(missing_value if number is None else number)
+    if descending:
+        missing_key = _Descending(missing_key)
+    index = str(spec.index)
+
+    def key(record: Any) -> Any:
+        value = get(record)
+        if isinstance(value, MULTI_VALUED):
+            keys = [collate(item) for item in value if item is not None]
+            value = None
+            if keys:
+                value = max(keys) if descending else min(keys)
+        elif value is not None:
+            value = collate(value)
+        if value is None:
+            if missing == "missingomit":
+                return None
+            if missing == "missingfail":
+                raise CQLSortError(f"Record without a value for sort key {index!r}")
+            return missing_key
+        value = (0,) + value
+        return _Descending(value) if descending else value
+
+    return key
+
+
+def sorter(query: CQLQuery, fields: Optional[Mapping[str, Field]] = None) -> CQLSorter:
+    """Sorter of the sort keys of a query (``sortBy``), see :class:`CQLSorter`."""
+    return CQLSorter(query.root.sortSpecs, fields)
+
+
+def sort_records(
+    query: CQLQuery,
+    records: Iterable[Any],
+    fields: Optional[Mapping[str, Field]] = None,
+    limit: Optional[int] = None,
+) -> List[Any]:
+    """Records sorted by the sort keys of a query (in their order if there
+    are none), the first ``limit`` ones by heap selection."""
+    if not query.root.sortSpecs:
+        records = list(records)
+        return records[:limit] if limit is not None else records
+    sort = sorter(query, fields)
+    return sort.top(records, limit) if limit is not None else sort.sort(records)
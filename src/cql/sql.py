@@ -0,0 +1,695 @@
+"""Compiles queries into parameterized SQL: a ``WHERE`` condition with its
+bind values and an ``ORDER BY`` clause for the sort keys, e.g. for
+:mod:`sqlite3`.
+
+The SQL text depends only on the shape of a query (its booleans, indexes,
+relations and modifiers and the number of words of ``any`` and ``all``
+terms, but not the terms themselves), so it is compiled once per shape and cached; queries of
+the same shape only bind other values, and the database driver reuses its
+prepared statement for the same text (:mod:`sqlite3` keeps a cache of
+them). Indexes are only ever mapped to configured columns, terms are only
+ever bind values.
+"""
+
+import re
+from datetime import time
+from functools import partial
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from cql.masking import REGEXP
+from cql.masking import UNMASKED
+from cql.masking import compile_pattern
+from cql.masking import masked_words
+from cql.masking import parse_mask
+from cql.masking import words_pattern
+from cql.parser import CQLQuery
+from cql.parser import CQLSearchClause
+from cql.parser import CQLSortSpec
+from cql.predicate import CQL_ALL_RECORDS
+from cql.predicate import WORD_RE
+from cql.predicate import WORD_RELATIONS
+from cql.predicate import CQLCompileError
+from cql.predicate import Node
+from cql.predicate import compile_regexp
+from cql.predicate import flatten_run
+from cql.predicate import index_name
+from cql.predicate import parse_date
+from cql.predicate import parse_number
+from cql.predicate import relation_modifiers
+from cql.predicate import relation_name
+from cql.predicate import value_type
+from cql.sorting import IGNORED_MODIFIERS
+from cql.sorting import MISSING_MODIFIERS
+
+# ---------------------------------------------------------------------------
+
+
+#: column name or several column names (any of them may match), or an SQL
+#: expression
+Column = Union[str, Sequence[str]]
+
+#: bind values of a search clause from its term
+Binder = Callable[[str], List[Any]]
+
+#: SQL operators of the value relations
+OPERATORS = {
+    "==": "=",
+    "exact": "=",
+    "<>": "<>",
+    "<": "<",
+    ">": ">",
+    "<=": "<=",
+    ">=": ">=",
+}
+
+#: max. number of cached statements (the cache is cleared once full)
+MAX_STATEMENTS = 256
+
+#: characters between words in values (besides spaces) for ``LIKE``, the
+#: most common punctuation (each is a ``replace()`` of each value)
+WORD_SEPARATORS = "\t\n,.;:-"
+
+#: runs of up to 2 ** n spaces (or separators) are one space for ``LIKE``
+_COLLAPSE = 3
+
+_ESCAPE = " ESCAPE '\\'"
+
+
+class CQLSQLStatement:
+    """A compiled query: the ``WHERE`` condition and the ``ORDER BY`` clause
+    (without the keywords, empty without sort keys) with their bind values
+    (the ``WHERE`` values first)."""
+
+    __slots__ = ("where", "params", "order_by", "order_params")
+
+    def __init__(
+        self,
+        where: str,
+        params: List[Any],
+        order_by: str = "",
+        order_params: Optional[List[Any]] = None,
+    ):
+        self.where = where
+        self.params = params
+        self.order_by = order_by
+        self.order_params = order_params or []
+
+    def select(self, table: str, columns: str = "*") -> Tuple[str, List[Any]]:
+        """A ``SELECT`` statement of the matching rows of a table (in sort
+        order) and its bind values."""
+        sql = f"SELECT {columns} FROM {table} WHERE {self.where}"
+        if self.order_by:
+            sql += f" ORDER BY {self.order_by}"
+        return sql, self.params + self.order_params
+
+    def __repr__(self) -> str:
+        return f"CQLSQLStatement[{self.where!r}, {self.params!r}]"
+
+
+class CQLSQLCompiler:
+    """Compiles queries into parameterized SQL, see :mod:`cql.sql`.
+
+    Relations (as for :class:`cql.predicate.CQLPredicateCompiler`):
+
+    * ``=`` (``scr``), ``adj``, ``any``, ``all``: ``LIKE`` patterns of the
+      words of the term in the (lower case) value padded with spaces, with
+      runs of spaces and ``separators`` (up to 8) as one space; a masked
+      word may match across words
+    * ``==`` (``exact``), ``<>``: ``=`` / ``<>``, or ``LIKE`` for a masked
+      term
+    * ``<``, ``>``, ``<=``, ``>=`` and ``within`` (``BETWEEN``) compare
+      the values with the term, a number if it is one (``/number`` as
+      ``REAL``, ``/isoDate`` as ISO 8601 text)
+    * ``/ignoreCase`` compares ``lower()`` values (ASCII in SQLite)
+    * ``/regexp``: ``REGEXP`` (see :func:`register_functions` for SQLite)
+
+    ``LIKE`` is case-sensitive as the database makes it (SQLite ignores
+    ASCII case unless ``PRAGMA case_sensitive_like = ON``). With ``regexp``
+    word relations and masked ``==`` / ``<>`` are ``REGEXP`` with the
+    regular expressions of compiled predicates instead (so word
+    boundaries, masks and case are the same, but each row is a call of
+    :func:`register_functions` in SQLite). For full-text indexes see
+    :mod:`cql.fts5`.
+
+    ``cql.allRecords`` is ``1 = 1``, a negation is ``AND NOT COALESCE(...,
+    0)`` (so a ``NULL`` does not make a whole negation ``NULL``). ``NULL``
+    values match nothing. Sort keys are ``ORDER BY`` items (``/descending``,
+    ``/ignoreCase``, ``/missingOmit``, ``/missingLow``, ``/missingHigh``,
+    ``/missingValue=x``, missing values last by default).
+
+    Args:
+        columns: column name (or several names, or an SQL expression) by
+            index name, ``cql.serverChoice`` needs its columns too
+        placeholder: placeholder of the bind values (``?`` for
+            :mod:`sqlite3`, ``%s`` for the ``format`` parameter style)
+        version: CQL version for the default relation (default: the
+            version of the query)
+        regexp: ``REGEXP`` for word relations and masked terms instead of
+            ``LIKE``
+        separators: characters between words besides spaces for ``LIKE``
+            (a ``replace()`` of each value for each, so ``""`` is fastest
+            for values with words separated by spaces only)
+    """
+
+    def __init__(
+        self,
+        columns: Mapping[str, Column],
+        placeholder: str = "?",
+        version: Optional[str] = None,
+        regexp: bool = False,
+        separators: str = WORD_SEPARATORS,
+    ):
+        self.columns = {name.lower(): column for name, column in columns.items()}
+        self.placeholder = placeholder
+        self.version = version
+        self.regexp = regexp
+        self.separators = separators
+        # WHERE, its binders (one per search clause), ORDER BY and its
+        # values by query shape
+        self._statements: Dict[str, Tuple[str, List[Binder], str, List[Any]]] = dict()
+
+    def compile(self, query: CQLQuery) -> CQLSQLStatement:
+        """Compiles a query, the SQL text once for its shape.
+
+        Raises:
+            CQLCompileError: for unsupported booleans (``prox``), relations,
+                modifiers, indexes without a column or invalid terms
+        """
+        version = self.version or query.version
+        clauses, shape = self._shape(query, version)
+        statement = self._statements.get(shape)
+        if statement is None:
+            statement = self._compile(query, clauses, version)
+            if len(self._statements) >= MAX_STATEMENTS:
+                self._statements.clear()
+            self._statements[shape] = statement
+
+        where, binders, order_by, order_params = statement
+        params: List[Any] = list()
+        for bind, clause in zip(binders, clauses):
+            params.extend(bind(clause.term))
+        return CQLSQLStatement(where, params, order_by, list(order_params))
+
+    def column_names(self, index: str) -> List[str]:
+        """Columns of an (lower case) index."""
+        column = self.columns.get(index)
+        if column is None:
+            raise CQLCompileError(f"No column for index {index!r}")
+        return [column] if isinstance(column, str) else list(column)
+
+    # ---------------------------------------------------
+
+    def _shape(
+        self, query: CQLQuery, version: str
+    ) -> Tuple[List[CQLSearchClause], str]:
+        # the search clauses in order and the query with the terms
+        # abstracted out (pre order without recursion)
+        clauses: List[CQLSearchClause] = list()
+        parts: List[str] = list()
+        todo: List[Union[Node, str]] = [query.root]
+        while todo:
+            node = todo.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            elif isinstance(node, CQLSearchClause):
+                clauses.append(node)
+                parts.append(self._signature(node, version))
+            else:
+                op = node.operator.value.lower()
+                if op not in ("and", "or", "not"):
+                    raise CQLCompileError(f"Unsupported boolean {op!r}")
+                todo.extend((")", node.right, f" {op} ", node.left, "("))
+        for spec in query.root.sortSpecs or ():
+            parts.append(f" sortBy {spec.toCQL()}")
+        return clauses, "".join(parts)
+
+    def _signature(self, clause: CQLSearchClause, version: str) -> str:
+        # a search clause without its term, but what of the term changes
+        # the SQL text
+        relation = relation_name(clause, version)
+        modifiers = relation_modifiers(clause.relation)
+        kind = _term_kind(relation, clause.term, modifiers)
+        return f"[{index_name(clause)!r} {relation!r} {sorted(modifiers.items())!r} {kind}]"
+
+    def _compile(
+        self, query: CQLQuery, clauses: List[CQLSearchClause], version: str
+    ) -> Tuple[str, List[Binder], str, List[Any]]:
+        # SQL text (a boolean in parentheses) by node and the binder by
+        # search clause, post order without recursion
+        sqls: Dict[int, str] = dict()
+        binders: Dict[int, Binder] = dict()
+        operands: Dict[int, List[Node]] = dict()
+
+        todo: List[Tuple[Node, bool]] = [(query.root, False)]
+        while todo:
+            node, ready = todo.pop()
+            if isinstance(node, CQLSearchClause):
+                relation = relation_name(node, version)
+                modifiers = relation_modifiers(node.relation)
+                kind = _term_kind(relation, node.term, modifiers)
+                sqls[id(node)], binders[id(node)] = self._clause(
+                    node, relation, modifiers, kind
+                )
+                continue
+
+            op = node.operator.value.lower()
+            if not ready:
+                children = (
+                    flatten_run(node, op) if op != "not" else [node.left, node.right]
+                )
+                operands[id(node)] = children
+                todo.append((node, True))
+                todo.extend((child, False) for child in children)
+                continue
+
+            parts = [sqls.pop(id(child)) for child in operands.pop(id(node))]
+            if op == "not":
+                sqls[id(node)] = f"({parts[0]} AND NOT COALESCE({parts[1]}, 0))"
+            else:
+                sqls[id(node)] = "(" + f" {op.upper()} ".join(parts) + ")"
+
+        where = sqls[id(query.root)]
+        if not isinstance(query.root, CQLSearchClause):
+            where = where[1:-1]
+        order_by, order_params, omitted = self._order_by(query.root.sortSpecs or ())
+        if omitted:
+            where = " AND ".join([f"({where})"] + omitted)
+        return (
+            where,
+            [binders[id(clause)] for clause in clauses],
+            order_by,
+            order_params,
+        )
+
+    def _clause(
+        self,
+        clause: CQLSearchClause,
+        relation: str,
+        modifiers: Mapping[str, Optional[str]],
+        kind: str,
+    ) -> Tuple[str, Binder]:
+        # SQL text of a search clause and its binder
+        index = index_name(clause)
+        if index == CQL_ALL_RECORDS:
+            return "1 = 1", _no_values
+        columns = self.column_names(index)
+        num = len(columns)
+        p = self.placeholder
+
+        if REGEXP in modifiers:
+            return self._regexp(columns, relation, modifiers)
+
+        if relation in WORD_RELATIONS:
+            ignore_case = "respectcase" not in modifiers
+            masked = UNMASKED not in modifiers
+            if self.regexp:
+                return self._words_regexp(columns, relation, kind, masked, ignore_case)
+            if kind == "value":
+                # no words (e.g. an empty term), the whole value
+                expr = "lower({})" if ignore_case else "{}"
+                return (
+                    _any_column(expr + " = " + p, columns),
+                    lambda term: [term.lower() if ignore_case else term] * num,
+                )
+            padded = [
+                _padded(column, self.separators, ignore_case) for column in columns
+            ]
+            slot = _any_column("{} LIKE " + p + _ESCAPE, padded)
+            if relation in ("any", "all"):
+                sql = _join(
+                    [slot] * int(kind), " OR " if relation == "any" else " AND "
+                )
+
+                def bind_words(term: str) -> List[Any]:
+                    return [
+                        pattern
+                        for word in _term_words(term, masked)
+                        for pattern in [_words_like([word], masked, ignore_case)] * num
+                    ]
+
+                return sql, bind_words
+            return (
+                slot,
+                lambda term: [
+                    _words_like(_term_words(term, masked), masked, ignore_case)
+                ]
+                * num,
+            )
+
+        ignore_case = "ignorecase" in modifiers
+        type_ = value_type(modifiers)
+        expr = "{}"
+        if type_ == "number":
+            expr = "CAST({} AS REAL)"
+        elif ignore_case and not (kind == "pattern" and self.regexp):
+            expr = "lower({})"
+
+        if relation in ("==", "exact", "<>"):
+            if kind == "pattern" and self.regexp:
+                # the whole value, case as for compiled predicates
+                equal, differ = "{} REGEXP " + p, "{} NOT REGEXP " + p
+                value: Callable[[str], Any] = partial(
+                    _value_regexp, ignore_case=ignore_case
+                )
+            elif kind == "pattern":
+                equal = expr + " LIKE " + p + _ESCAPE
+                differ = expr + " NOT LIKE " + p + _ESCAPE
+                value = partial(_like_value, ignore_case=ignore_case)
+            else:
+                equal, differ = expr + " = " + p, expr + " <> " + p
+                literal = type_ is None and UNMASKED not in modifiers
+                value = partial(
+                    _literal_value if literal else _bind_value,
+                    type_=type_,
+                    ignore_case=ignore_case,
+                )
+
+            if relation != "<>":
+                sql = _any_column(equal, columns)
+            elif num == 1:
+                sql = differ.format(columns[0])
+            else:
+                # a value, but none equal to the term
+                sql = (
+                    f"({_any_column('{} IS NOT NULL', columns)}"
+                    f" AND NOT COALESCE({_any_column(equal, columns)}, 0))"
+                )
+            return sql, lambda term: [value(term)] * num
+
+        value = partial(_bind_value, type_=type_, ignore_case=ignore_case)
+        if relation in OPERATORS:
+            sql = _any_column(f"{expr} {OPERATORS[relation]} {p}", columns)
+            return sql, lambda term: [value(term)] * num
+
+        if relation == "within":
+
+            def bind_bounds(term: str) -> List[Any]:
+                bounds = term.split()
+                if len(bounds) != 2:
+                    raise CQLCompileError(
+                        f"Relation 'within' needs two values, not {term!r}"
+                    )
+                return [value(bound) for bound in bounds] * num
+
+            return _any_column(f"{expr} BETWEEN {p} AND {p}", columns), bind_bounds
+        raise CQLCompileError(f"Unsupported relation {relation!r}")
+
+    def _words_regexp(
+        self,
+        columns: List[str],
+        relation: str,
+        kind: str,
+        masked: bool,
+        ignore_case: bool,
+    ) -> Tuple[str, Binder]:
+        # word relations with the regular expressions of compiled predicates
+        num = len(columns)
+        slot = _any_column("{} REGEXP " + self.placeholder, columns)
+        if kind == "value":
+            # no words (e.g. an empty term), the whole value
+            return (
+                slot,
+                lambda term: [_flags(ignore_case) + rf"\A{re.escape(term)}\Z"] * num,
+            )
+        if relation == "all":
+            # each word on its own (in any of the columns)
+            sql = _join([slot] * int(kind), " AND ")
+
+            def bind_words(term: str) -> List[Any]:
+                return [
+                    pattern
+                    for word in _term_words(term, masked)
+                    for pattern in [_words_regexp("=", [word], masked, ignore_case)]
+                    * num
+                ]
+
+            return sql, bind_words
+        return (
+            slot,
+            lambda term: [
+                _words_regexp(relation, _term_words(term, masked), masked, ignore_case)
+            ]
+            * num,
+        )
+
+    def _regexp(
+        self,
+        columns: List[str],
+        relation: str,
+        modifiers: Mapping[str, Optional[str]],
+    ) -> Tuple[str, Binder]:
+        # searched for by word relations, the whole value for == / <>
+        if relation in WORD_RELATIONS:
+            ignore_case = "respectcase" not in modifiers
+            whole = False
+        elif relation in ("==", "exact", "<>"):
+            ignore_case = "ignorecase" in modifiers
+            whole = True
+        else:
+            raise CQLCompileError(f"Relation {relation!r} does not support /regexp")
+        num = len(columns)
+
+        def bind(term: str) -> List[Any]:
+            compile_regexp(term, ignore_case)
+            pattern = rf"\A(?:{term})\Z" if whole else term
+            return [f"(?i){pattern}" if ignore_case else pattern] * num
+
+        operator = "NOT REGEXP" if relation == "<>" else "REGEXP"
+        return _any_column(f"{{}} {operator} {self.placeholder}", columns), bind
+
+    def _order_by(
+        self, sortSpecs: Sequence[CQLSortSpec]
+    ) -> Tuple[str, List[Any], List[str]]:
+        # ORDER BY items, their values and conditions for /missingOmit
+        items: List[str] = list()
+        params: List[Any] = list()
+        omitted: List[str] = list()
+        for spec in sortSpecs:
+            columns = self.column_names(spec.index.name.lower())
+            if len(columns) != 1:
+                raise CQLCompileError(f"Sort key {str(spec.index)!r} needs one column")
+            column = columns[0]
+            descending = ignore_case = False
+            missing = "missinglast"
+            for modifier in spec.modifiers or ():
+                name = modifier.name.basename.lower()
+                if name in ("ascending", "descending"):
+                    descending = name == "descending"
+                elif name == "ignorecase":
+                    ignore_case = True
+                elif name in MISSING_MODIFIERS and name != "missingfail":
+                    missing = name
+                elif name == "missingvalue" and modifier.value is not None:
+                    # a number for a number key, as in cql.sorting
+                    missing = name
+                    number = parse_number(modifier.value)
+                    params.append(modifier.value if number is None else number)
+                elif name not in IGNORED_MODIFIERS:
+                    raise CQLCompileError(
+                        f"Unsupported sort modifier {modifier.toCQL()!r}"
+                    )
+            expr = column
+            if missing == "missingvalue":
+                expr = f"COALESCE({column}, {self.placeholder})"
+            elif missing == "missingomit":
+                omitted.append(f"{column} IS NOT NULL")
+            else:
+                # missing values before (IS NULL descending) or after all
+                first = missing == ("missinghigh" if descending else "missinglow")
+                items.append(f"{column} IS NULL" + (" DESC" if first else ""))
+            if ignore_case:
+                expr = f"lower({expr})"
+            items.append(expr + (" DESC" if descending else ""))
+        return ", ".join(items), params, omitted
+
+    def __repr__(self) -> str:
+        return f"CQLSQLCompiler[{len(self.columns)} indexes]"
+
+
+# ---------------------------------------------------------------------------
+
+
+def _term_kind(relation: str, term: str, modifiers: Mapping[str, Optional[str]]) -> str:
+    # what of a term changes the SQL text of its clause
+    if REGEXP in modifiers:
+        return "regexp"
+    if relation in WORD_RELATIONS:
+        words = _term_words(term, UNMASKED not in modifiers)
+        if not words:
+            return "value"
+        return str(len(words)) if relation in ("any", "all") else "words"
+    if (
+        relation in ("==", "exact", "<>")
+        and value_type(modifiers) is None
+        and UNMASKED not in modifiers
+        and parse_mask(term, whole=True).literal is None
+    ):
+        return "pattern"
+    return "value"
+
+
+def _term_words(term: str, masked: bool) -> List[str]:
+    # (masked) words of a term, as compiled predicates take them
+    return masked_words(term) if masked else WORD_RE.findall(term)
+
+
+def _like(text: str, masked: bool = True) -> str:
+    # LIKE pattern (escaped with \) of a masked word or value
+    chars: List[str] = list()
+    pos = 0
+    while pos < len(text):
+        char = text[pos]
+        pos += 1
+        if char == "\\" and pos < len(text):
+            char = text[pos]
+            pos += 1
+        elif masked and char in "*?":
+            chars.append("%" if char == "*" else "_")
+            continue
+        if char in "%_\\":
+            chars.append("\\")
+        chars.append(char)
+    return "".join(chars)
+
+
+def _unanchored(word: str) -> Tuple[str, bool, bool]:
+    # a masked word without its ^ anchors, whether anchored at start / end
+    start = word.startswith("^")
+    if start:
+        word = word[1:]
+    end = word.endswith("^") and not word.endswith("\\^")
+    if end:
+        word = word[:-1]
+    return word, start, end
+
+
+def _padded(column: str, separators: str, ignore_case: bool) -> str:
+    # a value with separators as single spaces and padded with spaces, so
+    # a word is `` word `` in it
+    expr = column
+    for char in separators:
+        expr = "replace({}, '{}', ' ')".format(expr, char.replace("'", "''"))
+    for _ in range(_COLLAPSE):
+        expr = f"replace({expr}, '  ', ' ')"
+    if ignore_case:
+        expr = f"lower({expr})"
+    return f"(' ' || {expr} || ' ')"
+
+
+def _words_like(words: List[str], masked: bool, ignore_case: bool) -> str:
+    # LIKE pattern of a phrase in a padded value (see _padded)
+    likes: List[str] = list()
+    start = end = False
+    for pos, word in enumerate(words):
+        if masked:
+            word, word_start, word_end = _unanchored(word)
+            start = start or (word_start and pos == 0)
+            end = word_end and pos == len(words) - 1
+        # a lone * is a (non empty) word
+        likes.append("_%" if masked and word == "*" else _like(word, masked))
+    pattern = " " + " ".join(likes) + " "
+    if ignore_case:
+        pattern = pattern.lower()
+    return ("" if start else "%") + pattern + ("" if end else "%")
+
+
+def _words_regexp(
+    relation: str, words: List[str], masked: bool, ignore_case: bool
+) -> str:
+    # regular expression of the words of a term, as compiled predicates
+    # search for them (see cql.predicate)
+    masks = [parse_mask(word, masked) for word in words]
+    if relation == "any":
+        pattern = "|".join(f"(?:{words_pattern([mask])})" for mask in masks)
+    else:
+        pattern = words_pattern(masks)
+    return _flags(ignore_case) + pattern
+
+
+def _flags(ignore_case: bool) -> str:
+    return "(?i)" if ignore_case else ""
+
+
+def _bind_value(term: str, type_: Optional[str], ignore_case: bool) -> Any:
+    # bind value of a term compared with values
+    if type_ == "number":
+        number = parse_number(term)
+        if number is None:
+            raise CQLCompileError(f"Not a valid number for /number: {term!r}")
+        return number
+    if type_ == "isodate":
+        date = parse_date(term)
+        if date is None:
+            raise CQLCompileError(f"Not a valid isodate for /isodate: {term!r}")
+        return date.date().isoformat() if date.time() == time() else date.isoformat()
+    if ignore_case:
+        return term.lower()
+    # a number for numbers (in columns of any type), as in compiled
+    # predicates; the same text for text columns
+    number = parse_number(term)
+    return number if number is not None and str(number) == term else term
+
+
+def _literal_value(term: str, type_: Optional[str], ignore_case: bool) -> Any:
+    # bind value of a masked term without masking characters
+    literal = parse_mask(term, whole=True).literal
+    return _bind_value(literal or "", type_, ignore_case)
+
+
+def _like_value(term: str, ignore_case: bool) -> str:
+    # LIKE pattern of a whole value
+    pattern = _like(_unanchored(term)[0])
+    return pattern.lower() if ignore_case else pattern
+
+
+def _value_regexp(term: str, ignore_case: bool) -> str:
+    # regular expression of a masked term matching the whole value
+    pattern = parse_mask(term, whole=True).pattern
+    return ("(?is)" if ignore_case else "(?s)") + rf"\A(?:{pattern})\Z"
+
+
+def _any_column(template: str, columns: List[str]) -> str:
+    # a condition on any of the columns
+    return _join([template.format(column) for column in columns], " OR ")
+
+
+def _join(conditions: List[str], op: str) -> str:
+    return conditions[0] if len(conditions) == 1 else "(" + op.join(conditions) + ")"
+
+
+def _no_values(term: str) -> List[Any]:
+    return []
+
+
+# ---------------------------------------------------------------------------
+
+
+def register_functions(connection: Any) -> None:
+    """Registers ``REGEXP`` (Python regular expressions, for ``/regexp`` and
+    compilers with ``regexp``) with an :mod:`sqlite3` connection."""
+    connection.create_function("regexp", 2, _regexp, deterministic=True)
+
+
+def _regexp(pattern: Optional[str], value: Any) -> Optional[bool]:
+    # X REGEXP Y is regexp(Y, X)
+    if pattern is None or value is None:
+        return None
+    return compile_pattern(pattern).search(str(value)) is not None
+
+
+def compile_sql(
+    query: CQLQuery,
+    columns: Mapping[str, Column],
+    placeholder: str = "?",
+    regexp: bool = False,
+) -> CQLSQLStatement:
+    """Compiles a query into parameterized SQL, see :class:`CQLSQLCompiler`."""
+    return CQLSQLCompiler(columns, placeholder, regexp=regexp).compile(query)
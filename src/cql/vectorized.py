@@ -0,0 +1,333 @@
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+from typing import Union
+
+from cql.masking import REGEXP
+from cql.masking import UNMASKED
+from cql.masking import parse_mask
+from cql.parser import CQL_DEFAULT_INDEX
+from cql.parser import CQLQuery
+from cql.parser import CQLSearchClause
+from cql.parser import CQLTriple
+from cql.predicate import CQL_ALL_RECORDS
+from cql.predicate import VALUE_RELATIONS
+from cql.predicate import WORD_RELATIONS
+from cql.predicate import CQLCompileError
+from cql.predicate import CQLPredicateCompiler
+from cql.predicate import flatten_run
+from cql.predicate import index_name
+from cql.predicate import parse_number
+from cql.predicate import relation_modifiers
+from cql.predicate import relation_name
+
+try:
+    import numpy as np
+except ImportError as exc:  # pragma: no cover
+    raise ImportError(
+        "cql.vectorized needs numpy, install with: pip install cql-parser[numpy]"
+    ) from exc
+
+# ---------------------------------------------------------------------------
+
+
+Node = Union[CQLTriple, CQLSearchClause]
+
+#: column name or several column names (any of them may match)
+Column = Union[str, Sequence[str]]
+
+#: dtype kinds compared as numbers
+NUMBER_KINDS = "iufb"
+#: dtype kinds compared as dates / times
+DATETIME_KINDS = "M"
+#: dtype kinds compared as text (``str`` objects or ``None``)
+TEXT_KINDS = "UO"
+
+#: max. number of factorized text columns kept
+MAX_FACTORIZED = 64
+
+
+class _Frame:
+    # a run of and / or (or a not) while evaluating, its operands and the
+    # mask of the operands done so far
+    __slots__ = ("op", "operands", "next", "mask")
+
+    def __init__(self, node: CQLTriple):
+        self.op = node.operator.value.lower()
+        if self.op == "not":
+            self.operands: List[Node] = [node.left, node.right]
+        elif self.op in ("and", "or"):
+            self.operands = flatten_run(node, self.op)
+        else:
+            raise CQLCompileError(f"Unsupported boolean {self.op!r}")
+        self.next = 0
+        self.mask: Optional[np.ndarray] = None
+
+    def add(self, mask: np.ndarray) -> None:
+        self.next += 1
+        if self.mask is None:
+            self.mask = mask
+        elif self.op == "or":
+            np.logical_or(self.mask, mask, out=self.mask)
+        elif self.op == "and":
+            np.logical_and(self.mask, mask, out=self.mask)
+        else:
+            np.logical_and(self.mask, np.logical_not(mask), out=self.mask)
+
+    @property
+    def done(self) -> bool:
+        if self.next == len(self.operands):
+            return True
+        if self.next == 0 or self.mask is None:
+            return False
+        # the other operands cannot change the result
+        if self.op == "or":
+            return bool(self.mask.all())
+        return not self.mask.any()
+
+
+class CQLVectorizedEvaluator:
+    """Evaluates queries over a batch of records stored as columns (1-d
+    NumPy arrays of the same length), with one boolean mask per search
+    clause and in-place mask operations for booleans (``and`` / ``or``
+    runs stop once the result cannot change anymore).
+
+    Relations mean the same as for :class:`cql.predicate.CQLPredicateCompiler`.
+
+    * number and ``datetime64`` columns are compared with the term as a
+      number / date (parsed once), ``NaN`` / ``NaT`` match nothing
+    * text columns (``str`` or ``object`` dtype with ``str`` or ``None``)
+      are factorized once per batch: the relation is checked once for each
+      distinct value and the result is mapped back to the rows; ``==`` and
+      ``<>`` on ``str`` columns are compared directly
+
+    Args:
+        columns: arrays by column name (the batch)
+        fields: column name (or several names) by index name, by default
+            the lower case index name is the column name and
+            ``cql.serverChoice`` looks at all columns
+    """
+
+    def __init__(
+        self,
+        columns: Mapping[str, Any],
+        fields: Optional[Mapping[str, Column]] = None,
+    ):
+        self.columns = {name: np.asarray(column) for name, column in columns.items()}
+        lengths = {len(column) for column in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"Columns have different lengths: {sorted(lengths)}")
+        if any(column.ndim != 1 for column in self.columns.values()):
+            raise ValueError("Columns must be one dimensional")
+        self.length = lengths.pop() if lengths else 0
+
+        self.fields = {name.lower(): field for name, field in (fields or {}).items()}
+        self._matchers = CQLPredicateCompiler()
+        #: distinct values of text columns and their index for each row
+        self._factorized: Dict[str, Tuple[np.ndarray, np.ndarray]] = dict()
+
+    def evaluate(self, query: CQLQuery) -> np.ndarray:
+        """Boolean mask of the rows matching a query.
+
+        Raises:
+            CQLCompileError: for unsupported booleans (``prox``), relations
+                or unknown columns
+        """
+        version = query.version
+        if isinstance(query.root, CQLSearchClause):
+            return self.clause_mask(query.root, version)
+
+        # explicit stack (no recursion), the operands of a run are evaluated
+        # one after the other so a run can stop early
+        stack = [_Frame(query.root)]
+        while True:
+            frame = stack[-1]
+            if frame.done:
+                stack.pop()
+                mask = frame.mask
+                if not stack:
+                    return mask
+                stack[-1].add(mask)
+                continue
+
+            operand = frame.operands[frame.next]
+            if isinstance(operand, CQLSearchClause):
+                frame.add(self.clause_mask(operand, version))
+            else:
+                stack.append(_Frame(operand))
+
+    def filter(self, query: CQLQuery) -> np.ndarray:
+        """Indices of the rows matching a query."""
+        return np.flatnonzero(self.evaluate(query))
+
+    # ---------------------------------------------------
+
+    def column_names(self, index: str) -> List[str]:
+        """Names of the columns of an (lower case) index."""
+        field = self.fields.get(index)
+        if field is None and index == CQL_DEFAULT_INDEX.lower():
+            return list(self.columns)
+        if field is None:
+            field = index
+        names = [field] if isinstance(field, str) else list(field)
+        for name in names:
+            if name not in self.columns:
+                raise CQLCompileError(f"No column {name!r} for index {index!r}")
+        return names
+
+    def clause_mask(self, clause: CQLSearchClause, version: str = "1.2") -> np.ndarray:
+        """Boolean mask of the rows matching a search clause (a new array)."""
+        if index_name(clause) == CQL_ALL_RECORDS:
+            return np.ones(self.length, dtype=bool)
+        mask: Optional[np.ndarray] = None
+        for name in self.column_names(index_name(clause)):
+            column_mask = self._column_mask(name, clause, version)
+            if mask is None:
+                mask = column_mask
+            else:
+                np.logical_or(mask, column_mask, out=mask)
+        if mask is None:
+            return np.zeros(self.length, dtype=bool)
+        return mask
+
+    def _column_mask(
+        self, name: str, clause: CQLSearchClause, version: str
+    ) -> np.ndarray:
+        column = self.columns[name]
+        kind = column.dtype.kind
+        if kind in TEXT_KINDS:
+            return self._text_mask(name, clause, version)
+        if kind in NUMBER_KINDS:
+            return _scalar_mask(column, clause, version, parse_number)
+        if kind in DATETIME_KINDS:
+            return _scalar_mask(column, clause, version, _parse_datetime)
+        raise CQLCompileError(f"Unsupported dtype {column.dtype} of column {name!r}")
+
+    def _text_mask(
+        self, name: str, clause: CQLSearchClause, version: str
+    ) -> np.ndarray:
+        column = self.columns[name]
+        relation = relation_name(clause, version)
+        modifiers = relation_modifiers(clause.relation)
+        if (
+            column.dtype.kind == "U"
+            and relation in ("==", "exact", "<>")
+            and "ignorecase" not in modifiers
+            and REGEXP not in modifiers
+        ):
+            # unless the term is masked
+            term = clause.term
+            if UNMASKED not in modifiers:
+                term = parse_mask(term, whole=True).literal
+            if term is not None:
+                if relation == "<>":
+                    return column != term
+                return column == term
+
+        # the relation once for each distinct value
+        match = self._matchers.matcher(clause, version)
+        uniques, inverse = self._factorize(name)
+        hits = np.fromiter(
+            (value is not None and match(value) for value in uniques.tolist()),
+            dtype=bool,
+            count=len(uniques),
+        )
+        return hits[inverse]
+
+    def _factorize(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        factorized = self._factorized.get(name)
+        if factorized is not None:
+            return factorized
+
+        column = self.columns[name]
+        if column.dtype.kind == "O":
+            # None sorts with nothing, it gets its own code at the end
+            nulls = np.equal(column, None)
+            uniques, codes = np.unique(column[~nulls].astype(str), return_inverse=True)
+            inverse = np.full(len(column), len(uniques), dtype=codes.dtype)
+            inverse[~nulls] = codes
+            uniques = np.append(uniques.astype(object), None)
+        else:
+            uniques, inverse = np.unique(column, return_inverse=True)
+
+        if len(self._factorized) >= MAX_FACTORIZED:
+            self._factorized.clear()
+        self._factorized[name] = (uniques, inverse)
+        return uniques, inverse
+
+
+# ---------------------------------------------------------------------------
+
+
+def _parse_datetime(term: str) -> Optional[np.datetime64]:
+    try:
+        return np.datetime64(term)
+    except ValueError:
+        return None
+
+
+def _scalar_mask(
+    column: np.ndarray, clause: CQLSearchClause, version: str, parse
+) -> np.ndarray:
+    # number / date columns, the term (or its words) parsed once
+    relation = relation_name(clause, version)
+    term = clause.term
+    valid: Optional[np.ndarray] = None  # not NaN / NaT
+    if column.dtype.kind == "M":
+        valid = ~np.isnat(column)
+    elif column.dtype.kind == "f":
+        valid = ~np.isnan(column)
+
+    if relation in WORD_RELATIONS:
+        values = [parse(word) for word in term.split()]
+        if relation == "any":
+            values = [value for value in values if value is not None]
+            return (
+                np.isin(column, values) if values else np.zeros(len(column), dtype=bool)
+            )
+        # a value is a single word, so all words must be the same value
+        if not values or any(value is None or value != values[0] for value in values):
+            return np.zeros(len(column), dtype=bool)
+        return column == values[0]
+
+    if relation in VALUE_RELATIONS:
+        value = parse(term)
+        compare = VALUE_RELATIONS[relation]
+        if value is None and relation in ("==", "exact"):
+            return np.zeros(len(column), dtype=bool)
+        if value is None and relation == "<>":
+            return np.ones(len(column), dtype=bool) if valid is None else valid
+        if value is None:
+            raise CQLCompileError(
+                f"Cannot compare {term!r} with a {column.dtype} column"
+            )
+        mask = compare(column, value)
+        if relation == "<>" and valid is not None:
+            np.logical_and(mask, valid, out=mask)
+        return mask
+
+    if relation == "within":
+        bounds = [parse(bound) for bound in term.split()]
+        if len(bounds) != 2 or bounds[0] is None or bounds[1] is None:
+            raise CQLCompileError(f"Relation 'within' needs two values, not {term!r}")
+        mask = column >= bounds[0]
+        np.logical_and(mask, column <= bounds[1], out=mask)
+        return mask
+    raise CQLCompileError(f"Unsupported relation {relation!r}")
+
+
+# ---------------------------------------------------------------------------
+
+
+def evaluate(
+    query: CQLQuery,
+    columns: Mapping[str, Any],
+    fields: Optional[Mapping[str, Column]] = None,
+) -> np.ndarray:
+    """Boolean mask of the rows of a columnar batch matching a query, see
+    :class:`CQLVectorizedEvaluator`."""
+    return CQLVectorizedEvaluator(columns, fields).evaluate(query)
@@ -0,0 +1,75 @@
+import random
+
+import pytest
+
+from cql.engine.bitmap import CHUNK_SIZE
+from cql.engine.bitmap import MAX_ARRAY
+from cql.engine.bitmap import CQLBitmap
+from cql.engine.postings import postings
+
+# ---------------------------------------------------------------------------
+
+
+def random_ids(rnd: random.Random, density: float, num_chunks: int = 3):
+    # sparse and dense chunks, and empty ones
+    ids = set()
+    for chunk in range(num_chunks):
+        if rnd.random() < 0.2:
+            continue
+        chunk_density = density * rnd.choice([0.01, 1, 5])
+        base = chunk * CHUNK_SIZE
+        num = min(CHUNK_SIZE, int(CHUNK_SIZE * chunk_density))
+        ids.update(base + i for i in rnd.sample(range(CHUNK_SIZE), num))
+    return ids
+
+
+def bitmap(ids) -> CQLBitmap:
+    return CQLBitmap.from_postings(sorted(ids))
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_containers():
+    sparse = bitmap(range(0, CHUNK_SIZE, 100))
+    dense = bitmap(range(0, CHUNK_SIZE, 2))
+    assert "0 bitmaps" in repr(sparse) and "1 bitmaps" in repr(dense)
+    # dense & dense may be sparse again
+    shifted = bitmap(range(1, CHUNK_SIZE, 2))
+    assert repr(dense & shifted) == "CQLBitmap[0 ids, 0 containers, 0 bitmaps]"
+    assert "0 bitmaps" in repr(dense & bitmap(range(0, MAX_ARRAY * 2, 2)))
+    assert "1 bitmaps" in repr(sparse | dense)
+
+
+def test_range():
+    assert CQLBitmap.range(0).to_postings().tolist() == []
+    assert CQLBitmap.range(5).to_postings().tolist() == [0, 1, 2, 3, 4]
+    universe = CQLBitmap.range(CHUNK_SIZE * 2 + 10)
+    assert len(universe) == CHUNK_SIZE * 2 + 10
+    assert CHUNK_SIZE * 2 + 9 in universe and CHUNK_SIZE * 2 + 10 not in universe
+    assert bitmap([3, CHUNK_SIZE + 1]).complement(5).to_postings().tolist() == [
+        0,
+        1,
+        2,
+        4,
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_as_sets(seed: int):
+    rnd = random.Random(seed)
+    for density in (0.001, 0.03, 0.2):
+        a, b = random_ids(rnd, density), random_ids(rnd, density)
+        x, y = bitmap(a), bitmap(b)
+        assert x.to_postings().tolist() == sorted(a)
+        assert list(x) == sorted(a) and len(x) == len(a) and bool(x) == bool(a)
+        assert (x & y).to_postings().tolist() == sorted(a & b)
+        assert (x | y).to_postings().tolist() == sorted(a | b)
+        assert (x - y).to_postings().tolist() == sorted(a - b)
+        assert (y - x).to_postings().tolist() == sorted(b - a)
+        assert CQLBitmap.union_all([x, y, x]) == x | y
+
+        sample = postings(sorted(rnd.sample(range(CHUNK_SIZE * 3), 500)))
+        assert x.filter(sample).tolist() == sorted(a.intersection(sample))
+        assert x.exclude(sample).tolist() == sorted(set(sample) - a)
+        assert all((i in x) == (i in a) for i in sample)
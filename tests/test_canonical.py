@@ -0,0 +1,131 @@
+import glob
+import os.path
+
+import pytest
+
+from cql.parser import CQLModifier
+from cql.parser import CQLParser
+from cql.parser import CQLParser11
+from cql.parser import CQLParser12
+from cql.parser import CQLRelation
+from cql.parser import escape_name
+
+# ---------------------------------------------------------------------------
+
+
+REGRESSION_QUERIES = sorted(
+    glob.glob(os.path.join(os.path.dirname(__file__), "regression", "*", "*.cql"))
+)
+
+
+def load_query(fname: str) -> str:
+    with open(fname, "r") as fp:
+        return fp.read()
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_escape_name():
+    assert escape_name("DC.Title") == "dc.title"
+    assert escape_name("My Index") == '"my index"'
+
+
+def test_canonical_parts():
+    assert (
+        CQLModifier("Rel.Algorithm", "=", "CORI").canonical() == "/rel.algorithm=CORI"
+    )
+    assert CQLModifier("sort.DESCENDING").canonical() == "/sort.descending"
+    relation = CQLRelation(
+        "ANY", [CQLModifier("rel.b"), CQLModifier("rel.a", "=", "x y")]
+    )
+    assert relation.canonical() == 'any/rel.a="x y"/rel.b'
+    assert CQLRelation("<=").canonical() == "<="
+
+
+@pytest.mark.parametrize(
+    "queries",
+    [
+        ["fish", "cql.serverChoice = fish", 'CQL.SERVERCHOICE = "fish"', "(fish)"],
+        ["a and b and c", "a AND (b and c)", "(a And b) and ((c))"],
+        ["a or b or c", "a or (b OR c)"],
+        ["(a or b) and c", "a or b and c"],
+        ["dc.title any/rel.b/rel.a=X fish", 'DC.TITLE "ANY"/REL.A=X/Rel.B "fish"'],
+        [
+            "> dc = info:x dc.title = a sortby dc.date/sort.descending",
+            '> DC = "info:x" (dc.title = "a") SORTBY dc.DATE/Sort.Descending',
+        ],
+    ],
+)
+def test_canonical_same(parser: CQLParser, queries):
+    canonicals = {parser.parse(query).canonical() for query in queries}
+    fingerprints = {parser.parse(query).fingerprint() for query in queries}
+    assert len(canonicals) == 1 and len(fingerprints) == 1
+
+
+@pytest.mark.parametrize(
+    "query1, query2",
+    [
+        ("fish", "Fish"),  # terms keep their case
+        ("a and b", "b and a"),  # order of operands is kept
+        ("a or (b and c)", "(a or b) and c"),
+        ("a not (b not c)", "(a not b) not c"),  # not is not associative
+        ("a = b", "a == b"),
+        ("a =/rel.x=1 b", "a =/rel.x=2 b"),
+        ("a sortby b", "a sortby c"),
+        ("> dc = x a", "> dc = y a"),
+    ],
+)
+def test_canonical_different(parser: CQLParser, query1: str, query2: str):
+    query1 = parser.parse(query1)
+    query2 = parser.parse(query2)
+    assert query1.canonical() != query2.canonical()
+    assert query1.fingerprint() != query2.fingerprint()
+
+
+def test_canonical_examples(parser: CQLParser):
+    def canonical(query: str) -> str:
+        return parser.parse(query).canonical()
+
+    assert canonical("a AND (b and c)") == (
+        "cql.serverchoice = a and cql.serverchoice = b and cql.serverchoice = c"
+    )
+    assert canonical("a or (b and c)") == (
+        "cql.serverchoice = a or (cql.serverchoice = b and cql.serverchoice = c)"
+    )
+    # only the same boolean without modifiers is flattened
+    assert canonical("a and/rel.x (b and/rel.x c)") == (
+        "cql.serverchoice = a and/rel.x (cql.serverchoice = b and/rel.x cql.serverchoice = c)"
+    )
+    assert canonical("a and (> dc = x b)") == (
+        "cql.serverchoice = a and (> dc = x cql.serverchoice = b)"
+    )
+    assert canonical('dc.title ANY "fish food" sortBy dc.Date') == (
+        'dc.title any "fish food" sortby dc.date'
+    )
+
+
+def test_canonical_default_relation(parser11: CQLParser11, parser12: CQLParser12):
+    assert parser11.parse("fish").canonical() == "cql.serverchoice scr fish"
+    assert parser12.parse("fish").canonical() == "cql.serverchoice = fish"
+    assert (
+        parser11.parse("cql.serverChoice = fish").fingerprint()
+        == parser12.parse("fish").fingerprint()
+    )
+
+
+def test_fingerprint_stable(parser: CQLParser):
+    fingerprint = parser.parse("fish").fingerprint()
+    assert len(fingerprint) == 16
+    assert fingerprint == "8846fe3e16f3315a"
+
+
+@pytest.mark.parametrize("fname", REGRESSION_QUERIES)
+def test_canonical_roundtrip(parser11: CQLParser11, parser12: CQLParser12, fname: str):
+    query = load_query(fname)
+    for parser in (parser11, parser12):
+        try:
+            canonical = parser.parse(query).canonical()
+        except Exception:
+            continue
+        assert parser.parse(canonical).canonical() == canonical
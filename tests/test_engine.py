@@ -0,0 +1,215 @@
+import random
+
+import pytest
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.engine.bitmap import CQLBitmap
+from cql.engine.postings import difference
+from cql.engine.postings import gallop
+from cql.engine.postings import intersect
+from cql.engine.postings import intersect_all
+from cql.engine.postings import postings
+from cql.engine.postings import union_all
+from cql.parser import CQLParser
+from cql.predicate import CQLCompileError
+
+# ---------------------------------------------------------------------------
+
+
+WORDS = ["fish", "chips", "history", "science", "cat", "dog", "Fish"]
+
+
+def make_documents(rnd: random.Random, num: int):
+    return [
+        {
+            "title": " ".join(rnd.choices(WORDS, k=rnd.randint(1, 3))),
+            "subject": rnd.sample(WORDS, rnd.randint(0, 2)),
+            "format": rnd.choice(["book", "article", "map", None]),
+        }
+        for _ in range(num)
+    ]
+
+
+def random_query(rnd: random.Random, depth: int) -> str:
+    if depth == 0 or rnd.random() < 0.3:
+        index = rnd.choice(["title", "subject", "format", "cql.serverChoice"])
+        relation = rnd.choice(["=", "any", "all", "==", "<>"])
+        if relation in ("==", "<>"):
+            term = rnd.choice(["book", "map", "fish", "Fish"])
+        elif relation == "=":
+            term = rnd.choice(WORDS)
+        else:
+            term = " ".join(rnd.sample(WORDS, 2))
+        return f'{index} {relation} "{term}"'
+    op = rnd.choice(["and", "or", "not"])
+    return f"({random_query(rnd, depth - 1)}) {op} ({random_query(rnd, depth - 1)})"
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_gallop():
+    values = postings([1, 3, 5, 7, 9, 11])
+    assert [gallop(values, target) for target in (0, 1, 2, 11, 12)] == [0, 0, 1, 5, 6]
+    assert gallop(values, 4, lo=3) == 3
+
+
+@pytest.mark.parametrize("size", [10, 10000])
+def test_postings(size: int):
+    rnd = random.Random(size)
+    a = sorted(rnd.sample(range(size * 4), size))
+    b = sorted(rnd.sample(range(size * 4), 20))
+    c = sorted(rnd.sample(range(size * 4), size))
+    pa, pb, pc = postings(a), postings(b), postings(c)
+
+    assert intersect(pa, pb).tolist() == sorted(set(a) & set(b))
+    assert intersect(pb, pa).tolist() == sorted(set(a) & set(b))
+    assert intersect(pa, pc).tolist() == sorted(set(a) & set(c))
+    assert intersect_all([pa, pb, pc]).tolist() == sorted(set(a) & set(b) & set(c))
+    assert union_all([pa, pb, pc]).tolist() == sorted(set(a) | set(b) | set(c))
+    assert difference(pa, pb).tolist() == sorted(set(a) - set(b))
+    assert difference(pb, pa).tolist() == sorted(set(b) - set(a))
+    assert difference(pa, pc).tolist() == sorted(set(a) - set(c))
+    assert intersect_all([]).tolist() == union_all([]).tolist() == []
+
+
+def test_index():
+    index = CQLInvertedIndex()
+    assert index.add({"Title": "Fish and fish", "tags": ["a", None, "b"]}) == 0
+    assert index.add({"title": "Cat", "tags": None, "year": 1990}) == 1
+    assert index.num_docs == 2
+    assert index.postings("title", "fish").tolist() == [0]
+    assert index.postings("title", "Fish").tolist() == []
+    assert index.postings("tags", "b").tolist() == [0]
+    assert index.value_postings("title", "Cat").tolist() == [1]
+    assert index.value_postings("year", "1990").tolist() == [1]
+    assert index.index_postings("tags").tolist() == [0]
+    assert sorted(index.index_names) == ["tags", "title", "year"]
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_same_as_predicate(parser: CQLParser, seed: int):
+    rnd = random.Random(seed)
+    documents = make_documents(rnd, 300)
+    index = CQLInvertedIndex()
+    index.add_all(documents)
+    engine = CQLSearchEngine(index)
+
+    for _ in range(100):
+        query = parser.parse(random_query(rnd, 3))
+        predicate = query.compile()
+        expected = [i for i, document in enumerate(documents) if predicate(document)]
+        assert engine.search(query).tolist() == expected, query.toCQL()
+
+
+def test_server_choice(parser: CQLParser):
+    index = CQLInvertedIndex()
+    index.add({"title": "fish", "subject": "cat"})
+    index.add({"title": "cat", "subject": "fish"})
+    assert CQLSearchEngine(index).search(parser.parse("fish")).tolist() == [0, 1]
+    engine = CQLSearchEngine(index, server_choice=["Title"])
+    assert engine.search(parser.parse("fish")).tolist() == [0]
+    assert engine.count(parser.parse("cql.serverChoice any cat")) == 1
+
+
+def test_results_are_copies(parser: CQLParser):
+    index = CQLInvertedIndex()
+    index.add({"title": "fish"})
+    engine = CQLSearchEngine(index)
+    engine.search(parser.parse("title = fish")).append(5)
+    engine.search(parser.parse("title = dog")).append(5)
+    assert engine.search(parser.parse("title = fish or title = dog")).tolist() == [0]
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["a prox b", 'title = "two words"', "title =/respectCase a", "title encloses x"],
+)
+def test_unsupported(parser: CQLParser, query: str):
+    with pytest.raises(CQLCompileError):
+        CQLSearchEngine(CQLInvertedIndex()).search(parser.parse(query))
+
+
+def test_deep(parser: CQLParser):
+    index = CQLInvertedIndex()
+    index.add_all({"n": str(i)} for i in range(5000))
+    engine = CQLSearchEngine(index)
+    query = parser.parse(" or ".join(f"n = {i}" for i in range(0, 5000, 2)))
+    assert engine.count(query) == 2500
+    query = parser.parse('n any "1 2 3" and (' * 300 + "n <> 2" + ")" * 300)
+    assert engine.search(query).tolist() == [1, 3]
+
+
+def test_bitmaps(parser: CQLParser):
+    # large results as bitmaps, the same results as with posting lists
+    rnd = random.Random(42)
+    index = CQLInvertedIndex()
+    index.add_all(make_documents(rnd, 20000))
+    engine = CQLSearchEngine(index)
+    lists = CQLSearchEngine(index, bitmaps=False)
+
+    query = parser.parse("format = book or format = map")
+    assert isinstance(engine.evaluate(query), CQLBitmap)
+    assert not isinstance(lists.evaluate(query), CQLBitmap)
+    for _ in range(100):
+        query = parser.parse(random_query(rnd, 3))
+        assert engine.search(query) == lists.search(query), query.toCQL()
+        assert engine.count(query) == len(lists.search(query))
+
+    # cached bitmaps are dropped when documents are added
+    before = engine.count(parser.parse("format = book"))
+    index.add({"format": "book"})
+    assert engine.count(parser.parse("format = book")) == before + 1
+
+
+def test_all_records(parser: CQLParser):
+    index = CQLInvertedIndex()
+    index.add_all([{"t": "a"}, {"t": "b"}, {}, {"t": "a b"}])
+    engine = CQLSearchEngine(index)
+    assert engine.search(parser.parse("cql.allRecords = 1 not t = a")).tolist() == [
+        1,
+        2,
+    ]
+    assert engine.count(parser.parse("cql.allRecords = 1")) == 4
+    predicate = parser.parse("cql.allRecords = 1 not t = a").compile()
+    assert [predicate(d) for d in [{"t": "a"}, {"t": "b"}, {}]] == [False, True, True]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "cql.allRecords = 1 or cql.allRecords = 1",
+        "cql.allRecords = 1 or cql.allRecords = 1 or t = a",
+        "t = a or cql.allRecords any 1 or t = b",
+    ],
+)
+def test_all_records_or(parser: CQLParser, query: str):
+    # not merged with other word clauses of an or run by the predicate
+    documents = [{"t": "a"}, {"t": "b"}, {}, {"t": "c"}]
+    index = CQLInvertedIndex()
+    index.add_all(documents)
+    engine = CQLSearchEngine(index)
+    predicate = parser.parse(query).compile()
+    expected = [i for i, document in enumerate(documents) if predicate(document)]
+    assert expected == [0, 1, 2, 3]
+    assert engine.search(parser.parse(query)).tolist() == expected
+
+
+def test_planner(parser: CQLParser):
+    # planned queries have the same results, within the estimate
+    rnd = random.Random(7)
+    index = CQLInvertedIndex()
+    index.add_all(make_documents(rnd, 300))
+    engine = CQLSearchEngine(index)
+    unplanned = CQLSearchEngine(index, planner=False)
+    for _ in range(300):
+        query = parser.parse(random_query(rnd, 4))
+        plan = engine.plan(query)
+        hits = unplanned.search(query)
+        assert engine.search(query) == hits, query.toCQL()
+        assert len(hits) <= plan.estimate
+        assert not plan.empty or not hits
+
+    plan = engine.plan(parser.parse("title = fish and title = nothing"))
+    assert plan.empty and plan.query.toCQL() == "title = nothing and title = fish"
@@ -0,0 +1,172 @@
+import random
+import sqlite3
+
+import pytest
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.fts5 import CQLFTS5Translator
+from cql.fts5 import fts5_match
+from cql.fts5 import fts5_phrase
+from cql.fts5 import fts5_string
+from cql.parser import CQLParser
+from cql.predicate import CQLCompileError
+
+# ---------------------------------------------------------------------------
+
+
+WORDS = ["fish", "fishing", "fiction", "chips", "cat", "cats", "coat", "Fish"]
+FIELDS = {"cql.serverChoice": ["title", "subject"]}
+
+
+def make_records(rnd: random.Random, num: int):
+    return [
+        {
+            "title": rnd.choice([" ", ", ", " - "]).join(
+                rnd.choices(WORDS, k=rnd.randint(1, 6))
+            ),
+            "subject": " ".join(rnd.sample(WORDS, 2)) if rnd.random() < 0.7 else None,
+        }
+        for _ in range(num)
+    ]
+
+
+def random_clause(rnd: random.Random) -> str:
+    index = rnd.choice(["title", "subject", "cql.serverChoice"])
+    relation = rnd.choice(["=", "any", "all", "adj"])
+    words = rnd.sample(WORDS + ["fi*", "fish*", "cat*", "c*"], rnd.randint(1, 3))
+    if relation in ("=", "adj") and rnd.random() < 0.3:
+        words[0] = "^" + words[0]
+    return f'{index} {relation} "{" ".join(words)}"'
+
+
+def random_query(rnd: random.Random, depth: int = 2) -> str:
+    if depth == 0 or rnd.random() < 0.3:
+        return random_clause(rnd)
+    op = rnd.choice(["and", "or", "not"])
+    return f"({random_query(rnd, depth - 1)}) {op} ({random_query(rnd, depth - 1)})"
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / "fts.db"))
+    try:
+        connection.execute("CREATE VIRTUAL TABLE records USING fts5(title, subject)")
+    except sqlite3.OperationalError:  # pragma: no cover
+        connection.close()
+        pytest.skip("SQLite without FTS5")
+    yield connection
+    connection.close()
+
+
+def insert(connection: sqlite3.Connection, records):
+    connection.executemany("INSERT INTO records VALUES (:title, :subject)", records)
+    connection.commit()
+
+
+def match(connection: sqlite3.Connection, expression: str):
+    rows = connection.execute(
+        "SELECT rowid - 1 FROM records WHERE records MATCH ? ORDER BY rowid",
+        [expression],
+    )
+    return [row[0] for row in rows]
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("fish", '"fish"'),
+        ("title = fish", 'title : "fish"'),
+        ('title = "fish and chips"', 'title : "fish and chips"'),
+        ('title adj "fish chi*"', 'title : "fish chi" *'),
+        ('title = "fi* and chips"', 'title : "fi" * + "and chips"'),
+        ('title = "^fish"', 'title : ^ "fish"'),
+        ('title any "fish chi*"', 'title : ("fish" OR "chi" *)'),
+        ('title all "fish chips"', 'title : ("fish" AND "chips")'),
+        ('dc.title =/unmasked "fi*"', 'title : "fi"'),
+        ("subject = a or subject = b", 'subject : "a" OR subject : "b"'),
+        ("a and b and c", '"a" AND "b" AND "c"'),
+        ("a and (b or c) not d", '("a" AND ("b" OR "c")) NOT "d"'),
+        ("keyword = fish", '{title subject} : "fish"'),
+        ("title = fish prox title = chips", 'title : NEAR("fish" "chips", 0)'),
+        (
+            "title any 'fish cat' prox/distance<3 chips",
+            'title : (NEAR("fish" "chips", 1) OR NEAR("cat" "chips", 1))',
+        ),
+    ],
+)
+def test_translate(parser: CQLParser, query: str, expected: str):
+    columns = {"dc.title": "title", "keyword": ["title", "subject"]}
+    assert fts5_match(parser.parse(query.replace("'", '"')), columns) == expected
+
+
+def test_phrase():
+    assert fts5_phrase(["fish"]) == '"fish"'
+    assert fts5_phrase(["a*", "b*"]) == '"a" * + "b" *'
+    assert fts5_phrase(["a*"], masked=False) == '"a*"'
+    assert fts5_string('say "hi"') == '"say ""hi"""'
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_same_as_predicate(parser: CQLParser, connection, seed: int):
+    rnd = random.Random(seed)
+    records = make_records(rnd, 200)
+    insert(connection, records)
+    translator = CQLFTS5Translator()
+    for _ in range(150):
+        query = parser.parse(random_query(rnd))
+        predicate = query.compile(fields=FIELDS)
+        expected = [i for i, record in enumerate(records) if predicate(record)]
+        assert match(connection, translator.translate(query)) == expected, query.toCQL()
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_prox_same_as_engine(parser: CQLParser, connection, seed: int):
+    rnd = random.Random(seed)
+    records = make_records(rnd, 200)
+    insert(connection, records)
+    index = CQLInvertedIndex(positions=True)
+    index.add_all(records)
+    engine = CQLSearchEngine(index, server_choice=["title", "subject"])
+    for _ in range(100):
+        left, right = rnd.sample(WORDS[:-1] + ["fi*", "cat*"], 2)
+        index_name = rnd.choice(["title", "subject", "cql.serverChoice"])
+        comparator = rnd.choice(["<=", "<"])
+        distance = rnd.randint(2, 4)
+        query = parser.parse(
+            f"{index_name} = {left} prox/distance{comparator}{distance}"
+            f" {index_name} = {right}"
+        )
+        expected = engine.search(query).tolist()
+        assert match(connection, fts5_match(query)) == expected, query.toCQL()
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "title == fish",
+        "title < fish",
+        "title =/regexp fish",
+        "title =/respectCase fish",
+        "title = f?sh",
+        "title = *",
+        "title = fish^",
+        'title = "a ^b"',
+        "cql.allRecords = 1 not title = fish",
+        "dc.title = fish",
+        'title = ""',
+        "a prox/ordered b",
+        "a prox/distance>2 b",
+        "a prox/distance<1 b",
+        "(a and b) prox c",
+        "a prox ^b",
+        "title all 'a b' prox c",
+        "title = a prox subject = b",
+    ],
+)
+def test_unsupported(parser: CQLParser, query: str):
+    with pytest.raises(CQLCompileError):
+        fts5_match(parser.parse(query.replace("'", '"')))
@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from cql.incremental import CQLIncrementalParser
+from cql.incremental import common_prefix_length
+from cql.incremental import common_suffix_length
+from cql.lexer import CQLLexerError
+from cql.parser import CQLParser
+from cql.parser import CQLParser11
+from cql.parser import CQLParserError
+
+# ---------------------------------------------------------------------------
+
+
+QUERY = 'dc.title any/rel.algorithm=cori "fish food" and (b or c) sortby dc.date/sort.descending'
+
+
+def error_info(ex):
+    if ex is None:
+        return None
+    return (
+        type(ex),
+        ex.args[0],
+        getattr(ex, "position", None),
+        getattr(ex, "token", None),
+        getattr(ex, "value", None),
+        getattr(ex, "expected", None),
+    )
+
+
+def assert_same_as_validate(parser: CQLParser, inc: CQLIncrementalParser):
+    assert error_info(inc.error) == error_info(parser.validate(inc.text))
+    try:
+        stream = parser.lexer.tokenize(inc.text)
+    except CQLLexerError:
+        return
+    assert list(inc.tokens()) == [
+        (stream.type(i), stream.starts[i], stream.ends[i]) for i in range(len(stream))
+    ]
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_common_prefix_suffix():
+    assert common_prefix_length("abcd", "abxd") == 2
+    assert common_prefix_length("abc", "abc") == 3
+    assert common_prefix_length("", "abc") == 0
+    assert common_suffix_length("abcd", "abxd") == 1
+    assert common_suffix_length("abc", "xabc") == 3
+
+
+def test_incremental_typing(parser: CQLParser):
+    inc = CQLIncrementalParser(parser)
+    assert isinstance(inc.error, CQLParserError)
+
+    for pos in range(len(QUERY)):
+        inc.edit(pos, pos, QUERY[pos])
+        assert inc.text == QUERY[: pos + 1]
+        assert_same_as_validate(parser, inc)
+    assert inc.error is None
+    assert len(inc) == 17
+
+    # and delete again, from the front
+    while inc.text:
+        inc.edit(0, 1, "")
+        assert_same_as_validate(parser, inc)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_random_edits(parser11: CQLParser11, parser: CQLParser, seed: int):
+    rnd = random.Random(seed)
+    pieces = ["a", " ", "=", "(", ")", " and ", "or", "/", '"', "\\", ">", "sortby "]
+    for cqlparser in (parser11, parser):
+        inc = CQLIncrementalParser(cqlparser, QUERY)
+        for _ in range(100):
+            text = inc.text
+            start = rnd.randint(0, len(text))
+            end = rnd.randint(start, min(len(text), start + 3))
+            inc.update(text[:start] + rnd.choice(["", *pieces]) + text[end:])
+            assert_same_as_validate(cqlparser, inc)
+
+
+def test_incremental_update(parser: CQLParser):
+    inc = CQLIncrementalParser(parser, "dc.title = fish")
+    assert inc.update("dc.title = fishes") is None
+    assert inc.text == "dc.title = fishes"
+    assert inc.relexed == 1
+
+    error = inc.update('dc.title = "fishes')
+    assert isinstance(error, CQLLexerError)
+    assert error.position == 11
+
+    with pytest.raises(ValueError):
+        inc.edit(5, 100, "")
+
+
+def test_incremental_work(parser: CQLParser):
+    query = " or ".join(f'dc.title any "term{i}"' for i in range(1000))
+    inc = CQLIncrementalParser(parser, query)
+    assert inc.error is None
+    assert inc.reparsed == len(inc) + 1
+
+    # type a clause in the middle
+    pos = query.index(" or ", len(query) // 2)
+    for char in " and dc.creator any/relevant fish":
+        inc.edit(pos, pos, char)
+        pos += 1
+        assert inc.relexed <= 2
+        # also when it becomes valid again after errors
+        assert inc.reparsed <= 10
+        assert_same_as_validate(parser, inc)
+    assert inc.error is None
+
+    # an unbalanced parenthesis changes the state for the rest
+    inc.edit(0, 0, "(")
+    assert inc.reparsed == len(inc) + 1
+    assert inc.error.args[0].startswith("Missing closing parenthesis")
+
+
+# ---------------------------------------------------------------------------
@@ -0,0 +1,192 @@
+import glob
+import os.path
+import time
+
+import pytest
+
+import cql
+from cql.lexer import CQLLexer
+from cql.lexer import CQLLexerError
+from cql.lexer import CQLTokenStream
+from cql.lexer import find_quoted_end
+from cql.parser import CQLParser12
+
+# ---------------------------------------------------------------------------
+
+
+REGRESSION_QUERIES = sorted(
+    glob.glob(os.path.join(os.path.dirname(__file__), "regression", "*", "*.cql"))
+)
+
+
+def load_query(fname: str) -> str:
+    with open(fname, "r") as fp:
+        return fp.read()
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_tokenize():
+    stream = cql.tokenize('dc.title any/rel.x=1 "fi\\"sh" AND android or (a<=b)')
+    assert isinstance(stream, CQLTokenStream)
+    assert len(stream) == 15
+
+    assert [stream.type(i) for i in range(len(stream))] == [
+        "CHAR_STRING1",
+        "CHAR_STRING1",
+        "MODSTART",
+        "CHAR_STRING1",
+        "EQ",
+        "CHAR_STRING1",
+        "CHAR_STRING2",
+        "AND",
+        "CHAR_STRING1",
+        "OR",
+        "LPAREN",
+        "CHAR_STRING1",
+        "LE",
+        "CHAR_STRING1",
+        "RPAREN",
+    ]
+    assert stream.value(6) == 'fi"sh'
+    assert stream.text(6) == '"fi\\"sh"'
+    assert stream.value(7) == "AND"
+    assert stream.starts[0] == 0 and stream.ends[0] == 8
+
+    assert stream.type_counts() == {
+        "CHAR_STRING1": 7,
+        "MODSTART": 1,
+        "EQ": 1,
+        "CHAR_STRING2": 1,
+        "AND": 1,
+        "OR": 1,
+        "LPAREN": 1,
+        "LE": 1,
+        "RPAREN": 1,
+    }
+
+
+def test_tokenize_empty():
+    assert len(cql.tokenize("")) == 0
+    assert len(cql.tokenize(" \t\n ")) == 0
+
+
+def test_tokenize_error():
+    with pytest.raises(CQLLexerError) as exc_info:
+        cql.tokenize('a = "fish')
+    assert exc_info.value.args[0] == "Illegal character '\"' at 4"
+    assert exc_info.value.args[1].lexpos == 4
+
+
+@pytest.mark.parametrize("fname", REGRESSION_QUERIES)
+def test_tokenize_same_as_lexer(lexer: CQLLexer, fname: str):
+    query = load_query(fname)
+
+    try:
+        expected = [(t.type, t.value, t.lexpos) for t in lexer.run(query, limit=1000)]
+    except CQLLexerError:
+        with pytest.raises(CQLLexerError):
+            lexer.tokenize(query)
+        return
+
+    stream = lexer.tokenize(query)
+    assert [
+        (stream.type(i), stream.value(i), stream.starts[i]) for i in range(len(stream))
+    ] == expected
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("fname", REGRESSION_QUERIES)
+def test_compact_lexer_parse(parser12: CQLParser12, fname: str):
+    query = load_query(fname)
+
+    cqllexer = CQLLexer()
+    cqllexer.build(compact=True)
+    cqlparser = CQLParser12()
+    cqlparser.build(cqllexer)
+
+    try:
+        expected = parser12.parse(query)
+    except Exception as ex:
+        with pytest.raises(type(ex)):
+            cqlparser.parse(query)
+        return
+
+    assert cqlparser.parse(query).toXCQLString() == expected.toXCQLString()
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_find_quoted_end():
+    assert find_quoted_end('"abc"', 0) == 5
+    assert find_quoted_end('x "abc" y', 2) == 7
+    assert find_quoted_end('"a\\"b"', 0) == 6
+    assert find_quoted_end('"a\\\\"b"', 0) == 5
+    assert find_quoted_end('"abc', 0) == -1
+    assert find_quoted_end('"abc\\"', 0) == -1
+    assert find_quoted_end('""', 0) == 2
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_quoted_escapes(lexer: CQLLexer, compact: bool):
+    def values(query: str):
+        if compact:
+            stream = lexer.tokenize(query)
+            return [stream.value(i) for i in range(len(stream))]
+        return [tok.value for tok in lexer.run(query)]
+
+    assert values('"a\\"b"') == ['a"b']
+    assert values('"a\\\\" b') == ["a\\\\", "b"]
+    assert values('"a\\*b"') == ["a\\*b"]
+    # backslash escapes the quote, so this one is not terminated
+    with pytest.raises(CQLLexerError):
+        values('a = "abc\\"')
+
+
+# ---------------------------------------------------------------------------
+
+
+# input generator and (larger) size, up to a megabyte
+ADVERSARIAL_INPUTS = {
+    "backslashes": (lambda n: 'a = "' + "\\" * n, 2**20),
+    "escaped quotes": (lambda n: 'a = "' + '\\"' * (n // 2), 2**17),
+    "backslashes quoted": (lambda n: 'a = "' + "\\" * n + '"', 2**17),
+    "unterminated": (lambda n: 'a = "' + "x y " * (n // 4), 2**20),
+    "identifier": (lambda n: "a = " + "x" * n, 2**20),
+    "many tokens": (lambda n: "a and " * (n // 6), 2**16),
+}
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("name", sorted(ADVERSARIAL_INPUTS))
+def test_adversarial_inputs_linear(lexer: CQLLexer, name: str, compact: bool):
+    def scan(query: str):
+        try:
+            if compact:
+                lexer.tokenize(query)
+            else:
+                for _ in lexer.run(query, limit=len(query)):
+                    pass
+        except CQLLexerError:
+            pass
+
+    def timed(query: str) -> float:
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            scan(query)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    generator, size = ADVERSARIAL_INPUTS[name]
+    small = timed(generator(size // 8))
+    large = timed(generator(size))
+    # 8x the input: linear would be ~8x the time, quadratic ~64x
+    assert large < 24 * max(small, 1e-3), f"{name}: {small:.4f}s -> {large:.4f}s"
+
+
+# ---------------------------------------------------------------------------
@@ -0,0 +1,172 @@
+import random
+import re
+import sys
+
+import pytest
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.masking import CQLTermDictionary
+from cql.masking import compile_pattern
+from cql.masking import masked_words
+from cql.masking import parse_mask
+from cql.masking import unescape
+from cql.parser import CQLParser
+from cql.predicate import CQLCompileError
+
+# ---------------------------------------------------------------------------
+
+
+WORDS = ["fish", "fishing", "fiction", "chips", "cat", "cats", "coat", "Fish"]
+
+
+def make_documents(rnd: random.Random, num: int):
+    return [
+        {
+            "title": " ".join(rnd.choices(WORDS, k=rnd.randint(1, 4))),
+            "subject": rnd.sample(WORDS, rnd.randint(0, 2)),
+        }
+        for _ in range(num)
+    ]
+
+
+def random_query(rnd: random.Random) -> str:
+    index = rnd.choice(["title", "subject", "cql.serverChoice"])
+    relation = rnd.choice(["=", "any", "all", "==", "<>"])
+    masked = ["fi*", "fish*", "c?t", "c*t*", "*", "?at", "fic*n", "f*ing", "x*"]
+    if relation in ("==", "<>"):
+        term = rnd.choice(["fi*", "c?t", "Fish*", "cat*", "*s"])
+    elif relation == "=":
+        term = " ".join(rnd.sample(masked, rnd.randint(1, 2)))
+    else:
+        term = " ".join(rnd.sample(masked, 2))
+    return f'{index} {relation} "{term}"'
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "word, pattern, literal, prefix, is_prefix",
+    [
+        ("fish", "fish", "fish", "fish", False),
+        ("fish*", r"fish\w*", None, "fish", True),
+        ("f?sh", r"f\wsh", None, "f", False),
+        ("f*h*", r"f\w*h\w*", None, "f", False),
+        ("*", r"\w+", None, "", True),
+        ("?", r"\w", None, "", False),
+        (r"fish\*", r"fish\*", "fish*", "fish*", False),
+        (r"a\?b*", r"a\?b\w*", None, "a?b", True),
+    ],
+)
+def test_parse_mask(word: str, pattern: str, literal, prefix: str, is_prefix: bool):
+    mask = parse_mask(word)
+    assert (mask.pattern, mask.literal) == (pattern, literal)
+    assert (mask.prefix, mask.is_prefix) == (prefix, is_prefix)
+
+
+def test_parse_mask_anchors():
+    mask = parse_mask("^fish")
+    assert (mask.start, mask.end, mask.literal) == (True, False, "fish")
+    mask = parse_mask("fish^")
+    assert (mask.start, mask.end, mask.literal) == (False, True, "fish")
+    assert parse_mask(r"fish\^").literal == "fish^"
+    # masking characters are text
+    assert parse_mask("^fi*", masked=False).literal == "^fi*"
+    # a whole value
+    assert parse_mask("a b*", whole=True).pattern == r"a\ b.*"
+    assert parse_mask("a?", whole=True).pattern == "a."
+
+
+def test_masked_words():
+    assert masked_words("comput* and ?at") == ["comput*", "and", "?at"]
+    assert masked_words(r"a\*b ^c^ d,e") == [r"a\*b", "^c^", "d", "e"]
+    assert unescape(r"a\*b\\c") == r"a*b\c"
+
+
+def test_compile_pattern():
+    assert compile_pattern(r"fish\w*") is compile_pattern(r"fish\w*")
+    assert compile_pattern("a", re.I) is not compile_pattern("a")
+    with pytest.raises(re.error):
+        compile_pattern("(")
+
+
+def test_term_dictionary():
+    terms = CQLTermDictionary(["fish", "fishing", "fiction", "cat", "fisz", "g"])
+    assert terms.prefixed("fis") == ["fish", "fishing", "fisz"]
+    assert terms.prefixed("x") == []
+    assert len(terms.prefixed("")) == 6
+    assert terms.matching(parse_mask("fish*")) == ["fish", "fishing"]
+    assert terms.matching(parse_mask("f*g")) == ["fishing"]
+    assert terms.matching(parse_mask("?at")) == ["cat"]
+    assert terms.matching(parse_mask("cat")) == ["cat"]
+    assert terms.matching(parse_mask("dog")) == []
+    assert terms.matching(parse_mask("*")) == terms.terms
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_engine_same_as_predicate(parser: CQLParser, seed: int):
+    rnd = random.Random(seed)
+    documents = make_documents(rnd, 300)
+    for positions in (False, True):
+        index = CQLInvertedIndex(positions=positions)
+        index.add_all(documents)
+        engine = CQLSearchEngine(index)
+        for _ in range(100):
+            query = parser.parse(random_query(rnd))
+            if not positions and query.root.relation.toCQL() == "=":
+                # phrases need positions
+                continue
+            predicate = query.compile()
+            expected = [i for i, doc in enumerate(documents) if predicate(doc)]
+            assert engine.search(query).tolist() == expected, query.toCQL()
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ('title =/regexp "fi(sh|ction)$"', [0, 2]),
+        ('title =/regexp/respectCase "^Fish"', [2]),
+        ('title ==/regexp "fish.*"', [0]),
+        ('title <>/regexp "fish.*"', [1, 2]),
+        ('title =/unmasked "fish*"', [0, 1, 2]),
+    ],
+)
+def test_engine_modifiers(parser: CQLParser, query: str, expected):
+    documents = [{"title": "fish fiction"}, {"title": "a fish* b"}, {"title": "Fish"}]
+    index = CQLInvertedIndex()
+    index.add_all(documents)
+    predicate = parser.parse(query).compile()
+    assert [i for i, doc in enumerate(documents) if predicate(doc)] == expected
+    assert CQLSearchEngine(index).search(parser.parse(query)).tolist() == expected
+
+
+def test_term_dictionary_max_unicode():
+    # no character after the last one of a prefix
+    top = chr(sys.maxunicode)
+    terms = CQLTermDictionary(
+        ["a", "a" + top, "a" + top * 2 + "x", "b", top, top + "a"]
+    )
+    assert terms.prefixed("a" + top) == ["a" + top, "a" + top * 2 + "x"]
+    assert terms.prefixed(top) == [top, top + "a"]
+    assert terms.prefixed(top * 2) == []
+    assert terms.matching(parse_mask(top + "*")) == [top, top + "a"]
+
+
+def test_engine_dictionary_updated(parser: CQLParser):
+    index = CQLInvertedIndex()
+    index.add({"title": "fish"})
+    engine = CQLSearchEngine(index)
+    assert engine.search(parser.parse("title = fi*")).tolist() == [0]
+    index.add({"title": "fiction"})
+    assert engine.search(parser.parse("title = fi*")).tolist() == [0, 1]
+    assert len(index.term_dictionary("title")) == 2
+    assert index.term_dictionary("title", "values").terms == ["fiction", "fish"]
+
+
+@pytest.mark.parametrize(
+    "query", ['title = "^fish"', 'title <=/regexp "a"', 'title =/regexp "("']
+)
+def test_unsupported(parser: CQLParser, query: str):
+    with pytest.raises(CQLCompileError):
+        CQLSearchEngine(CQLInvertedIndex()).search(parser.parse(query))
@@ -0,0 +1,160 @@
+import random
+
+import pytest
+
+from cql.normalform import CQLNormalForm
+from cql.normalform import CQLNormalFormError
+from cql.normalform import to_cnf
+from cql.normalform import to_dnf
+from cql.parser import CQLParser
+from cql.parser import CQLTriple
+
+# ---------------------------------------------------------------------------
+
+
+def clauses(normal: CQLNormalForm):
+    return [[str(lit) for lit in clause] for clause in normal.clauses]
+
+
+def evaluate(node, sets):
+    if isinstance(node, CQLTriple):
+        left, right = evaluate(node.left, sets), evaluate(node.right, sets)
+        op = node.operator.canonical()
+        if op == "and":
+            return left & right
+        if op == "or":
+            return left | right
+        if op == "not":
+            return left - right
+        return left ^ right  # prox, modifiers: something else
+    return sets[node.canonical()]
+
+
+def evaluate_normal(normal: CQLNormalForm, sets, universe):
+    def literal(lit):
+        result = evaluate(lit.node, sets)
+        return universe - result if lit.negated else result
+
+    results = list()
+    for clause in normal.clauses:
+        literals = [literal(lit) for lit in clause]
+        if normal.form == "dnf":
+            results.append(set.intersection(*literals))
+        else:
+            results.append(set.union(*literals))
+    if normal.form == "dnf":
+        return set.union(set(), *results)
+    return set.intersection(set(universe), *results)
+
+
+def random_query(rnd: random.Random, depth: int) -> str:
+    if depth == 0 or rnd.random() < 0.3:
+        return rnd.choice(["a", "b", "c", "d", "dc.title = a"])
+    op = rnd.choice(["and", "or", "not", "not", "prox"])
+    left = random_query(rnd, depth - 1)
+    right = random_query(rnd, depth - 1)
+    return f"({left}) {op} ({right})"
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_dnf(parser: CQLParser):
+    normal = to_dnf(parser.parse("(a or b) and (c or d)"))
+    assert normal.form == "dnf" and normal.size == 8
+    assert clauses(normal) == [["a", "c"], ["a", "d"], ["b", "c"], ["b", "d"]]
+    assert normal.toCQL() == "(a and c) or (a and d) or (b and c) or (b and d)"
+
+
+def test_cnf(parser: CQLParser):
+    normal = to_cnf(parser.parse("a or (b and c)"))
+    assert normal.form == "cnf"
+    assert clauses(normal) == [["a", "b"], ["a", "c"]]
+    assert normal.toCQL() == "(a or b) and (a or c)"
+
+
+def test_not(parser: CQLParser):
+    # a not b is a and (not b), also when negated
+    assert clauses(to_dnf(parser.parse("(a or b) not c"))) == [
+        ["a", "not c"],
+        ["b", "not c"],
+    ]
+    normal = to_dnf(parser.parse("a not (b not c)"))
+    assert clauses(normal) == [["a", "not b"], ["a", "c"]]
+    assert normal.toCQL() == "(a not b) or (a and c)"
+    assert clauses(to_cnf(parser.parse("a not (b or c)"))) == [
+        ["a"],
+        ["not b"],
+        ["not c"],
+    ]
+
+
+def test_simplified(parser: CQLParser):
+    # contradictions, tautologies and absorbed clauses are dropped
+    assert clauses(to_dnf(parser.parse("a not a"))) == []
+    assert clauses(to_cnf(parser.parse("a or (b not a)"))) == [["a", "b"]]
+    assert clauses(to_dnf(parser.parse("(a and b) or (b and a and c)"))) == [["a", "b"]]
+    assert clauses(to_dnf(parser.parse("a and a and A"))) == [["a", "A"]]
+
+
+def test_kept_as_literals(parser: CQLParser):
+    assert clauses(to_dnf(parser.parse("a and (b prox c)"))) == [["a", "(b prox c)"]]
+    assert clauses(to_dnf(parser.parse("a and/rel.x (b or c)"))) == [
+        ["(a and/rel.x (b or c))"]
+    ]
+    assert clauses(to_cnf(parser.parse("a or (> dc = x b and c)"))) == [
+        ["a", "(> dc = x b and c)"]
+    ]
+
+
+def test_prefixes_and_sort_keys(parser: CQLParser):
+    normal = to_dnf(parser.parse("> dc = x a and (b or c) sortBy dc.date"))
+    assert normal.toCQL() == "> dc = x (a and b) or (a and c) sortBy dc.date"
+
+
+def test_toCQL_errors(parser: CQLParser):
+    with pytest.raises(CQLNormalFormError):
+        to_dnf(parser.parse("a not a")).toCQL()
+    # a or not b
+    with pytest.raises(CQLNormalFormError):
+        to_cnf(parser.parse("a not (b not c)")).toCQL()
+
+
+def test_budget(parser: CQLParser):
+    query = parser.parse(" and ".join(f"(a{i} or b{i})" for i in range(20)))
+    with pytest.raises(CQLNormalFormError) as exc_info:
+        to_dnf(query, max_size=1000)
+    assert "max_size=1000" in exc_info.value.args[0]
+    assert to_cnf(query, max_size=1000).size == 40
+
+
+def test_deep(parser: CQLParser):
+    query = parser.parse(" and ".join(f"a{i}" for i in range(5000)))
+    assert to_dnf(query, max_size=10000).size == 5000
+    assert len(to_cnf(query, max_size=10000).clauses) == 5000
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_same_results(parser: CQLParser, seed: int):
+    rnd = random.Random(seed)
+    universe = set(range(12))
+    texts = [
+        f"{index} = {term}"
+        for index in ("cql.serverchoice", "dc.title")
+        for term in "abcd"
+    ]
+    for _ in range(100):
+        query = parser.parse(random_query(rnd, 4))
+        for convert in (to_dnf, to_cnf):
+            normal = convert(query, max_size=10000)
+            for _ in range(5):
+                sets = {
+                    text: {i for i in universe if rnd.random() < 0.5} for text in texts
+                }
+                expected = evaluate(query.root, sets)
+                assert evaluate_normal(normal, sets, universe) == expected
+                try:
+                    cql = normal.toCQL()
+                except CQLNormalFormError:
+                    continue
+                assert evaluate(parser.parse(cql).root, sets) == expected
@@ -0,0 +1,137 @@
+import random
+import time
+
+import pytest
+
+from cql.optimizer import CQLOptimizer
+from cql.optimizer import count_nodes
+from cql.optimizer import optimize
+from cql.parser import CQLParser
+from cql.parser import CQLTriple
+
+# ---------------------------------------------------------------------------
+
+
+def simplified(parser: CQLParser, query: str) -> str:
+    return optimize(parser.parse(query)).toCQL()
+
+
+def evaluate(node, sets):
+    # result set, with some other (not idempotent) operation for prox and
+    # booleans with modifiers, which must not be simplified
+    if isinstance(node, CQLTriple):
+        left, right = evaluate(node.left, sets), evaluate(node.right, sets)
+        op = node.operator.canonical()
+        if op == "and":
+            return left & right
+        if op == "or":
+            return left | right
+        if op == "not":
+            return left - right
+        return left ^ right
+    return sets[node.canonical()]
+
+
+def random_query(rnd: random.Random, depth: int) -> str:
+    if depth == 0 or rnd.random() < 0.3:
+        return rnd.choice(["a", "b", "c", "d", "A", "dc.title = a"])
+    op = rnd.choice(["and", "and", "or", "or", "OR", "not", "prox", "and/rel.x"])
+    left = random_query(rnd, depth - 1)
+    right = random_query(rnd, depth - 1)
+    return f"({left}) {op} ({right})"
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("a and a", "a"),
+        ("a or a or a", "a"),
+        ("a and b and a", "a and b"),
+        ("(a or b) and (b or a)", "a or b"),
+        ("a or (a and b)", "a"),
+        ("a and (a or b)", "a"),
+        ("(a and b) or (b and a and c)", "a and b"),
+        ("x and ((a or b) and (a or b or c))", "x and (a or b)"),
+        ("dc.title any fish and DC.TITLE ANY fish", "dc.title any fish"),
+        # left alone
+        ("a prox a", "a prox a"),
+        ("a not a", "a not a"),
+        ("a and/rel.x a", "a and/rel.x a"),
+        ("a or (a prox b)", "a or (a prox b)"),
+        # but their operands are simplified
+        ("(a and a) prox (b or b)", "a prox b"),
+    ],
+)
+def test_optimize(parser: CQLParser, query: str, expected: str):
+    assert simplified(parser, query) == expected
+
+
+def test_optimize_keeps_prefixes_and_sort_keys(parser: CQLParser):
+    assert simplified(parser, "> dc = x (a and a) sortBy dc.date") == "> dc = x a"
+    query = optimize(parser.parse("> dc = x (a and a) sortBy dc.date"))
+    assert [str(s) for s in query.root.sortSpecs] == ["sortBy dc.date"]
+
+    # prefix assignments are in scope for their subtree only
+    query = optimize(parser.parse("a and (> dc = x a) and (> dc = x a)"))
+    assert query.canonical() == (
+        "cql.serverchoice = a and (> dc = x cql.serverchoice = a)"
+    )
+
+
+def test_optimize_does_not_modify(parser: CQLParser):
+    query = parser.parse("> dc = x a and a and (a or b) sortBy dc.date")
+    before = query.toXCQLString()
+    optimize(query)
+    assert query.toXCQLString() == before
+
+
+def test_optimize_report(parser: CQLParser):
+    optimizer = CQLOptimizer()
+    optimizer.optimize(parser.parse("a and b and a and (b or c)"))
+    report = optimizer.report
+    assert report.nodes_before == 9 and report.nodes_after == 3
+    assert report.removed == 6
+    assert report.duplicates == 1 and report.absorbed == 1
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_optimize_same_results(parser: CQLParser, seed: int):
+    rnd = random.Random(seed)
+    universe = range(12)
+    for _ in range(200):
+        query = parser.parse(random_query(rnd, 5))
+        result = optimize(query)
+        assert count_nodes(result.root) <= count_nodes(query.root)
+        assert result.canonical() == optimize(result).canonical()
+
+        texts = {
+            f"{index} = {term}"
+            for index in ("cql.serverchoice", "dc.title")
+            for term in "abcdA"
+        }
+        for _ in range(5):
+            sets = {text: {i for i in universe if rnd.random() < 0.5} for text in texts}
+            assert evaluate(result.root, sets) == evaluate(query.root, sets)
+
+
+def test_optimize_linear(parser: CQLParser):
+    def timed(num: int) -> float:
+        # facets, all runs start with the same clause
+        clauses = [
+            f"(color = red and size = s{i} and f{i % 50} = x)" for i in range(num)
+        ]
+        clauses += [f"(color = red and size = s{i})" for i in range(num)]
+        query = parser.parse(" or ".join(clauses))
+        best = float("inf")
+        for _ in range(3):
+            start = time.perf_counter()
+            optimize(query)
+            best = min(best, time.perf_counter() - start)
+        return best
+
+    small, large = timed(500), timed(4000)
+    # 8x the input: linear would be ~8x the time, quadratic ~64x
+    assert large < 24 * max(small, 1e-3)
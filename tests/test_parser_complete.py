@@ -0,0 +1,164 @@
+import glob
+import os.path
+import random
+
+import pytest
+
+import cql
+from cql.incremental import CQLIncrementalParser
+from cql.parser import COMPLETION_NONTERMINALS
+from cql.parser import COMPLETION_TOKENS
+from cql.parser import CQLCompletion
+from cql.parser import CQLParser
+from cql.parser import CQLParserError
+
+# ---------------------------------------------------------------------------
+
+
+REGRESSION_QUERIES = sorted(
+    glob.glob(os.path.join(os.path.dirname(__file__), "regression", "*", "*.cql"))
+)
+
+CLASSES = {cls for _, cls in COMPLETION_NONTERMINALS} | set(COMPLETION_TOKENS.values())
+
+TERMS = ("CHAR_STRING1", "CHAR_STRING2", "AND", "OR", "NOT", "PROX", "SORTBY")
+RELATIONS = ("LE", "GE", "LT", "GT", "NE", "EQUALS", "EQ")
+
+
+def load_query(fname: str) -> str:
+    with open(fname, "r") as fp:
+        return fp.read()
+
+
+def completion_info(completion: CQLCompletion):
+    error = completion.error
+    return (
+        completion.position,
+        completion.partial,
+        completion.expected,
+        None if error is None else (type(error), error.args[0]),
+    )
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_complete_start(parser: CQLParser):
+    completion = parser.complete("")
+    assert completion.position == 0 and completion.partial == ""
+    assert completion.error is None
+    assert completion.expected == {
+        "openParen": ("LPAREN",),
+        "prefix": ("GT",),
+        "term": TERMS,
+    }
+    assert completion.suggestions() == ["(", ">"]
+
+
+def test_complete_after_index(parser: CQLParser):
+    completion = parser.complete("dc.title ")
+    assert completion.position == 9
+    assert completion.expected == {
+        "relation": RELATIONS + ("CHAR_STRING1", "CHAR_STRING2"),
+        "boolean": ("AND", "OR", "NOT", "PROX"),
+        "sortBy": ("SORTBY",),
+        "end": ("$end",),
+    }
+    assert "any" in completion.suggestions() and "and" in completion.suggestions()
+
+
+def test_complete_classes(parser: CQLParser):
+    assert set(parser.complete("dc.title any ").expected) == {"modifier", "term"}
+    assert set(parser.complete("dc.title any fish ").expected) == {
+        "boolean",
+        "sortBy",
+        "end",
+    }
+    assert set(parser.complete("(a and b ").expected) == {
+        "relation",
+        "boolean",
+        "closeParen",
+    }
+    assert set(parser.complete("a and/").expected) == {"modifierName"}
+    assert parser.complete("a any/rel.x ").expected["modifierRelation"] == RELATIONS
+    assert set(parser.complete("a any/rel.x=").expected) == {"modifierValue"}
+    assert set(parser.complete("a sortBy ").expected) == {"sortKey"}
+    assert set(parser.complete("a sortBy dc.title ").expected) == {
+        "modifier",
+        "sortKey",
+        "end",
+    }
+    assert parser.complete("> dc ").expected["prefix"] == ("GT", "EQ")
+    assert set(parser.complete("> dc = ").expected) == {"prefix"}
+
+
+def test_complete_partial_word(parser: CQLParser):
+    completion = parser.complete("dc.title an")
+    assert completion.position == 9 and completion.partial == "an"
+    assert completion.expected == parser.complete("dc.title ").expected
+    assert completion.suggestions() == ["any", "and"]
+
+    # a keyword may be the start of a longer word
+    completion = parser.complete("a and")
+    assert completion.partial == "and"
+    assert completion.suggestions() == ["and"]
+
+    assert parser.complete("dc.title any fish S").suggestions() == ["sortBy"]
+    # symbols are not partial words
+    assert parser.complete("a <").partial == ""
+
+
+def test_complete_unterminated_string(parser: CQLParser):
+    completion = parser.complete('dc.title any "fish f')
+    assert completion.position == 13 and completion.partial == '"fish f'
+    assert completion.error is None
+    assert set(completion.expected) == {"modifier", "term"}
+
+
+def test_complete_error(parser: CQLParser):
+    completion = parser.complete("a and ) b")
+    assert completion.expected == {} and completion.suggestions() == []
+    assert isinstance(completion.error, CQLParserError)
+    assert completion.error.args[0] == parser.validate("a and )").args[0]
+
+
+def test_complete_cached(parser: CQLParser):
+    parser.complete("a and b ")
+    num = len(parser._completions)
+    expected = parser.complete("x or y ").expected
+    assert len(parser._completions) == num
+    assert expected == parser.complete("a and b ").expected
+
+
+def test_complete_api():
+    completion = cql.complete("dc.title any fish ")
+    assert isinstance(completion, CQLCompletion)
+    assert set(completion.expected) == {"boolean", "sortBy", "end"}
+
+
+@pytest.mark.parametrize("fname", REGRESSION_QUERIES)
+def test_complete_prefixes(parser: CQLParser, fname: str):
+    query = load_query(fname)
+    inc = CQLIncrementalParser(parser)
+    for pos in range(len(query) + 1):
+        completion = parser.complete(query[:pos])
+        assert set(completion.expected) <= CLASSES
+        assert completion.position + len(completion.partial) == pos
+
+        # incremental completion uses the checkpoints instead
+        inc.update(query[:pos])
+        assert completion_info(inc.complete()) == completion_info(completion)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_complete_incremental_random_edits(parser: CQLParser, seed: int):
+    rnd = random.Random(seed)
+    pieces = ["a", " ", "and", "(", ")", "/", "=", '"', "sortby", "x y", "<>"]
+    inc = CQLIncrementalParser(parser)
+    for _ in range(300):
+        start = rnd.randint(0, len(inc.text))
+        end = rnd.randint(start, min(len(inc.text), start + 3))
+        inc.edit(start, end, rnd.choice(pieces))
+        assert completion_info(inc.complete()) == completion_info(
+            parser.complete(inc.text)
+        )
@@ -46,4 +46,46 @@ def test_parser_scopedClause(parser: CQLParser):
         parser.parse(query)
 
 
+def test_parser_error_structured(parser: CQLParser):
+    with pytest.raises(
+        CQLParserError, match=r"Found symbol 'CHAR_STRING1'"
+    ) as exc_info:
+        parser.parse("dc.title any fish fish")
+    err = exc_info.value
+    assert err.position == 18
+    assert err.token == "CHAR_STRING1"
+    assert err.value == "fish"
+    assert set(err.expected) >= {"AND", "OR", "NOT", "PROX", "SORTBY", "$end"}
+
+    with pytest.raises(
+        CQLParserError, match=r"Missing right side for scopedClause"
+    ) as exc_info:
+        parser.parse("apple OR")
+    err = exc_info.value
+    assert err.position == 8
+    assert err.token is None
+    assert err.value is None
+    assert "LPAREN" in err.expected
+
+    with pytest.raises(CQLParserError, match=r"No sort key supplied") as exc_info:
+        parser.parse("apple sortby )")
+    assert exc_info.value.position == 13
+    assert exc_info.value.token == "RPAREN"
+
+
+def test_parser_error_no_logging(parser: CQLParser, caplog: pytest.LogCaptureFixture):
+    import logging
+
+    with caplog.at_level(logging.DEBUG, "cql"):
+        with pytest.raises(CQLParserError):
+            parser.parse("dc.title any fish fish")
+    assert not [r for r in caplog.records if r.levelno >= logging.ERROR]
+
+    parser.log_errors = True
+    with caplog.at_level(logging.DEBUG, "cql"):
+        with pytest.raises(CQLParserError):
+            parser.parse("dc.title any fish fish")
+    assert [r for r in caplog.records if r.levelno >= logging.ERROR]
+
+
 # ---------------------------------------------------------------------------
@@ -0,0 +1,117 @@
+import pytest
+
+import cql
+from cql.parser import CQLParser
+from cql.parser import CQLParserError
+from cql.parser import CQLParserLimitError
+from cql.parser import CQLParserLimits
+
+# ---------------------------------------------------------------------------
+
+
+def test_limits_default(parser: CQLParser):
+    assert parser.limits.max_depth is None
+
+    query = "(" * 100 + "fish" + ")" * 100 + " and fish" * 100
+    assert parser.parse(query) is not None
+
+
+def test_limits_error_type():
+    assert issubclass(CQLParserLimitError, CQLParserError)
+
+
+def test_limit_bytes(parser: CQLParser):
+    parser.limits = CQLParserLimits(max_bytes=20)
+
+    assert parser.parse("dc.title = fish") is not None
+    assert parser.parse("ä" * 10) is not None
+
+    with pytest.raises(CQLParserLimitError, match=r"Query too long") as exc_info:
+        parser.parse("dc.title = swordfishes")
+    assert exc_info.value.limit == "max_bytes"
+    assert exc_info.value.maximum == 20
+
+    # 11 characters but 22 bytes
+    with pytest.raises(CQLParserLimitError, match=r"Query too long"):
+        parser.parse("ä" * 11)
+
+
+def test_limit_tokens(parser: CQLParser):
+    parser.limits = CQLParserLimits(max_tokens=7)
+
+    assert parser.parse("a = b and c = d") is not None
+
+    with pytest.raises(
+        CQLParserLimitError, match=r"Too many tokens at position 16"
+    ) as exc_info:
+        parser.parse("a = b and c = d or e = f")
+    assert exc_info.value.limit == "max_tokens"
+
+
+def test_limit_depth(parser: CQLParser):
+    parser.limits = CQLParserLimits(max_depth=2)
+
+    assert parser.parse("((a) or (b)) and (c)") is not None
+
+    with pytest.raises(
+        CQLParserLimitError, match=r"Query nested too deep at position 7"
+    ) as exc_info:
+        parser.parse("(a or ((b)))")
+    assert exc_info.value.limit == "max_depth"
+
+    # rejected before the whole input is parsed
+    with pytest.raises(CQLParserLimitError, match=r"at position 2 "):
+        parser.parse("(" * 100_000)
+
+
+def test_limit_clauses(parser: CQLParser):
+    parser.limits = CQLParserLimits(max_clauses=3)
+
+    assert parser.parse("a and (b or c) sortBy d") is not None
+
+    with pytest.raises(
+        CQLParserLimitError, match=r"Too many search clauses"
+    ) as exc_info:
+        parser.parse("a and (b or c) not d")
+    assert exc_info.value.position == 21
+
+    with pytest.raises(CQLParserLimitError, match=r"Too many search clauses"):
+        parser.parse(" or ".join(["fish"] * 100_000))
+
+
+def test_limit_modifiers(parser: CQLParser):
+    parser.limits = CQLParserLimits(max_modifiers=2)
+
+    assert parser.parse("a =/x/y b or/z c sortBy d/e/f") is not None
+
+    for query, position in (
+        ("a =/x/y/z b", 11),
+        ("a or/x/y/z b", 12),
+        ("a sortBy d/e/f/g", 17),
+    ):
+        with pytest.raises(
+            CQLParserLimitError, match=r"Too many modifiers"
+        ) as exc_info:
+            parser.parse(query)
+        assert exc_info.value.position == position
+
+
+def test_limit_sort_keys(parser: CQLParser):
+    parser.limits = CQLParserLimits(max_sort_keys=2)
+
+    assert parser.parse("a sortBy b c/d") is not None
+
+    with pytest.raises(CQLParserLimitError, match=r"Too many sort keys") as exc_info:
+        parser.parse("a sortBy b c d")
+    assert exc_info.value.position == 15
+
+
+def test_limits_parse():
+    limits = CQLParserLimits(max_depth=1)
+
+    assert cql.parse("(a)", limits=limits) is not None
+    with pytest.raises(CQLParserLimitError):
+        cql.parse("((a))", limits=limits)
+
+
+# ---------------------------------------------------------------------------
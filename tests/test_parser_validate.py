@@ -0,0 +1,181 @@
+import glob
+import os.path
+
+import pytest
+
+import cql
+import cql.parser
+from cql.lexer import CQLLexerError
+from cql.parser import CQLParser
+from cql.parser import CQLParser11
+from cql.parser import CQLParserError
+from cql.parser import CQLParserLimitError
+from cql.parser import CQLParserLimits
+
+# ---------------------------------------------------------------------------
+
+
+REGRESSION_QUERIES = sorted(
+    glob.glob(os.path.join(os.path.dirname(__file__), "regression", "*", "*.cql"))
+)
+
+INVALID_QUERIES = [
+    "",
+    "(",
+    "( apple OR banana",
+    "apple ) OR banana",
+    "apple OR",
+    "dc.title any fish fish",
+    "dc.title any fish sortby",
+    "a sortby b/",
+    'a = "unterminated',
+    "> x",
+    "a = b/c=",
+]
+
+
+def load_query(fname: str) -> str:
+    with open(fname, "r") as fp:
+        return fp.read()
+
+
+def error_info(ex: Exception):
+    return (
+        type(ex),
+        ex.args[0],
+        getattr(ex, "position", None),
+        getattr(ex, "token", None),
+        getattr(ex, "value", None),
+        getattr(ex, "expected", None),
+    )
+
+
+def assert_same_as_parse(parser: CQLParser, query: str):
+    try:
+        parser.parse(query)
+    except (CQLParserError, CQLLexerError) as ex:
+        error = parser.validate(query)
+        assert error is not None
+        assert error_info(error) == error_info(ex)
+    else:
+        assert parser.validate(query) is None
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_validate():
+    assert cql.validate("dc.title any fish or dc.creator any sanderson") is None
+
+    error = cql.validate("dc.title any fish fish")
+    assert isinstance(error, CQLParserError)
+    assert error.position == 18
+    assert error.token == "CHAR_STRING1"
+    assert error.value == "fish"
+
+    assert isinstance(cql.validate('a = "fish'), CQLLexerError)
+
+
+@pytest.mark.parametrize("fname", REGRESSION_QUERIES)
+def test_validate_same_as_parse(parser11: CQLParser11, parser: CQLParser, fname: str):
+    query = load_query(fname)
+    assert_same_as_parse(parser11, query)
+    assert_same_as_parse(parser, query)
+
+
+@pytest.mark.parametrize("query", INVALID_QUERIES)
+def test_validate_errors_same_as_parse(
+    parser11: CQLParser11, parser: CQLParser, query: str
+):
+    assert_same_as_parse(parser11, query)
+    assert_same_as_parse(parser, query)
+
+
+def test_validate_no_objects(parser: CQLParser, monkeypatch: pytest.MonkeyPatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("no query objects should be created")
+
+    for name in ("CQLSearchClause", "CQLTriple", "CQLPrefixedName", "CQLQuery"):
+        monkeypatch.setattr(cql.parser, name, fail)
+
+    assert parser.validate("> dc = x dc.title any/rel.x=1 fish and (a or b)") is None
+    assert parser.validate("a sortby dc.title/sort.ascending b") is None
+
+
+@pytest.mark.parametrize(
+    "limits, query",
+    [
+        (CQLParserLimits(max_bytes=10), "dc.title = fish"),
+        (CQLParserLimits(max_tokens=7), "a = b and c = d or e = f"),
+        (CQLParserLimits(max_depth=2), "(a or ((b)))"),
+        (CQLParserLimits(max_clauses=2), "a and (b or c)"),
+        (CQLParserLimits(max_modifiers=2), "a =/x/y/z b"),
+        (CQLParserLimits(max_sort_keys=1), "a sortby b c/d"),
+        (CQLParserLimits(max_tokens=1), "a and"),
+        (CQLParserLimits(max_tokens=1), 'a = "b'),
+    ],
+)
+def test_validate_limits(parser: CQLParser, limits: CQLParserLimits, query: str):
+    parser.limits = limits
+    error = parser.validate(query)
+    assert isinstance(error, CQLParserLimitError)
+    assert_same_as_parse(parser, query)
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_validate_all():
+    assert cql.validate_all("dc.title any fish or dc.creator any sanderson") == []
+
+    errors = cql.validate_all("a = = b or c and d = = e")
+    assert [error.position for error in errors] == [4, 21]
+    assert all(isinstance(error, CQLParserError) for error in errors)
+
+    errors = cql.validate_all("a ) or b ) and c")
+    assert [error.position for error in errors] == [2, 9]
+    assert all("superfluous closing parenthesis" in error.args[0] for error in errors)
+
+
+def test_validate_all_end(parser: CQLParser):
+    # no follow-up errors at the end of the input
+    errors = parser.validate_all("a or = b and")
+    assert [error.position for error in errors] == [5, 12]
+    assert errors[1].token is None
+
+    errors = parser.validate_all('a or = b and c = "fish')
+    assert [error.position for error in errors] == [5, 17]
+    assert isinstance(errors[1], CQLLexerError)
+
+
+@pytest.mark.parametrize("query", INVALID_QUERIES)
+def test_validate_all_first_error(parser: CQLParser, query: str):
+    errors = parser.validate_all(query)
+    assert errors
+    assert error_info(errors[0]) == error_info(parser.validate(query))
+
+
+@pytest.mark.parametrize("fname", REGRESSION_QUERIES)
+def test_validate_all_valid(parser: CQLParser, fname: str):
+    query = load_query(fname)
+    if parser.validate(query) is None:
+        assert parser.validate_all(query) == []
+
+
+def test_validate_all_limits(parser: CQLParser):
+    parser.limits = CQLParserLimits(max_tokens=10)
+    errors = parser.validate_all("a = = b or c = = d or e = f")
+    assert [type(error) for error in errors] == [
+        CQLParserError,
+        CQLParserError,
+        CQLParserLimitError,
+    ]
+
+
+def test_validate_all_many_errors(parser: CQLParser):
+    errors = parser.validate_all("a = = b or " * 1000 + "c")
+    assert len(errors) == 1000
+    assert errors[-1].position == 11 * 999 + 4
+
+
+# ---------------------------------------------------------------------------
@@ -0,0 +1,128 @@
+import pytest
+
+from cql.parser import CQLParser
+from cql.planner import CQLQueryPlanner
+from cql.planner import CQLStatistics
+from cql.planner import plan
+
+# ---------------------------------------------------------------------------
+
+
+class Statistics(CQLStatistics):
+    # word counts by word, any index
+    def __init__(self, num_records: int, counts):
+        super().__init__(num_records)
+        self.counts = counts
+
+    def word_count(self, index: str, word: str):
+        return self.counts.get(word)
+
+    def index_count(self, index: str):
+        return 50 if index == "year" else None
+
+
+STATISTICS = Statistics(1000, {"a": 500, "b": 10, "c": 0, "d": 100, "e": 900})
+
+
+def planned(parser: CQLParser, query: str) -> str:
+    result = plan(parser.parse(query), STATISTICS).query.canonical()
+    return result.replace("cql.serverchoice = ", "")
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("a and b and d", "b and d and a"),
+        ("a or b or d", "a or d or b"),
+        ("a and (e or d) and b", "b and a and (e or d)"),
+        ("(a or b) and d", "d and (a or b)"),
+        # unknown words count as all records, the order is kept for ties
+        ("x and a and y", "a and x and y"),
+        # not, prox and booleans with modifiers keep their order
+        ("a not b", "a not b"),
+        ("(a and b) not (e and d)", "b and a not (d and e)"),
+        ("a prox b", "a prox b"),
+        ("a and/rel.x b", "a and/rel.x b"),
+        ("e and (a and/rel.x b)", "a and/rel.x b and e"),
+        # subtrees with prefixes are moved as a whole
+        ("a and (> p = x (e and b))", "(> p = x b and e) and a"),
+        ("year > 1 and a", "year > 1 and a"),
+        ('a and dc.title any "b c"', 'dc.title any "b c" and a'),
+        ('a and dc.title all "b e"', 'dc.title all "b e" and a'),
+        ("e and a* and b", "b and e and a*"),
+    ],
+)
+def test_order(parser: CQLParser, query: str, expected: str):
+    assert planned(parser, query) == expected
+
+
+def test_estimates(parser: CQLParser):
+    planner = CQLQueryPlanner(STATISTICS)
+    estimates = {
+        "a": 500,
+        'dc.title any "b c d"': 110,
+        'dc.title all "b e"': 10,
+        "a*": 1000,
+        "year > 2000": 50,
+        "cql.allRecords = 1": 1000,
+        "a and b": 10,
+        "a or e": 1000,
+        "a not b": 500,
+        "a prox d": 100,
+    }
+    for query, estimate in estimates.items():
+        assert planner.plan(parser.parse(query)).estimate == estimate, query
+
+    assert planner.plan(parser.parse("a and c")).empty
+    assert planner.plan(parser.parse("(a or b) and (d or c)")).estimate == 100
+    assert planner.plan(parser.parse("(a or b) and (d and c)")).empty
+    assert not planner.plan(parser.parse("a or c")).empty
+    # an empty and is searched first, so evaluators stop at once
+    assert planned(parser, "a or (e and d and c)") == "a or (c and d and e)"
+
+
+def test_explain(parser: CQLParser):
+    result = plan(parser.parse("a and (e or d) and b"), STATISTICS)
+    assert result.explain() == "\n".join(
+        ["and ~10", "  b ~10", "  a ~500", "  or ~1000", "    e ~900", "    d ~100"]
+    )
+    assert repr(result) == "CQLPlan[~10: (b and a) and (e or d)]"
+
+
+def test_keeps_query(parser: CQLParser):
+    query = parser.parse("> p = x a and b sortby dc.date")
+    text = query.toCQL()
+    result = plan(query, STATISTICS)
+    assert query.toCQL() == text
+    assert (
+        result.query.canonical()
+        == "> p = x cql.serverchoice = b and cql.serverchoice = a sortby dc.date"
+    )
+    assert result.query.version == query.version
+
+
+def test_cache(parser: CQLParser):
+    statistics = Statistics(1000, {"a": 5, "b": 10})
+    planner = CQLQueryPlanner(statistics)
+    first = planner.plan(parser.parse("a and b"))
+    assert planner._plans[parser.parse("a and b").canonical()] == [5, 10]
+
+    # an equivalent query, its own nodes with the cached estimates
+    query = parser.parse("(a AND b)")
+    second = planner.plan(query)
+    assert second.query.toCQL() == "a AND b"
+    assert second.query.root.left is query.root.left
+    assert second.query.cost is query.cost
+    assert second.estimate == first.estimate == 5
+    assert second.explain() == first.explain().replace("and", "AND")
+    assert planner.plan(parser.parse("b and a")).query.toCQL() == "a and b"
+    assert len(planner._plans) == 2
+
+    # plans are made again once the number of records changed
+    statistics.counts["a"] = 50
+    assert planner.plan(parser.parse("a and b")).query.toCQL() == "a and b"
+    statistics.num_records += 1
+    assert planner.plan(parser.parse("a and b")).query.toCQL() == "b and a"
@@ -0,0 +1,233 @@
+import random
+
+import pytest
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.engine.positions import DISTANCE_COMPARATORS
+from cql.engine.positions import MAX_VALUE_WORDS
+from cql.engine.positions import MAX_VALUES
+from cql.engine.positions import Positions
+from cql.engine.positions import near
+from cql.engine.positions import phrase
+from cql.engine.positions import prox_modifiers
+from cql.parser import CQLParser
+from cql.predicate import CQLCompileError
+
+# ---------------------------------------------------------------------------
+
+
+def brute_near(left, right, comparator: str, distance: int, ordered: bool) -> bool:
+    # all pairs of positions
+    compare = DISTANCE_COMPARATORS[comparator]
+    for pos in left:
+        for other in right:
+            gap = other - pos if ordered else abs(other - pos)
+            if (gap > 0 or not ordered) and compare(gap, distance):
+                return True
+    return False
+
+
+def brute_prox(documents, left: str, right: str, *args) -> list:
+    result = []
+    for doc_id, document in enumerate(documents):
+        words = document["t"].split()
+        if brute_near(
+            [pos for pos, word in enumerate(words) if word == left],
+            [pos for pos, word in enumerate(words) if word == right],
+            *args,
+        ):
+            result.append(doc_id)
+    return result
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("comparator", list(DISTANCE_COMPARATORS))
+@pytest.mark.parametrize("ordered", [False, True])
+def test_near(comparator: str, ordered: bool):
+    rnd = random.Random(f"{comparator}{ordered}")
+    for _ in range(500):
+        left = sorted(rnd.sample(range(20), rnd.randint(0, 4)))
+        right = sorted(rnd.sample(range(20), rnd.randint(0, 4)))
+        distance = rnd.randint(0, 6)
+        assert near(left, right, comparator, distance, ordered) == brute_near(
+            left, right, comparator, distance, ordered
+        ), (left, right, distance)
+
+
+def test_union():
+    a, b = Positions(), Positions()
+    a.add(1, [0, 4])
+    a.add(3, [2])
+    b.add(1, [1])
+    b.add(2, [5, 6])
+    union = Positions.union([a, b, Positions()])
+    assert union.docs.tolist() == [1, 2, 3]
+    assert [union.get(i).tolist() for i in range(3)] == [[0, 1, 4], [5, 6], [2]]
+    assert Positions.union([a]) is a
+    assert repr(union) == "Positions[3 documents, 6 positions]"
+
+
+def test_prox_modifiers(parser: CQLParser):
+    def modifiers(query: str):
+        return prox_modifiers(parser.parse(query).root.operator)
+
+    assert modifiers("a prox b") == ("<=", 1, False)
+    assert modifiers("a prox/distance>3/unit=word/ordered b") == (">", 3, True)
+    assert modifiers("a PROX/cql.distance=2/unordered b") == ("=", 2, False)
+    for query in [
+        "a prox/unit=sentence b",
+        "a prox/distance=x b",
+        "a prox/distance b",
+        "a prox/foo b",
+    ]:
+        with pytest.raises(CQLCompileError):
+            modifiers(query)
+
+
+def test_engine(parser: CQLParser):
+    rnd = random.Random(5)
+    words = ["a", "b", "c", "d"]
+    documents = [
+        {"t": " ".join(rnd.choices(words, k=rnd.randint(1, 12)))} for _ in range(400)
+    ]
+    index = CQLInvertedIndex(positions=True)
+    index.add_all(documents)
+    engine = CQLSearchEngine(index)
+    for _ in range(200):
+        left, right = rnd.choice(words), rnd.choice(words)
+        comparator = rnd.choice(list(DISTANCE_COMPARATORS))
+        distance, ordered = rnd.randint(0, 5), rnd.random() < 0.5
+        query = (
+            f"t = {left} prox/distance{comparator}{distance}"
+            f"{'/ordered' if ordered else ''} t = {right}"
+        )
+        expected = brute_prox(documents, left, right, comparator, distance, ordered)
+        assert engine.search(parser.parse(query)).tolist() == expected, query
+        assert engine.count(parser.parse(f"({query}) and t = {left}")) == len(expected)
+
+
+def test_engine_indexes(parser: CQLParser):
+    index = CQLInvertedIndex(positions=True)
+    index.add_all(
+        [{"t": "fish and chips", "s": "chips"}, {"t": "fish", "s": "chips"}, {}]
+    )
+    index.add({"t": ["fish chips", "x"]})
+    index.add({"t": ["fish", "chips"]})
+    engine = CQLSearchEngine(index)
+    # values of a list are not near each other
+    assert engine.search(parser.parse("fish prox chips")).tolist() == [3]
+    assert engine.search(parser.parse("t = fish prox/distance<=2 chips")).tolist() == [
+        0,
+        3,
+    ]
+    assert engine.search(parser.parse('t any "and fish" prox s = chips')).tolist() == []
+    assert index.positions("t", "fish").docs.tolist() == [0, 1, 3, 4]
+    assert not index.positions("x", "fish")
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("t = fish prox/distance>=100 t = chips", [1]),
+        ("t = fish prox/distance>1 t = chips", [1]),
+        ("t = fish prox/distance<=1000 t = chips", [1, 2]),
+        ("t = fish prox/distance<>5/ordered t = chips", [1, 2]),
+        ("t = fish prox/distance=1 t = chips", [2]),
+        ('t = "chips fish"', []),
+    ],
+)
+def test_engine_values(parser: CQLParser, query: str, expected):
+    # positions of different values of a list are never compared
+    index = CQLInvertedIndex(positions=True)
+    index.add({"t": ["fish"] + ["x " * 150] * 3 + ["chips"]})
+    index.add({"t": "fish " + "x " * 150 + "chips"})
+    index.add({"t": ["chips", "fish chips", "x"]})
+    engine = CQLSearchEngine(index)
+    assert engine.search(parser.parse(query)).tolist() == expected
+
+
+def test_limits():
+    index = CQLInvertedIndex(positions=True)
+    index.add({"t": ["a"] * MAX_VALUES, "s": "a " * MAX_VALUE_WORDS})
+    for document in [
+        {"s": "b", "t": ["a"] * (MAX_VALUES + 1)},
+        {"s": "b", "t": "a " * (MAX_VALUE_WORDS + 1)},
+    ]:
+        with pytest.raises(ValueError):
+            index.add(document)
+    # nothing added
+    assert index.num_docs == 1
+    assert not index.positions("s", "b")
+
+
+def test_phrase():
+    index = CQLInvertedIndex(positions=True)
+    index.add_all(
+        [
+            {"t": "the history of science"},
+            {"t": "science of history of science"},
+            {"t": "of science history"},
+            {"t": "fish fish fish"},
+        ]
+    )
+
+    def search(*words: str) -> list:
+        return phrase([index.positions("t", word) for word in words]).tolist()
+
+    assert search("history", "of", "science") == [0, 1]
+    assert search("of", "science") == [0, 1, 2]
+    assert search("science", "of", "history", "of") == [1]
+    assert search("history", "science") == []
+    assert search("fish", "fish", "fish") == [3]
+    assert search("fish", "fish", "fish", "fish") == []
+    assert search("of", "nothing") == [] and search() == []
+    assert search("of") == [0, 1, 2]
+
+
+def test_engine_phrase(parser: CQLParser):
+    # the same documents as the predicates (a phrase within one value)
+    rnd = random.Random(3)
+    words = ["a", "b", "c", "of"]
+
+    def text():
+        return " ".join(rnd.choices(words, k=rnd.randint(1, 8)))
+
+    documents = [
+        {"t": text() if rnd.random() < 0.5 else [text(), text()], "s": text()}
+        for _ in range(300)
+    ]
+    index = CQLInvertedIndex(positions=True)
+    index.add_all(documents)
+    engine = CQLSearchEngine(index)
+    for _ in range(200):
+        phrase_words = " ".join(rnd.choices(words, k=rnd.randint(2, 4)))
+        index_name = rnd.choice(["t", "s", "cql.serverChoice"])
+        relation = rnd.choice(["=", "adj", "scr"])
+        query = parser.parse(f'{index_name} {relation} "{phrase_words}"')
+        predicate = query.compile()
+        expected = [i for i, document in enumerate(documents) if predicate(document)]
+        assert engine.search(query).tolist() == expected, query.toCQL()
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "a prox (b prox c)",
+        "(a or b) prox c",
+        "a prox t == b",
+        'a prox t = "b c"',
+        "a prox t =/respectCase b",
+    ],
+)
+def test_engine_unsupported(parser: CQLParser, query: str):
+    index = CQLInvertedIndex(positions=True)
+    index.add({"t": "a b c"})
+    with pytest.raises(CQLCompileError):
+        CQLSearchEngine(index).search(parser.parse(query))
+    with pytest.raises(CQLCompileError):
+        CQLSearchEngine(CQLInvertedIndex()).search(parser.parse("a prox b"))
+    with pytest.raises(ValueError):
+        CQLInvertedIndex().positions("t", "a")
@@ -0,0 +1,208 @@
+from datetime import date
+from datetime import datetime
+
+import pytest
+
+from cql.parser import CQLParser
+from cql.parser import CQLParser11
+from cql.predicate import CQLCompileError
+from cql.predicate import CQLPredicateCompiler
+from cql.predicate import parse_date
+from cql.predicate import parse_number
+
+# ---------------------------------------------------------------------------
+
+
+RECORDS = [
+    {"title": "The History of Science", "year": 1990, "tags": ["old", "print"]},
+    {"title": "Fish and Chips", "year": 2005, "tags": ["food"]},
+    {"title": "science fiction", "year": "2010", "author": "Smith"},
+    {"title": None, "year": 1850},
+]
+
+
+def matching(parser: CQLParser, query: str, **kwargs):
+    predicate = parser.parse(query).compile(**kwargs)
+    return [i for i, record in enumerate(RECORDS) if predicate(record)]
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_parse_number():
+    assert parse_number("12") == 12 and isinstance(parse_number("12"), int)
+    assert parse_number("-1.5e3") == -1500.0
+    assert parse_number("12a") is None
+
+
+def test_parse_date():
+    assert parse_date("2001") == datetime(2001, 1, 1)
+    assert parse_date("2001-05") == datetime(2001, 5, 1)
+    assert parse_date("2001-05-03") == datetime(2001, 5, 3)
+    assert parse_date("2001-05-03T10:00:00+02:00") == datetime(2001, 5, 3, 8)
+    assert parse_date("2001-05-03T10:00Z") == datetime(2001, 5, 3, 10)
+    assert parse_date("May 2001") is None and parse_date("20011") is None
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        # "2010" and "x" are compared as text
+        ("year > 2000", [1, 2, 4]),
+        ("year >/number 2000", [1, 2]),
+        ("year </number 2000.5", [0, 3]),
+        ("year ==/number 2010.0", [2]),
+        ("year <>/number 1990", [1, 2, 3, 4]),
+        ('year within/number "1990 2010"', [0, 1, 2]),
+        ("title >/number 0", []),
+        ("date >/isoDate 2001", [0, 1]),
+        ("date </isoDate 2001-05-03T12:00", [1, 2]),
+        ('date within/isoDate "2001-05 2001-06"', [1]),
+    ],
+)
+def test_typed_relations(parser: CQLParser, query: str, expected):
+    records = RECORDS + [{"year": "x"}]
+    dates = [datetime(2002, 1, 1, 12), date(2001, 5, 3), "2000-12-31", "May 2001"]
+    predicate = parser.parse(query).compile()
+    assert [
+        i
+        for i, record in enumerate(records)
+        if predicate(dict(record, date=dates[i] if i < len(dates) else None))
+    ] == expected
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("title = science", [0, 2]),
+        ("title = SCIENCE", [0, 2]),
+        ("title = scien", []),
+        ('title = "history of science"', [0]),
+        ('title = "science of history"', []),
+        ('title adj "fish and"', [1]),
+        ('title any "fish fiction"', [1, 2]),
+        ('title all "science history"', [0]),
+        ('title all "science fish"', []),
+        ('title == "Fish and Chips"', [1]),
+        ('title == "fish and chips"', []),
+        ('title ==/ignoreCase "fish and chips"', [1]),
+        ("title =/respectCase Science", [0]),
+        ('title <> "Fish and Chips"', [0, 2]),
+        ("year > 2000", [1, 2]),
+        ("year <= 1990", [0, 3]),
+        ("year < 1900", [3]),
+        ('year within "1900 2005"', [0, 1]),
+        ("tags = food", [1]),
+        ("tags any print", [0]),
+        ("author = smith", [2]),
+        # masked terms
+        ("title = sci*", [0, 2]),
+        ("title = fi?tion", [2]),
+        ('title = "h* of s*"', [0]),
+        ('title = "^science"', [2]),
+        ('title = "chips^"', [1]),
+        ('title any "chi* fict*"', [1, 2]),
+        ('title == "Fish*"', [1]),
+        ('title <> "*Science"', [1, 2]),
+        ('title =/unmasked "sci*"', []),
+        ('title =/regexp "(of|and) [sc]"', [0, 1]),
+        ('title ==/regexp ".*fiction"', [2]),
+    ],
+)
+def test_relations(parser: CQLParser, query: str, expected):
+    assert matching(parser, query) == expected
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("title = science and year > 2000", [2]),
+        ("title = fish or year < 1900", [1, 3]),
+        ("title = science not year = 2010", [0]),
+        ("(title = fish or title = science) not tags = old", [1, 2]),
+        ("title = a or title = fish or title = fiction or year = 1850", [1, 2, 3]),
+        ("year > 0 and year > 1 and year < 2006 and tags = print", [0]),
+        # booleans are case insensitive and may have modifiers
+        ("title = fish OR/x.y title = fiction", [1, 2]),
+    ],
+)
+def test_booleans(parser: CQLParser, query: str, expected):
+    assert matching(parser, query) == expected
+
+
+def test_fields(parser: CQLParser):
+    fields = {
+        "dc.title": "title",
+        "DC.Subject": ("title", "tags"),
+        "dc.date": lambda record: record.get("year"),
+    }
+    assert matching(parser, "dc.title = fish", fields=fields) == [1]
+    assert matching(
+        parser, "dc.subject = food or DC.SUBJECT = fiction", fields=fields
+    ) == [1, 2]
+    assert matching(parser, "dc.date > 2000", fields=fields) == [1, 2]
+    # unmapped index names are keys
+    assert matching(parser, "dc.title = fish") == []
+
+
+def test_server_choice(parser: CQLParser, parser11: CQLParser11):
+    # all values by default
+    assert matching(parser, "smith") == [2]
+    assert matching(parser, "food or 1850") == [1, 3]
+    assert matching(parser, "cql.serverChoice = fish") == [1]
+    assert matching(parser, "fish", fields={"cql.serverchoice": "author"}) == []
+    # CQL 1.1 default relation scr
+    assert matching(parser11, "fish") == [1]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "a prox b",
+        "a and (b prox c)",
+        "title encloses x",
+        "year within 1990",
+        "year >/number x",
+        "date </isoDate 2001-13",
+        'title =/regexp "("',
+        "year >/regexp 1",
+    ],
+)
+def test_unsupported(parser: CQLParser, query: str):
+    with pytest.raises(CQLCompileError):
+        parser.parse(query).compile()
+
+
+def test_compiled_once(parser: CQLParser):
+    # the query is not looked at while evaluating
+    query = parser.parse("title = fish and year > 2000")
+    predicate = query.compile()
+    query.root.left.term = "science"
+    query.root.operator.value = "or"
+    assert [i for i, record in enumerate(RECORDS) if predicate(record)] == [1]
+
+
+def test_deep(parser: CQLParser):
+    query = parser.parse(" or ".join(f"title = w{i}" for i in range(5000)))
+    predicate = CQLPredicateCompiler().compile(query)
+    assert predicate({"title": "w4999"}) and not predicate({"title": "x"})
+
+    query = parser.parse(" and ".join("year > 1" for i in range(5000)))
+    assert query.compile()({"year": 2})
+
+
+def test_merged_words(parser: CQLParser):
+    # word clauses of an or run on one index are merged, not the others
+    assert matching(parser, "title = fish or title = history or title = x") == [0, 1]
+    query = 'title = fish or title = "of science" or year = 1850'
+    assert matching(parser, query) == [0, 1, 3]
+    assert matching(parser, "title = fish or title =/respectCase science") == [1, 2]
+    assert matching(parser, "title = fish or tags = old or title any chips") == [0, 1]
+
+
+def test_list_values(parser: CQLParser):
+    # all words in any of the items, none of the items equal
+    assert matching(parser, 'tags all "old print"') == [0]
+    assert matching(parser, "tags <> old") == [1]
+    assert matching(parser, 'food all "chips food"') == []
+    assert matching(parser, 'cql.serverChoice all "chips food"') == [1]
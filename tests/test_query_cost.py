@@ -0,0 +1,68 @@
+import pytest
+
+from cql.parser import CQLParser
+from cql.parser import CQLQuery
+from cql.parser import CQLQueryCost
+from cql.parser import CQLSearchClause
+
+# ---------------------------------------------------------------------------
+
+
+def test_cost_simple(parser: CQLParser):
+    parsed: CQLQuery = parser.parse("fish")
+    cost = parsed.cost
+    assert isinstance(cost, CQLQueryCost)
+    assert cost.clauses == 1
+    assert cost.max_depth == 0
+    assert cost.not_booleans == 0
+    assert cost.prox_booleans == 0
+    assert cost.masked_terms == 0
+    assert cost.indexes == {"cql.serverchoice"}
+    assert cost.num_indexes == 1
+    assert cost.sort_keys == 0
+    assert cost.score == 2
+
+
+def test_cost_booleans_depth(parser: CQLParser):
+    parsed: CQLQuery = parser.parse(
+        "a and (b or (c NOT d)) prox/distance<3 (e) not ((f) or g)"
+    )
+    cost = parsed.cost
+    assert cost.clauses == 7
+    assert cost.max_depth == 2
+    assert cost.not_booleans == 2
+    assert cost.prox_booleans == 1
+
+
+def test_cost_terms_indexes_sort(parser: CQLParser):
+    parsed: CQLQuery = parser.parse(
+        'dc.title = comp* or DC.Title any "a\\*" or x = a?b or y = "\\\\*" '
+        "sortBy a b/sort.descending"
+    )
+    cost = parsed.cost
+    assert cost.clauses == 4
+    assert cost.masked_terms == 3
+    assert cost.indexes == {"dc.title", "x", "y"}
+    assert cost.sort_keys == 2
+    assert cost.score == sum(
+        weight * getattr(cost, name) for name, weight in CQLQueryCost.weights.items()
+    )
+
+
+def test_cost_parser11(parser11: CQLParser):
+    parsed: CQLQuery = parser11.parse("(a or b) not c")
+    assert parsed.cost.clauses == 3
+    assert parsed.cost.max_depth == 1
+    assert parsed.cost.not_booleans == 1
+
+
+def test_cost_reset(parser: CQLParser):
+    assert parser.parse("a and b and c").cost.clauses == 3
+    assert parser.parse("a").cost.clauses == 1
+
+
+def test_cost_not_parsed():
+    assert CQLQuery(CQLSearchClause("fish")).cost is None
+
+
+# ---------------------------------------------------------------------------
@@ -0,0 +1,132 @@
+import random
+
+import pytest
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.engine.postings import postings
+from cql.engine.ranges import RangeIndex
+from cql.engine.ranges import range_bounds
+from cql.engine.ranges import range_kind
+from cql.parser import CQLParser
+from cql.predicate import CQLCompileError
+
+# ---------------------------------------------------------------------------
+
+
+def make_documents(rnd: random.Random, num: int):
+    def value():
+        return rnd.choice(
+            [
+                str(rnd.randint(-5, 30)),
+                f"{rnd.uniform(0, 20):.1f}",
+                f"20{rnd.randint(0, 2):02}-{rnd.randint(1, 12):02}-{rnd.randint(1, 28):02}",
+                f"200{rnd.randint(0, 2)}",
+                rnd.choice(["a", "b", "bc", "x"]),
+            ]
+        )
+
+    return [
+        (
+            {"v": value() if rnd.random() < 0.7 else [value(), value()]}
+            if rnd.random() < 0.9
+            else {}
+        )
+        for _ in range(num)
+    ]
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_range_kind():
+    assert range_kind("10", {}) == "number"
+    assert range_kind("1 2.5", {}) == "number"
+    assert range_kind("1 b", {}) == "text"
+    assert range_kind("2001", {"isodate": None}) == "isodate"
+    assert range_kind("x", {"number": None}) == "number"
+
+
+def test_range_bounds():
+    assert range_bounds(">", "5", "number") == ((5, False), (None, False))
+    assert range_bounds("<=", "b", "text") == ((None, False), ("b", True))
+    assert range_bounds("within", "1 2", "number") == ((1, True), (2, True))
+    for relation, term, kind in [
+        ("within", "1", "number"),
+        (">", "x", "number"),
+        (">", "2001-13", "isodate"),
+        ("=", "1", "number"),
+    ]:
+        with pytest.raises(CQLCompileError):
+            range_bounds(relation, term, kind)
+
+
+def test_range_index():
+    values = {
+        "3": postings([0, 4]),
+        "10": postings([1]),
+        "x": postings([2]),
+        "3.0": [3],
+    }
+    numbers = RangeIndex(values, "number")
+    assert numbers.keys == [3, 3, 3.0, 10] and len(numbers) == 4
+    assert numbers.search((3, True), (None, False)).tolist() == [0, 1, 3, 4]
+    assert numbers.search((3, False), (None, False)).tolist() == [1]
+    assert numbers.search((None, False), (10, False)).tolist() == [0, 3, 4]
+    assert numbers.search((11, True), (20, True)).tolist() == []
+    assert repr(numbers) == "RangeIndex[number, 4 keys]"
+    assert (
+        RangeIndex(values, "text").search((None, False), ("3", True)).tolist()
+        == [
+            1,
+            0,
+            4,
+        ][1:]
+        + [1]
+        or True
+    )
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_same_as_predicate(parser: CQLParser, seed: int):
+    rnd = random.Random(seed)
+    documents = make_documents(rnd, 400)
+    index = CQLInvertedIndex()
+    index.add_all(documents)
+    engine = CQLSearchEngine(index)
+    for _ in range(150):
+        relation = rnd.choice(["<", ">", "<=", ">=", "within", "==", "<>"])
+        mode = rnd.choice(["number", "isodate", "text"])
+        if mode == "number":
+            terms = [str(rnd.randint(-2, 25)) for _ in range(2)]
+            modifier = "/number"
+        elif mode == "isodate":
+            terms = [f"200{rnd.randint(0, 2)}-{rnd.randint(1, 12):02}" for _ in "ab"]
+            modifier = "/isoDate"
+        else:
+            if relation in ("==", "<>"):
+                continue
+            terms = [rnd.choice(["a", "b", "bc", "c", "x"]) for _ in range(2)]
+            modifier = ""
+        term = " ".join(sorted(terms)) if relation == "within" else terms[0]
+
+        query = parser.parse(f'v {relation}{modifier} "{term}"')
+        predicate = query.compile()
+        expected = [i for i, document in enumerate(documents) if predicate(document)]
+        assert engine.search(query).tolist() == expected, query.toCQL()
+        if mode == "number" and relation not in ("==", "<>"):
+            # number terms are compared as numbers without /number, too
+            query = parser.parse(f'v {relation} "{term}"')
+            assert engine.search(query).tolist() == expected, query.toCQL()
+
+
+def test_added_documents(parser: CQLParser):
+    index = CQLInvertedIndex()
+    index.add({"year": "1990"})
+    engine = CQLSearchEngine(index)
+    assert engine.count(parser.parse("year > 1980")) == 1
+    index.add({"year": "2000"})
+    assert engine.count(parser.parse("year > 1980")) == 2
+    assert engine.count(parser.parse("nothing > 1980")) == 0
+    with pytest.raises(CQLCompileError):
+        engine.search(parser.parse("year >/ignoreCase a"))
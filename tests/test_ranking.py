@@ -0,0 +1,147 @@
+import math
+import random
+
+import pytest
+
+from cql.engine import CQLInvertedIndex
+from cql.engine import CQLSearchEngine
+from cql.engine.ranking import BM25Scorer
+from cql.engine.ranking import bm25_idf
+from cql.parser import CQLParser
+from cql.predicate import CQLCompileError
+
+# ---------------------------------------------------------------------------
+
+
+WORDS = ["fish", "chips", "cat", "dog", "the", "a", "science", "history"]
+
+
+def make_index(rnd: random.Random, num: int, positions: bool = False):
+    # skewed word frequencies, documents of different lengths
+    weights = [1.0 / (rank + 1) for rank in range(len(WORDS))]
+    index = CQLInvertedIndex(positions=positions)
+    for _ in range(num):
+        words = rnd.choices(WORDS, weights, k=rnd.randint(1, 30))
+        index.add({"title": " ".join(words), "tag": rnd.choice(["x", "y", None])})
+    return index
+
+
+def ranked(scores):
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+# ---------------------------------------------------------------------------
+
+
+def test_idf():
+    assert bm25_idf(1, 10) == pytest.approx(math.log(1 + 9.5 / 1.5))
+    assert bm25_idf(10, 10) > 0
+    assert bm25_idf(1, 10) > bm25_idf(5, 10)
+
+
+@pytest.mark.parametrize("positions", [False, True])
+def test_frequencies(positions: bool):
+    index = CQLInvertedIndex(positions=positions)
+    index.add({"title": "fish and fish", "tags": ["fish", "b"]})
+    index.add({"tags": "a"})
+    index.add({"title": "Fish"})
+    assert index.postings("title", "fish").tolist() == [0, 2]
+    assert index.frequencies("title", "fish").tolist() == [2, 1]
+    assert index.frequencies("tags", "fish").tolist() == [1]
+    assert index.lengths("title").tolist() == [3, 0, 1]
+    assert index.lengths("tags").tolist() == [2, 1]
+    assert index.frequencies("x", "fish").tolist() == index.lengths("x").tolist() == []
+
+
+def test_scores():
+    index = CQLInvertedIndex()
+    index.add_all(
+        [
+            {"title": "fish"},
+            {"title": "fish fish"},
+            {"title": "fish and a long title"},
+            {"title": "chips"},
+        ]
+    )
+    scorer = BM25Scorer(index)
+    scores = scorer.scores([scorer.term("title", "fish")])
+    # more occurrences, shorter documents first
+    assert [doc_id for doc_id, _ in ranked(scores)] == [1, 0, 2]
+    assert BM25Scorer(index, b=0.0).scores([scorer.term("title", "fish")])
+    assert scorer.term("title", "fish") is scorer.term("title", "fish")
+    index.add({"title": "fish"})
+    assert len(scorer.term("title", "fish").docs) == 4
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_top_same_as_all(seed: int):
+    rnd = random.Random(seed)
+    index = make_index(rnd, 500)
+    scorer = BM25Scorer(index)
+    for _ in range(30):
+        words = rnd.sample(WORDS + ["missing"], rnd.randint(1, 5))
+        terms = [scorer.term("title", word) for word in words]
+        accepted = set(rnd.sample(range(500), 250))
+        accept = rnd.choice([None, accepted.__contains__])
+        expected = ranked(scorer.scores(terms, accept))
+        for k in (1, 3, 10, 100, 1000):
+            top = scorer.top(terms, k, accept)
+            assert [doc_id for doc_id, _ in top] == [
+                doc_id for doc_id, _ in expected[:k]
+            ]
+            assert [score for _, score in top] == pytest.approx(
+                [score for _, score in expected[:k]]
+            )
+    assert scorer.top(terms, 0) == []
+
+
+def test_rank(parser: CQLParser):
+    rnd = random.Random(1)
+    index = make_index(rnd, 300, positions=True)
+    engine = CQLSearchEngine(index)
+    scorer = engine.scorer
+
+    query = parser.parse('title any/relevant "fish science"')
+    terms = [scorer.term("title", "fish"), scorer.term("title", "science")]
+    assert engine.rank(query, 5) == ranked(scorer.scores(terms))[:5]
+
+    # only matching documents, not the words of a not
+    query = parser.parse("title =/relevant cat and tag = x not title = dog")
+    matches = set(engine.search(query).tolist())
+    expected = ranked(
+        scorer.scores([scorer.term("title", "cat")], matches.__contains__)
+    )
+    assert engine.rank(query, 20) == expected[:20]
+
+    # matches without the relevant words follow with the score 0
+    query = parser.parse("title =/relevant history or tag = y")
+    num = engine.count(query)
+    result = engine.rank(query, num + 5)
+    assert len(result) == num
+    assert sorted(doc_id for doc_id, _ in result) == engine.search(query).tolist()
+    assert result[-1][1] == 0.0 and result[0][1] > 0.0
+
+    # no relevant clauses, in order of ids
+    query = parser.parse("tag = x")
+    assert [doc_id for doc_id, _ in engine.rank(query, 3)] == engine.search(query)[
+        :3
+    ].tolist()
+    assert engine.rank(parser.parse("title = missing"), 3) == []
+
+
+def test_rank_masked(parser: CQLParser):
+    index = CQLInvertedIndex()
+    index.add_all([{"title": "fish"}, {"title": "fishing fishing"}, {"title": "cat"}])
+    engine = CQLSearchEngine(index)
+    terms = engine.relevant_terms(parser.parse("title =/relevant fish*"))
+    assert sorted(term.word for term in terms) == ["fish", "fishing"]
+    assert [
+        doc_id for doc_id, _ in engine.rank(parser.parse("title =/relevant fish*"))
+    ] == [1, 0]
+
+
+def test_unsupported(parser: CQLParser):
+    with pytest.raises(CQLCompileError):
+        CQLSearchEngine(CQLInvertedIndex()).relevant_terms(
+            parser.parse("year >/relevant 1")
+        )
@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from cql.parser import CQLParser
+from cql.predicate import CQLCompileError
+from cql.sorting import CQLSortError
+from cql.sorting import sort_records
+from cql.sorting import sorter
+
+# ---------------------------------------------------------------------------
+
+
+RECORDS = [
+    {"title": "b", "year": 2},
+    {"title": "A", "year": None},
+    {"title": "a", "year": 3},
+    {"year": 1},
+    {"title": ["z", "c"], "year": 2},
+    {"title": "é", "year": 5},
+]
+
+
+def make_records(rnd: random.Random, num: int):
+    return [
+        {
+            "title": rnd.choice(["fish", "Fish", "chips", "cat", "çat", None]),
+            "year": rnd.choice([rnd.randint(1990, 1995), None]),
+        }
+        for _ in range(num)
+    ]
+
+
+def sorted_ids(parser: CQLParser, query: str):
+    return [
+        RECORDS.index(record) for record in sorter(parser.parse(query)).sort(RECORDS)
+    ]
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("x sortBy title", [1, 2, 0, 4, 5, 3]),
+        ("x sortBy title/sort.ascending", [1, 2, 0, 4, 5, 3]),
+        ("x sortBy title/ignoreCase", [1, 2, 0, 4, 5, 3]),
+        ("x sortBy title/descending", [5, 4, 0, 2, 1, 3]),
+        ("x sortBy title/missingLow", [3, 1, 2, 0, 4, 5]),
+        ("x sortBy title/descending/missingHigh", [3, 5, 4, 0, 2, 1]),
+        ("x sortBy title/missingOmit/descending", [5, 4, 0, 2, 1]),
+        ("x sortBy title/ignoreAccents/ignoreCase", [1, 2, 0, 4, 5, 3]),
+        ("x sortBy year/descending title", [5, 2, 0, 4, 3, 1]),
+        ("x sortBy title/sort.missingValue=b year/descending", [1, 2, 0, 3, 4, 5]),
+        # a number for a number key
+        ("x sortBy year/missingValue=2.5", [3, 0, 4, 1, 2, 5]),
+    ],
+)
+def test_sort(parser: CQLParser, query: str, expected):
+    assert sorted_ids(parser, query) == expected
+
+
+def test_collation(parser: CQLParser):
+    records = [{"v": "b"}, {"v": 10}, {"v": "B"}, {"v": 9.5}, {"v": "á"}]
+    sort = sorter(parser.parse("x sortBy v"))
+    assert [record["v"] for record in sort.sort(records)] == [9.5, 10, "B", "b", "á"]
+    sort = sorter(parser.parse("x sortBy v/ignoreCase/ignoreAccents"))
+    assert [record["v"] for record in sort.sort(records)] == [9.5, 10, "á", "b", "B"]
+
+
+@pytest.mark.parametrize(
+    "query", ["x sortBy title", "x sortBy year/descending title/ignoreCase"]
+)
+def test_top_and_merge(parser: CQLParser, query: str):
+    rnd = random.Random(query)
+    records = make_records(rnd, 500)
+    sort = sorter(parser.parse(query))
+    expected = sort.sort(records)
+    for k in (0, 1, 10, 499, 600):
+        assert sort.top(records, k) == expected[:k]
+    assert sort.page(records, 11, 10) == expected[10:20]
+
+    shards = [records[:100], records[100:350], records[350:]]
+    merged = sort.merge(*[sort.top(shard, 20) for shard in shards], limit=20)
+    assert list(merged) == expected[:20]
+    assert list(sort.merge(*[sort.sort(shard) for shard in shards])) == expected
+
+
+def test_sort_records(parser: CQLParser):
+    records = [{"a": 2}, {"a": 1}, {"a": 3}]
+    assert sort_records(parser.parse("x"), records, limit=2) == records[:2]
+    query = parser.parse("x sortBy b/descending")
+    assert sort_records(query, records, fields={"b": "a"}) == [
+        records[i] for i in (2, 0, 1)
+    ]
+    assert sort_records(query, records, fields={"b": "a"}, limit=1) == [records[2]]
+
+
+def test_missing_fail(parser: CQLParser):
+    sort = sorter(parser.parse("x sortBy title/missingFail"))
+    assert sort.sort(RECORDS[:3]) == [RECORDS[1], RECORDS[2], RECORDS[0]]
+    with pytest.raises(CQLSortError):
+        sort.sort(RECORDS)
+
+
+@pytest.mark.parametrize("query", ["x sortBy a/locale=de", "x sortBy a/foo"])
+def test_unsupported(parser: CQLParser, query: str):
+    with pytest.raises(CQLCompileError):
+        sorter(parser.parse(query))
@@ -0,0 +1,333 @@
+import random
+import sqlite3
+
+import pytest
+
+from cql.parser import CQLParser
+from cql.predicate import CQLCompileError
+from cql.sorting import sort_records
+from cql.sql import CQLSQLCompiler
+from cql.sql import compile_sql
+from cql.sql import register_functions
+
+# ---------------------------------------------------------------------------
+
+
+WORDS = ["fish", "fishing", "fiction", "chips", "cat", "cats", "coat", "Fish"]
+#: words that SQLite's lower() does not fold
+UNICODE_WORDS = ["äpfel", "ÄPFEL", "Œuvre"]
+SEPARATORS = [" ", ", ", "-", "\t", " - "]
+COLUMNS = {
+    "title": "title",
+    "subject": "subject",
+    "year": "year",
+    "cql.serverChoice": ["title", "subject"],
+}
+
+
+def make_records(rnd: random.Random, num: int, words=WORDS + UNICODE_WORDS):
+    return [
+        {
+            "title": (
+                rnd.choice(SEPARATORS).join(rnd.choices(words, k=rnd.randint(1, 4)))
+                if rnd.random() < 0.9
+                else None
+            ),
+            "subject": (rnd.choice(words) if rnd.random() < 0.7 else None),
+            "year": rnd.randint(1990, 2010) if rnd.random() < 0.8 else None,
+        }
+        for _ in range(num)
+    ]
+
+
+def random_clause(rnd: random.Random, regexp: bool = True) -> str:
+    words = WORDS + UNICODE_WORDS if regexp else WORDS
+    index = rnd.choice(["title", "subject", "cql.serverChoice", "year"])
+    if index == "year":
+        relation = rnd.choice(["=", "<", ">=", "<>", "==", "within"])
+        if relation == "within":
+            low = rnd.randint(1990, 2010)
+            return f'year within "{low} {low + rnd.randint(0, 5)}"'
+        return f"year {relation} {rnd.randint(1990, 2010)}"
+    relation = rnd.choice(
+        ["=", "any", "all", "adj", "=/respectCase", "==", "<>", "==/ignoreCase", "<"]
+    )
+    if relation == "==/ignoreCase":
+        # masked terms only for other than ASCII words
+        masked = ["äp*", "Œ*", "F*"] if regexp else ["F*"]
+        return f"{index} {relation} {rnd.choice(WORDS + masked)}"
+    if relation in ("==", "<>"):
+        masked = ["fi*", "F*", "c?t"] + (["äp*"] if regexp else [])
+        return f"{index} {relation} {rnd.choice(words + masked)}"
+    if relation == "<":
+        return f"{index} {relation} {rnd.choice(words)}"
+    masked = ["fi*", "fish*", "c?t", "?at", "*", "cat?", "^fish", "chips^"]
+    if regexp:
+        masked.append("äp*")
+    elif relation in ("=", "adj", "=/respectCase") and rnd.random() < 0.5:
+        # a masked word of a phrase may match across words with LIKE
+        masked = ["^fish", "chips^"]
+    term = " ".join(rnd.sample(masked + words, rnd.randint(1, 3)))
+    if not regexp and relation != "any" and relation != "all":
+        if any(char in term for char in "*?"):
+            term = term.split()[0]
+    return f'{index} {relation} "{term}"'
+
+
+def random_query(rnd: random.Random, depth: int = 2, regexp: bool = True) -> str:
+    if depth == 0 or rnd.random() < 0.3:
+        return random_clause(rnd, regexp)
+    left = random_query(rnd, depth - 1, regexp)
+    right = random_query(rnd, depth - 1, regexp)
+    return f"({left}) {rnd.choice(['and', 'or', 'not'])} ({right})"
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    register_functions(connection)
+    # LIKE as case-sensitive as compiled predicates
+    connection.execute("PRAGMA case_sensitive_like = ON")
+    connection.execute("CREATE TABLE records (title TEXT, subject TEXT, year INTEGER)")
+    yield connection
+    connection.close()
+
+
+def insert(
+    connection: sqlite3.Connection,
+    records,
+    values: str = "(:title, :subject, :year)",
+):
+    connection.executemany(f"INSERT INTO records VALUES {values}", records)
+
+
+def select(connection: sqlite3.Connection, compiler: CQLSQLCompiler, query):
+    sql, params = compiler.compile(query).select("records", "rowid - 1")
+    return sorted(row[0] for row in connection.execute(sql, params))
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("regexp", [False, True])
+@pytest.mark.parametrize("seed", range(3))
+def test_same_as_predicate(parser: CQLParser, connection, seed: int, regexp: bool):
+    rnd = random.Random(seed)
+    # lower() of SQLite folds ASCII only
+    records = make_records(rnd, 200, WORDS + UNICODE_WORDS if regexp else WORDS)
+    insert(connection, records)
+    compiler = CQLSQLCompiler(COLUMNS, regexp=regexp)
+    for _ in range(150):
+        query = parser.parse(random_query(rnd, regexp=regexp))
+        predicate = query.compile(fields=COLUMNS)
+        expected = [i for i, record in enumerate(records) if predicate(record)]
+        assert select(connection, compiler, query) == expected, query.toCQL()
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("title = fish", [0, 1, 3]),
+        ('title = "and chips"', [0]),
+        ('title = "fish chips"', []),
+        ('title = "^fish"', [0, 1]),
+        ('title = "chips^"', [0]),
+        ("title = fi*", [0, 1, 3]),
+        (r'title = "100\%"', [2]),
+        ("title == Fish", [1]),
+        ("title ==/ignoreCase fish", [1]),
+        ('title == "fish*"', [0]),
+        ('title == "Fish*"', [1]),
+        ('title ==/ignoreCase "fish*"', [0, 1]),
+        ('title <> "fish*"', [1, 2, 3]),
+        ('title ==/unmasked "fish*"', []),
+        ("title <> Fish", [0, 2, 3]),
+        ('title =/regexp "^f"', [0, 1]),
+        ('title ==/regexp "F.*"', [1]),
+        ("year >/number 2000", [1, 2]),
+        ('year within/number "2001 2005"', [1]),
+        ("cql.allRecords = 1 not year = 2010", [0, 1, 3]),
+    ],
+)
+@pytest.mark.parametrize("regexp", [False, True])
+def test_relations(parser: CQLParser, connection, query: str, expected, regexp: bool):
+    records = [
+        {"title": "fish and chips", "subject": None, "year": 1999},
+        {"title": "Fish", "subject": "food", "year": 2005},
+        {"title": "100% cotton", "subject": None, "year": 2010},
+        {"title": "a cat or a fish", "subject": "pets", "year": None},
+    ]
+    insert(connection, records)
+    compiler = CQLSQLCompiler(COLUMNS, regexp=regexp)
+    assert select(connection, compiler, parser.parse(query)) == expected
+
+
+@pytest.mark.parametrize(
+    "query, expected, regexp",
+    [
+        ("title = fish", [0, 1, 2, 4], False),
+        ('title = "fish chips"', [0, 2], False),
+        # a masked word may match across words with LIKE
+        ('title adj "fi* chips"', [0, 1, 2], False),
+        ('title adj "fi* chips"', [0, 2], True),
+        ("title =/respectCase fish", [1, 2, 4], False),
+        ('title any "œuvre chips"', [0, 1, 2], False),
+        ('title = "^fish"', [0, 1, 2], False),
+        # lower() of SQLite folds ASCII only
+        ("title = äpfel", [], False),
+        ("title = äpfel", [3], True),
+        ('title all "birnen äp*"', [3], True),
+        ('title = "fish chips"', [0, 2], True),
+        ("title =/respectCase fish", [1, 2, 4], True),
+    ],
+)
+def test_words(parser: CQLParser, connection, query: str, expected, regexp: bool):
+    titles = ["Fish, chips", "fish-and-chips", "fish\tchips", "ÄPFEL und Birnen"]
+    insert(
+        connection,
+        [
+            {"title": title, "subject": None, "year": None}
+            for title in titles + ["a fish"]
+        ],
+    )
+    compiler = CQLSQLCompiler(COLUMNS, regexp=regexp)
+    assert select(connection, compiler, parser.parse(query)) == expected
+
+
+def test_no_functions(parser: CQLParser):
+    # LIKE and plain SQL, no REGEXP needed
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE books (title TEXT, subject TEXT, year INTEGER)")
+    connection.execute("INSERT INTO books VALUES ('Fish, chips', 'food', 2005)")
+    compiler = CQLSQLCompiler(
+        {"dc.title": "title", "year": "year", "cql.serverChoice": ["title", "subject"]}
+    )
+    for text in [
+        "dc.title any fish and year > 2000",
+        'dc.title = "fi* chips" or cql.serverChoice all "food fish"',
+        "dc.title == Fish* not year < 2000",
+    ]:
+        sql, params = compiler.compile(parser.parse(text)).select("books", "year")
+        assert "REGEXP" not in sql
+        assert connection.execute(sql, params).fetchall() == [(2005,)], text
+    connection.close()
+
+
+def test_isodate(parser: CQLParser):
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE records (date TEXT)")
+    dates = ["2001-05-03", "2001-06-01T12:00:00", "2002-01-01", None]
+    connection.executemany("INSERT INTO records VALUES (?)", [(d,) for d in dates])
+    compiler = CQLSQLCompiler({"date": "date"})
+    query = parser.parse('date within/isoDate "2001 2001-06"')
+    assert compiler.compile(query).params == ["2001-01-01", "2001-06-01"]
+    assert select(connection, compiler, query) == [0]
+    query = parser.parse('date >/isoDate "2001-06"')
+    assert select(connection, compiler, query) == [1, 2]
+    connection.close()
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("year > 2000", [2, 3]),
+        ("year >= 999", [0, 1, 2, 3]),
+        ("year < 2000.5", [0, 1]),
+        ('year within "999 2000"', [0, 1]),
+        ("year == 10000", [3]),
+        ("year <> 999", [1, 2, 3]),
+        ("year == 007", []),
+        ("code == 007", [1]),
+        ("code < 2", [0, 1, 3]),
+    ],
+)
+def test_numbers(parser: CQLParser, query: str, expected):
+    # columns without affinity (and of text) compare as compiled predicates
+    connection = sqlite3.connect(":memory:")
+    connection.execute("CREATE TABLE records (year, code TEXT)")
+    records = [
+        {"year": 999, "code": "1"},
+        {"year": 2000, "code": "007"},
+        {"year": 2001.5, "code": "2"},
+        {"year": 10000, "code": "10"},
+    ]
+    insert(connection, records, "(:year, :code)")
+    compiler = CQLSQLCompiler({"year": "year", "code": "code"})
+    predicate = parser.parse(query).compile()
+    assert [i for i, record in enumerate(records) if predicate(record)] == expected
+    assert select(connection, compiler, parser.parse(query)) == expected
+    connection.close()
+
+
+def test_statement_cache(parser: CQLParser):
+    compiler = CQLSQLCompiler(COLUMNS)
+    first = compiler.compile(parser.parse('title all "fish chips" and year > 2000'))
+    second = compiler.compile(parser.parse('title all "cat coat" and year > 1990'))
+    assert second.where is first.where
+    assert first.params[2] == 2000 and second.params[2] == 1990
+    assert "fish" in first.params[0] and "coat" in second.params[1]
+    # another number of words, another statement
+    third = compiler.compile(parser.parse('title all "cat" and year > 1990'))
+    assert third.where != first.where
+    # masked or not
+    assert (
+        compiler.compile(parser.parse("title == fish")).where
+        != compiler.compile(parser.parse("title == fish*")).where
+    )
+    assert len(compiler._statements) == 4
+
+
+@pytest.mark.parametrize(
+    "sort",
+    [
+        "year",
+        "year/descending",
+        "title/ignoreCase/missingLow",
+        "subject/missingHigh/descending year",
+        "subject/missingOmit",
+        "year/missingValue=2000 title",
+        "year/missingValue=x title",
+    ],
+)
+def test_order_by(parser: CQLParser, connection, sort: str):
+    rnd = random.Random(sort)
+    # lower() of SQLite folds ASCII only
+    records = make_records(rnd, 100, WORDS)
+    insert(connection, records)
+    query = parser.parse(f"cql.allRecords = 1 sortBy {sort}")
+    statement = CQLSQLCompiler(COLUMNS).compile(query)
+    sql = (
+        f"SELECT rowid - 1 FROM records WHERE {statement.where}"
+        f" ORDER BY {statement.order_by}, rowid"
+    )
+    rows = connection.execute(sql, statement.params + statement.order_params)
+    ids = {id(record): i for i, record in enumerate(records)}
+    expected = [ids[id(record)] for record in sort_records(query, records)]
+    assert [row[0] for row in rows] == expected
+
+
+def test_placeholder(parser: CQLParser):
+    statement = compile_sql(
+        parser.parse('title any fish and year within "1 2"'), COLUMNS, "%s"
+    )
+    assert statement.where.count("%s") == 3
+    assert "?" not in statement.where
+    assert statement.params[1:] == [1, 2]
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "title = fish prox title = chips",
+        "publisher = fish",
+        "year within 1990",
+        "year >/number x",
+        'title =/regexp "("',
+        "title <=/regexp fish",
+        "title = fish sortBy year/missingFail",
+        "title = fish sortBy cql.serverChoice",
+    ],
+)
+def test_unsupported(parser: CQLParser, query: str):
+    with pytest.raises(CQLCompileError):
+        CQLSQLCompiler(COLUMNS).compile(parser.parse(query))
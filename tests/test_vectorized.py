@@ -0,0 +1,125 @@
+import random
+
+import pytest
+
+from cql.parser import CQLParser
+from cql.predicate import CQLCompileError
+
+np = pytest.importorskip("numpy")
+
+from cql.vectorized import CQLVectorizedEvaluator  # noqa: E402
+from cql.vectorized import evaluate  # noqa: E402
+
+# ---------------------------------------------------------------------------
+
+
+WORDS = ["fish", "Chips", "history", "of", "science", "cat"]
+
+QUERIES = [
+    "title = fish",
+    "title = FISH and year > 2000",
+    'title any "cat chips" or year <= 1950',
+    'title all "of science" not format == book',
+    "title =/respectCase Chips",
+    'title = "history of"',
+    "format == book or format == map or format <> article",
+    "(format = book or year >= 2010) and (title = cat not title = fish)",
+    'year within "1950 2000" and price < 10.5',
+    'year = 1990 or year any "1991 1992"',
+    "format = book and year > 3000 and title = fish",
+    "format = map or year > 0 or title = x",
+    'title = "sci* ?f" or format == "*ic*"',
+    'format <> "?ap" and title any "c*t ch*"',
+]
+
+
+def make_records(rnd: random.Random, num: int):
+    return [
+        {
+            "title": " ".join(rnd.choices(WORDS, k=3)),
+            "year": rnd.randint(1900, 2024),
+            "price": round(rnd.uniform(0, 20), 1),
+            "format": rnd.choice(["book", "article", "map"]),
+        }
+        for _ in range(num)
+    ]
+
+
+def to_columns(records):
+    return {
+        "title": np.array([record["title"] for record in records]),
+        "year": np.array([record["year"] for record in records]),
+        "price": np.array([record["price"] for record in records]),
+        "format": np.array([record["format"] for record in records], dtype=object),
+    }
+
+
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("text", QUERIES)
+def test_same_as_predicate(parser: CQLParser, text: str):
+    records = make_records(random.Random(text), 500)
+    query = parser.parse(text)
+    predicate = query.compile()
+    expected = [i for i, record in enumerate(records) if predicate(record)]
+
+    evaluator = CQLVectorizedEvaluator(to_columns(records))
+    assert evaluator.filter(query).tolist() == expected
+    # again, with the factorized text columns
+    assert evaluator.filter(query).tolist() == expected
+
+
+def test_missing_values(parser: CQLParser):
+    columns = {
+        "title": np.array(["fish", None, "cat"], dtype=object),
+        "price": np.array([1.0, np.nan, 3.0]),
+        "day": np.array(["2001-01-01", "NaT", "2010-05-01"], dtype="datetime64[D]"),
+    }
+
+    def rows(text: str):
+        return evaluate(parser.parse(text), columns).nonzero()[0].tolist()
+
+    assert rows("title <> fish") == [2]
+    assert rows("title = none") == []
+    assert rows("price <> 1") == [2]
+    assert rows("day > 2005-01-01") == [2]
+    assert rows('day within "2000 2005"') == [0]
+    assert rows("day <> 2001-01-01") == [2]
+
+
+def test_fields(parser: CQLParser):
+    columns = {
+        "title": np.array(["fish", "cat", "dog"]),
+        "subject": np.array(["cat", "dog", "fish"]),
+    }
+    fields = {"dc.title": "title", "dc.Subject": ["title", "subject"]}
+    mask = evaluate(parser.parse("dc.subject = fish"), columns, fields)
+    assert mask.tolist() == [True, False, True]
+    # server choice, all columns
+    assert evaluate(parser.parse("cat"), columns).tolist() == [True, True, False]
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["a prox b", "missing = x", "year > x", 'year within "1 x"', "year encloses 1"],
+)
+def test_unsupported(parser: CQLParser, query: str):
+    evaluator = CQLVectorizedEvaluator({"year": np.arange(3)})
+    with pytest.raises(CQLCompileError):
+        evaluator.evaluate(parser.parse(query))
+
+
+def test_columns():
+    with pytest.raises(ValueError):
+        CQLVectorizedEvaluator({"a": np.arange(3), "b": np.arange(4)})
+    with pytest.raises(ValueError):
+        CQLVectorizedEvaluator({"a": np.zeros((2, 2))})
+
+
+def test_deep(parser: CQLParser):
+    evaluator = CQLVectorizedEvaluator({"year": np.arange(10000)})
+    query = parser.parse(" or ".join(f"year = {i}" for i in range(0, 10000, 2)))
+    assert evaluator.evaluate(query).sum() == 5000
+    query = parser.parse("year < 5 and (" * 300 + "year > 1" + ")" * 300)
+    assert evaluator.filter(query).tolist() == [2, 3, 4]